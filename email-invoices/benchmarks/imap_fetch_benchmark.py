@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+IMAP fetch benchmark
+
+Compares fetching one message per UID FETCH (``fetch_batch_size: 0``) in
+``EmailProcessor.process_emails`` with batched UID FETCH commands against a
+local, in-process IMAP stand-in that adds a fixed latency to every command
+round trip.
+
+Usage:
+    python benchmarks/imap_fetch_benchmark.py --messages 2000 --latency 0.005
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import tempfile
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from email_processor import EmailProcessor  # noqa: E402
+
+
+class LocalIMAPStandIn:
+    """Minimal in-memory replacement for ``imaplib.IMAP4_SSL``.
+
+    Only the commands used by ``EmailProcessor`` are implemented. Every call
+    sleeps for ``latency`` seconds to model one network round trip.
+    """
+
+    def __init__(self, messages: List[bytes], latency: float):
+        self.messages = {uid: raw for uid, raw in enumerate(messages, 1)}
+        self.seen = set()
+        self.latency = latency
+        self.round_trips = 0
+
+    def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def select(self, folder: str = 'INBOX') -> Tuple[str, List[bytes]]:
+        self._round_trip()
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def response(self, code: str) -> Tuple[str, List[Any]]:
+        return code, [b'1'] if code == 'UIDVALIDITY' else [None]
+
+    def uid(self, command: str, *args: Any) -> Tuple[str, List[Any]]:
+        self._round_trip()
+        command = command.upper()
+        if command == 'SEARCH':
+            ids = [uid for uid in self.messages if uid not in self.seen]
+            return 'OK', [' '.join(map(str, ids)).encode()]
+        if command == 'FETCH':
+            peek = 'PEEK' in args[1].upper()
+            data: List[Any] = []
+            for uid in self._expand(args[0]):
+                raw = self.messages[uid]
+                if not peek:
+                    self.seen.add(uid)
+                data.append((b'%d (UID %d BODY[] {%d}' % (uid, uid, len(raw)), raw))
+                data.append(b')')
+            return 'OK', data
+        if command == 'STORE':
+            if 'SEEN' in args[2].upper():
+                self.seen.update(self._expand(args[0]))
+            return 'OK', [None]
+        return 'NO', [b'Unsupported command']
+
+    def _expand(self, message_set: str) -> List[int]:
+        uids = []
+        for item in message_set.split(','):
+            start, _, end = item.partition(':')
+            uids.extend(range(int(start), int(end or start) + 1))
+        return [uid for uid in uids if uid in self.messages]
+
+
+def build_messages(count: int, attachment_size: int) -> List[bytes]:
+    """Build ``count`` deterministic test messages."""
+    messages = []
+    for index in range(count):
+        msg = MIMEMultipart()
+        msg['From'] = f"billing{index % 7}@vendor{index % 5}.example.com"
+        msg['To'] = "invoices@example.com"
+        msg['Subject'] = f"Invoice {index:05d}"
+        msg.attach(MIMEText(f"Please find invoice {index:05d} attached.", 'plain'))
+        if attachment_size:
+            part = MIMEApplication(bytes(index % 256 for _ in range(attachment_size)))
+            part['Content-Disposition'] = f'attachment; filename="invoice_{index:05d}.pdf"'
+            msg.attach(part)
+        messages.append(msg.as_bytes())
+    return messages
+
+
+def run_once(messages: List[bytes], latency: float, batch_size: int) -> Dict[str, Any]:
+    """Run ``process_emails`` once and return throughput figures."""
+    with tempfile.TemporaryDirectory(prefix='imap_bench_') as output_dir:
+        processor = EmailProcessor({
+            'email': {'folder': 'INBOX', 'fetch_batch_size': batch_size},
+            'output_dir': output_dir,
+        })
+        processor.mail = LocalIMAPStandIn(messages, latency)
+
+        start = time.perf_counter()
+        processor.process_emails()
+        elapsed = time.perf_counter() - start
+
+    return {
+        'mode': 'batched' if batch_size else 'per-message',
+        'batch_size': batch_size,
+        'messages': len(messages),
+        'round_trips': processor.mail.round_trips,
+        'seconds': round(elapsed, 4),
+        'messages_per_sec': round(len(messages) / elapsed, 1) if elapsed else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark IMAP fetch modes.')
+    parser.add_argument('--messages', type=int, default=2000,
+                        help='Number of unseen messages in the stand-in mailbox')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='Simulated round-trip latency in seconds')
+    parser.add_argument('--batch-sizes', type=str, default='0,100,500',
+                        help='Comma-separated batch sizes to compare (0 = per-message)')
+    parser.add_argument('--attachment-size', type=int, default=0,
+                        help='Size in bytes of a PDF attachment added to every message')
+    args = parser.parse_args()
+
+    logging.getLogger('email_processor').setLevel(logging.WARNING)
+    messages = build_messages(args.messages, args.attachment_size)
+    batch_sizes = [int(size) for size in re.split(r'[,\s]+', args.batch_sizes) if size]
+
+    results = [run_once(messages, args.latency, size) for size in batch_sizes]
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Content-addressed attachment store
+
+Attachments are stored once under their SHA-256 digest. Output directories
+receive hardlinks into the store, and processing stages record their results
+per digest so the same file is never processed twice.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class BlobWriter:
+    """
+    Incrementally write a blob while computing its digest.
+
+    Use as a context manager; the blob is committed into the store when the
+    block exits without an exception and discarded otherwise. A caller that
+    already knows the digest passes it in and the content is not hashed again.
+    """
+
+    def __init__(self, store: 'BlobStore', digest: Optional[str] = None):
+        self._store = store
+        self._known_digest = digest
+        self._hash = hashlib.sha256() if digest is None else None
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.tmp_dir, prefix='blob_')
+        self._file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.digest: Optional[str] = None
+        self.created = False
+
+    def write(self, chunk: bytes) -> None:
+        """Append a chunk to the blob."""
+        if self._hash is not None:
+            self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Move the blob into place and return its digest."""
+        if self.digest is not None:
+            return self.digest
+        self._file.close()
+        self.digest = self._known_digest or self._hash.hexdigest()
+        target = self._store.path_for(self.digest)
+        if target.exists():
+            os.unlink(self._tmp_path)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._tmp_path, target)
+            self.created = True
+        return self.digest
+
+    def abort(self) -> None:
+        """Discard the partially written blob."""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+    def __enter__(self) -> 'BlobWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class BlobStore:
+    """
+    A directory of blobs keyed by SHA-256 with per-stage result records.
+
+    Layout::
+
+        <root>/blobs/ab/abcdef...         file contents
+        <root>/stages/<stage>/ab/abcdef...json   stage results
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Initialize the store.
+
+        Args:
+            root: Root directory of the store (created if missing)
+        """
+        self.root = Path(root)
+        self.tmp_dir = self.root / 'tmp'
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        (self.root / 'blobs').mkdir(exist_ok=True)
+
+    def path_for(self, digest: str) -> Path:
+        """Return the path of the blob with the given digest."""
+        return self.root / 'blobs' / digest[:2] / digest
+
+    def writer(self, digest: Optional[str] = None) -> BlobWriter:
+        """
+        Return a writer that hashes the content while it is written.
+
+        Args:
+            digest: SHA-256 of the content if already computed; the writer
+                then trusts it instead of hashing again
+        """
+        return BlobWriter(self, digest)
+
+    def put(self, data: bytes) -> Tuple[str, bool]:
+        """
+        Store a blob.
+
+        Args:
+            data: Blob contents
+
+        Returns:
+            Tuple of ``(digest, created)`` where ``created`` is False if the
+            blob was already present
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if self.path_for(digest).exists():
+            return digest, False
+        with self.writer(digest) as writer:
+            writer.write(data)
+        return digest, writer.created
+
+    def link(self, digest: str, destination: Union[str, Path]) -> Path:
+        """
+        Make a blob available at ``destination``.
+
+        A hardlink is used when possible, falling back to a copy across
+        filesystems.
+
+        Args:
+            digest: Digest of a stored blob
+            destination: Path of the link to create
+
+        Returns:
+            The destination path
+        """
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        source = self.path_for(digest)
+        if destination.exists():
+            if destination.samefile(source):
+                return destination
+            destination.unlink()
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+        return destination
+
+    def _result_path(self, stage: str, digest: str) -> Path:
+        return self.root / 'stages' / stage / digest[:2] / f"{digest}.json"
+
+    def get_result(self, stage: str, digest: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the recorded result of a stage for a blob.
+
+        Args:
+            stage: Stage name, e.g. ``"ocr"`` or ``"ai"``
+            digest: Blob digest
+
+        Returns:
+            The stored result, or ``None`` if the stage has not seen the blob
+        """
+        path = self._result_path(stage, digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable {stage} result for {digest}: {e}")
+            return None
+
+    def put_result(self, stage: str, digest: str, result: Dict[str, Any]) -> None:
+        """
+        Record the result of a stage for a blob.
+
+        Args:
+            stage: Stage name
+            digest: Blob digest
+            result: JSON-serializable result
+        """
+        path = self._result_path(stage, digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, prefix='result_')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
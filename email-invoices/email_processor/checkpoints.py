@@ -0,0 +1,216 @@
+"""
+Mailbox sync checkpoints
+
+This module provides a small SQLite-backed store that records, per mailbox,
+the UIDVALIDITY value, the highest processed UID and the status of every
+processed UID. Reruns only need to fetch UIDs above the high-water mark plus
+the UIDs that failed last time.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    mailbox TEXT PRIMARY KEY,
+    uidvalidity INTEGER,
+    high_water INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    mailbox TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (mailbox, uid)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_status ON messages (mailbox, status);
+"""
+
+
+class CheckpointStore:
+    """
+    Persistent per-mailbox sync state.
+
+    A mailbox is identified by a free-form key such as
+    ``"user@imap.example.com/INBOX"``. The store is safe to share between
+    threads.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        """
+        Open (and create if needed) the checkpoint database.
+
+        Args:
+            path: Path to the SQLite database file
+            max_attempts: How many times a failed UID is retried
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def begin(self, mailbox: str, uidvalidity: Optional[int]) -> int:
+        """
+        Start a sync run and return the UID high-water mark.
+
+        If the server reports a different UIDVALIDITY than the one stored,
+        previously recorded UIDs are meaningless and the mailbox state is
+        reset.
+
+        Args:
+            mailbox: Mailbox key
+            uidvalidity: UIDVALIDITY reported by the server after SELECT
+
+        Returns:
+            Highest UID already processed (0 for a fresh mailbox)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT uidvalidity, high_water FROM mailboxes WHERE mailbox = ?', (mailbox,)
+            ).fetchone()
+
+            if row and (uidvalidity is None or row[0] == uidvalidity):
+                return row[1]
+
+            if row:
+                logger.warning(
+                    f"UIDVALIDITY of {mailbox} changed ({row[0]} -> {uidvalidity}); "
+                    "resetting checkpoint"
+                )
+            self._conn.execute('BEGIN')
+            self._conn.execute('DELETE FROM messages WHERE mailbox = ?', (mailbox,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO mailboxes (mailbox, uidvalidity, high_water, updated_at) '
+                'VALUES (?, ?, 0, ?)',
+                (mailbox, uidvalidity, _now()),
+            )
+            self._conn.execute('COMMIT')
+            return 0
+
+    def high_water(self, mailbox: str) -> int:
+        """Return the highest processed UID of a mailbox."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT high_water FROM mailboxes WHERE mailbox = ?', (mailbox,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def unprocessed(self, mailbox: str, uids: Iterable[int]) -> List[int]:
+        """
+        Drop the UIDs that are already recorded as done.
+
+        Args:
+            mailbox: Mailbox key
+            uids: Candidate UIDs
+
+        Returns:
+            Sorted UIDs that still need processing
+        """
+        uids = sorted({int(uid) for uid in uids})
+        if not uids:
+            return []
+        with self._lock:
+            done = {
+                row[0] for row in self._conn.execute(
+                    'SELECT uid FROM messages WHERE mailbox = ? AND status = ? '
+                    'AND uid BETWEEN ? AND ?',
+                    (mailbox, STATUS_DONE, uids[0], uids[-1]),
+                )
+            }
+        return [uid for uid in uids if uid not in done]
+
+    def retry_uids(self, mailbox: str) -> List[int]:
+        """Return failed UIDs that have not exhausted their retry budget."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT uid FROM messages WHERE mailbox = ? AND status = ? AND attempts < ? '
+                'ORDER BY uid',
+                (mailbox, STATUS_FAILED, self.max_attempts),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark(self, mailbox: str, uid: int, status: str, error: Optional[str] = None) -> None:
+        """
+        Record the outcome of processing a single UID.
+
+        Args:
+            mailbox: Mailbox key
+            uid: Message UID
+            status: ``STATUS_DONE`` or ``STATUS_FAILED``
+            error: Optional error description for failed messages
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO messages (mailbox, uid, status, attempts, error, updated_at) '
+                'VALUES (?, ?, ?, 1, ?, ?) '
+                'ON CONFLICT (mailbox, uid) DO UPDATE SET status = excluded.status, '
+                'attempts = attempts + 1, error = excluded.error, updated_at = excluded.updated_at',
+                (mailbox, int(uid), status, error, _now()),
+            )
+
+    def advance(self, mailbox: str, uid: int) -> None:
+        """Raise the high-water mark of a mailbox to ``uid`` if it is higher."""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE mailboxes SET high_water = MAX(high_water, ?), updated_at = ? '
+                'WHERE mailbox = ?',
+                (int(uid), _now(), mailbox),
+            )
+
+
+class UidWatermark:
+    """
+    Track which of a set of UIDs have been recorded in the checkpoint store.
+
+    Messages can finish out of order, and a UID that is never recorded (for
+    example because its FETCH failed) must not end up below the high-water
+    mark, where no later run would look at it again. ``record`` returns the
+    highest UID below which every tracked UID has been recorded, which is
+    the value that is safe to pass to ``CheckpointStore.advance``.
+    """
+
+    def __init__(self, uids: Iterable[int]):
+        self._uids = sorted({int(uid) for uid in uids})
+        self._recorded = set()
+        self._next = 0
+
+    def record(self, uid: int) -> Optional[int]:
+        """Record a UID and return the new safe high-water mark, if any."""
+        self._recorded.add(int(uid))
+        while self._next < len(self._uids) and self._uids[self._next] in self._recorded:
+            self._next += 1
+        return self.safe
+
+    @property
+    def safe(self) -> Optional[int]:
+        """Highest tracked UID below which every tracked UID was recorded."""
+        return self._uids[self._next - 1] if self._next else None
+
+    def missing(self) -> List[int]:
+        """Return the tracked UIDs that were not recorded yet."""
+        return [uid for uid in self._uids[self._next:] if uid not in self._recorded]
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
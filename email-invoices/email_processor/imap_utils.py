@@ -0,0 +1,213 @@
+"""
+IMAP helper utilities
+
+This module contains helpers shared by the email processors for working with
+UID message sets and for parsing FETCH responses returned by ``imaplib``.
+"""
+
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_LITERAL_RE = re.compile(rb'\{(\d+)\+?\}$')
+_LITERAL_MARKER_RE = re.compile(rb'\x00(\d+)\x00')
+_ATOM_DELIMITERS = b' ()"\x00'
+
+
+def chunked(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    """
+    Split a sequence into consecutive chunks.
+
+    Args:
+        items: Sequence to split
+        size: Maximum number of items per chunk
+
+    Yields:
+        Consecutive slices of ``items``
+    """
+    if size <= 0:
+        raise ValueError("Chunk size must be positive")
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def compress_uid_set(uids: Iterable[Any]) -> str:
+    """
+    Build a compact IMAP message set from a collection of UIDs.
+
+    Consecutive UIDs are collapsed into ranges, e.g. ``[1, 2, 3, 7, 9, 10]``
+    becomes ``"1:3,7,9:10"``.
+
+    Args:
+        uids: UIDs as ints, strings or bytes
+
+    Returns:
+        Message set string suitable for UID commands
+    """
+    numbers = sorted({int(uid) for uid in uids})
+    if not numbers:
+        raise ValueError("Cannot build a message set from an empty UID list")
+
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:]:
+        if number == prev + 1:
+            prev = number
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = number
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def parse_uid_list(data: List[Any]) -> List[int]:
+    """
+    Parse the payload of a ``UID SEARCH`` response into a list of UIDs.
+
+    Args:
+        data: Data part of the ``imaplib`` response
+
+    Returns:
+        Sorted list of UIDs
+    """
+    if not data or not data[0]:
+        return []
+    return sorted(int(uid) for uid in data[0].split())
+
+
+def get_uidvalidity(mail: Any) -> Optional[int]:
+    """
+    Return the UIDVALIDITY reported by the last SELECT/EXAMINE, if any.
+
+    Args:
+        mail: ``imaplib`` client that has just selected a folder
+
+    Returns:
+        The UIDVALIDITY value, or ``None`` if the server did not report it
+    """
+    try:
+        _, values = mail.response('UIDVALIDITY')
+        return int(values[0])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _tokenize_list(text: bytes, literals: List[bytes], pos: int) -> Tuple[List[Any], int]:
+    """Parse a parenthesized list starting right after the opening paren."""
+    items: List[Any] = []
+    length = len(text)
+    while pos < length:
+        char = text[pos:pos + 1]
+        if char == b' ':
+            pos += 1
+        elif char == b')':
+            return items, pos + 1
+        elif char == b'(':
+            value, pos = _tokenize_list(text, literals, pos + 1)
+            items.append(value)
+        elif char == b'"':
+            value, pos = _read_quoted(text, pos + 1)
+            items.append(value)
+        elif char == b'\x00':
+            match = _LITERAL_MARKER_RE.match(text, pos)
+            if not match:
+                raise ValueError("Malformed literal marker in FETCH response")
+            items.append(literals[int(match.group(1))])
+            pos = match.end()
+        else:
+            value, pos = _read_atom(text, pos)
+            items.append(None if value.upper() == b'NIL' else value)
+    return items, pos
+
+
+def _read_quoted(text: bytes, pos: int) -> Tuple[bytes, int]:
+    """Read a quoted string starting right after the opening quote."""
+    out = bytearray()
+    while pos < len(text):
+        char = text[pos]
+        if char == 0x5C:  # backslash
+            out.append(text[pos + 1])
+            pos += 2
+        elif char == 0x22:  # closing quote
+            return bytes(out), pos + 1
+        else:
+            out.append(char)
+            pos += 1
+    raise ValueError("Unterminated quoted string in FETCH response")
+
+
+def _read_atom(text: bytes, pos: int) -> Tuple[bytes, int]:
+    """Read an atom, keeping bracketed sections such as ``BODY[1.2]`` intact."""
+    start = pos
+    depth = 0
+    while pos < len(text):
+        char = text[pos:pos + 1]
+        if char == b'[':
+            depth += 1
+        elif char == b']':
+            depth -= 1
+        elif depth == 0 and char in _ATOM_DELIMITERS:
+            break
+        pos += 1
+    return text[start:pos], pos
+
+
+def _parse_message(chunks: List[Any]) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Parse the chunks belonging to a single ``* n FETCH (...)`` response."""
+    text_parts: List[bytes] = []
+    literals: List[bytes] = []
+    for chunk in chunks:
+        if isinstance(chunk, tuple):
+            prefix, literal = chunk
+            text_parts.append(_LITERAL_RE.sub(b'', prefix))
+            text_parts.append(b'\x00%d\x00' % len(literals))
+            literals.append(literal)
+        else:
+            text_parts.append(chunk)
+
+    text = b''.join(text_parts)
+    paren = text.find(b'(')
+    if paren < 0:
+        return None
+
+    values, _ = _tokenize_list(text, literals, paren + 1)
+    items = {}
+    for key, value in zip(values[0::2], values[1::2]):
+        items[key.decode('ascii', 'replace').upper()] = value
+
+    uid = items.get('UID')
+    return (int(uid) if uid is not None else None), items
+
+
+def iter_fetch_response(data: List[Any]) -> Iterator[Tuple[Optional[int], Dict[str, Any]]]:
+    """
+    Parse a FETCH response from ``imaplib`` message by message.
+
+    The response list is consumed as it is parsed: each element is released
+    once its message has been yielded, so the caller only keeps references to
+    the message it is currently handling.
+
+    Args:
+        data: Data part of an ``imaplib`` FETCH/UID FETCH response
+
+    Yields:
+        Tuples of ``(uid, items)`` where ``items`` maps data item names such
+        as ``RFC822`` or ``BODY[1]`` to their values
+    """
+    current: List[Any] = []
+    for index, element in enumerate(data):
+        data[index] = None
+        if element is None:
+            continue
+        head = element[0] if isinstance(element, tuple) else element
+        starts_message = head[:1].isdigit()
+        if starts_message and current:
+            parsed = _parse_message(current)
+            current = []
+            if parsed:
+                yield parsed
+        current.append(element)
+
+    if current:
+        parsed = _parse_message(current)
+        if parsed:
+            yield parsed
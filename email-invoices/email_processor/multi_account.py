@@ -0,0 +1,362 @@
+"""
+Multi-mailbox ingestion
+
+This module runs many mailboxes concurrently on top of a bounded pool of IMAP
+connections. Large mailboxes are split into disjoint UID ranges that are
+fetched over parallel connections, and work is interleaved round-robin across
+accounts so one huge mailbox cannot starve the others. Each server has its
+own workers, so a busy server does not hold up the accounts of another.
+"""
+
+import imaplib
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import zip_longest
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .checkpoints import UidWatermark
+from .imap_utils import chunked, get_uidvalidity
+from .process_invoices import EmailProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS_PER_SERVER = 4
+DEFAULT_RANGE_SIZE = 500
+
+
+def _open_connection(email_config: Dict[str, Any]) -> imaplib.IMAP4:
+    """Open and authenticate a new IMAP connection."""
+    mail = imaplib.IMAP4_SSL(email_config['server'], email_config['port'])
+    mail.login(email_config['username'], email_config['password'])
+    return mail
+
+
+class ImapConnectionPool:
+    """
+    A pool of authenticated IMAP connections bounded per server.
+
+    At most ``max_per_server`` connections are open to any ``(server, port)``
+    at a time, across all accounts on that server. Idle connections are kept
+    per account and reused; an idle connection of another account is closed
+    when a new login is needed and the server is at its limit.
+    """
+
+    def __init__(
+        self,
+        max_per_server: int = DEFAULT_MAX_CONNECTIONS_PER_SERVER,
+        connect: Callable[[Dict[str, Any]], imaplib.IMAP4] = _open_connection,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            max_per_server: Maximum open connections per server
+            connect: Factory opening an authenticated connection for an
+                ``email`` configuration section
+        """
+        self.max_per_server = max_per_server
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._open: Dict[Tuple[str, int], int] = defaultdict(int)
+        self._idle: Dict[Tuple[str, int, str], List[imaplib.IMAP4]] = defaultdict(list)
+
+    @staticmethod
+    def _keys(email_config: Dict[str, Any]) -> Tuple[Tuple[str, int], Tuple[str, int, str]]:
+        server = (email_config['server'], int(email_config.get('port', 993)))
+        return server, server + (email_config['username'],)
+
+    @contextmanager
+    def connection(self, email_config: Dict[str, Any]) -> Iterator[imaplib.IMAP4]:
+        """
+        Borrow a connection for an account.
+
+        Args:
+            email_config: ``email`` configuration section of the account
+
+        Yields:
+            An authenticated connection. It is returned to the pool when the
+            block exits normally and discarded if the block raises.
+        """
+        mail = self._acquire(email_config)
+        try:
+            yield mail
+        except Exception:
+            self._release(email_config, mail, broken=True)
+            raise
+        else:
+            self._release(email_config, mail, broken=False)
+
+    def _acquire(self, email_config: Dict[str, Any]) -> imaplib.IMAP4:
+        server_key, account_key = self._keys(email_config)
+        evicted = None
+        with self._cond:
+            while True:
+                if self._idle[account_key]:
+                    return self._idle[account_key].pop()
+                if self._open[server_key] < self.max_per_server:
+                    self._open[server_key] += 1
+                    break
+                evicted = self._pop_idle_for_server(server_key)
+                if evicted is not None:
+                    break
+                self._cond.wait()
+
+        if evicted is not None:
+            # Reuse the evicted connection's slot for a new login
+            _logout(evicted)
+        try:
+            return self._connect(email_config)
+        except Exception:
+            with self._cond:
+                self._open[server_key] -= 1
+                self._cond.notify_all()
+            raise
+
+    def _pop_idle_for_server(self, server_key: Tuple[str, int]) -> Optional[imaplib.IMAP4]:
+        for account_key, connections in self._idle.items():
+            if account_key[:2] == server_key and connections:
+                return connections.pop()
+        return None
+
+    def _release(self, email_config: Dict[str, Any], mail: imaplib.IMAP4, broken: bool) -> None:
+        server_key, account_key = self._keys(email_config)
+        with self._cond:
+            if broken:
+                self._open[server_key] -= 1
+            else:
+                self._idle[account_key].append(mail)
+            self._cond.notify_all()
+        if broken:
+            _logout(mail)
+
+    def close_all(self) -> None:
+        """Log out all idle connections."""
+        with self._cond:
+            idle = [(key, conn) for key, conns in self._idle.items() for conn in conns]
+            self._idle.clear()
+            for key, _ in idle:
+                self._open[key[:2]] -= 1
+            self._cond.notify_all()
+        for _, conn in idle:
+            _logout(conn)
+
+
+def _interleave(plans: Dict[str, List[List[int]]]) -> List[Tuple[str, List[int]]]:
+    """Order work units round-robin across accounts: A1, B1, C1, A2, B2, ..."""
+    queues = [[(name, uids) for uids in ranges] for name, ranges in plans.items()]
+    return [unit for round_ in zip_longest(*queues) for unit in round_ if unit]
+
+
+def _logout(mail: imaplib.IMAP4) -> None:
+    try:
+        mail.logout()
+    except Exception as e:
+        logger.debug(f"Error logging out pooled connection: {e}")
+
+
+class MultiAccountRunner:
+    """
+    Process many mailboxes concurrently over a shared connection pool.
+    """
+
+    def __init__(
+        self,
+        accounts: List[Dict[str, Any]],
+        max_connections_per_server: int = DEFAULT_MAX_CONNECTIONS_PER_SERVER,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        pool: Optional[ImapConnectionPool] = None,
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            accounts: One ``EmailProcessor`` configuration per mailbox; an
+                optional ``name`` key labels the account in reports
+            max_connections_per_server: Connection limit per IMAP server
+            range_size: Number of UIDs per work unit
+            pool: Optional pre-built connection pool
+        """
+        self.pool = pool or ImapConnectionPool(max_connections_per_server)
+        self.range_size = max(range_size, 1)
+        self.processors: Dict[str, EmailProcessor] = {}
+        for index, account in enumerate(accounts):
+            name = account.get('name') or f"{account['email']['username']}@{account['email']['server']}"
+            if name in self.processors:
+                name = f"{name}#{index}"
+            self.processors[name] = EmailProcessor(account)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'MultiAccountRunner':
+        """
+        Build a runner from a configuration with an ``accounts`` list.
+
+        Settings outside ``accounts`` act as defaults for every account, and
+        the optional ``pool`` section sets ``max_connections_per_server`` and
+        ``range_size``.
+        """
+        defaults = {k: v for k, v in config.items() if k not in ('accounts', 'pool')}
+        accounts = []
+        for account in config['accounts']:
+            merged = {**defaults, **account}
+            merged['email'] = {**defaults.get('email', {}), **account.get('email', {})}
+            accounts.append(merged)
+
+        pool_config = config.get('pool', {})
+        return cls(
+            accounts,
+            max_connections_per_server=int(
+                pool_config.get('max_connections_per_server', DEFAULT_MAX_CONNECTIONS_PER_SERVER)
+            ),
+            range_size=int(pool_config.get('range_size', DEFAULT_RANGE_SIZE)),
+        )
+
+    def _server(self, name: str) -> Tuple[str, int]:
+        """Return the ``(server, port)`` of an account."""
+        server, _ = self.pool._keys(self.processors[name].config['email'])
+        return server
+
+    def _plan(self, name: str) -> List[List[int]]:
+        """Select the account's folder, find pending UIDs and split them into ranges."""
+        processor = self.processors[name]
+        email_config = processor.config['email']
+        with self.pool.connection(email_config) as mail:
+            status, _ = mail.select(email_config.get('folder', 'INBOX'))
+            if status != 'OK':
+                raise RuntimeError(f"Failed to select folder for {name}")
+            processor.uidvalidity = get_uidvalidity(mail)
+            if processor.checkpoints:
+                uids = processor._checkpointed_uids(mail, processor.uidvalidity)
+            else:
+                uids = processor._search_new_uids('UNSEEN', mail)
+        return [list(chunk) for chunk in chunked(uids or [], self.range_size)]
+
+    def _run_unit(self, name: str, uids: List[int]) -> Dict[int, Optional[str]]:
+        """
+        Fetch and process one UID range over a pooled connection.
+
+        Returns:
+            The error of every UID of the range, or None for the ones
+            processed successfully
+
+        Raises:
+            RuntimeError: If the account's folder cannot be selected
+        """
+        processor = self.processors[name]
+        email_config = processor.config['email']
+        batch_size = max(int(email_config.get('fetch_batch_size') or 0), 1)
+        outcomes: Dict[int, Optional[str]] = {}
+        with self.pool.connection(email_config) as mail:
+            # A pooled connection may still have another folder selected
+            status, _ = mail.select(email_config.get('folder', 'INBOX'))
+            if status != 'OK':
+                raise RuntimeError(f"Failed to select folder for {name}")
+            processor._process_uids(
+                uids, batch_size, mail, advance_checkpoint=False, outcomes=outcomes
+            )
+        return outcomes
+
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Process all accounts.
+
+        Returns:
+            Per-account report with the number of messages processed, errors
+            (failed messages, ranges and plans), elapsed seconds and messages
+            per second
+        """
+        stats: Dict[str, Dict[str, Any]] = {
+            name: {'messages': 0, 'ranges': 0, 'errors': 0, 'started': None, 'finished': None}
+            for name in self.processors
+        }
+        lock = threading.Lock()
+        plans: Dict[str, List[List[int]]] = {}
+        recorded: Dict[str, List[int]] = {name: [] for name in self.processors}
+
+        # One executor per server, with a thread per allowed connection: a
+        # server at its connection limit only holds back its own accounts'
+        # units instead of blocking threads that other servers' units need
+        executors = {
+            server: ThreadPoolExecutor(
+                max_workers=self.pool.max_per_server, thread_name_prefix=f"imap-{server[0]}"
+            )
+            for server in {self._server(name) for name in self.processors}
+        }
+
+        def submit(name: str, fn: Callable[..., Any], *args: Any) -> Future:
+            return executors[self._server(name)].submit(fn, *args)
+
+        try:
+            # Phase 1: find pending UIDs per account
+            futures = {submit(name, self._plan, name): name for name in self.processors}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    plans[name] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to plan mailbox {name}: {e}")
+                    stats[name]['errors'] += 1
+
+            # Phase 2: interleave UID ranges round-robin across accounts
+            def run_unit(name: str, uids: List[int]) -> None:
+                with lock:
+                    stats[name]['started'] = stats[name]['started'] or time.monotonic()
+                try:
+                    outcomes = self._run_unit(name, uids)
+                    failed = sum(1 for error in outcomes.values() if error)
+                    with lock:
+                        stats[name]['messages'] += len(outcomes) - failed
+                        stats[name]['errors'] += failed
+                        stats[name]['ranges'] += 1
+                        recorded[name].extend(outcomes)
+                except Exception as e:
+                    logger.error(f"Failed to process {name} UIDs {uids[0]}-{uids[-1]}: {e}")
+                    with lock:
+                        stats[name]['errors'] += 1
+                finally:
+                    with lock:
+                        stats[name]['finished'] = time.monotonic()
+
+            units = _interleave(plans)
+            for future in [submit(name, run_unit, name, uids) for name, uids in units]:
+                future.result()
+        finally:
+            for executor in executors.values():
+                executor.shutdown()
+            self.pool.close_all()
+
+        # Advance each checkpoint over the UIDs recorded as done or failed; a
+        # range that raised stops it below its first unrecorded UID
+        for name, plan in plans.items():
+            processor = self.processors[name]
+            if not processor.checkpoints or not plan:
+                continue
+            watermark = UidWatermark(uid for uids in plan for uid in uids)
+            for uid in recorded[name]:
+                watermark.record(uid)
+            if watermark.safe is not None:
+                processor.checkpoints.advance(processor._mailbox_key(), watermark.safe)
+
+        report = {name: self._report(entry) for name, entry in stats.items()}
+        for name, entry in report.items():
+            logger.info(
+                f"{name}: {entry['messages']} messages in {entry['seconds']}s "
+                f"({entry['messages_per_sec'] or 0} msg/s, {entry['errors']} errors)"
+            )
+        return report
+
+    @staticmethod
+    def _report(entry: Dict[str, Any]) -> Dict[str, Any]:
+        elapsed = 0.0
+        if entry['started'] is not None and entry['finished'] is not None:
+            elapsed = entry['finished'] - entry['started']
+        return {
+            'messages': entry['messages'],
+            'ranges': entry['ranges'],
+            'errors': entry['errors'],
+            'seconds': round(elapsed, 3),
+            'messages_per_sec': round(entry['messages'] / elapsed, 2) if elapsed else None,
+        }
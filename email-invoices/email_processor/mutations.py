@@ -0,0 +1,184 @@
+"""
+Bulk mailbox mutations
+
+Flag changes and moves requested while messages are processed are collected
+here and committed in bulk: one ``UID STORE`` per flag set and message set,
+``UID MOVE`` (RFC 6851) where the server supports it with a ``COPY`` +
+``\\Deleted`` fallback otherwise, and a single ``UID EXPUNGE`` (RFC 4315) at
+the end. Messages that were never added keep their flags untouched.
+"""
+
+import imaplib
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
+
+from .imap_utils import chunked, compress_uid_set
+from .search import quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MUTATION_BATCH_SIZE = 500
+
+_ATOM_RE = re.compile(r'^[A-Za-z0-9._/&+-]+$')
+
+
+def mailbox_argument(folder: str) -> str:
+    """Return a folder name as an IMAP mailbox argument, quoting it when needed."""
+    return folder if _ATOM_RE.match(folder) else quote(folder)
+
+
+class MailboxChanges:
+    """
+    Pending flag changes and moves for the messages of the selected folder.
+
+    Example::
+
+        changes = MailboxChanges(mail)
+        changes.add_flags(42, r'\\Seen')
+        changes.move(42, 'Processed')
+        changes.commit()
+    """
+
+    def __init__(
+        self,
+        mail: Any,
+        batch_size: int = DEFAULT_MUTATION_BATCH_SIZE,
+        commit_every: int = 0,
+    ):
+        """
+        Initialize the change set.
+
+        Args:
+            mail: ``imaplib`` client with the folder selected
+            batch_size: Maximum number of messages per UID command
+            commit_every: Commit automatically once this many messages have
+                pending changes (0 = only when ``commit`` is called)
+        """
+        self.mail = mail
+        self.batch_size = max(int(batch_size), 1)
+        self.commit_every = max(int(commit_every or 0), 0)
+        self._flags: Dict[Tuple[str, ...], Set[int]] = defaultdict(set)
+        self._moves: Dict[str, Set[int]] = defaultdict(set)
+        self._touched: Set[int] = set()
+
+    @property
+    def pending(self) -> int:
+        """Number of messages with uncommitted changes."""
+        return len(self._touched)
+
+    def add_flags(self, uid: int, *flags: str) -> None:
+        """
+        Queue flags to be added to a message.
+
+        Args:
+            uid: UID of the message
+            flags: Flags such as ``\\Seen`` or ``$Processed``
+        """
+        if flags:
+            self._flags[tuple(sorted(set(flags)))].add(int(uid))
+            self._touch(uid)
+
+    def move(self, uid: int, folder: str) -> None:
+        """
+        Queue a message to be moved to another folder.
+
+        Args:
+            uid: UID of the message
+            folder: Destination folder
+        """
+        self._moves[folder].add(int(uid))
+        self._touch(uid)
+
+    def _touch(self, uid: int) -> None:
+        self._touched.add(int(uid))
+        if self.commit_every and len(self._touched) >= self.commit_every:
+            self.commit()
+
+    def _capabilities(self) -> Set[str]:
+        capabilities = getattr(self.mail, 'capabilities', None) or ()
+        try:
+            return {str(cap).upper() for cap in capabilities}
+        except TypeError:
+            return set()
+
+    def _uid(self, command: str, *args: Any) -> bool:
+        try:
+            status, data = self.mail.uid(command, *args)
+        except imaplib.IMAP4.abort:
+            # Dropped connections are left to the caller
+            raise
+        except imaplib.IMAP4.error as e:
+            logger.error(f"UID {command} {args[0]} failed: {e}")
+            return False
+        if status != 'OK':
+            logger.error(f"UID {command} {args[0]} failed: {data}")
+            return False
+        return True
+
+    def commit(self) -> Dict[str, int]:
+        """
+        Send all pending changes to the server.
+
+        Flags are stored before moves so that moved messages carry them.
+
+        Returns:
+            Counts of ``flagged``, ``moved`` and ``failed`` messages
+        """
+        summary = {'flagged': 0, 'moved': 0, 'failed': 0}
+        flags, moves = self._flags, self._moves
+        self._flags, self._moves, self._touched = defaultdict(set), defaultdict(set), set()
+        if not (flags or moves):
+            return summary
+
+        failed: Set[int] = set()
+        for flag_set, uids in flags.items():
+            flag_list = f"({' '.join(flag_set)})"
+            for chunk in chunked(sorted(uids), self.batch_size):
+                if self._uid('STORE', compress_uid_set(chunk), '+FLAGS.SILENT', flag_list):
+                    summary['flagged'] += len(chunk)
+                else:
+                    failed.update(chunk)
+
+        capabilities = self._capabilities()
+        deleted: List[int] = []
+        for folder, uids in moves.items():
+            mailbox = mailbox_argument(folder)
+            for chunk in chunked(sorted(uids), self.batch_size):
+                message_set = compress_uid_set(chunk)
+                if 'MOVE' in capabilities and self._uid('MOVE', message_set, mailbox):
+                    summary['moved'] += len(chunk)
+                    continue
+                if not self._uid('COPY', message_set, mailbox):
+                    failed.update(chunk)
+                    continue
+                if self._uid('STORE', message_set, '+FLAGS.SILENT', r'(\Deleted)'):
+                    deleted.extend(chunk)
+                    summary['moved'] += len(chunk)
+                else:
+                    failed.update(chunk)
+
+        if deleted:
+            self._expunge(deleted, 'UIDPLUS' in capabilities)
+
+        summary['failed'] = len(failed)
+        logger.info(
+            f"Committed mailbox changes: {summary['flagged']} flagged, "
+            f"{summary['moved']} moved, {summary['failed']} failed"
+        )
+        return summary
+
+    def _expunge(self, uids: List[int], uidplus: bool) -> None:
+        """Remove the copied originals with one UID EXPUNGE, or EXPUNGE without UIDPLUS."""
+        if uidplus:
+            self._uid('EXPUNGE', compress_uid_set(uids))
+            return
+        # Without UIDPLUS EXPUNGE also removes messages deleted by other clients
+        logger.warning("Server lacks UIDPLUS; falling back to EXPUNGE of the whole folder")
+        try:
+            self.mail.expunge()
+        except imaplib.IMAP4.abort:
+            raise
+        except imaplib.IMAP4.error as e:
+            logger.error(f"EXPUNGE failed: {e}")
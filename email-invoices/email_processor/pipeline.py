@@ -0,0 +1,436 @@
+"""
+Asynchronous invoice pipeline
+
+This module runs the email invoice flow as a chain of asyncio stages
+connected by bounded queues::
+
+    fetch -> persist -> OCR -> AI extraction -> sink
+
+Blocking IMAP and disk work runs in threads, OCR runs in a process pool and
+AI calls are capped at a fixed concurrency. Every queue is bounded, so a slow
+stage applies backpressure upstream and end-to-end throughput is set by the
+slowest stage rather than by the sum of all stages.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .checkpoints import STATUS_DONE, STATUS_FAILED, UidWatermark
+from .mutations import MailboxChanges
+from .streaming import StreamedMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_PERSIST_WORKERS = 2
+DEFAULT_AI_CONCURRENCY = 4
+
+# Marks the end of a queue; one is sent per downstream worker
+_DONE = object()
+
+_ocr_processor = None
+
+
+def _init_ocr_worker(config: Optional[Dict[str, Any]] = None) -> None:
+    """Create the OCR processor of a pool worker once, when the worker starts."""
+    global _ocr_processor
+    from shared import create_ocr_processor
+
+    _ocr_processor = create_ocr_processor(config)
+
+
+def ocr_file(path: str) -> str:
+    """
+    Extract the text of an attachment with the shared local OCR processor.
+
+    Runs inside OCR pool workers, which keep one processor each.
+
+    Args:
+        path: Path of a PDF or image file
+
+    Returns:
+        Extracted text (empty if OCR failed)
+    """
+    if _ocr_processor is None:
+        _init_ocr_worker()
+    result = _ocr_processor.process_file(path)
+    return result.get('full_text') or result.get('text') or ''
+
+
+class _Job:
+    """An attachment travelling through the pipeline."""
+
+    __slots__ = ('uid', 'filepath', 'digest', 'processed_dir', 'text', 'ai_result', 'error')
+
+    def __init__(self, uid: int, filepath: str, digest: Optional[str], processed_dir: str):
+        self.uid = uid
+        self.filepath = filepath
+        self.digest = digest
+        self.processed_dir = processed_dir
+        self.text: Optional[str] = None
+        self.ai_result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+
+class InvoicePipeline:
+    """
+    Staged asyncio pipeline on top of an ``EmailProcessor``.
+
+    The processor provides the connection, the fetch strategy (full, partial
+    or streaming), attachment storage, AI extraction and checkpoints; the
+    pipeline only changes how these steps are scheduled.
+    """
+
+    def __init__(
+        self,
+        processor: Any,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        persist_workers: int = DEFAULT_PERSIST_WORKERS,
+        ocr_workers: Optional[int] = None,
+        ai_concurrency: int = DEFAULT_AI_CONCURRENCY,
+        ocr: Optional[Callable[[str], str]] = ocr_file,
+        ocr_executor: Optional[Executor] = None,
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            processor: Connected ``EmailProcessor`` with its folder selected
+            queue_size: Capacity of each queue between stages
+            persist_workers: Concurrent attachment writers
+            ocr_workers: OCR processes (defaults to the CPU count)
+            ai_concurrency: Maximum concurrent AI calls
+            ocr: Picklable function returning the text of a file, or None to
+                skip OCR
+            ocr_executor: Executor for OCR calls; by default a process pool
+                of ``ocr_workers`` is created for each run, or a thread pool
+                when ``ocr.service_socket`` points to the shared OCR service
+        """
+        self.processor = processor
+        self.queue_size = max(queue_size, 1)
+        self.persist_workers = max(persist_workers, 1)
+        self.ocr_workers = max(ocr_workers or os.cpu_count() or 1, 1)
+        self.ai_concurrency = max(ai_concurrency, 1)
+        self.ocr = ocr
+        self.ocr_executor = ocr_executor
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._pending: Dict[int, int] = {}
+        self._errors: Dict[int, str] = {}
+        self._outcomes: Optional[Dict[int, Optional[str]]] = None
+        self._watermark = UidWatermark([])
+        self._changes: Optional[MailboxChanges] = None
+
+    @classmethod
+    def from_processor(cls, processor: Any) -> 'InvoicePipeline':
+        """
+        Build a pipeline from the ``pipeline`` and ``ocr`` configuration sections.
+
+        ``pipeline`` may set ``queue_size``, ``persist_workers``,
+        ``ocr_workers`` and ``ai_concurrency``; OCR is skipped when
+        ``ocr.enabled`` is false.
+        """
+        config = processor.config.get('pipeline', {})
+        ocr_enabled = processor.config.get('ocr', {}).get('enabled', True)
+        return cls(
+            processor,
+            queue_size=int(config.get('queue_size', DEFAULT_QUEUE_SIZE)),
+            persist_workers=int(config.get('persist_workers', DEFAULT_PERSIST_WORKERS)),
+            ocr_workers=int(config['ocr_workers']) if config.get('ocr_workers') else None,
+            ai_concurrency=int(config.get('ai_concurrency', DEFAULT_AI_CONCURRENCY)),
+            ocr=ocr_file if ocr_enabled else None,
+        )
+
+    def run(
+        self,
+        uids: List[int],
+        batch_size: int = 100,
+        outcomes: Optional[Dict[int, Optional[str]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Process the given UIDs and block until all attachments reached the sink.
+
+        Args:
+            uids: UIDs of the messages to process
+            batch_size: Maximum number of messages per UID FETCH command
+            outcomes: Optional dict filled with the error of every requested
+                UID, or None for the ones processed successfully
+
+        Returns:
+            List of processing results for each attachment
+        """
+        return asyncio.run(self.run_async(uids, batch_size, outcomes))
+
+    async def run_async(
+        self,
+        uids: List[int],
+        batch_size: int = 100,
+        outcomes: Optional[Dict[int, Optional[str]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Coroutine version of ``run``."""
+        if not uids:
+            return []
+
+        results: List[Dict[str, Any]] = []
+        self.stats = defaultdict(lambda: {'items': 0, 'busy_seconds': 0.0})
+        self._stop.clear()
+        self._pending = {}
+        self._errors = {}
+        self._outcomes = outcomes
+        self._watermark = UidWatermark(uids)
+        # The fetch thread owns the connection until the run ends, so the
+        # changes are committed once at the end rather than every N messages
+        self._changes = MailboxChanges(self.processor.mail)
+
+        fetched: asyncio.Queue = asyncio.Queue(self.queue_size)
+        persisted: asyncio.Queue = asyncio.Queue(self.queue_size)
+        extracted: asyncio.Queue = asyncio.Queue(self.queue_size)
+        analysed: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        ocr_config = self.processor.config.get('ocr', {})
+        owns_ocr_executor = self.ocr is not None and self.ocr_executor is None
+        ocr_executor = self.ocr_executor
+        if owns_ocr_executor:
+            # With the shared OCR service the workers only wait on its socket
+            executor_class = (
+                ThreadPoolExecutor if ocr_config.get('service_socket') else ProcessPoolExecutor
+            )
+            ocr_executor = executor_class(
+                max_workers=self.ocr_workers,
+                initializer=_init_ocr_worker,
+                initargs=(ocr_config,),
+            )
+        self._threads = ThreadPoolExecutor(
+            max_workers=1 + self.persist_workers + self.ai_concurrency + 1,
+            thread_name_prefix='invoice-pipeline',
+        )
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(
+                self._fetch(uids, batch_size, fetched, downstream=self.persist_workers),
+                self._stage('persist', self._persist, fetched, persisted,
+                            self.persist_workers, downstream=self.ocr_workers),
+                self._stage('ocr', lambda job: self._extract_text(job, ocr_executor),
+                            persisted, extracted, self.ocr_workers, downstream=self.ai_concurrency),
+                self._stage('ai', self._analyse, extracted, analysed,
+                            self.ai_concurrency, downstream=1),
+                self._stage('sink', lambda job: self._sink(job, results), analysed, None, 1),
+            )
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            self._threads.shutdown(wait=True)
+            if owns_ocr_executor:
+                ocr_executor.shutdown(wait=True)
+
+        await asyncio.get_running_loop().run_in_executor(None, self._changes.commit)
+        # UIDs whose FETCH failed never entered the pipeline; record them for
+        # a retry, then advance over the UIDs recorded as done or failed
+        for uid in self._watermark.missing():
+            logger.warning(f"Email UID {uid} was not fetched; marking it for a retry")
+            self._finish_message(uid, 'Message could not be fetched')
+        checkpoints = self.processor.checkpoints
+        if checkpoints and self._watermark.safe is not None:
+            checkpoints.advance(self.processor._mailbox_key(), self._watermark.safe)
+
+        self._log_stats(time.perf_counter() - started, len(results))
+        return results
+
+    async def _in_thread(self, func: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._threads, func, *args)
+
+    async def _stage(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[List[Any]]],
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue],
+        workers: int,
+        downstream: int = 0,
+    ) -> None:
+        """Run ``workers`` consumers of ``inbox`` that feed ``outbox``."""
+        stats = self.stats[name]
+
+        async def worker() -> None:
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                begin = time.perf_counter()
+                try:
+                    outputs = await handler(item)
+                except Exception as e:
+                    logger.error(f"Pipeline stage {name} failed: {e}", exc_info=True)
+                    outputs = []
+                stats['busy_seconds'] += time.perf_counter() - begin
+                stats['items'] += 1
+                if outbox is not None:
+                    for output in outputs:
+                        await outbox.put(output)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            if outbox is not None:
+                for _ in range(downstream):
+                    await outbox.put(_DONE)
+
+    async def _fetch(
+        self, uids: List[int], batch_size: int, outbox: asyncio.Queue, downstream: int
+    ) -> None:
+        """Fetch messages in a thread, blocking it while the queue is full."""
+        loop = asyncio.get_running_loop()
+        stats = self.stats['fetch']
+
+        def produce() -> None:
+            for uid, message in self.processor._iter_messages(uids, batch_size):
+                stats['items'] += 1
+                future = asyncio.run_coroutine_threadsafe(outbox.put((uid, message)), loop)
+                while True:
+                    try:
+                        future.result(timeout=1.0)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        if self._stop.is_set():
+                            future.cancel()
+                            return
+
+        begin = time.perf_counter()
+        try:
+            await loop.run_in_executor(self._threads, produce)
+        finally:
+            stats['busy_seconds'] += time.perf_counter() - begin
+            for _ in range(downstream):
+                await outbox.put(_DONE)
+
+    async def _persist(self, item: Any) -> List[_Job]:
+        """Save the attachments of a message; one job per attachment."""
+        uid, message = item
+        try:
+            persisted = await self._in_thread(self._persist_message, message)
+        except Exception as e:
+            logger.error(f"Error persisting email UID {uid}: {e}", exc_info=True)
+            self._finish_message(uid, str(e))
+            return []
+
+        jobs = []
+        for entry in persisted:
+            if entry is None:
+                self._errors.setdefault(uid, "Failed to save attachment")
+                continue
+            jobs.append(_Job(uid, *entry))
+        self._pending[uid] = len(jobs)
+        if not jobs:
+            self._finish_message(uid)
+        return jobs
+
+    def _persist_message(self, message: Any) -> List[Any]:
+        processor = self.processor
+        if isinstance(message, StreamedMessage):
+            # Oversized attachments were dropped while decoding
+            return [
+                processor._persist_streamed_attachment(attachment)
+                for attachment in message.attachments if not attachment.error
+            ]
+        return [
+            processor._persist_attachment(part)
+            for part in message.walk()
+            if part.get_content_maintype() != 'multipart'
+            and part.get('Content-Disposition') is not None
+        ]
+
+    async def _extract_text(self, job: _Job, executor: Optional[Executor]) -> List[_Job]:
+        """Run OCR in the process pool, reusing results recorded for the blob."""
+        if self.ocr is None:
+            return [job]
+
+        blob_store = self.processor.blob_store
+        cached = blob_store.get_result('ocr', job.digest) if job.digest else None
+        if cached is not None:
+            job.text = cached.get('text', '')
+            return [job]
+
+        try:
+            loop = asyncio.get_running_loop()
+            job.text = await loop.run_in_executor(executor, self.ocr, job.filepath)
+            if job.digest and job.text:
+                blob_store.put_result('ocr', job.digest, {'text': job.text})
+        except Exception as e:
+            logger.error(f"OCR failed for {job.filepath}: {e}")
+        return [job]
+
+    async def _analyse(self, job: _Job) -> List[_Job]:
+        """Extract invoice data with the AI processor; concurrency equals the worker count."""
+        processor = self.processor
+        if not processor.ai_processor.is_enabled():
+            return [job]
+
+        try:
+            job.ai_result = await self._in_thread(
+                processor._extract_with_ai, job.filepath, job.digest, job.text
+            )
+        except Exception as e:
+            logger.error(f"AI processing failed: {e}", exc_info=True)
+            job.error = str(e)
+        return [job]
+
+    async def _sink(self, job: _Job, results: List[Dict[str, Any]]) -> List[Any]:
+        """Write the results of an attachment and settle its message."""
+        if job.error:
+            result = self.processor._attachment_result(
+                job.filepath, job.digest, {"success": False, "error": job.error}
+            )
+        else:
+            result = await self._in_thread(
+                self.processor._record_attachment_result,
+                job.filepath, job.digest, job.processed_dir, job.ai_result,
+            )
+        if job.text is not None:
+            result['extracted_text'] = job.text
+        results.append(result)
+
+        error = job.error or self.processor._result_error(result)
+        if error:
+            self._errors.setdefault(job.uid, error)
+        self._pending[job.uid] -= 1
+        if not self._pending[job.uid]:
+            self._finish_message(job.uid)
+        return []
+
+    def _finish_message(self, uid: int, error: Optional[str] = None) -> None:
+        """Record the outcome of a message once all of its attachments are done."""
+        error = error or self._errors.pop(uid, None)
+        self._pending.pop(uid, None)
+        self._watermark.record(uid)
+        if self._outcomes is not None:
+            self._outcomes[uid] = error
+        checkpoints = self.processor.checkpoints
+        if checkpoints:
+            status = STATUS_FAILED if error else STATUS_DONE
+            checkpoints.mark(self.processor._mailbox_key(), uid, status, error)
+        if not error:
+            self.processor._queue_processed(self._changes, uid)
+
+    def _log_stats(self, elapsed: float, attachments: int) -> None:
+        rate = attachments / elapsed if elapsed else 0.0
+        stages = ', '.join(
+            f"{name} {entry['items']:.0f} items/{entry['busy_seconds']:.2f}s"
+            for name, entry in self.stats.items()
+        )
+        logger.info(
+            f"Pipeline processed {attachments} attachments in {elapsed:.2f}s "
+            f"({rate:.2f}/s); {stages}"
+        )
@@ -10,14 +10,35 @@ import os
 import logging
 import json
 import time
+import threading
 from datetime import datetime
 from pathlib import Path
 from email import message as email_message
 from email import message_from_bytes
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Iterator
 
 # Local imports
 from .ai_processor import AIProcessor
+from .blob_store import BlobStore
+from .bodystructure import fetch_partial_messages
+from .checkpoints import STATUS_DONE, STATUS_FAILED, CheckpointStore, UidWatermark
+from .imap_utils import (
+    chunked,
+    compress_uid_set,
+    get_uidvalidity,
+    iter_fetch_response,
+    parse_uid_list,
+)
+from .mutations import DEFAULT_MUTATION_BATCH_SIZE, MailboxChanges
+from .session import MAX_RECONNECT_DELAY, ImapSession
+from .streaming import (
+    DEFAULT_CHUNK_SIZE,
+    SpoolFile,
+    StreamedAttachment,
+    StreamedMessage,
+    fetch_message_chunks,
+    parse_message_stream,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -26,6 +47,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_FILE_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png', '.tiff']
+
 class EmailProcessor:
     """
     A class to process emails and extract invoice attachments.
@@ -40,11 +63,29 @@ class EmailProcessor:
         """
         self.config = config
         self.mail = None
+        self.last_uid = 0
+        self.uidvalidity = None
+        self._stop_event = threading.Event()
         self._ensure_output_dirs()
         
+        # Persistent sync checkpoints replace the UNSEEN flag when configured
+        checkpoint_db = self._processing_option('checkpoint_db')
+        self.checkpoints = CheckpointStore(checkpoint_db) if checkpoint_db else None
+        
+        # Content-addressed attachment store shared by all runs
+        blob_store_dir = self._processing_option('blob_store_dir')
+        self.blob_store = BlobStore(blob_store_dir) if blob_store_dir else None
+        
         # Initialize AI processor if enabled
         self.ai_processor = AIProcessor(config)
 
+    def _processing_option(self, key: str, default: Any = None) -> Any:
+        """Look up a processing setting in the ``processing`` section or at the top level."""
+        value = self.config.get('processing', {}).get(key)
+        if value is None:
+            value = self.config.get(key)
+        return default if value is None else value
+
     def _ensure_output_dirs(self) -> None:
         """Ensure that output directories exist."""
         os.makedirs(self.config.get('output_dir', 'output'), exist_ok=True)
@@ -81,16 +122,9 @@ class EmailProcessor:
         Returns:
             Path to the saved file or None if saving failed
         """
-        filename = part.get_filename()
-        if not filename:
+        filepath = self._attachment_path(part.get_filename(), output_dir)
+        if not filepath:
             return None
-
-        # Ensure the output directory exists
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Create a safe filename
-        safe_filename = "".join(c if c.isalnum() or c in ' .-_' else '_' for c in filename)
-        filepath = os.path.join(output_dir, safe_filename)
         
         try:
             with open(filepath, 'wb') as f:
@@ -99,8 +133,50 @@ class EmailProcessor:
             return filepath
             
         except Exception as e:
-            logger.error(f"Failed to save attachment {filename}: {e}")
+            logger.error(f"Failed to save attachment {part.get_filename()}: {e}")
+            return None
+
+    def _store_attachment(
+        self, part: email_message.Message, output_dir: str
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Save an email attachment into the blob store and link it into ``output_dir``.
+
+        The payload is decoded once and hashed while it is stored, so an
+        attachment received several times is kept on disk only once.
+
+        Args:
+            part: The email part containing the attachment
+            output_dir: Directory to link the attachment into
+
+        Returns:
+            Tuple of ``(path, sha256)`` or None if saving failed
+        """
+        filepath = self._attachment_path(part.get_filename(), output_dir)
+        if not filepath:
+            return None
+
+        try:
+            digest, created = self.blob_store.put(part.get_payload(decode=True))
+            self.blob_store.link(digest, filepath)
+            logger.info(f"{'Stored' if created else 'Linked existing'} attachment: {filepath}")
+            return filepath, digest
+
+        except Exception as e:
+            logger.error(f"Failed to store attachment {part.get_filename()}: {e}")
+            return None
+
+    def _attachment_path(self, filename: Optional[str], output_dir: str) -> Optional[str]:
+        """Return a safe path for an attachment inside ``output_dir``, creating the directory."""
+        if not filename:
             return None
+
+        # Ensure the output directory exists
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Create a safe filename
+        safe_filename = "".join(c if c.isalnum() or c in ' .-_' else '_' for c in filename)
+        return os.path.join(output_dir, safe_filename)
             
     def _process_attachment(self, part: email_message.Message) -> Dict[str, Any]:
         """
@@ -112,50 +188,218 @@ class EmailProcessor:
         Returns:
             Dict containing processing results
         """
-        # Create output directories
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_dir = os.path.join(self.config.get('output_dir', 'output'), timestamp)
-        original_dir = os.path.join(output_dir, 'original')
-        processed_dir = os.path.join(output_dir, 'processed')
+        persisted = self._persist_attachment(part)
+        if not persisted:
+            return {"success": False, "error": "Failed to save attachment"}
+        
+        return self._process_saved_attachment(*persisted)
+
+    def _process_streamed_attachment(self, attachment: StreamedAttachment) -> Dict[str, Any]:
+        """
+        Process an attachment that was decoded to disk by the streaming parser.
+
+        Args:
+            attachment: Attachment whose sink is a committed ``BlobWriter`` or
+                ``SpoolFile``
+
+        Returns:
+            Dict containing processing results
+        """
+        persisted = self._persist_streamed_attachment(attachment)
+        if not persisted:
+            return {"success": False, "error": "Failed to save attachment"}
+        
+        return self._process_saved_attachment(*persisted)
+
+    def _persist_attachment(
+        self, part: email_message.Message
+    ) -> Optional[Tuple[str, Optional[str], str]]:
+        """
+        Save an attachment into a new timestamped output directory.
+
+        Args:
+            part: The email part containing the attachment
+
+        Returns:
+            Tuple of ``(path, sha256, processed_dir)`` where ``sha256`` is
+            None without a blob store, or None if saving failed
+        """
+        original_dir, processed_dir = self._attachment_dirs()
         
         # Save original attachment
-        filepath = self._save_attachment(part, original_dir)
+        digest = None
+        if self.blob_store:
+            stored = self._store_attachment(part, original_dir)
+            filepath, digest = stored if stored else (None, None)
+        else:
+            filepath = self._save_attachment(part, original_dir)
         if not filepath:
-            return {"success": False, "error": "Failed to save attachment"}
-            
-        result = {
-            "original_file": filepath,
-            "timestamp": datetime.now().isoformat(),
-            "ai_processing": {}
-        }
+            return None
+        return filepath, digest, processed_dir
+
+    def _persist_streamed_attachment(
+        self, attachment: StreamedAttachment
+    ) -> Optional[Tuple[str, Optional[str], str]]:
+        """
+        Move or link a streamed attachment into a new timestamped output directory.
+
+        Args:
+            attachment: Attachment decoded by the streaming parser
+
+        Returns:
+            Tuple of ``(path, sha256, processed_dir)``, or None if saving failed
+        """
+        original_dir, processed_dir = self._attachment_dirs()
+        filepath = self._attachment_path(attachment.filename, original_dir)
+        digest = getattr(attachment.sink, 'digest', None)
+        try:
+            if not filepath:
+                raise ValueError("attachment has no filename")
+            if digest:
+                self.blob_store.link(digest, filepath)
+            else:
+                attachment.sink.move_to(filepath)
+            logger.info(f"Saved attachment: {filepath}")
+        except Exception as e:
+            logger.error(f"Failed to save attachment {attachment.filename}: {e}")
+            if not digest:
+                attachment.sink.abort()
+            return None
+        return filepath, digest, processed_dir
+
+    def _attachment_dirs(self) -> Tuple[str, str]:
+        """Return the ``original`` and ``processed`` directories for a new attachment."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_dir = os.path.join(self.config.get('output_dir', 'output'), timestamp)
+        return os.path.join(output_dir, 'original'), os.path.join(output_dir, 'processed')
+
+    def _process_saved_attachment(
+        self,
+        filepath: str,
+        digest: Optional[str],
+        processed_dir: str,
+        text: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the processing stages on a saved attachment.
+
+        Args:
+            filepath: Path of the saved attachment
+            digest: SHA-256 of the attachment when the blob store is enabled
+            processed_dir: Directory for the processing results
+            text: Text extracted from the attachment, if already known
+
+        Returns:
+            Dict containing processing results
+        """
+        ai_result = None
         
         # Process with AI if enabled
         if self.ai_processor.is_enabled():
             try:
-                # For now, just log that we would process with AI
-                # In a real implementation, you would extract text and pass to AI
-                logger.info(f"Processing with AI: {filepath}")
-                # This is a placeholder - you would implement actual text extraction
-                ai_result = self.ai_processor.process_invoice(
-                    f"Invoice from attachment: {os.path.basename(filepath)}"
-                )
-                result["ai_processing"] = ai_result
-                
-                # Save AI results
-                os.makedirs(processed_dir, exist_ok=True)
-                result_file = os.path.join(processed_dir, f"{os.path.basename(filepath)}.json")
-                with open(result_file, 'w') as f:
-                    json.dump(ai_result, f, indent=2)
-                    
+                ai_result = self._extract_with_ai(filepath, digest, text)
             except Exception as e:
                 logger.error(f"AI processing failed: {e}", exc_info=True)
-                result["ai_processing"] = {
-                    "success": False,
-                    "error": str(e)
-                }
+                return self._attachment_result(
+                    filepath, digest, {"success": False, "error": str(e)}
+                )
         
+        return self._record_attachment_result(filepath, digest, processed_dir, ai_result)
+
+    def _extract_with_ai(
+        self, filepath: str, digest: Optional[str], text: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract invoice data from an attachment with the AI processor.
+
+        Results are cached per blob digest, so a blob the AI stage has
+        already seen is not sent again.
+
+        Args:
+            filepath: Path of the saved attachment
+            digest: SHA-256 of the attachment when the blob store is enabled
+            text: Text extracted from the attachment, if already known
+
+        Returns:
+            The AI processing result
+        """
+        # Skip blobs the AI stage has already seen
+        ai_result = self.blob_store.get_result('ai', digest) if digest else None
+        if ai_result is not None:
+            logger.info(f"Reusing AI result for {filepath} ({digest[:12]})")
+            return ai_result
+        
+        logger.info(f"Processing with AI: {filepath}")
+        if text is None:
+            # This is a placeholder - you would implement actual text extraction
+            text = f"Invoice from attachment: {os.path.basename(filepath)}"
+        ai_result = self.ai_processor.process_invoice(text, filepath)
+        if digest and ai_result.get('success') is not False:
+            self.blob_store.put_result('ai', digest, ai_result)
+        return ai_result
+
+    def _record_attachment_result(
+        self,
+        filepath: str,
+        digest: Optional[str],
+        processed_dir: str,
+        ai_result: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Save the AI result of an attachment and build its processing result.
+
+        Args:
+            filepath: Path of the saved attachment
+            digest: SHA-256 of the attachment when the blob store is enabled
+            processed_dir: Directory for the processing results
+            ai_result: AI processing result, or None if AI is disabled
+
+        Returns:
+            Dict containing processing results
+        """
+        if ai_result is None:
+            return self._attachment_result(filepath, digest)
+        
+        try:
+            # Save AI results
+            os.makedirs(processed_dir, exist_ok=True)
+            result_file = os.path.join(processed_dir, f"{os.path.basename(filepath)}.json")
+            with open(result_file, 'w') as f:
+                json.dump(ai_result, f, indent=2)
+        except Exception as e:
+            logger.error(f"Failed to save AI result for {filepath}: {e}", exc_info=True)
+            ai_result = {"success": False, "error": str(e)}
+        
+        return self._attachment_result(filepath, digest, ai_result)
+
+    @staticmethod
+    def _attachment_result(
+        filepath: str, digest: Optional[str], ai_result: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        result = {
+            "original_file": filepath,
+            "timestamp": datetime.now().isoformat(),
+            "ai_processing": ai_result or {}
+        }
+        if digest:
+            result["sha256"] = digest
         return result
 
+    @staticmethod
+    def _result_error(result: Dict[str, Any]) -> Optional[str]:
+        """
+        Return the error of an attachment result, or None if it succeeded.
+
+        An attachment failed if it could not be saved or if its AI stage
+        reported a failure, including a result file that could not be written.
+        """
+        if result.get('success') is False:
+            return result.get('error', 'Processing failed')
+        ai_result = result.get('ai_processing') or {}
+        if ai_result.get('success') is False:
+            return ai_result.get('error', 'Processing failed')
+        return None
+
     def process_emails(self) -> List[Dict[str, Any]]:
         """
         Process all emails in the configured folder.
@@ -177,82 +421,406 @@ class EmailProcessor:
             if status != 'OK':
                 raise RuntimeError(f"Failed to select folder: {folder}")
             
-            # Search for all unseen emails
-            status, messages = self.mail.search(None, 'UNSEEN')
-            if status != 'OK':
-                logger.error("Failed to search emails")
-                return results
-                
-            message_ids = messages[0].split()
-            logger.info(f"Found {len(message_ids)} new messages to process")
+            self.uidvalidity = get_uidvalidity(self.mail)
             
-            if not message_ids:
-                logger.info("No new messages to process")
-                return results
+            # Messages are fetched by UID; 0 fetches one message per command
+            batch_size = int(self.config['email'].get('fetch_batch_size') or 0)
+            results = self._process_emails_batched(max(batch_size, 1))
 
-            # Process each email
-            for msg_id in message_ids:
-                try:
-                    # Mark as seen to avoid reprocessing
-                    self.mail.store(msg_id, '+FLAGS', r'\Seen')
-                    
-                    # Fetch the email
-                    status, data = self.mail.fetch(msg_id, '(RFC822)')
-                    if status != 'OK':
-                        logger.error(f"Failed to fetch email {msg_id.decode()}")
-                        continue
-
-                    raw_email = data[0][1]
-                    email_msg = message_from_bytes(raw_email)
-                    
-                    # Process each attachment
-                    for part in email_msg.walk():
-                        if part.get_content_maintype() == 'multipart':
-                            continue
-                            
-                        if part.get('Content-Disposition') is None:
-                            continue
-                            
-                        # Process the attachment
-                        result = self._process_attachment(part)
-                        if result:
-                            results.append(result)
-                            
-                except Exception as e:
-                    logger.error(f"Error processing email {msg_id}: {e}", exc_info=True)
-                    
         except Exception as e:
             logger.error(f"Error in process_emails: {e}", exc_info=True)
             raise
             
         return results
 
-    def _move_to_processed(self, msg_id: str, processed_folder: str) -> bool:
+    def _process_emails_batched(
+        self, batch_size: int, criteria: str = 'UNSEEN'
+    ) -> List[Dict[str, Any]]:
+        """
+        Process all matching emails using batched UID FETCH commands.
+
+        The unseen UIDs are fetched ``batch_size`` at a time over compact
+        message sets (e.g. ``1:500``) and each response is parsed message by
+        message. Messages are fetched with ``BODY.PEEK`` so their flags are
+        left alone; ``\\Seen`` (and the move to ``email.processed_folder``
+        when ``email.move_processed`` is set) is only queued for messages
+        that were processed successfully and committed in bulk. With
+        ``email.partial_fetch`` enabled only the attachment sections selected
+        from each BODYSTRUCTURE are downloaded.
+
+        When a checkpoint store is configured, ``criteria`` is ignored: the
+        messages above the stored UID high-water mark plus previously failed
+        UIDs are processed, regardless of their ``\\Seen`` flag.
+
+        Args:
+            batch_size: Maximum number of messages per UID FETCH command
+            criteria: IMAP SEARCH criteria selecting the messages to process
+
+        Returns:
+            List of processing results for each attachment
+        """
+        if self.checkpoints:
+            uids = self._checkpointed_uids()
+        else:
+            uids = self._search_new_uids(criteria)
+
+        if uids is None:
+            return []
+        logger.info(f"Found {len(uids)} new messages to process")
+
+        if not uids:
+            logger.info("No new messages to process")
+            return []
+
+        outcomes: Dict[int, Optional[str]] = {}
+        if self.config.get('pipeline', {}).get('enabled'):
+            from .pipeline import InvoicePipeline
+            
+            results = InvoicePipeline.from_processor(self).run(uids, batch_size, outcomes)
+        else:
+            results = self._process_uids(uids, batch_size, outcomes=outcomes)
+
+        # Searches continue above last_uid; stop it below the first message
+        # that failed, which is still unseen, so the next cycle retries it
+        for uid in sorted(uids):
+            if uid not in outcomes or outcomes[uid]:
+                break
+            self.last_uid = max(self.last_uid, uid)
+        return results
+
+    def _search_new_uids(self, criteria: str, mail: Any = None) -> Optional[List[int]]:
+        """
+        Search for UIDs above the last processed one.
+
+        Args:
+            criteria: IMAP SEARCH criteria
+            mail: Connection to use (defaults to ``self.mail``)
+
+        Returns:
+            Matching UIDs, or ``None`` if the search failed
+        """
+        mail = mail or self.mail
+        status, data = mail.uid('SEARCH', None, criteria)
+        if status != 'OK':
+            logger.error("Failed to search emails")
+            return None
+
+        # "UID n:*" always matches the newest message, even below n
+        return [uid for uid in parse_uid_list(data) if uid > self.last_uid]
+
+    def _process_uids(
+        self,
+        uids: List[int],
+        batch_size: int,
+        mail: Any = None,
+        advance_checkpoint: bool = True,
+        outcomes: Optional[Dict[int, Optional[str]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch and process the given UIDs, recording outcomes in the checkpoint store.
+
+        Args:
+            uids: UIDs of the messages to process
+            batch_size: Maximum number of messages per UID FETCH command
+            mail: Connection to use (defaults to ``self.mail``)
+            advance_checkpoint: Raise the checkpoint high-water mark as
+                messages are recorded. Callers processing UID ranges out of
+                order should advance it themselves once all ranges are done.
+            outcomes: Optional dict filled with the error of every requested
+                UID, or None for the ones processed successfully
+
+        Returns:
+            List of processing results for each attachment
+        """
+        mail = mail or self.mail
+        results = []
+
+        if self.config['email'].get('streaming'):
+            process_message = self._process_streamed_message
+        else:
+            process_message = self._process_message
+
+        mailbox = self._mailbox_key()
+        changes = self._mailbox_changes(mail, batch_size)
+        watermark = UidWatermark(uids)
+        for uid, email_msg in self._iter_messages(uids, batch_size, mail):
+            error = None
+            try:
+                message_results = process_message(email_msg)
+                results.extend(message_results)
+                error = next(
+                    filter(None, (self._result_error(r) for r in message_results)), None
+                )
+            except Exception as e:
+                logger.error(f"Error processing email UID {uid}: {e}", exc_info=True)
+                error = str(e)
+
+            if outcomes is not None:
+                outcomes[uid] = error
+            safe_uid = watermark.record(uid)
+            if self.checkpoints:
+                self.checkpoints.mark(mailbox, uid, STATUS_FAILED if error else STATUS_DONE, error)
+                if advance_checkpoint and safe_uid is not None:
+                    self.checkpoints.advance(mailbox, safe_uid)
+            # Failed messages keep their flags so they are picked up again
+            if not error:
+                self._queue_processed(changes, uid)
+
+        # UIDs whose FETCH failed were never yielded; record them for a retry
+        # so the high-water mark does not pass over them
+        for uid in watermark.missing():
+            logger.warning(f"Email UID {uid} was not fetched; marking it for a retry")
+            error = 'Message could not be fetched'
+            if outcomes is not None:
+                outcomes[uid] = error
+            if self.checkpoints:
+                self.checkpoints.mark(mailbox, uid, STATUS_FAILED, error)
+            watermark.record(uid)
+        if self.checkpoints and advance_checkpoint and watermark.safe is not None:
+            self.checkpoints.advance(mailbox, watermark.safe)
+
+        changes.commit()
+        return results
+
+    def _iter_messages(
+        self, uids: List[int], batch_size: int, mail: Any = None
+    ) -> Iterator[Tuple[int, Any]]:
+        """
+        Fetch messages with the configured strategy.
+
+        Args:
+            uids: UIDs of the messages to fetch
+            batch_size: Maximum number of messages per UID FETCH command
+            mail: Connection to use (defaults to ``self.mail``)
+
+        Yields:
+            Tuples of ``(uid, message)``, where ``message`` is a
+            ``StreamedMessage`` in streaming mode and an ``email`` message
+            otherwise
+        """
+        mail = mail or self.mail
+        if self.config['email'].get('streaming'):
+            return self._iter_streamed_messages(uids, mail)
+        if self.config['email'].get('partial_fetch'):
+            return fetch_partial_messages(
+                mail,
+                uids,
+                self._attachment_extensions(),
+                self._max_attachment_bytes(),
+                batch_size,
+            )
+        return self._iter_fetched_messages(uids, batch_size, mail)
+
+    def _mailbox_changes(self, mail: Any = None, batch_size: int = 500) -> MailboxChanges:
+        """
+        Return a change set for the flags and moves of processed messages.
+
+        Changes are committed every ``email.commit_every`` messages when set,
+        otherwise once the caller calls ``commit``.
+        """
+        return MailboxChanges(
+            mail or self.mail,
+            batch_size=max(batch_size, DEFAULT_MUTATION_BATCH_SIZE),
+            commit_every=int(self.config['email'].get('commit_every') or 0),
+        )
+
+    def _queue_processed(self, changes: MailboxChanges, uid: int) -> None:
+        """Queue the changes for a successfully processed message."""
+        email_config = self.config['email']
+        changes.add_flags(uid, r'\Seen')
+        if email_config.get('move_processed'):
+            changes.move(uid, email_config.get('processed_folder') or 'Processed')
+
+    def _mailbox_key(self) -> str:
+        """Return the key identifying the configured mailbox in the checkpoint store."""
+        email_config = self.config['email']
+        return (
+            f"{email_config.get('username', '')}@{email_config.get('server', '')}"
+            f"/{email_config.get('folder', 'INBOX')}"
+        )
+
+    def _checkpointed_uids(
+        self, mail: Any = None, uidvalidity: Optional[int] = None
+    ) -> Optional[List[int]]:
+        """
+        Return the UIDs to process according to the checkpoint store.
+
+        Args:
+            mail: Connection to use (defaults to ``self.mail``)
+            uidvalidity: UIDVALIDITY of the selected folder (defaults to
+                ``self.uidvalidity``)
+
+        Returns:
+            UIDs above the high-water mark that are not done yet plus failed
+            UIDs due for a retry, or ``None`` if the search failed
+        """
+        mail = mail or self.mail
+        mailbox = self._mailbox_key()
+        high_water = self.checkpoints.begin(mailbox, uidvalidity or self.uidvalidity)
+
+        status, data = mail.uid('SEARCH', None, f'UID {high_water + 1}:*')
+        if status != 'OK':
+            logger.error("Failed to search emails")
+            return None
+
+        new_uids = [uid for uid in parse_uid_list(data) if uid > high_water]
+        pending = set(self.checkpoints.unprocessed(mailbox, new_uids))
+        pending.update(self.checkpoints.retry_uids(mailbox))
+        return sorted(pending)
+
+    def _attachment_extensions(self) -> List[str]:
+        """Return the attachment extensions accepted for processing."""
+        return self._processing_option('file_extensions') or DEFAULT_FILE_EXTENSIONS
+
+    def _max_attachment_bytes(self) -> Optional[int]:
+        """Return the configured attachment size limit in bytes, if any."""
+        size_mb = self._processing_option('max_attachment_size_mb')
+        return int(float(size_mb) * 1024 * 1024) if size_mb else None
+
+    def _iter_fetched_messages(
+        self, uids: List[int], batch_size: int, mail: Any = None
+    ) -> Iterator[Tuple[int, email_message.Message]]:
+        """
+        Fetch messages by UID in batches and yield them as they are parsed.
+
+        Args:
+            uids: UIDs of the messages to fetch
+            batch_size: Maximum number of messages per UID FETCH command
+            mail: Connection to use (defaults to ``self.mail``)
+
+        Yields:
+            Tuples of ``(uid, message)``
+        """
+        mail = mail or self.mail
+        for chunk in chunked(uids, batch_size):
+            message_set = compress_uid_set(chunk)
+            try:
+                status, data = mail.uid('FETCH', message_set, '(BODY.PEEK[])')
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error as e:
+                logger.error(f"Failed to fetch message set {message_set}: {e}")
+                continue
+            if status != 'OK':
+                logger.error(f"Failed to fetch message set {message_set}")
+                continue
+
+            for uid, items in iter_fetch_response(data):
+                raw_email = items.get('BODY[]', items.get('RFC822'))
+                if raw_email is None:
+                    continue
+                yield uid, message_from_bytes(raw_email)
+
+    def _iter_streamed_messages(
+        self, uids: List[int], mail: Any = None
+    ) -> Iterator[Tuple[int, StreamedMessage]]:
+        """
+        Download messages in chunks and decode their attachments straight to disk.
+
+        Only one chunk of each message is held in memory at a time, and
+        attachments above ``max_attachment_size_mb`` are discarded while they
+        are decoded.
+
+        Args:
+            uids: UIDs of the messages to fetch
+            mail: Connection to use (defaults to ``self.mail``)
+
+        Yields:
+            Tuples of ``(uid, streamed_message)``
+        """
+        mail = mail or self.mail
+        chunk_size = int(self.config['email'].get('stream_chunk_size') or DEFAULT_CHUNK_SIZE)
+        extensions = {ext.lower() for ext in self._attachment_extensions()}
+
+        def wanted(headers: email_message.Message) -> bool:
+            filename = headers.get_filename()
+            return (
+                headers.get('Content-Disposition') is not None
+                and bool(filename)
+                and os.path.splitext(filename)[1].lower() in extensions
+            )
+
+        for uid in uids:
+            try:
+                streamed = parse_message_stream(
+                    fetch_message_chunks(mail, uid, chunk_size),
+                    self._open_attachment_sink,
+                    self._max_attachment_bytes(),
+                    wanted,
+                )
+            except (imaplib.IMAP4.abort, OSError):
+                raise
+            except Exception as e:
+                logger.error(f"Failed to stream email UID {uid}: {e}")
+                continue
+            yield uid, streamed
+
+    def _open_attachment_sink(self) -> Any:
+        """Return a writer for a streamed attachment: the blob store or a spool file."""
+        if self.blob_store:
+            return self.blob_store.writer()
+        return SpoolFile(os.path.join(self.config.get('output_dir', 'output'), '.spool'))
+
+    def _process_streamed_message(self, streamed: StreamedMessage) -> List[Dict[str, Any]]:
+        """
+        Process the attachments of a message parsed by the streaming parser.
+
+        Args:
+            streamed: Streamed message
+
+        Returns:
+            List of processing results for each attachment
+        """
+        results = []
+        for attachment in streamed.attachments:
+            # Oversized attachments were dropped while decoding, as in partial fetch mode
+            if attachment.error:
+                continue
+            results.append(self._process_streamed_attachment(attachment))
+        return results
+
+    def _process_message(self, email_msg: email_message.Message) -> List[Dict[str, Any]]:
+        """
+        Process all attachments of a single email.
+
+        Args:
+            email_msg: Parsed email message
+
+        Returns:
+            List of processing results for each attachment
+        """
+        results = []
+        for part in email_msg.walk():
+            if part.get_content_maintype() == 'multipart':
+                continue
+
+            if part.get('Content-Disposition') is None:
+                continue
+
+            # Process the attachment
+            result = self._process_attachment(part)
+            if result:
+                results.append(result)
+
+        return results
+
+    def _move_to_processed(self, uid: int, processed_folder: str) -> bool:
         """
         Move an email to the processed folder.
+
+        Prefer queueing moves on a ``MailboxChanges`` set, which commits many
+        messages with one command; this moves a single message immediately.
         
         Args:
-            msg_id: The ID of the message to move
+            uid: The UID of the message to move
             processed_folder: Name of the folder to move the message to
             
         Returns:
             True if the message was moved successfully, False otherwise
         """
-        try:
-            # Copy the message to the processed folder
-            result = self.mail.copy(msg_id, processed_folder)
-            if result[0] != 'OK':
-                logger.error(f"Failed to copy message {msg_id} to {processed_folder}")
-                return False
-                
-            # Mark the original message as deleted
-            self.mail.store(msg_id, '+FLAGS', '\\Deleted')
-            self.mail.expunge()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error moving message {msg_id} to {processed_folder}: {e}")
-            return False
+        changes = MailboxChanges(self.mail)
+        changes.move(uid, processed_folder)
+        return changes.commit()['failed'] == 0
 
     def run(self) -> None:
         """
@@ -272,6 +840,56 @@ class EmailProcessor:
                 except Exception as e:
                     logger.error(f"Error closing email connection: {e}")
 
+    def run_forever(self) -> None:
+        """
+        Run as a daemon on a single persistent IMAP session.
+
+        Unseen messages are processed once at startup; afterwards the session
+        waits with IMAP IDLE (or NOOP keepalives when IDLE is unavailable) and
+        only UIDs above the last processed one are fetched; a failed message
+        keeps the UIDs after it from being passed over until it succeeds.
+        Dropped sessions are re-established automatically, and a cycle that
+        fails otherwise (e.g. a rejected command) is retried with backoff.
+        Call ``stop()`` to exit.
+        """
+        session = ImapSession(self.config['email'], self._stop_event)
+        batch_size = max(int(self.config['email'].get('fetch_batch_size') or 0), 1)
+        uidvalidity = None
+        retry_delay = 1.0
+
+        try:
+            self.mail = session.reconnect()
+            while self.mail and not self._stop_event.is_set():
+                try:
+                    # UIDs are only comparable within one UIDVALIDITY epoch
+                    self.uidvalidity = session.uidvalidity
+                    if session.uidvalidity != uidvalidity:
+                        uidvalidity = session.uidvalidity
+                        self.last_uid = 0
+
+                    criteria = 'UNSEEN'
+                    if self.last_uid:
+                        criteria = f'UID {self.last_uid + 1}:* UNSEEN'
+                    self._process_emails_batched(batch_size, criteria)
+                    retry_delay = 1.0
+
+                    session.wait_for_changes()
+
+                except (imaplib.IMAP4.abort, OSError) as e:
+                    logger.warning(f"IMAP session dropped: {e}; reconnecting")
+                    self.mail = session.reconnect()
+                except (imaplib.IMAP4.error, RuntimeError) as e:
+                    logger.error(f"Processing cycle failed: {e}; retrying in {retry_delay:.0f}s")
+                    self._stop_event.wait(retry_delay)
+                    retry_delay = min(retry_delay * 2, MAX_RECONNECT_DELAY)
+        finally:
+            session.close()
+            self.mail = None
+
+    def stop(self) -> None:
+        """Ask a running ``run_forever`` loop to exit."""
+        self._stop_event.set()
+
 
 def main():
     """Main entry point for the email processor."""
@@ -281,6 +899,8 @@ def main():
     parser = argparse.ArgumentParser(description='Process email invoices.')
     parser.add_argument('--config', type=str, default='config.yaml',
                         help='Path to configuration file')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep a persistent session and process new mail as it arrives')
     
     args = parser.parse_args()
     
@@ -288,9 +908,21 @@ def main():
         with open(args.config, 'r') as f:
             config = yaml.safe_load(f)
         
+        if config.get('accounts'):
+            from .multi_account import MultiAccountRunner
+            
+            report = MultiAccountRunner.from_config(config).run()
+            print(json.dumps(report, indent=2))
+            return 0
+        
         processor = EmailProcessor(config)
-        processor.run()
+        if args.daemon:
+            processor.run_forever()
+        else:
+            processor.run()
         
+    except KeyboardInterrupt:
+        logger.info("Email processor stopped")
     except Exception as e:
         logger.error(f"Failed to run email processor: {e}")
         return 1
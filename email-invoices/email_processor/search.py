@@ -0,0 +1,297 @@
+"""
+IMAP search and header prefiltering
+
+This module builds IMAP SEARCH criteria so the server narrows the candidate
+messages, translates the ``filter`` conditions of ``process_invoices.yaml``
+where they map onto SEARCH keys, and prefetches only the ``Date`` and
+``From`` headers of the candidates so that messages can be filtered before
+their bodies are downloaded.
+"""
+
+import calendar
+import fnmatch
+import logging
+import re
+from datetime import date, datetime, timedelta
+from email import message as email_message
+from email import message_from_bytes
+from email.utils import parseaddr
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .imap_utils import chunked, compress_uid_set, iter_fetch_response
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_HEADER_FIELDS = ('DATE', 'FROM')
+
+# IMAP dates always use English month names, whatever the locale
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+_DATE_CLAUSE_RE = re.compile(
+    r"^\{\{\s*date\s*\|\s*date\(\s*['\"]([^'\"]+)['\"]\s*\)\s*\}\}\s*(==|>=|<=|>|<)\s*(.+)$"
+)
+_HEADER_CLAUSE_RE = re.compile(
+    r"^\{\{\s*(from|to|subject)\s*\}\}\s+contains\s+(.+)$|^(.+)\s+in\s+\{\{\s*(from|to|subject)\s*\}\}$",
+    re.IGNORECASE,
+)
+_TEMPLATE_RE = re.compile(r'\{\{(.*?)\}\}')
+_FORMAT_RE = re.compile(r"^['\"]([^'\"]+)['\"]\s*\|\s*format\((.+)\)$")
+_DEFAULT_RE = re.compile(r'^(\w+)\s*\|\s*default\(.*\)$')
+
+
+def imap_date(value: Union[date, datetime]) -> str:
+    """Format a date for IMAP SEARCH, e.g. ``01-May-2025``."""
+    return f"{value.day:02d}-{_MONTHS[value.month - 1]}-{value.year}"
+
+
+def quote(value: str) -> str:
+    """Quote a string argument of an IMAP command."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def month_range(year: int, month: int) -> Tuple[date, date]:
+    """Return the first day of a month and the first day of the next month."""
+    first = date(year, month, 1)
+    return first, first + timedelta(days=calendar.monthrange(year, month)[1])
+
+
+def month_search_criteria(year: int, month: int) -> str:
+    """
+    Build SEARCH criteria matching messages received and sent in a given month.
+
+    ``SINCE``/``BEFORE`` compare the arrival (internal) date, as the search
+    did before the month check moved to the server. ``SENTSINCE``/``SENTBEFORE``
+    add the ``Date`` header check that was done client-side, so the server
+    returns exactly the messages the former search plus that check kept; a
+    message dated in one month but delivered in the next still matches
+    neither month.
+    """
+    first, following = month_range(year, month)
+    return (f"SINCE {imap_date(first)} BEFORE {imap_date(following)} "
+            f"SENTSINCE {imap_date(first)} SENTBEFORE {imap_date(following)}")
+
+
+class SenderFilter:
+    """
+    Sender allow and deny lists.
+
+    Entries are addresses (``billing@vendor.com``), domains (``vendor.com``,
+    which also match subdomains) or shell-style patterns (``*@*.vendor.com``).
+    A sender passes if it matches no deny entry and, when an allow list is
+    set, at least one allow entry.
+    """
+
+    def __init__(self, allow: Optional[Iterable[str]] = None, deny: Optional[Iterable[str]] = None):
+        self.allow = [entry.strip().lower() for entry in allow or () if entry.strip()]
+        self.deny = [entry.strip().lower() for entry in deny or () if entry.strip()]
+
+    def __bool__(self) -> bool:
+        return bool(self.allow or self.deny)
+
+    @staticmethod
+    def _matches(address: str, entry: str) -> bool:
+        if any(char in entry for char in '*?['):
+            return fnmatch.fnmatchcase(address, entry)
+        if '@' in entry:
+            return address == entry
+        domain = address.rpartition('@')[2]
+        return domain == entry or domain.endswith('.' + entry)
+
+    def allows(self, sender: str) -> bool:
+        """Whether a ``From`` header value passes the lists."""
+        address = parseaddr(sender or '')[1].lower()
+        if any(self._matches(address, entry) for entry in self.deny):
+            return False
+        return not self.allow or any(self._matches(address, entry) for entry in self.allow)
+
+    def search_criteria(self) -> Optional[str]:
+        """
+        Translate the lists into SEARCH criteria where possible.
+
+        ``FROM`` is a substring match on the server, so the result selects a
+        superset of the allowed senders; ``allows`` still has to be applied
+        to the prefetched headers. Pattern entries are left to the client.
+        """
+        criteria = []
+        allow = [entry.lstrip('@') for entry in self.allow]
+        if allow and not any(any(char in entry for char in '*?[') for entry in allow):
+            terms = [f"FROM {quote(entry)}" for entry in allow]
+            criteria.append(_or_all(terms))
+        for entry in self.deny:
+            # Only exact addresses are safe to exclude by substring
+            if '@' in entry and not any(char in entry for char in '*?['):
+                criteria.append(f"NOT FROM {quote(entry)}")
+        return ' '.join(criteria) or None
+
+
+def _or_all(terms: Sequence[str]) -> str:
+    if len(terms) == 1:
+        return terms[0]
+    return f"OR {terms[0]} {_or_all(terms[1:])}"
+
+
+def _render(value: str, variables: Dict[str, Any]) -> Optional[str]:
+    """Resolve the simple template expressions used on the right-hand side of filters."""
+    unresolved = False
+
+    def resolve(match: 're.Match') -> str:
+        nonlocal unresolved
+        expr = match.group(1).strip()
+        fmt = None
+        format_match = _FORMAT_RE.match(expr)
+        if format_match:
+            fmt, expr = format_match.group(1), format_match.group(2).strip()
+        default_match = _DEFAULT_RE.match(expr)
+        name = default_match.group(1) if default_match else expr
+        if name not in variables:
+            unresolved = True
+            return ''
+        resolved = variables[name]
+        return fmt % resolved if fmt else str(resolved)
+
+    rendered = _TEMPLATE_RE.sub(resolve, value.strip())
+    if unresolved:
+        return None
+    if len(rendered) >= 2 and rendered[0] == rendered[-1] and rendered[0] in '\'"':
+        return rendered[1:-1]
+    return None
+
+
+def _date_criteria(fmt: str, operator: str, value: str) -> Optional[str]:
+    granularity = {'%Y': 'year', '%Y-%m': 'month', '%Y-%m-%d': 'day'}.get(fmt)
+    if granularity is None:
+        return None
+    try:
+        start = datetime.strptime(value, fmt).date()
+    except ValueError:
+        return None
+
+    if granularity == 'year':
+        end = date(start.year + 1, 1, 1)
+    elif granularity == 'month':
+        end = month_range(start.year, start.month)[1]
+    else:
+        end = start + timedelta(days=1)
+
+    return {
+        '==': f"SENTSINCE {imap_date(start)} SENTBEFORE {imap_date(end)}",
+        '>=': f"SENTSINCE {imap_date(start)}",
+        '>': f"SENTSINCE {imap_date(end)}",
+        '<': f"SENTBEFORE {imap_date(start)}",
+        '<=': f"SENTBEFORE {imap_date(end)}",
+    }[operator]
+
+
+def translate_filter_condition(
+    condition: str, variables: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    Translate a route ``filter`` condition into IMAP SEARCH criteria.
+
+    Supported clauses, joined with ``and``:
+
+    * ``{{date|date('%Y-%m')}} == '2025-05'`` with ``==``, ``>=``, ``>``,
+      ``<`` or ``<=`` and the formats ``%Y``, ``%Y-%m`` and ``%Y-%m-%d``
+    * ``{{from}} contains 'vendor.com'`` or ``'vendor.com' in {{from}}``
+      (also for ``to`` and ``subject``)
+
+    Right-hand sides may use ``{{NAME}}``, ``{{NAME|default(...)}}`` and
+    ``{{'%02d'|format(NAME|default(...))}}`` with ``NAME`` taken from
+    ``variables``. Clauses that cannot be translated are left for the client;
+    since the clauses are ANDed, dropping one only widens the server result.
+    Conditions using ``or`` or ``not`` are not translated at all.
+
+    Args:
+        condition: Filter condition
+        variables: Values for template variables such as ``YEAR``/``MONTH``
+
+    Returns:
+        SEARCH criteria, or None if no clause could be translated
+    """
+    variables = variables or {}
+    # Only conjunctions can be split safely into independent SEARCH keys
+    if re.search(r'\b(or|not)\b', _TEMPLATE_RE.sub('', condition), re.IGNORECASE):
+        return None
+
+    criteria = []
+    for clause in re.split(r'\s+and\s+', condition.strip()):
+        clause = clause.strip().strip('()').strip()
+        date_match = _DATE_CLAUSE_RE.match(clause)
+        if date_match:
+            fmt, operator, value = date_match.groups()
+            value = _render(value, variables)
+            translated = _date_criteria(fmt, operator, value) if value is not None else None
+        else:
+            header_match = _HEADER_CLAUSE_RE.match(clause)
+            translated = None
+            if header_match:
+                field = (header_match.group(1) or header_match.group(4)).upper()
+                value = _render(header_match.group(2) or header_match.group(3), variables)
+                if value:
+                    translated = f"{field} {quote(value)}"
+
+        if translated:
+            criteria.append(translated)
+        else:
+            logger.debug(f"Filter clause left to the client: {clause}")
+    return ' '.join(criteria) or None
+
+
+def load_route_filters(path: Union[str, Path]) -> List[str]:
+    """
+    Read the ``filter`` processor conditions from a routes file.
+
+    Args:
+        path: Path to a routes YAML file such as ``process_invoices.yaml``
+
+    Returns:
+        The conditions of all ``filter`` processors, in route order
+    """
+    import yaml
+
+    with open(path, 'r', encoding='utf-8') as f:
+        routes = (yaml.safe_load(f) or {}).get('routes', [])
+    return [
+        processor['condition']
+        for route in routes
+        for processor in route.get('processors', [])
+        if processor.get('type') == 'filter' and processor.get('condition')
+    ]
+
+
+def fetch_headers(
+    mail: Any,
+    uids: Sequence[int],
+    batch_size: int = 500,
+    fields: Sequence[str] = PREFETCH_HEADER_FIELDS,
+) -> Iterator[Tuple[int, email_message.Message]]:
+    """
+    Fetch selected header fields for many messages without their bodies.
+
+    Args:
+        mail: ``imaplib`` client with the folder selected
+        uids: UIDs of the messages
+        batch_size: Maximum number of messages per UID FETCH command
+        fields: Header field names to fetch
+
+    Yields:
+        Tuples of ``(uid, headers)``
+    """
+    items = f"(UID BODY.PEEK[HEADER.FIELDS ({' '.join(fields)})])"
+    for chunk in chunked(list(uids), batch_size):
+        message_set = compress_uid_set(chunk)
+        status, data = mail.uid('FETCH', message_set, items)
+        if status != 'OK':
+            logger.error(f"Failed to fetch headers for message set {message_set}")
+            continue
+        for uid, fetched in iter_fetch_response(data):
+            header = next(
+                (value for key, value in fetched.items()
+                 if key.startswith('BODY[HEADER') and isinstance(value, bytes)),
+                None,
+            )
+            if uid is not None and header is not None:
+                yield uid, message_from_bytes(header)
+
@@ -0,0 +1,204 @@
+"""
+Persistent IMAP session
+
+This module provides a long-lived, authenticated IMAP session that waits for
+new mail with IMAP IDLE (RFC 2177) when the server supports it and falls back
+to periodic NOOP keepalives otherwise. Dropped connections are re-established
+with exponential backoff.
+"""
+
+import imaplib
+import logging
+import select
+import ssl
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .imap_utils import get_uidvalidity
+
+logger = logging.getLogger(__name__)
+
+# RFC 2177 asks clients to re-issue IDLE at least every 29 minutes
+DEFAULT_IDLE_TIMEOUT = 29 * 60
+DEFAULT_KEEPALIVE_INTERVAL = 300
+MAX_RECONNECT_DELAY = 60
+
+
+def _has_buffered_input(mail: imaplib.IMAP4) -> bool:
+    """
+    Tell whether a response can be read without waiting on the socket.
+
+    imaplib reads through a buffered file, so a line sent together with an
+    earlier one (e.g. an EXISTS right after the IDLE continuation) may sit
+    in that buffer while the socket has nothing left to report; TLS may
+    also hold decrypted bytes. The buffer is peeked with the socket briefly
+    non-blocking, which also pulls in anything the socket already holds.
+    """
+    if getattr(mail.sock, 'pending', lambda: 0)():
+        return True
+    timeout = mail.sock.gettimeout()
+    mail.sock.settimeout(0)
+    try:
+        return bool(mail.file.peek())
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+
+class ImapSession:
+    """
+    A persistent IMAP session bound to a single folder.
+    """
+
+    def __init__(self, email_config: Dict[str, Any], stop_event: Optional[threading.Event] = None):
+        """
+        Initialize the session with the ``email`` section of the configuration.
+
+        Args:
+            email_config: Email settings (server, port, username, password, folder)
+            stop_event: Optional event used to interrupt waits and reconnects
+        """
+        self.config = email_config
+        self.folder = email_config.get('folder', 'INBOX')
+        self.use_idle = bool(email_config.get('idle', True))
+        self.idle_timeout = float(email_config.get('idle_timeout', DEFAULT_IDLE_TIMEOUT))
+        self.keepalive_interval = float(
+            email_config.get('keepalive_interval', DEFAULT_KEEPALIVE_INTERVAL)
+        )
+        self.stop_event = stop_event or threading.Event()
+        self.mail: Optional[imaplib.IMAP4] = None
+        self.uidvalidity: Optional[int] = None
+        self._reconnect_delay = 1.0
+
+    @property
+    def supports_idle(self) -> bool:
+        """Whether the server advertised the IDLE capability."""
+        return bool(self.mail) and 'IDLE' in getattr(self.mail, 'capabilities', ())
+
+    def open(self) -> imaplib.IMAP4:
+        """
+        Connect, log in and select the configured folder.
+
+        Returns:
+            The connected ``imaplib`` client
+
+        Raises:
+            RuntimeError: If the folder cannot be selected
+        """
+        mail = imaplib.IMAP4_SSL(self.config['server'], self.config['port'])
+        mail.login(self.config['username'], self.config['password'])
+        status, _ = mail.select(self.folder)
+        if status != 'OK':
+            raise RuntimeError(f"Failed to select folder: {self.folder}")
+
+        self.uidvalidity = get_uidvalidity(mail)
+        self.mail = mail
+        self._reconnect_delay = 1.0
+        logger.info(
+            f"IMAP session opened on {self.folder} "
+            f"({'IDLE' if self.supports_idle and self.use_idle else 'NOOP keepalive'})"
+        )
+        return mail
+
+    def close(self) -> None:
+        """Log out and drop the connection, ignoring errors."""
+        if not self.mail:
+            return
+        try:
+            self.mail.close()
+            self.mail.logout()
+        except Exception as e:
+            logger.debug(f"Error closing IMAP session: {e}")
+        finally:
+            self.mail = None
+
+    def reconnect(self) -> Optional[imaplib.IMAP4]:
+        """
+        Re-establish the session, backing off exponentially between attempts.
+
+        Returns:
+            The new client, or ``None`` if the session was stopped meanwhile
+        """
+        self.close()
+        while not self.stop_event.is_set():
+            try:
+                return self.open()
+            except Exception as e:
+                logger.warning(
+                    f"Reconnect failed: {e}; retrying in {self._reconnect_delay:.0f}s"
+                )
+                self.stop_event.wait(self._reconnect_delay)
+                self._reconnect_delay = min(self._reconnect_delay * 2, MAX_RECONNECT_DELAY)
+        return None
+
+    def wait_for_changes(self) -> bool:
+        """
+        Block until the mailbox may have changed.
+
+        Uses IDLE when available, otherwise sleeps for the keepalive interval
+        and sends a NOOP to keep the session alive.
+
+        Returns:
+            True if new messages may be available
+
+        Raises:
+            imaplib.IMAP4.abort: If the connection dropped while waiting
+        """
+        if self.use_idle and self.supports_idle:
+            return self._idle(self.idle_timeout)
+
+        self.stop_event.wait(self.keepalive_interval)
+        status, _ = self.mail.noop()
+        if status != 'OK':
+            raise imaplib.IMAP4.abort("NOOP failed")
+        return True
+
+    def _idle(self, timeout: float) -> bool:
+        """Run a single IDLE command until an update arrives or ``timeout`` expires."""
+        mail = self.mail
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+
+        line = mail.readline()
+        if not line.startswith(b'+'):
+            mail.tagged_commands.pop(tag, None)
+            raise imaplib.IMAP4.abort(f"IDLE rejected: {line!r}")
+
+        changed = False
+        deadline = time.monotonic() + timeout
+        try:
+            while not changed and not self.stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                # Wake up at least once per second to honour the stop event
+                if not _has_buffered_input(mail):
+                    readable, _, _ = select.select([mail.sock], [], [], min(remaining, 1.0))
+                    if not readable:
+                        continue
+
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed during IDLE")
+                if line.startswith(b'* BYE'):
+                    raise imaplib.IMAP4.abort(f"Server closed the session: {line!r}")
+                if line.startswith(b'*') and (b'EXISTS' in line or b'RECENT' in line):
+                    changed = True
+        finally:
+            mail.send(b'DONE\r\n')
+
+        # Drain untagged responses until IDLE completes
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while leaving IDLE")
+            if line.startswith(tag):
+                mail.tagged_commands.pop(tag, None)
+                break
+            if b'EXISTS' in line or b'RECENT' in line:
+                changed = True
+
+        return changed
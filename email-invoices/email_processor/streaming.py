@@ -0,0 +1,439 @@
+"""
+Streaming MIME parsing
+
+This module parses messages incrementally, without building the full
+``email`` object tree. Messages are downloaded in fixed-size chunks with
+partial ``BODY.PEEK[]<offset.length>`` fetches, part headers are parsed with
+``email.parser.BytesFeedParser`` and attachment bodies are decoded chunk by
+chunk straight into a sink on disk, so peak memory stays roughly constant
+regardless of attachment size.
+"""
+
+import binascii
+import logging
+import os
+import re
+import shutil
+import tempfile
+from email import message as email_message
+from email.parser import BytesFeedParser
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+from .imap_utils import iter_fetch_response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# RFC 2046 limits boundaries to 70 characters, so longer lines are never
+# boundary delimiters and can be passed on before their end is seen
+_MAX_BOUNDARY_LINE = 1024
+_BASE64_JUNK_RE = re.compile(rb'[^A-Za-z0-9+/=]')
+
+
+class SpoolFile:
+    """
+    A temporary file that an attachment is decoded into.
+
+    Offers the same ``write``/``commit``/``abort`` interface as
+    ``BlobWriter`` for processors running without a blob store.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Create the spool file.
+
+        Args:
+            directory: Directory for the temporary file (created if missing)
+        """
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='spool_')
+        self._file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        """Append a chunk to the file."""
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Close the file and return its path."""
+        self._file.close()
+        return self.path
+
+    def abort(self) -> None:
+        """Close and delete the file."""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def move_to(self, destination: str) -> str:
+        """Move the committed file to ``destination`` and return the new path."""
+        shutil.move(self.path, destination)
+        self.path = destination
+        return destination
+
+
+class StreamedAttachment(NamedTuple):
+    """An attachment decoded into a sink by ``StreamingMessageParser``."""
+
+    headers: email_message.Message
+    filename: Optional[str]
+    content_type: str
+    size: int
+    sink: Any
+    error: Optional[str] = None
+
+
+class StreamedMessage(NamedTuple):
+    """Top-level headers and attachments of a streamed message."""
+
+    headers: email_message.Message
+    attachments: List[StreamedAttachment]
+
+
+def is_attachment(headers: email_message.Message) -> bool:
+    """Default attachment test: a non-multipart part with a Content-Disposition."""
+    return headers.get('Content-Disposition') is not None
+
+
+class _Base64Decoder:
+    def __init__(self):
+        self._pending = b''
+
+    def decode(self, data: bytes) -> bytes:
+        data = self._pending + _BASE64_JUNK_RE.sub(b'', data)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b''
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b''
+        if not pending:
+            return b''
+        # Tolerate truncated input by padding the final quantum
+        return binascii.a2b_base64(pending + b'=' * (-len(pending) % 4))
+
+
+class _QuotedPrintableDecoder:
+    def __init__(self):
+        self._pending = b''
+
+    def decode(self, data: bytes) -> bytes:
+        data = self._pending + data
+        # Decode complete lines only so soft line breaks and escapes stay intact
+        end = data.rfind(b'\n') + 1
+        if not end and len(data) > _MAX_BOUNDARY_LINE:
+            end = len(data) - 2 if b'=' in data[-2:] else len(data)
+        self._pending = data[end:]
+        return binascii.a2b_qp(data[:end]) if end else b''
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b''
+        return binascii.a2b_qp(pending) if pending else b''
+
+
+class _IdentityDecoder:
+    def decode(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def _decoder_for(encoding: str):
+    encoding = (encoding or '7bit').strip().lower()
+    if encoding == 'base64':
+        return _Base64Decoder()
+    if encoding == 'quoted-printable':
+        return _QuotedPrintableDecoder()
+    return _IdentityDecoder()
+
+
+class _Part:
+    """State of the leaf part currently being streamed."""
+
+    def __init__(self, headers, sink, max_bytes):
+        self.headers = headers
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.decoder = _decoder_for(headers.get('Content-Transfer-Encoding', '7bit'))
+        self.size = 0
+        self.error = None
+
+    def write(self, data: bytes) -> None:
+        if self.sink is None or not data:
+            return
+        decoded = self.decoder.decode(data)
+        self._emit(decoded)
+
+    def _emit(self, decoded: bytes) -> None:
+        if self.sink is None or not decoded:
+            return
+        self.size += len(decoded)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.error = f"attachment exceeds {self.max_bytes} bytes"
+            self.sink.abort()
+            self.sink = None
+            return
+        self.sink.write(decoded)
+
+    def finish(self) -> Optional[StreamedAttachment]:
+        if self.sink is None and self.error is None:
+            return None
+        if self.sink is not None:
+            self._emit(self.decoder.flush())
+        if self.sink is not None:
+            self.sink.commit()
+        return StreamedAttachment(
+            headers=self.headers,
+            filename=self.headers.get_filename(),
+            content_type=self.headers.get_content_type(),
+            size=self.size,
+            sink=self.sink,
+            error=self.error,
+        )
+
+
+class StreamingMessageParser:
+    """
+    Incremental MIME parser that decodes attachments into sinks.
+
+    Feed raw message bytes in arbitrarily sized chunks with ``feed`` and call
+    ``close`` to obtain the result. Only header blocks and a single partial
+    line are buffered; attachment bodies are decoded as they arrive.
+    """
+
+    _HEADERS, _BODY = range(2)
+
+    def __init__(
+        self,
+        open_sink: Callable[[], Any],
+        max_part_bytes: Optional[int] = None,
+        wanted: Callable[[email_message.Message], bool] = is_attachment,
+    ):
+        """
+        Initialize the parser.
+
+        Args:
+            open_sink: Factory returning a writer with ``write``, ``commit``
+                and ``abort`` methods (e.g. ``BlobStore.writer``)
+            max_part_bytes: Decoded size limit per attachment; larger
+                attachments are discarded and reported with an error
+            wanted: Predicate selecting the leaf parts to decode, given their
+                headers
+        """
+        self._open_sink = open_sink
+        self._max_part_bytes = max_part_bytes
+        self._wanted = wanted
+        self._state = self._HEADERS
+        self._header_lines: List[bytes] = []
+        self._boundaries: List[bytes] = []
+        self._part: Optional[_Part] = None
+        self._buffer = b''
+        self._midline = False
+        self._pending_eol = b''
+        self._headers: Optional[email_message.Message] = None
+        self._attachments: List[StreamedAttachment] = []
+
+    def feed(self, data: bytes) -> None:
+        """Parse the next chunk of raw message bytes."""
+        data = self._buffer + data
+        start = 0
+        while True:
+            if self._state == self._BODY and not data.startswith(b'-', start):
+                # No line before the next one starting with "-" can be a
+                # boundary, so hand all complete lines up to it over at once
+                end = data.find(b'\n-', start)
+                if end < 0:
+                    end = data.rfind(b'\n', start)
+                if end < 0:
+                    break
+                self._body(data[start:end + 1], complete=True)
+                start = end + 1
+                continue
+
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            self._line(data[start:end + 1], complete=True)
+            start = end + 1
+        self._buffer = data[start:]
+
+        # A long partial line cannot be a boundary, so stream it right away
+        if self._state == self._BODY and len(self._buffer) > _MAX_BOUNDARY_LINE:
+            self._line(self._buffer, complete=False)
+            self._buffer = b''
+
+    def close(self) -> StreamedMessage:
+        """
+        Finish parsing.
+
+        Returns:
+            The top-level headers and the attachments that were decoded
+        """
+        if self._buffer:
+            self._line(self._buffer, complete=False)
+            self._buffer = b''
+        if self._state == self._HEADERS and self._header_lines:
+            self._end_headers()
+        self._finish_part()
+        headers = self._headers if self._headers is not None else email_message.Message()
+        return StreamedMessage(headers, self._attachments)
+
+    def abort(self) -> None:
+        """Discard the attachment being written and everything decoded so far."""
+        if self._part is not None and self._part.sink is not None:
+            self._part.sink.abort()
+        self._part = None
+        for attachment in self._attachments:
+            if attachment.sink is not None and hasattr(attachment.sink, 'abort'):
+                attachment.sink.abort()
+        self._attachments = []
+
+    def _line(self, line: bytes, complete: bool) -> None:
+        if self._state == self._HEADERS:
+            if line.strip(b'\r\n') == b'':
+                self._end_headers()
+            else:
+                self._header_lines.append(line)
+            return
+
+        if not self._midline and self._boundaries and line[:2] == b'--':
+            if self._boundary_line(line.rstrip()):
+                return
+
+        self._body(line, complete)
+
+    def _body(self, data: bytes, complete: bool) -> None:
+        """Pass body bytes to the current part; ``complete`` if they end a line."""
+        # The line break before a boundary belongs to the boundary, so it is
+        # held back until the next line shows it is part of the body
+        eol = b''
+        if complete:
+            eol = b'\r\n' if data.endswith(b'\r\n') else b'\n'
+        if self._part is not None:
+            self._part.write(self._pending_eol + data[:len(data) - len(eol)])
+        self._pending_eol = eol
+        self._midline = not complete
+
+    def _boundary_line(self, line: bytes) -> bool:
+        for depth in range(len(self._boundaries) - 1, -1, -1):
+            boundary = self._boundaries[depth]
+            if line == b'--' + boundary + b'--':
+                self._finish_part()
+                del self._boundaries[depth:]
+                return True
+            if line == b'--' + boundary:
+                self._finish_part()
+                del self._boundaries[depth + 1:]
+                self._state = self._HEADERS
+                return True
+        return False
+
+    def _end_headers(self) -> None:
+        parser = BytesFeedParser()
+        parser.feed(b''.join(self._header_lines) + b'\r\n')
+        headers = parser.close()
+        self._header_lines = []
+        self._state = self._BODY
+        self._pending_eol = b''
+        self._midline = False
+        if self._headers is None:
+            self._headers = headers
+
+        if headers.get_content_maintype() == 'multipart':
+            boundary = headers.get_boundary()
+            if boundary:
+                self._boundaries.append(boundary.encode('ascii', 'replace'))
+            return
+
+        # Descend into attached messages instead of treating them as a blob
+        if headers.get_content_type() == 'message/rfc822':
+            self._state = self._HEADERS
+            return
+
+        sink = self._open_sink() if self._wanted(headers) else None
+        self._part = _Part(headers, sink, self._max_part_bytes)
+
+    def _finish_part(self) -> None:
+        part, self._part = self._part, None
+        self._pending_eol = b''
+        self._midline = False
+        if part is None:
+            return
+        attachment = part.finish()
+        if attachment is None:
+            return
+        if attachment.error:
+            logger.warning(f"Skipping attachment {attachment.filename}: {attachment.error}")
+        self._attachments.append(attachment)
+
+
+def fetch_message_chunks(mail: Any, uid: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Download a message in fixed-size pieces with partial FETCH commands.
+
+    ``BODY.PEEK`` is used, so the ``\\Seen`` flag is left untouched.
+
+    Args:
+        mail: ``imaplib`` client with the folder selected
+        uid: UID of the message
+        chunk_size: Number of octets per FETCH
+
+    Yields:
+        Consecutive chunks of the raw message
+    """
+    status, data = mail.uid('FETCH', str(uid), '(RFC822.SIZE)')
+    if status != 'OK':
+        raise RuntimeError(f"Failed to fetch size of message {uid}")
+    size = next(
+        (int(items['RFC822.SIZE']) for _, items in iter_fetch_response(data) if 'RFC822.SIZE' in items),
+        None,
+    )
+    if size is None:
+        raise RuntimeError(f"Server did not report the size of message {uid}")
+
+    offset = 0
+    while offset < size:
+        status, data = mail.uid('FETCH', str(uid), f'(BODY.PEEK[]<{offset}.{chunk_size}>)')
+        if status != 'OK':
+            raise RuntimeError(f"Failed to fetch message {uid} at offset {offset}")
+        chunk = next(
+            (value for _, items in iter_fetch_response(data)
+             for key, value in items.items() if key.startswith('BODY[]') and value),
+            None,
+        )
+        if not chunk:
+            break
+        yield chunk
+        offset += len(chunk)
+
+
+def parse_message_stream(
+    chunks: Iterable[bytes],
+    open_sink: Callable[[], Any],
+    max_part_bytes: Optional[int] = None,
+    wanted: Callable[[email_message.Message], bool] = is_attachment,
+) -> StreamedMessage:
+    """
+    Parse a message from an iterable of raw chunks.
+
+    Args:
+        chunks: Raw message bytes in pieces
+        open_sink: Sink factory, see ``StreamingMessageParser``
+        max_part_bytes: Decoded size limit per attachment
+        wanted: Predicate selecting the parts to decode
+
+    Returns:
+        The parsed message. If reading the chunks fails, every sink is
+        aborted and the error is re-raised.
+    """
+    parser = StreamingMessageParser(open_sink, max_part_bytes, wanted)
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.close()
+    except Exception:
+        parser.abort()
+        raise
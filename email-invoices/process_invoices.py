@@ -16,18 +16,42 @@ import sys
 from email.utils import parsedate_to_datetime
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 # Add shared directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 # Import shared utilities
-from shared import load_config
+from shared import get_ocr_cache, load_config
+from shared.utils.local_ocr import PREPROCESS_VERSION
+from shared.utils.ocr_cache import content_digest, make_key
+from shared.utils.ocr_service import PRIORITY_NORMAL, OCRServiceClient, OCRServiceError
+from shared.utils.page_preprocess import to_gray
+from shared.utils.pdf_text import extract_text_layer, is_usable_text, page_runs
+from shared.utils.tiff_frames import TIFF_EXTENSIONS, iter_frames
+from email_processor.blob_store import BlobStore
+from email_processor.bodystructure import fetch_partial_messages
+from email_processor.checkpoints import STATUS_DONE, STATUS_FAILED, CheckpointStore, UidWatermark
+from email_processor.imap_utils import get_uidvalidity, parse_uid_list
+from email_processor.search import (
+    SenderFilter,
+    fetch_headers,
+    load_route_filters,
+    month_search_criteria,
+    translate_filter_condition,
+)
+from email_processor.streaming import (
+    DEFAULT_CHUNK_SIZE,
+    SpoolFile,
+    StreamedMessage,
+    fetch_message_chunks,
+    parse_message_stream,
+)
 
 # Third-party imports
 try:
     import pytesseract
-    from pdf2image import convert_from_bytes
+    from pdf2image import convert_from_bytes, convert_from_path
     import cv2
     import numpy as np
     HAS_OCR_DEPS = True
@@ -41,6 +65,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Configuration file main() loads; relative paths in it are resolved against its directory
+CONFIG_PATH = Path(__file__).parent / 'config' / 'config.json'
+
 class EmailInvoiceProcessor:
     def __init__(self, config=None, **kwargs):
         """Initialize with configuration.
@@ -71,7 +98,54 @@ class EmailInvoiceProcessor:
         self.output_dir = Path(self.config.get('output_dir', './output'))
         self.year = self.config.get_int('year', datetime.now().year)
         self.month = self.config.get_int('month', datetime.now().month)
-        self.supported_extensions = {'.pdf', '.jpg', '.jpeg', '.png'}
+        self.supported_extensions = {'.pdf', '.jpg', '.jpeg', '.png', '.tif', '.tiff'}
+        
+        # Local OCR settings; the defaults are Tesseract's and pdf2image's own
+        self.ocr_languages = self.config.get_list('ocr_languages') or ['eng']
+        self.ocr_dpi = self.config.get_int('ocr_dpi', 200)
+        self.ocr_oem = self.config.get_int('ocr_oem', 3)
+        self.ocr_psm = self.config.get_int('ocr_psm', 3)
+        
+        # Read the text layer of born-digital PDFs and OCR only scanned pages
+        self.use_text_layer = self.config.get_bool('use_text_layer', False)
+        
+        # Download only attachment sections selected from BODYSTRUCTURE
+        self.partial_fetch = self.config.get_bool('partial_fetch', False)
+        self.fetch_batch_size = self.config.get_int('fetch_batch_size', 100)
+        max_size_mb = self.config.get_float('max_attachment_size_mb', 0)
+        self.max_attachment_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        
+        # Download messages in chunks and decode attachments straight to disk
+        self.streaming = self.config.get_bool('streaming', False)
+        self.stream_chunk_size = self.config.get_int('stream_chunk_size', DEFAULT_CHUNK_SIZE)
+        
+        # Narrow candidates on the server and by prefetched Date/From headers
+        self.header_prefetch = self.config.get_bool('header_prefetch', True)
+        self.sender_filter = SenderFilter(
+            self.config.get_list('sender_allowlist'),
+            self.config.get_list('sender_denylist'),
+        )
+        self.route_filters = self._load_route_filters(self.config.get('route_file'))
+        
+        # Persistent sync checkpoints so reruns only fetch new mail
+        checkpoint_db = self.config.get('checkpoint_db')
+        self.checkpoints = CheckpointStore(checkpoint_db) if checkpoint_db else None
+        self.uidvalidity = None
+        
+        # Content-addressed store so repeated attachments are saved and OCR'd once
+        blob_store_dir = self.config.get('blob_store_dir')
+        self.blob_store = BlobStore(blob_store_dir) if blob_store_dir else None
+        
+        # OCR result cache, shareable with other processors through its database file
+        ocr_cache_path = self.config.get('ocr_cache_path')
+        self.ocr_cache = get_ocr_cache(ocr_cache_path) if ocr_cache_path else None
+        
+        # Submit OCR to the host's shared OCR service; local OCR is the fallback
+        ocr_service_socket = self.config.get('ocr_service_socket')
+        self.ocr_client = OCRServiceClient(
+            ocr_service_socket,
+            priority=self.config.get_int('ocr_service_priority', PRIORITY_NORMAL)
+        ) if ocr_service_socket else None
         
         # Create output directories
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -79,6 +153,23 @@ class EmailInvoiceProcessor:
         # Connect to email server
         self.mail = self._connect_email()
     
+    @staticmethod
+    def _load_route_filters(route_file: Optional[str]) -> List[str]:
+        """Read the filter conditions of the routes file, relative to the config directory.
+        
+        A missing or unreadable file only disables the pushdown of its filters.
+        """
+        if not route_file:
+            return []
+        path = Path(route_file)
+        if not path.is_absolute():
+            path = CONFIG_PATH.parent / path
+        try:
+            return load_route_filters(path)
+        except (OSError, ImportError) as e:
+            logger.warning(f"Route filters not pushed to the server; cannot read {path}: {e}")
+            return []
+    
     def _connect_email(self) -> imaplib.IMAP4_SSL:
         """Connect to the email server."""
         try:
@@ -93,12 +184,18 @@ class EmailInvoiceProcessor:
             mail = imaplib.IMAP4_SSL(server, port)
             mail.login(username, password)
             mail.select('inbox')
+            self.uidvalidity = get_uidvalidity(mail)
             logger.info("Successfully connected to email server")
             return mail
         except Exception as e:
             logger.error(f"Failed to connect to email server: {e}")
             raise
     
+    def _mailbox_key(self) -> str:
+        """Return the key identifying this mailbox and target month in the checkpoint store."""
+        username = self.config.get('username') or self.config.get('email')
+        return f"{username}@{self.config.get('imap_server')}/INBOX#{self.year:04d}-{self.month:02d}"
+    
     def _get_email_date(self, email_message: email.message.Message) -> Optional[datetime]:
         """Extract date from email."""
         date_str = email_message.get('Date')
@@ -114,6 +211,13 @@ class EmailInvoiceProcessor:
         """Check if email is from target month."""
         return email_date.year == self.year and email_date.month == self.month
     
+    def _is_wanted(self, headers: email.message.Message) -> bool:
+        """Check the Date and From headers against the target month and sender lists."""
+        email_date = self._get_email_date(headers)
+        if not email_date or not self._is_target_month(email_date):
+            return False
+        return not self.sender_filter or self.sender_filter.allows(headers.get('From', ''))
+    
     def _extract_sender_domain(self, email_message: email.message.Message) -> str:
         """Extract domain from sender's email address."""
         sender = email_message.get('From', '')
@@ -127,54 +231,156 @@ class EmailInvoiceProcessor:
         domain = email_address.split('@')[-1] if '@' in email_address else 'unknown'
         return domain.replace('.', '_')
     
-    def _extract_text_from_image(self, image_data: bytes) -> str:
-        """Extract text from image using OCR."""
+    def _tesseract(self, image) -> str:
+        """Run Tesseract with the configured languages and engine and segmentation modes."""
+        return pytesseract.image_to_string(
+            image,
+            lang='+'.join(self.ocr_languages),
+            config=f'--oem {self.ocr_oem} --psm {self.ocr_psm}'
+        )
+    
+    def _ocr_cache_key(self, digest: str, ext: str, backend: str) -> str:
+        """Return the OCR cache key of a document for the backend that OCRs it.
+        
+        Results of the OCR service are keyed by its socket, since the service
+        applies its own OCR settings; local results by every setting that
+        changes their text.
+        """
+        params = {'kind': ext, 'backend': backend}
+        if backend == 'service':
+            params['socket'] = self.ocr_client.socket_path
+        else:
+            params.update(
+                languages=list(self.ocr_languages),
+                dpi=self.ocr_dpi,
+                oem=self.ocr_oem,
+                psm=self.ocr_psm,
+                preprocess=PREPROCESS_VERSION,
+                text_layer=self.use_text_layer,
+            )
+        return make_key(digest, params)
+    
+    def _extract_text_from_image(self, image_data: Union[bytes, Path]) -> str:
+        """Extract text from image (bytes or a file path) using OCR."""
         try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            # Decode straight to grayscale
+            if isinstance(image_data, Path):
+                gray = cv2.imread(str(image_data), cv2.IMREAD_GRAYSCALE)
+            else:
+                # Convert bytes to numpy array
+                nparr = np.frombuffer(image_data, np.uint8)
+                gray = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
             
             # Apply thresholding to preprocess the image
             gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
             
             # Perform OCR
-            text = pytesseract.image_to_string(gray)
+            text = self._tesseract(gray)
             return text.strip()
         except Exception as e:
             logger.error(f"Error in OCR processing: {e}")
             return ""
     
-    def _extract_text_from_pdf(self, pdf_data: bytes) -> str:
-        """Extract text from PDF using OCR."""
+    def _extract_text_from_tiff(self, tiff_data: Union[bytes, Path]) -> str:
+        """Extract text from a (multi-page) TIFF, bytes or a file path, one frame at a time."""
         try:
-            # Convert PDF to images
-            images = convert_from_bytes(pdf_data)
-            
-            # Extract text from each page
             texts = []
-            for i, image in enumerate(images):
-                # Convert PIL Image to OpenCV format
-                open_cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
+            for _, frame, _ in iter_frames(tiff_data):
+                gray = to_gray(frame)
                 
                 # Apply thresholding
                 gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
                 
                 # Perform OCR
-                text = pytesseract.image_to_string(gray)
-                texts.append(text.strip())
+                texts.append(self._tesseract(gray).strip())
             
             return "\n--- PAGE BREAK ---\n".join(texts)
+        except Exception as e:
+            logger.error(f"Error in TIFF processing: {e}")
+            return ""
+    
+    def _extract_text_from_pdf(self, pdf_data: Union[bytes, Path]) -> str:
+        """Extract text from PDF (bytes or a file path), using OCR for scanned pages."""
+        try:
+            texts = {}
+            
+            # Keep the embedded text of born-digital pages
+            layer = extract_text_layer(pdf_data) if self.use_text_layer else None
+            if layer is None:
+                runs = [(None, None)]
+            else:
+                scanned = []
+                for page_number, text in enumerate(layer, 1):
+                    if is_usable_text(text):
+                        texts[page_number] = text.strip()
+                    else:
+                        scanned.append(page_number)
+                runs = page_runs(scanned)
+                logger.debug(f"Text layer used for {len(texts)} of {len(layer)} pages")
+            
+            for first_page, last_page in runs:
+                # Convert PDF to grayscale images, rendered so by Poppler
+                if isinstance(pdf_data, Path):
+                    images = convert_from_path(
+                        str(pdf_data), dpi=self.ocr_dpi, first_page=first_page,
+                        last_page=last_page, grayscale=True
+                    )
+                else:
+                    images = convert_from_bytes(
+                        pdf_data, dpi=self.ocr_dpi, first_page=first_page,
+                        last_page=last_page, grayscale=True
+                    )
+                
+                # Extract text from each page
+                for i, image in enumerate(images, first_page or 1):
+                    gray = to_gray(image)
+                    
+                    # Apply thresholding
+                    gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+                    
+                    # Perform OCR
+                    text = self._tesseract(gray)
+                    texts[i] = text.strip()
+            
+            return "\n--- PAGE BREAK ---\n".join(texts[i] for i in sorted(texts))
         except Exception as e:
             logger.error(f"Error in PDF processing: {e}")
             return ""
     
-    def _process_attachment(self, part, sender_domain: str) -> Optional[Dict]:
-        """Process an email attachment."""
-        filename = part.get_filename()
+    def _extract_text(
+        self, ext: str, file_data: Union[bytes, Path], sender_domain: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """Extract the text of an attachment, through the OCR service when configured.
+        
+        The sender domain lets the service reuse the language it detected in
+        earlier invoices of the same vendor.
+        
+        Returns:
+            The text and the backend that produced it, ``'service'`` or ``'local'``
+        """
+        if self.ocr_client is not None:
+            try:
+                if ext == '.pdf' or ext in TIFF_EXTENSIONS:
+                    extract = (self.ocr_client.extract_text_from_pdf if ext == '.pdf'
+                               else self.ocr_client.extract_text_from_tiff)
+                    result = extract(file_data, vendor=sender_domain)
+                    return "\n--- PAGE BREAK ---\n".join(
+                        page['text'] for page in result.get('pages', [])
+                    ), 'service'
+                return self.ocr_client.extract_text_from_image(
+                    file_data, vendor=sender_domain
+                ), 'service'
+            except OCRServiceError as e:
+                logger.warning(f"OCR service unavailable, using local OCR: {e}")
+        
+        if ext == '.pdf':
+            return self._extract_text_from_pdf(file_data), 'local'
+        if ext in TIFF_EXTENSIONS:
+            return self._extract_text_from_tiff(file_data), 'local'
+        return self._extract_text_from_image(file_data), 'local'
+    
+    def _attachment_target(self, filename: Optional[str], sender_domain: str) -> Optional[Path]:
+        """Return the path an attachment is saved to, or None if it is not supported."""
         if not filename:
             return None
         
@@ -190,20 +396,82 @@ class EmailInvoiceProcessor:
         # Create directory structure: year-month/sender_domain/invoices/
         invoice_dir = self.output_dir / f"{self.year:04d}-{self.month:02d}" / sender_domain / "invoices"
         invoice_dir.mkdir(parents=True, exist_ok=True)
+        return invoice_dir / safe_filename
+    
+    def _process_attachment(self, part, sender_domain: str) -> Optional[Dict]:
+        """Process an email attachment."""
+        filename = part.get_filename()
+        file_path = self._attachment_target(filename, sender_domain)
+        if file_path is None:
+            return None
         
-        # Save the attachment
-        file_path = invoice_dir / safe_filename
-        with open(file_path, 'wb') as f:
-            f.write(part.get_payload(decode=True))
-        
-        # Extract text based on file type
+        # Decode once and save the attachment
         file_data = part.get_payload(decode=True)
-        extracted_text = ""
+        digest = None
+        if self.blob_store:
+            digest, _ = self.blob_store.put(file_data)
+            self.blob_store.link(digest, file_path)
+        else:
+            with open(file_path, 'wb') as f:
+                f.write(file_data)
         
-        if ext == '.pdf':
-            extracted_text = self._extract_text_from_pdf(file_data)
-        else:  # Image file
-            extracted_text = self._extract_text_from_image(file_data)
+        return self._process_saved_attachment(
+            filename, file_path, file_data, len(file_data), digest, sender_domain
+        )
+    
+    def _process_streamed_attachment(self, attachment, sender_domain: str) -> Optional[Dict]:
+        """Process an attachment the streaming parser already decoded to disk."""
+        file_path = self._attachment_target(attachment.filename, sender_domain)
+        digest = getattr(attachment.sink, 'digest', None)
+        if file_path is None:
+            if not digest:
+                attachment.sink.abort()
+            return None
+        
+        if digest:
+            self.blob_store.link(digest, file_path)
+        else:
+            attachment.sink.move_to(str(file_path))
+        
+        # OCR reads the file from disk instead of an in-memory copy
+        return self._process_saved_attachment(
+            attachment.filename, file_path, file_path, attachment.size, digest, sender_domain
+        )
+    
+    def _process_saved_attachment(
+        self,
+        filename: str,
+        file_path: Path,
+        file_data: Union[bytes, Path],
+        file_size: int,
+        digest: Optional[str],
+        sender_domain: Optional[str] = None,
+    ) -> Dict:
+        """OCR a saved attachment and write its metadata next to it."""
+        ext = file_path.suffix.lower()
+        
+        # Reuse the OCR result of a blob seen before
+        cached = self.blob_store.get_result('ocr', digest) if digest else None
+        content = digest
+        if cached is None and self.ocr_cache is not None:
+            content = content or content_digest(file_data)
+            # Look up the result of the backend that would OCR the document
+            preferred = 'service' if self.ocr_client is not None else 'local'
+            cached = self.ocr_cache.get(self._ocr_cache_key(content, ext, preferred))
+        
+        if cached is not None:
+            logger.info(f"Reusing OCR result for {filename}")
+            extracted_text = cached.get('text', '')
+        else:
+            extracted_text, backend = self._extract_text(ext, file_data, sender_domain)
+        
+        if cached is None and extracted_text:
+            if digest:
+                self.blob_store.put_result('ocr', digest, {'text': extracted_text})
+            if self.ocr_cache is not None:
+                self.ocr_cache.put(
+                    self._ocr_cache_key(content, ext, backend), {'text': extracted_text}
+                )
         
         # Create metadata
         metadata = {
@@ -211,25 +479,158 @@ class EmailInvoiceProcessor:
             'saved_path': str(file_path.relative_to(self.output_dir)),
             'extracted_text': extracted_text,
             'processing_time': datetime.now().isoformat(),
-            'file_size': len(file_data),
+            'file_size': file_size,
             'file_type': ext.lstrip('.').upper()
         }
+        if digest:
+            metadata['sha256'] = digest
         
         # Save metadata as JSON
-        metadata_filename = f"{os.path.splitext(safe_filename)[0]}.json"
-        metadata_path = invoice_dir / metadata_filename
+        metadata_path = file_path.with_suffix('.json')
         with open(metadata_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
         
         logger.info(f"Processed attachment: {filename}")
         return metadata
     
+    def _iter_messages(
+        self, email_ids: List[bytes]
+    ) -> Iterator[Tuple[bytes, Union[email.message.Message, StreamedMessage]]]:
+        """Fetch emails by UID in full, only their attachment sections, or streamed in chunks."""
+        if self.streaming:
+            for email_id in email_ids:
+                try:
+                    streamed = parse_message_stream(
+                        fetch_message_chunks(self.mail, int(email_id), self.stream_chunk_size),
+                        self._open_attachment_sink,
+                        self.max_attachment_bytes,
+                        self._is_supported_attachment,
+                    )
+                except Exception as e:
+                    logger.error(f"Error fetching email {email_id}: {e}")
+                    continue
+                yield email_id, streamed
+            return
+        
+        if self.partial_fetch:
+            yield from fetch_partial_messages(
+                self.mail,
+                [int(email_id) for email_id in email_ids],
+                self.supported_extensions,
+                self.max_attachment_bytes,
+                self.fetch_batch_size,
+            )
+            return
+        
+        for email_id in email_ids:
+            try:
+                status, msg_data = self.mail.uid('fetch', email_id, '(RFC822)')
+                if status != 'OK':
+                    logger.warning(f"Failed to fetch email {email_id}")
+                    continue
+            except Exception as e:
+                logger.error(f"Error fetching email {email_id}: {e}")
+                continue
+            
+            yield email_id, email.message_from_bytes(msg_data[0][1])
+    
+    def _is_supported_attachment(self, headers: email.message.Message) -> bool:
+        """Whether a part's headers describe an attachment with a supported extension."""
+        filename = headers.get_filename()
+        return (
+            headers.get('Content-Disposition') is not None
+            and bool(filename)
+            and os.path.splitext(filename)[1].lower() in self.supported_extensions
+        )
+    
+    def _open_attachment_sink(self):
+        """Return a writer for a streamed attachment: the blob store or a spool file."""
+        if self.blob_store:
+            return self.blob_store.writer()
+        return SpoolFile(str(self.output_dir / '.spool'))
+    
+    def _process_email_message(self, email_message: Union[email.message.Message, StreamedMessage]) -> None:
+        """Process the attachments of a single email from the target month."""
+        if isinstance(email_message, StreamedMessage):
+            self._process_streamed_message(email_message)
+            return
+        
+        # Check email date and sender
+        if not self._is_wanted(email_message):
+            return
+        
+        # Extract sender domain for directory structure
+        sender_domain = self._extract_sender_domain(email_message)
+        
+        # Process attachments
+        for part in email_message.walk():
+            if part.get_content_maintype() == 'multipart' or part.get('Content-Disposition') is None:
+                continue
+            
+            self._process_attachment(part, sender_domain)
+    
+    def _process_streamed_message(self, streamed: StreamedMessage) -> None:
+        """Process the attachments of a streamed email from the target month."""
+        if not self._is_wanted(streamed.headers):
+            for attachment in streamed.attachments:
+                if attachment.sink is not None and not getattr(attachment.sink, 'digest', None):
+                    attachment.sink.abort()
+            return
+        
+        sender_domain = self._extract_sender_domain(streamed.headers)
+        for attachment in streamed.attachments:
+            # Oversized attachments were dropped while decoding
+            if attachment.error:
+                continue
+            self._process_streamed_attachment(attachment, sender_domain)
+    
+    def _search_criteria(self) -> str:
+        """Build SEARCH criteria for the target month, sender lists and route filters."""
+        criteria = [month_search_criteria(self.year, self.month)]
+        
+        sender_criteria = self.sender_filter.search_criteria()
+        if sender_criteria:
+            criteria.append(sender_criteria)
+        
+        variables = {'YEAR': self.year, 'MONTH': self.month}
+        for condition in self.route_filters:
+            translated = translate_filter_condition(condition, variables)
+            if translated:
+                criteria.append(translated)
+        
+        return ' '.join(criteria)
+    
+    def _prefilter(self, email_ids: List[bytes]) -> Tuple[List[bytes], List[bytes]]:
+        """
+        Split UIDs by their prefetched Date and From headers.
+        
+        Returns:
+            Tuple of ``(kept, skipped)`` UIDs. Only the skipped ones had
+            their headers fetched and rejected; UIDs whose headers could not
+            be fetched are kept, downloaded in full and filtered after parsing.
+        """
+        rejected = set()
+        for uid, headers in fetch_headers(self.mail, [int(i) for i in email_ids], self.fetch_batch_size):
+            if not self._is_wanted(headers):
+                rejected.add(uid)
+        
+        kept = [email_id for email_id in email_ids if int(email_id) not in rejected]
+        skipped = [email_id for email_id in email_ids if int(email_id) in rejected]
+        logger.info(f"Header prefetch kept {len(kept)} of {len(email_ids)} emails")
+        return kept, skipped
+    
     def process_emails(self):
         """Process emails from the specified month."""
         try:
-            # Search for emails from the target month
-            date_str = f"{self.year}-{self.month:02d}"
-            search_criteria = f'(SINCE "01-{self.month:02d}-{self.year}" BEFORE "01-{self.month+1 if self.month < 12 else 1}-{self.year + (0 if self.month < 12 else 1)}")'
+            # Let the server narrow the candidates as far as possible
+            search_criteria = self._search_criteria()
+            
+            # Only ask for UIDs above the checkpoint high-water mark
+            mailbox = self._mailbox_key()
+            high_water = 0
+            if self.checkpoints:
+                high_water = self.checkpoints.begin(mailbox, self.uidvalidity)
+                search_criteria = f"{search_criteria} UID {high_water + 1}:*"
             
             logger.info(f"Searching for emails with criteria: {search_criteria}")
             status, messages = self.mail.uid('search', None, search_criteria)
@@ -239,39 +640,47 @@ class EmailInvoiceProcessor:
                 return
             
             email_ids = messages[0].split()
+            if self.checkpoints:
+                new_uids = [uid for uid in parse_uid_list(messages) if uid > high_water]
+                pending = set(self.checkpoints.unprocessed(mailbox, new_uids))
+                pending.update(self.checkpoints.retry_uids(mailbox))
+                email_ids = [str(uid).encode() for uid in sorted(pending)]
+            
+            # The high-water mark only passes UIDs that were recorded
+            watermark = UidWatermark(int(email_id) for email_id in email_ids)
+            
+            # Download full messages only for UIDs whose headers pass the filters
+            if self.header_prefetch and email_ids:
+                email_ids, skipped = self._prefilter(email_ids)
+                if self.checkpoints:
+                    for email_id in skipped:
+                        self.checkpoints.mark(mailbox, int(email_id), STATUS_DONE)
+                        watermark.record(email_id)
             logger.info(f"Found {len(email_ids)} emails to process")
             
             # Process each email
-            for email_id in email_ids:
+            for email_id, email_message in self._iter_messages(email_ids):
+                error = None
                 try:
-                    # Fetch the email
-                    status, msg_data = self.mail.uid('fetch', email_id, '(RFC822)')
-                    if status != 'OK':
-                        logger.warning(f"Failed to fetch email {email_id}")
-                        continue
-                    
-                    # Parse the email
-                    raw_email = msg_data[0][1]
-                    email_message = email.message_from_bytes(raw_email)
-                    
-                    # Check email date
-                    email_date = self._get_email_date(email_message)
-                    if not email_date or not self._is_target_month(email_date):
-                        continue
-                    
-                    # Extract sender domain for directory structure
-                    sender_domain = self._extract_sender_domain(email_message)
-                    
-                    # Process attachments
-                    for part in email_message.walk():
-                        if part.get_content_maintype() == 'multipart' or part.get('Content-Disposition') is None:
-                            continue
-                        
-                        self._process_attachment(part, sender_domain)
-                    
+                    self._process_email_message(email_message)
                 except Exception as e:
                     logger.error(f"Error processing email {email_id}: {e}")
-                    continue
+                    error = str(e)
+                
+                if self.checkpoints:
+                    self.checkpoints.mark(mailbox, int(email_id), STATUS_FAILED if error else STATUS_DONE, error)
+                    safe_uid = watermark.record(email_id)
+                    if safe_uid is not None:
+                        self.checkpoints.advance(mailbox, safe_uid)
+            
+            # UIDs whose FETCH failed were never yielded; record them for a retry
+            if self.checkpoints:
+                for uid in watermark.missing():
+                    logger.warning(f"Email {uid} was not fetched; marking it for a retry")
+                    self.checkpoints.mark(mailbox, uid, STATUS_FAILED, 'Message could not be fetched')
+                    watermark.record(uid)
+                if watermark.safe is not None:
+                    self.checkpoints.advance(mailbox, watermark.safe)
             
             logger.info("Finished processing all emails")
             
@@ -292,7 +701,7 @@ def main():
         # Load configuration from multiple sources
         config = load_config(
             env_path=Path(__file__).parent / '.env',
-            json_path=Path(__file__).parent / 'config' / 'config.json',
+            json_path=CONFIG_PATH,
             env_prefix='EMAIL_'
         )
         
@@ -0,0 +1,83 @@
+"""
+Unit tests for the content-addressed attachment store.
+"""
+
+import hashlib
+import os
+
+import pytest
+from email_processor.blob_store import BlobStore
+
+
+class TestBlobStore:
+    """Test cases for the BlobStore class."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """Return a blob store in a temporary directory."""
+        return BlobStore(tmp_path / "blobs")
+
+    def test_put_is_content_addressed(self, store):
+        """Identical content is stored once under its SHA-256 digest."""
+        data = b"%PDF-1.4 invoice"
+        digest, created = store.put(data)
+
+        assert digest == hashlib.sha256(data).hexdigest()
+        assert created is True
+        assert store.path_for(digest).read_bytes() == data
+        assert store.put(data) == (digest, False)
+
+    def test_writer_hashes_while_writing(self, store):
+        """Chunks written through a writer produce the same digest as put()."""
+        with store.writer() as writer:
+            writer.write(b"abc")
+            writer.write(b"def")
+
+        assert writer.digest == hashlib.sha256(b"abcdef").hexdigest()
+        assert writer.size == 6
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_put_hashes_once(self, store, monkeypatch):
+        """put() hands its digest to the writer instead of hashing the content again."""
+        hashed = []
+        sha256 = hashlib.sha256
+
+        def counting_sha256(*args):
+            hashed.append(args)
+            return sha256(*args)
+
+        monkeypatch.setattr(hashlib, 'sha256', counting_sha256)
+        digest, created = store.put(b"%PDF-1.4 invoice")
+
+        assert created is True
+        assert len(hashed) == 1
+        assert store.path_for(digest).read_bytes() == b"%PDF-1.4 invoice"
+
+    def test_writer_discards_on_error(self, store):
+        """A failed write leaves neither a blob nor a temporary file behind."""
+        with pytest.raises(RuntimeError):
+            with store.writer() as writer:
+                writer.write(b"partial")
+                raise RuntimeError("boom")
+
+        assert writer.digest is None
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_link_shares_storage(self, store, tmp_path):
+        """Linked copies point to the same inode as the blob."""
+        digest, _ = store.put(b"data")
+        first = store.link(digest, tmp_path / "a" / "invoice.pdf")
+        second = store.link(digest, tmp_path / "b" / "invoice.pdf")
+
+        assert first.read_bytes() == b"data"
+        assert first.samefile(store.path_for(digest))
+        assert second.samefile(first)
+
+    def test_stage_results(self, store):
+        """Stage results are recorded per digest."""
+        digest, _ = store.put(b"data")
+
+        assert store.get_result("ocr", digest) is None
+        store.put_result("ocr", digest, {"text": "Total 10.00"})
+        assert store.get_result("ocr", digest) == {"text": "Total 10.00"}
+        assert store.get_result("ai", digest) is None
@@ -0,0 +1,117 @@
+"""
+Unit tests for BODYSTRUCTURE-driven partial downloads.
+"""
+
+import base64
+import imaplib
+from unittest.mock import MagicMock
+
+import pytest
+
+from email_processor.bodystructure import (
+    fetch_partial_messages,
+    parse_bodystructure,
+    select_attachment_parts,
+)
+from email_processor.imap_utils import iter_fetch_response
+
+STRUCTURE = (
+    b'1 (UID 7 BODYSTRUCTURE ('
+    b'("text" "html" ("charset" "utf-8") NIL NIL "quoted-printable" 900 20 NIL NIL NIL NIL)'
+    b'("image" "png" ("name" "logo.png") "<logo>" NIL "base64" 4000 NIL ("inline" ("filename" "logo.png")) NIL NIL)'
+    b'("application" "pdf" ("name" "invoice.pdf") NIL NIL "base64" 12 NIL ("attachment" ("filename" "invoice.pdf")) NIL NIL)'
+    b'("application" "pdf" ("name" "huge.pdf") NIL NIL "base64" 99999999 NIL ("attachment" ("filename" "huge.pdf")) NIL NIL)'
+    b' "mixed" ("boundary" "xyz") NIL NIL NIL))'
+)
+
+# A forwarded message holding a multipart body with a PDF, next to a
+# forwarded message with a single PDF body
+FORWARDED = (
+    b'1 (UID 8 BODYSTRUCTURE ('
+    b'("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 40 2 NIL NIL NIL NIL)'
+    b'("message" "rfc822" NIL NIL NIL "7bit" 5000 '
+    b'("Mon, 5 May 2025 10:00:00 +0000" "Invoice" NIL NIL NIL NIL NIL NIL NIL "<a@b>") '
+    b'(("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 20 1 NIL NIL NIL NIL)'
+    b'("application" "pdf" ("name" "march.pdf") NIL NIL "base64" 12 NIL '
+    b'("attachment" ("filename" "march.pdf")) NIL NIL) "mixed" ("boundary" "in") NIL NIL NIL) '
+    b'80 NIL ("attachment" ("filename" "Invoice.eml")) NIL NIL)'
+    b'("message" "rfc822" NIL NIL NIL "7bit" 900 '
+    b'(NIL "Scan" NIL NIL NIL NIL NIL NIL NIL NIL) '
+    b'("application" "pdf" ("name" "april.pdf") NIL NIL "base64" 12 NIL '
+    b'("attachment" ("filename" "april.pdf")) NIL NIL) 12 NIL NIL NIL NIL)'
+    b' "mixed" ("boundary" "out") NIL NIL NIL))'
+)
+
+
+def _parts():
+    (_, items), = iter_fetch_response([STRUCTURE])
+    return parse_bodystructure(items['BODYSTRUCTURE'])
+
+
+class TestBodyStructure:
+    """Test cases for BODYSTRUCTURE parsing and part selection."""
+
+    def test_parse_sections_and_filenames(self):
+        """Leaf parts are numbered and carry their filenames."""
+        parts = _parts()
+        assert [p.section for p in parts] == ['1', '2', '3', '4']
+        assert parts[2].filename == 'invoice.pdf'
+        assert parts[1].disposition == 'inline'
+
+    def test_select_skips_inline_html_and_oversized(self):
+        """Only supported, reasonably sized attachments are selected."""
+        selected = select_attachment_parts(_parts(), {'.pdf', '.png'}, max_size=10 * 1024 * 1024)
+        assert [p.filename for p in selected] == ['invoice.pdf']
+
+    def test_parse_descends_into_attached_messages(self):
+        """Parts of forwarded messages are listed with their nested section numbers."""
+        (_, items), = iter_fetch_response([FORWARDED])
+        parts = parse_bodystructure(items['BODYSTRUCTURE'])
+
+        assert [(p.section, p.content_type) for p in parts] == [
+            ('1', 'text/plain'),
+            ('2.1', 'text/plain'),
+            ('2.2', 'application/pdf'),
+            ('3.1', 'application/pdf'),
+        ]
+        selected = select_attachment_parts(parts, {'.pdf'})
+        assert [(p.section, p.filename) for p in selected] == [
+            ('2.2', 'march.pdf'), ('3.1', 'april.pdf')
+        ]
+
+    def test_fetch_partial_messages_downloads_selected_sections(self):
+        """Only the selected BODY.PEEK sections are fetched."""
+        payload = base64.b64encode(b'%PDF-1.4')
+        mail = MagicMock()
+        mail.uid.side_effect = [
+            ('OK', [STRUCTURE]),
+            ('OK', [(b'1 (UID 7 BODY[3] {%d}' % len(payload), payload), b')']),
+        ]
+
+        (uid, msg), = fetch_partial_messages(mail, [7], {'.pdf'}, max_size=1024 * 1024)
+
+        assert uid == 7
+        assert mail.uid.call_args_list[1].args[2] == '(UID BODY.PEEK[3])'
+        attachments = [p for p in msg.walk() if p.get_filename()]
+        assert [p.get_filename() for p in attachments] == ['invoice.pdf']
+        assert attachments[0].get_payload(decode=True) == b'%PDF-1.4'
+
+    def test_fetch_partial_messages_skips_unfetched_sections(self):
+        """A message whose sections could not be fetched is left for a retry, not emptied."""
+        mail = MagicMock()
+        mail.uid.side_effect = [('OK', [STRUCTURE]), ('NO', [b'Server busy'])]
+
+        assert list(fetch_partial_messages(mail, [7], {'.pdf'})) == []
+
+        mail.uid.side_effect = [('OK', [STRUCTURE]), imaplib.IMAP4.error('BAD command')]
+        assert list(fetch_partial_messages(mail, [7], {'.pdf'})) == []
+
+        mail.uid.side_effect = [imaplib.IMAP4.error('BAD command')]
+        assert list(fetch_partial_messages(mail, [7], {'.pdf'})) == []
+
+    def test_fetch_partial_messages_raises_on_abort(self):
+        mail = MagicMock()
+        mail.uid.side_effect = [('OK', [STRUCTURE]), imaplib.IMAP4.abort('connection reset')]
+
+        with pytest.raises(imaplib.IMAP4.abort):
+            list(fetch_partial_messages(mail, [7], {'.pdf'}))
@@ -0,0 +1,71 @@
+"""
+Unit tests for the mailbox checkpoint store.
+"""
+
+import pytest
+from email_processor.checkpoints import STATUS_DONE, STATUS_FAILED, CheckpointStore, UidWatermark
+
+
+class TestCheckpointStore:
+    """Test cases for the CheckpointStore class."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """Return a checkpoint store backed by a temporary database."""
+        store = CheckpointStore(str(tmp_path / "state" / "checkpoints.db"), max_attempts=2)
+        yield store
+        store.close()
+
+    def test_fresh_mailbox_starts_at_zero(self, store):
+        """A mailbox without history has a zero high-water mark."""
+        assert store.begin("box", 100) == 0
+
+    def test_high_water_survives_reopen(self, store, tmp_path):
+        """The high-water mark is persisted across store instances."""
+        store.begin("box", 100)
+        store.mark("box", 7, STATUS_DONE)
+        store.advance("box", 7)
+        store.advance("box", 3)
+
+        reopened = CheckpointStore(store.path)
+        assert reopened.begin("box", 100) == 7
+        reopened.close()
+
+    def test_uidvalidity_change_resets_state(self, store):
+        """A new UIDVALIDITY discards the recorded UIDs."""
+        store.begin("box", 100)
+        store.mark("box", 5, STATUS_FAILED, "boom")
+        store.advance("box", 5)
+
+        assert store.begin("box", 200) == 0
+        assert store.retry_uids("box") == []
+
+    def test_unprocessed_and_retries(self, store):
+        """Done UIDs are skipped and failed UIDs are retried up to the limit."""
+        store.begin("box", 1)
+        store.mark("box", 1, STATUS_DONE)
+        store.mark("box", 2, STATUS_FAILED, "boom")
+
+        assert store.unprocessed("box", [1, 2, 3]) == [2, 3]
+        assert store.retry_uids("box") == [2]
+
+        store.mark("box", 2, STATUS_FAILED, "boom again")
+        assert store.retry_uids("box") == []
+
+
+class TestUidWatermark:
+    """Test cases for the UidWatermark class."""
+
+    def test_safe_uid_stops_below_unrecorded_uids(self):
+        """The safe mark only passes UIDs once everything below them was recorded."""
+        watermark = UidWatermark([5, 3, 9, 7])
+        assert watermark.safe is None
+
+        assert watermark.record(5) is None
+        assert watermark.record(3) == 5
+        assert watermark.record(9) == 5
+        assert watermark.missing() == [7]
+
+        assert watermark.record(7) == 9
+        assert watermark.missing() == []
+
@@ -5,6 +5,7 @@ Unit tests for the EmailProcessor class.
 import imaplib
 import os
 import pytest
+from email.message import EmailMessage
 from unittest.mock import MagicMock, patch
 from email_processor.process_invoices import EmailProcessor
 
@@ -146,3 +147,320 @@ class TestEmailProcessor:
         
         # Check that makedirs was called for the processed directory
         mock_makedirs.assert_any_call(expected_processed_dir, exist_ok=True)
+
+    def test_process_emails_batched_uses_uid_fetch(self, sample_config):
+        """Test that batched mode fetches unseen UIDs over message sets."""
+        sample_config['email']['fetch_batch_size'] = 2
+        processor = EmailProcessor(sample_config)
+        processor.mail = MagicMock()
+        processor.mail.select.return_value = ('OK', [b'3'])
+
+        raw = b'Subject: test\r\n\r\nbody'
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'1 2 5']
+            return 'OK', [(b'1 (UID 1 RFC822 {%d}' % len(raw), raw), b')']
+        processor.mail.uid.side_effect = uid
+
+        processor.process_emails()
+
+        fetch_sets = [c.args[1] for c in processor.mail.uid.call_args_list if c.args[0] == 'FETCH']
+        assert fetch_sets == ['1:2', '5']
+        processor.mail.store.assert_not_called()
+        processor.mail.fetch.assert_not_called()
+
+    @patch('email_processor.process_invoices.ImapSession')
+    def test_run_forever_reconnects_and_fetches_new_uids(self, mock_session_cls, sample_config):
+        """Test that the daemon reconnects on drops and only asks for new UIDs."""
+        processor = EmailProcessor(sample_config)
+        mail = MagicMock()
+        searches = []
+
+        raw = b'Subject: test\r\n\r\nbody'
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                searches.append(args[1])
+                return 'OK', [b'4'] if len(searches) == 1 else [b'']
+            if command == 'FETCH':
+                return 'OK', [(b'1 (UID 4 BODY[] {%d}' % len(raw), raw), b')']
+            return 'OK', [None]
+        mail.uid.side_effect = uid
+
+        session = mock_session_cls.return_value
+        session.reconnect.return_value = mail
+        session.uidvalidity = 1
+
+        def wait_for_changes():
+            if session.wait_for_changes.call_count == 1:
+                raise imaplib.IMAP4.abort("dropped")
+            processor.stop()
+        session.wait_for_changes.side_effect = wait_for_changes
+
+        processor.run_forever()
+
+        assert session.reconnect.call_count == 2
+        assert searches == ['UNSEEN', 'UID 5:* UNSEEN']
+        session.close.assert_called_once()
+
+    @patch('email_processor.process_invoices.ImapSession')
+    def test_run_forever_retries_failed_messages(self, mock_session_cls, sample_config):
+        """A failed message is searched again; a failed cycle is retried instead of ending."""
+        processor = EmailProcessor(sample_config)
+        processor._process_message = MagicMock(side_effect=[
+            [{"success": True}], [{"success": False, "error": "boom"}], [{"success": True}],
+            [{"success": True}],
+        ])
+        mail = MagicMock()
+        searches = []
+        raw = b'Subject: test\r\n\r\nbody'
+        pending = {1: [4, 5, 6], 2: [5]}
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                searches.append(args[1])
+                if len(searches) == 3:
+                    raise imaplib.IMAP4.error('SEARCH rejected')
+                found = pending.get(len(searches), [])
+                return 'OK', [' '.join(map(str, found)).encode()]
+            if command == 'FETCH':
+                uids = [int(u) for u in args[0].replace(':', ',').split(',')]
+                uids = [u for u in range(min(uids), max(uids) + 1)]
+                response = []
+                for uid_ in uids:
+                    response.append((b'%d (UID %d BODY[] {%d}' % (uid_, uid_, len(raw)), raw))
+                    response.append(b')')
+                return 'OK', response
+            return 'OK', [None]
+        mail.uid.side_effect = uid
+
+        session = mock_session_cls.return_value
+        session.reconnect.return_value = mail
+        session.uidvalidity = 1
+        session.wait_for_changes.side_effect = (
+            lambda: processor.stop() if len(searches) >= 4 else True
+        )
+
+        with patch.object(processor._stop_event, 'wait') as wait:
+            processor.run_forever()
+
+        # UID 5 failed and stayed unseen, so the next search starts at it
+        assert searches == ['UNSEEN', 'UID 5:* UNSEEN', 'UID 6:* UNSEEN', 'UID 6:* UNSEEN']
+        assert processor._process_message.call_count == 4
+        assert processor.last_uid == 5
+        wait.assert_called_once_with(1.0)
+        assert session.reconnect.call_count == 1
+
+    def test_process_emails_with_checkpoints_fetches_only_new_uids(self, sample_config, tmp_path):
+        """Test that checkpointed runs search above the high-water mark."""
+        sample_config['checkpoint_db'] = str(tmp_path / "checkpoints.db")
+        processor = EmailProcessor(sample_config)
+        mailbox = processor._mailbox_key()
+        processor.checkpoints.begin(mailbox, 9)
+        processor.checkpoints.advance(mailbox, 10)
+
+        processor.mail = MagicMock()
+        processor.mail.select.return_value = ('OK', [b'3'])
+        processor.mail.response.return_value = ('UIDVALIDITY', [b'9'])
+        raw = b'Subject: test\r\n\r\nbody'
+        searches = []
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                searches.append(args[1])
+                return 'OK', [b'10 11']
+            return 'OK', [(b'1 (UID 11 RFC822 {%d}' % len(raw), raw), b')']
+        processor.mail.uid.side_effect = uid
+
+        processor.process_emails()
+
+        assert searches == ['UID 11:*']
+        assert processor.checkpoints.high_water(mailbox) == 11
+        assert processor.checkpoints.unprocessed(mailbox, [11]) == []
+
+    def test_failed_fetch_batch_is_retried_and_not_skipped(self, sample_config, tmp_path):
+        """UIDs of a fetch batch that raised are marked failed, not passed by the checkpoint."""
+        sample_config['checkpoint_db'] = str(tmp_path / "checkpoints.db")
+        sample_config['email']['fetch_batch_size'] = 2
+        processor = EmailProcessor(sample_config)
+        mailbox = processor._mailbox_key()
+        processor.mail = MagicMock()
+        processor.mail.select.return_value = ('OK', [b'4'])
+        processor.mail.response.return_value = ('UIDVALIDITY', [b'9'])
+        raw = b'Subject: test\r\n\r\nbody'
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'1 2 3 4']
+            if command == 'FETCH' and args[0] == '1:2':
+                raise imaplib.IMAP4.error('FETCH failed')
+            if command == 'FETCH':
+                response = []
+                for uid_ in (3, 4):
+                    response.append((b'%d (UID %d BODY[] {%d}' % (uid_, uid_, len(raw)), raw))
+                    response.append(b')')
+                return 'OK', response
+            return 'OK', [None]
+        processor.mail.uid.side_effect = uid
+        advances = []
+        advance = processor.checkpoints.advance
+        processor.checkpoints.advance = lambda box, uid_: (advances.append(uid_), advance(box, uid_))
+
+        processor.process_emails()
+
+        assert processor.checkpoints.retry_uids(mailbox) == [1, 2]
+        assert processor.checkpoints.unprocessed(mailbox, [1, 2, 3, 4]) == [1, 2]
+        # The mark never passed the unfetched UIDs before they were recorded
+        assert advances == [4]
+        assert processor.checkpoints.high_water(mailbox) == 4
+
+    @staticmethod
+    def _invoice_mailbox(processor, uids):
+        """Serve one message with a PDF attachment per UID on a mocked connection."""
+        msg = EmailMessage()
+        msg['Subject'] = 'Invoice'
+        msg.set_content('See attached.')
+        msg.add_attachment(b'%PDF-1.4 invoice', maintype='application', subtype='pdf',
+                           filename='invoice.pdf')
+        raw = msg.as_bytes()
+        processor.mail = MagicMock()
+        processor.mail.select.return_value = ('OK', [b'%d' % len(uids)])
+        processor.mail.response.return_value = ('UIDVALIDITY', [b'9'])
+        processor.mail.capabilities = ('IMAP4REV1', 'MOVE')
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [' '.join(map(str, uids)).encode()]
+            if command == 'FETCH':
+                response = []
+                for uid_ in uids:
+                    response.append((b'%d (UID %d BODY[] {%d}' % (uid_, uid_, len(raw)), raw))
+                    response.append(b')')
+                return 'OK', response
+            return 'OK', [None]
+        processor.mail.uid.side_effect = uid
+
+    def test_failed_ai_processing_is_retried(self, sample_config, tmp_path):
+        """A message whose AI stage raised is checkpointed as failed, not done."""
+        sample_config['checkpoint_db'] = str(tmp_path / "checkpoints.db")
+        sample_config['email']['fetch_batch_size'] = 10
+        processor = EmailProcessor(sample_config)
+        mailbox = processor._mailbox_key()
+        processor.ai_processor = MagicMock()
+        processor.ai_processor.is_enabled.return_value = True
+        processor.ai_processor.process_invoice.side_effect = [RuntimeError('model down'),
+                                                             {"total": "10.00"}]
+        self._invoice_mailbox(processor, [1, 2])
+
+        results = processor.process_emails()
+
+        assert [r['ai_processing'].get('success') for r in results] == [False, None]
+        assert processor.checkpoints.retry_uids(mailbox) == [1]
+        assert processor.checkpoints.unprocessed(mailbox, [1, 2]) == [1]
+
+    def test_failed_ai_processing_keeps_flags(self, sample_config):
+        """A message whose invoice was not extracted is neither flagged nor moved."""
+        sample_config['email'].update({'fetch_batch_size': 10, 'move_processed': True})
+        processor = EmailProcessor(sample_config)
+        processor.ai_processor = MagicMock()
+        processor.ai_processor.is_enabled.return_value = True
+        processor.ai_processor.process_invoice.side_effect = RuntimeError('model down')
+        self._invoice_mailbox(processor, [1, 2])
+
+        processor.process_emails()
+
+        mutations = [c.args for c in processor.mail.uid.call_args_list
+                     if c.args[0] not in ('SEARCH', 'FETCH')]
+        assert mutations == []
+        processor.mail.store.assert_not_called()
+        processor.mail.copy.assert_not_called()
+
+    def test_process_emails_flags_and_moves_only_successful_messages(self, sample_config):
+        """Failed messages keep their flags; the rest are flagged and moved in bulk."""
+        sample_config['email'].update({'fetch_batch_size': 10, 'move_processed': True})
+        processor = EmailProcessor(sample_config)
+        processor.mail = MagicMock()
+        processor.mail.select.return_value = ('OK', [b'3'])
+        processor.mail.capabilities = ('IMAP4REV1', 'MOVE')
+        processor._process_message = MagicMock(side_effect=[
+            [{"success": True}], [{"success": False, "error": "boom"}], [],
+        ])
+        raw = b'Subject: test\r\n\r\nbody'
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'1 2 3']
+            if command == 'FETCH':
+                assert args[1] == '(BODY.PEEK[])'
+                response = []
+                for uid_ in (1, 2, 3):
+                    response.append((b'%d (UID %d BODY[] {%d}' % (uid_, uid_, len(raw)), raw))
+                    response.append(b')')
+                return 'OK', response
+            return 'OK', [None]
+        processor.mail.uid.side_effect = uid
+
+        processor.process_emails()
+
+        mutations = [c.args for c in processor.mail.uid.call_args_list
+                     if c.args[0] not in ('SEARCH', 'FETCH')]
+        assert mutations == [
+            ('STORE', '1,3', '+FLAGS.SILENT', r'(\Seen)'),
+            ('MOVE', '1,3', 'Processed'),
+        ]
+        processor.mail.store.assert_not_called()
+
+    def test_process_attachment_with_blob_store_deduplicates(self, sample_config, tmp_path):
+        """Test that a repeated attachment is stored once and processed by AI once."""
+        sample_config['blob_store_dir'] = str(tmp_path / "blobs")
+        processor = EmailProcessor(sample_config)
+        processor.ai_processor = MagicMock()
+        processor.ai_processor.is_enabled.return_value = True
+        processor.ai_processor.process_invoice.return_value = {"total": "10.00"}
+        part = MagicMock()
+        part.get_filename.return_value = "invoice.pdf"
+        part.get_payload.return_value = b"%PDF-1.4 invoice"
+
+        with patch('email_processor.process_invoices.datetime') as mock_datetime:
+            mock_datetime.now.return_value.strftime.side_effect = ["20250602_120000", "20250602_120001"]
+            mock_datetime.now.return_value.isoformat.return_value = "2025-06-02T12:00:00"
+            first = processor._process_attachment(part)
+            second = processor._process_attachment(part)
+
+        assert first["sha256"] == second["sha256"]
+        assert os.path.samefile(first["original_file"], second["original_file"])
+        assert second["ai_processing"] == {"total": "10.00"}
+        processor.ai_processor.process_invoice.assert_called_once()
+
+    def test_process_emails_streaming_decodes_attachments_to_disk(self, sample_config):
+        """Test that streaming mode fetches messages in chunks and saves attachments."""
+        sample_config['email']['streaming'] = True
+        sample_config['email']['stream_chunk_size'] = 64
+        msg = EmailMessage()
+        msg.set_content('See attached.')
+        msg.add_attachment(b'%PDF-1.4 streamed', maintype='application', subtype='pdf',
+                           filename='invoice.pdf')
+        raw = msg.as_bytes()
+
+        processor = EmailProcessor(sample_config)
+        processor.mail = MagicMock()
+        processor.mail.select.return_value = ('OK', [b'1'])
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'4']
+            if command == 'STORE':
+                return 'OK', [b'']
+            if args[1] == '(RFC822.SIZE)':
+                return 'OK', [b'1 (UID 4 RFC822.SIZE %d)' % len(raw)]
+            offset = int(args[1].split('<')[1].split('.')[0])
+            chunk = raw[offset:offset + 64]
+            return 'OK', [(b'1 (UID 4 BODY[]<%d> {%d}' % (offset, len(chunk)), chunk), b')']
+        processor.mail.uid.side_effect = uid
+
+        results = processor.process_emails()
+
+        assert len(results) == 1
+        with open(results[0]['original_file'], 'rb') as f:
+            assert f.read() == b'%PDF-1.4 streamed'
+        processor.mail.uid.assert_any_call('STORE', '4', '+FLAGS.SILENT', r'(\Seen)')
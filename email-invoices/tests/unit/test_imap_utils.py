@@ -0,0 +1,66 @@
+"""
+Unit tests for the IMAP helper utilities.
+"""
+
+import pytest
+from email_processor.imap_utils import (
+    chunked,
+    compress_uid_set,
+    iter_fetch_response,
+    parse_uid_list,
+)
+
+
+class TestMessageSets:
+    """Test cases for UID message set helpers."""
+
+    def test_compress_uid_set_collapses_ranges(self):
+        """Consecutive UIDs are collapsed into ranges."""
+        assert compress_uid_set([9, 1, 2, 3, 7, 10]) == "1:3,7,9:10"
+
+    def test_compress_uid_set_accepts_bytes(self):
+        """UIDs returned by imaplib as bytes are accepted."""
+        assert compress_uid_set([b'5', b'4']) == "4:5"
+
+    def test_compress_uid_set_rejects_empty(self):
+        """An empty UID list cannot form a message set."""
+        with pytest.raises(ValueError):
+            compress_uid_set([])
+
+    def test_chunked(self):
+        """Sequences are split into consecutive chunks."""
+        assert list(chunked([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+
+    def test_parse_uid_list(self):
+        """UID SEARCH payloads are parsed into sorted integers."""
+        assert parse_uid_list([b'12 3 7']) == [3, 7, 12]
+        assert parse_uid_list([b'']) == []
+
+
+class TestIterFetchResponse:
+    """Test cases for FETCH response parsing."""
+
+    def test_parses_messages_with_literals(self):
+        """Each message is yielded with its UID and literal payload."""
+        data = [
+            (b'1 (UID 10 RFC822 {5}', b'first'),
+            b')',
+            (b'2 (UID 11 RFC822 {6}', b'second'),
+            b' FLAGS (\\Seen))',
+        ]
+        messages = list(iter_fetch_response(data))
+
+        assert [uid for uid, _ in messages] == [10, 11]
+        assert messages[0][1]['RFC822'] == b'first'
+        assert messages[1][1]['FLAGS'] == [b'\\Seen']
+
+    def test_uid_after_literal(self):
+        """UIDs reported after the literal are still picked up."""
+        data = [(b'3 (RFC822 {3}', b'abc'), b' UID 42)']
+        assert list(iter_fetch_response(data)) == [(42, {'RFC822': b'abc', 'UID': b'42'})]
+
+    def test_releases_consumed_elements(self):
+        """Parsed elements are dropped from the response list."""
+        data = [(b'1 (UID 1 RFC822 {1}', b'x'), b')']
+        list(iter_fetch_response(data))
+        assert data == [None, None]
@@ -0,0 +1,219 @@
+"""
+Unit tests for multi-mailbox ingestion.
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock
+
+from email_processor.multi_account import ImapConnectionPool, MultiAccountRunner, _interleave
+
+
+def _account(name, tmp_path):
+    return {
+        'name': name,
+        'email': {
+            'server': 'imap.example.com',
+            'port': 993,
+            'username': f'{name}@example.com',
+            'password': 'secret',
+            'fetch_batch_size': 10,
+        },
+        'output_dir': str(tmp_path / name),
+    }
+
+
+def _fetch_response(message_set, raw):
+    response = []
+    for part in message_set.split(','):
+        first, _, last = part.partition(':')
+        for uid in range(int(first), int(last or first) + 1):
+            response.append((b'%d (UID %d RFC822 {%d}' % (uid, uid, len(raw)), raw))
+            response.append(b')')
+    return response
+
+
+class TestConnectionPool:
+    """Test cases for the ImapConnectionPool class."""
+
+    def test_bounds_open_connections_per_server(self):
+        """No more than max_per_server connections are open at once."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+        pool = ImapConnectionPool(max_per_server=2, connect=lambda cfg: MagicMock())
+
+        def borrow(user):
+            with pool.connection({'server': 's', 'port': 993, 'username': user}):
+                with lock:
+                    active.append(user)
+                    peak.append(len(active))
+                time.sleep(0.01)
+                with lock:
+                    active.remove(user)
+
+        threads = [threading.Thread(target=borrow, args=(f'u{i % 3}',)) for i in range(9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak) <= 2
+
+    def test_reuses_idle_connection(self):
+        """A returned connection is reused for the same account."""
+        connect = MagicMock(side_effect=lambda cfg: MagicMock())
+        pool = ImapConnectionPool(max_per_server=1, connect=connect)
+        config = {'server': 's', 'port': 993, 'username': 'u'}
+
+        with pool.connection(config) as first:
+            pass
+        with pool.connection(config) as second:
+            pass
+
+        assert first is second
+        assert connect.call_count == 1
+
+
+class TestMultiAccountRunner:
+    """Test cases for the MultiAccountRunner class."""
+
+    def test_interleave_is_round_robin(self):
+        """Work units alternate between accounts."""
+        plans = {'big': [[1], [2], [3]], 'small': [[9]]}
+        assert _interleave(plans) == [('big', [1]), ('small', [9]), ('big', [2]), ('big', [3])]
+
+    def test_run_processes_ranges_and_reports(self, tmp_path):
+        """Every pending UID range is fetched and reported per account."""
+        raw = b'Subject: test\r\n\r\nbody'
+
+        def make_connection(cfg):
+            mail = MagicMock()
+            mail.select.return_value = ('OK', [b'1'])
+
+            def uid(command, *args):
+                if command == 'SEARCH':
+                    return 'OK', [b'1 2 3' if cfg['username'].startswith('big') else b'7']
+                return 'OK', _fetch_response(args[0], raw)
+            mail.uid.side_effect = uid
+            return mail
+
+        pool = ImapConnectionPool(max_per_server=2, connect=make_connection)
+        runner = MultiAccountRunner(
+            [_account('big', tmp_path), _account('small', tmp_path)], range_size=2, pool=pool
+        )
+
+        report = runner.run()
+
+        assert report['big']['messages'] == 3
+        assert report['big']['ranges'] == 2
+        assert report['small']['messages'] == 1
+        assert report['small']['errors'] == 0
+
+    def test_run_counts_failed_messages_and_advances_over_recorded_uids(self, tmp_path):
+        """Failed messages are reported and the checkpoint only passes recorded UIDs."""
+        raw = b'Subject: test\r\n\r\nbody'
+
+        def make_connection(cfg):
+            mail = MagicMock()
+            mail.select.return_value = ('OK', [b'1'])
+            mail.response.return_value = ('UIDVALIDITY', [b'1'])
+
+            def uid(command, *args):
+                if command == 'SEARCH':
+                    return 'OK', [b'1 2 3 4']
+                if command == 'FETCH' and args[0] == '3:4':
+                    return 'NO', [b'FETCH failed']
+                if command == 'FETCH':
+                    return 'OK', _fetch_response(args[0], raw)
+                return 'OK', [None]
+            mail.uid.side_effect = uid
+            return mail
+
+        account = _account('box', tmp_path)
+        account['checkpoint_db'] = str(tmp_path / 'checkpoints.db')
+        pool = ImapConnectionPool(max_per_server=1, connect=make_connection)
+        runner = MultiAccountRunner([account], range_size=2, pool=pool)
+        processor = runner.processors['box']
+        processor._process_message = MagicMock(side_effect=[
+            [{"success": True}], [{"success": False, "error": "boom"}],
+        ])
+
+        report = runner.run()
+
+        assert report['box']['messages'] == 1
+        assert report['box']['errors'] == 3
+        checkpoints = processor.checkpoints
+        mailbox = processor._mailbox_key()
+        assert checkpoints.retry_uids(mailbox) == [2, 3, 4]
+        assert checkpoints.high_water(mailbox) == 4
+
+
+    def test_run_unit_fails_when_select_fails(self, tmp_path):
+        """A range is not fetched from whatever folder the pooled connection had selected."""
+        selects = []
+
+        def make_connection(cfg):
+            mail = MagicMock()
+
+            def select(folder):
+                selects.append(folder)
+                return ('OK', [b'2']) if len(selects) == 1 else ('NO', [b'No such folder'])
+            mail.select.side_effect = select
+            mail.uid.side_effect = lambda command, *args: ('OK', [b'1 2'])
+            return mail
+
+        pool = ImapConnectionPool(max_per_server=1, connect=make_connection)
+        runner = MultiAccountRunner([_account('box', tmp_path)], range_size=2, pool=pool)
+        processor = runner.processors['box']
+        processor._process_uids = MagicMock()
+
+        report = runner.run()
+
+        processor._process_uids.assert_not_called()
+        assert report['box']['errors'] == 1
+        assert report['box']['messages'] == 0
+
+    def test_busy_server_does_not_block_other_servers(self, tmp_path):
+        """Units of a server at its connection limit do not hold back another server's units."""
+        raw = b'Subject: test\r\n\r\nbody'
+        fast_done = threading.Event()
+        released_early = []
+
+        def make_connection(cfg):
+            mail = MagicMock()
+            mail.select.return_value = ('OK', [b'1'])
+
+            def uid(command, *args):
+                if command == 'SEARCH':
+                    return 'OK', [b'1 2 3 4 5 6']
+                if command == 'FETCH' and cfg['server'] == 'slow.example.com':
+                    # Hold the slow server's only connection until the fast
+                    # account is done
+                    released_early.append(not fast_done.wait(5))
+                return 'OK', _fetch_response(args[0], raw)
+            mail.uid.side_effect = uid
+            return mail
+
+        slow = _account('slow', tmp_path)
+        slow['email']['server'] = 'slow.example.com'
+        fast = _account('fast', tmp_path)
+        pool = ImapConnectionPool(max_per_server=1, connect=make_connection)
+        runner = MultiAccountRunner([slow, fast], range_size=2, pool=pool)
+        fast_processor = runner.processors['fast']
+        process_uids = fast_processor._process_uids
+        ranges = []
+
+        def track(uids, *args, **kwargs):
+            result = process_uids(uids, *args, **kwargs)
+            ranges.append(uids)
+            if len(ranges) == 3:
+                fast_done.set()
+            return result
+        fast_processor._process_uids = track
+
+        report = runner.run()
+
+        assert released_early == [False, False, False]
+        assert report['fast']['ranges'] == 3
+        assert report['slow']['messages'] == 6
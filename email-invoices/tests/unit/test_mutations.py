@@ -0,0 +1,110 @@
+"""
+Unit tests for bulk mailbox mutations.
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+from email_processor.mutations import MailboxChanges, mailbox_argument
+
+
+@pytest.fixture
+def mail():
+    """Return a mock connection whose UID commands succeed."""
+    mail = MagicMock()
+    mail.capabilities = ('IMAP4REV1', 'UIDPLUS')
+    mail.uid.return_value = ('OK', [None])
+    return mail
+
+
+def _commands(mail):
+    return [call.args for call in mail.uid.call_args_list]
+
+
+def test_mailbox_argument_quotes_when_needed():
+    """Atoms are passed as-is, names with spaces are quoted."""
+    assert mailbox_argument('Processed') == 'Processed'
+    assert mailbox_argument('Invoices/Done') == 'Invoices/Done'
+    assert mailbox_argument('Processed Invoices') == '"Processed Invoices"'
+
+
+class TestMailboxChanges:
+    """Test cases for the MailboxChanges class."""
+
+    def test_flags_are_stored_over_message_sets(self, mail):
+        """One STORE is sent per flag set and chunk."""
+        changes = MailboxChanges(mail, batch_size=3)
+        for uid in (1, 2, 3, 5, 9):
+            changes.add_flags(uid, r'\Seen')
+
+        summary = changes.commit()
+
+        assert _commands(mail) == [
+            ('STORE', '1:3', '+FLAGS.SILENT', r'(\Seen)'),
+            ('STORE', '5,9', '+FLAGS.SILENT', r'(\Seen)'),
+        ]
+        assert summary == {'flagged': 5, 'moved': 0, 'failed': 0}
+        assert changes.pending == 0
+
+    def test_move_uses_move_capability(self, mail):
+        """Servers with MOVE get one UID MOVE and no expunge."""
+        mail.capabilities = ('IMAP4REV1', 'MOVE')
+        changes = MailboxChanges(mail)
+        changes.add_flags(1, r'\Seen')
+        changes.move(1, 'Processed Invoices')
+        changes.move(2, 'Processed Invoices')
+
+        changes.commit()
+
+        assert _commands(mail) == [
+            ('STORE', '1', '+FLAGS.SILENT', r'(\Seen)'),
+            ('MOVE', '1:2', '"Processed Invoices"'),
+        ]
+        mail.expunge.assert_not_called()
+
+    def test_move_falls_back_to_copy_and_uid_expunge(self, mail):
+        """Without MOVE, messages are copied, deleted and expunged once."""
+        changes = MailboxChanges(mail)
+        changes.move(1, 'Processed')
+        changes.move(2, 'Processed')
+        changes.move(4, 'Archive')
+
+        summary = changes.commit()
+
+        assert _commands(mail) == [
+            ('COPY', '1:2', 'Processed'),
+            ('STORE', '1:2', '+FLAGS.SILENT', r'(\Deleted)'),
+            ('COPY', '4', 'Archive'),
+            ('STORE', '4', '+FLAGS.SILENT', r'(\Deleted)'),
+            ('EXPUNGE', '1:2,4'),
+        ]
+        assert summary['moved'] == 3
+        mail.expunge.assert_not_called()
+
+    def test_failed_copy_is_not_deleted(self, mail):
+        """Messages whose COPY fails are neither deleted nor expunged."""
+        mail.capabilities = ()
+        mail.uid.side_effect = lambda command, *args: (
+            ('NO', [b'quota']) if command == 'COPY' else ('OK', [None])
+        )
+        changes = MailboxChanges(mail)
+        changes.move(7, 'Processed')
+
+        summary = changes.commit()
+
+        assert summary == {'flagged': 0, 'moved': 0, 'failed': 1}
+        assert ('STORE', '7', '+FLAGS.SILENT', r'(\Deleted)') not in _commands(mail)
+        mail.expunge.assert_not_called()
+
+    def test_commit_every(self, mail):
+        """Changes are committed automatically every N messages."""
+        changes = MailboxChanges(mail, commit_every=2)
+        changes.add_flags(1, r'\Seen')
+        mail.uid.assert_not_called()
+        changes.add_flags(2, r'\Seen')
+        assert _commands(mail) == [('STORE', '1:2', '+FLAGS.SILENT', r'(\Seen)')]
+
+        changes.add_flags(3, r'\Seen')
+        changes.commit()
+        assert _commands(mail)[-1] == ('STORE', '3', '+FLAGS.SILENT', r'(\Seen)')
+
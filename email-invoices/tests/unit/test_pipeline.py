@@ -0,0 +1,140 @@
+"""
+Unit tests for the asyncio invoice pipeline.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from unittest.mock import MagicMock
+
+import pytest
+from email_processor.pipeline import InvoicePipeline
+from email_processor.process_invoices import EmailProcessor
+
+
+def _raw_message(*names):
+    msg = EmailMessage()
+    msg.set_content('See attached.')
+    for name in names:
+        msg.add_attachment(name.encode(), maintype='application', subtype='pdf', filename=name)
+    return msg.as_bytes()
+
+
+def _fake_ocr(path):
+    with open(path, 'rb') as f:
+        return f"text of {f.read().decode()}"
+
+
+class TestInvoicePipeline:
+    """Test cases for the InvoicePipeline class."""
+
+    @pytest.fixture
+    def processor(self, tmp_path):
+        """Return a processor whose mailbox holds three messages."""
+        processor = EmailProcessor({
+            'email': {'server': 'imap.example.com', 'port': 993, 'username': 'user',
+                      'password': 'secret', 'folder': 'INBOX'},
+            'output_dir': str(tmp_path / 'output'),
+            'checkpoint_db': str(tmp_path / 'checkpoints.db'),
+        })
+        messages = {
+            1: _raw_message('a.pdf'),
+            2: _raw_message('b.pdf', 'c.pdf'),
+            3: _raw_message(),
+        }
+
+        def uid(command, *args):
+            if command != 'FETCH':
+                return 'OK', [None]
+            response = []
+            for number, (uid_, raw) in enumerate(sorted(messages.items()), 1):
+                response.append((b'%d (UID %d RFC822 {%d}' % (number, uid_, len(raw)), raw))
+                response.append(b')')
+            return 'OK', response
+        processor.mail = MagicMock()
+        processor.mail.uid.side_effect = uid
+        processor.checkpoints.begin(processor._mailbox_key(), 1)
+        return processor
+
+    def test_runs_all_stages(self, processor):
+        """Every attachment is persisted, OCR'd, analysed and recorded."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def process_invoice(text, file_path=None):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return {"success": True, "data": text}
+        processor.ai_processor = MagicMock()
+        processor.ai_processor.is_enabled.return_value = True
+        processor.ai_processor.process_invoice.side_effect = process_invoice
+
+        pipeline = InvoicePipeline(
+            processor, queue_size=1, ai_concurrency=2, ocr=_fake_ocr,
+            ocr_executor=ThreadPoolExecutor(2),
+        )
+        results = pipeline.run([1, 2, 3])
+
+        texts = sorted(r['extracted_text'] for r in results)
+        assert texts == ['text of a.pdf', 'text of b.pdf', 'text of c.pdf']
+        assert all(r['ai_processing']['data'] == r['extracted_text'] for r in results)
+        assert max(peak) <= 2
+
+        mailbox = processor._mailbox_key()
+        assert processor.checkpoints.unprocessed(mailbox, [1, 2, 3]) == []
+        assert processor.checkpoints.high_water(mailbox) == 3
+
+    def test_unfetched_message_is_marked_for_retry(self, processor):
+        """A UID the fetch never returned is marked failed instead of skipped."""
+        InvoicePipeline(processor, ocr=None).run([1, 2, 3, 4])
+
+        mailbox = processor._mailbox_key()
+        assert processor.checkpoints.retry_uids(mailbox) == [4]
+        assert processor.checkpoints.unprocessed(mailbox, [1, 2, 3, 4]) == [4]
+
+    def test_failed_ai_marks_message_failed(self, processor):
+        """A failing attachment marks its message for retry."""
+        processor.ai_processor = MagicMock()
+        processor.ai_processor.is_enabled.return_value = True
+        processor.ai_processor.process_invoice.side_effect = (
+            lambda text, file_path=None: {"success": 'b.pdf' not in file_path}
+        )
+
+        outcomes = {}
+        InvoicePipeline(processor, ocr=None).run([1, 2, 3, 4], outcomes=outcomes)
+
+        assert outcomes == {1: None, 2: 'Processing failed', 3: None,
+                            4: 'Message could not be fetched'}
+        assert processor.checkpoints.retry_uids(processor._mailbox_key()) == [2, 4]
+        # Only the messages that succeeded are flagged
+        processor.mail.uid.assert_any_call('STORE', '1,3', '+FLAGS.SILENT', r'(\Seen)')
+
+    def test_ocr_service_runs_ocr_in_threads(self, processor, tmp_path, monkeypatch):
+        """With the shared OCR service configured, OCR calls run in threads, not processes."""
+        initialized = []
+        monkeypatch.setattr('email_processor.pipeline._init_ocr_worker', initialized.append)
+        processor.config['ocr'] = {'service_socket': str(tmp_path / 'ocr.sock')}
+        processor.ai_processor = MagicMock()
+        processor.ai_processor.is_enabled.return_value = True
+        processor.ai_processor.process_invoice.side_effect = (
+            lambda text, file_path=None: {"success": True, "data": text}
+        )
+        callers = set()
+
+        def ocr(path):
+            # A process pool could not run this closure at all
+            callers.add(threading.get_ident())
+            return _fake_ocr(path)
+
+        results = InvoicePipeline(processor, ocr_workers=2, ocr=ocr).run([1, 2, 3])
+
+        texts = sorted(r['extracted_text'] for r in results)
+        assert texts == ['text of a.pdf', 'text of b.pdf', 'text of c.pdf']
+        assert threading.get_ident() not in callers
+        assert initialized and all(config == processor.config['ocr'] for config in initialized)
@@ -0,0 +1,113 @@
+"""
+Unit tests for IMAP search criteria and header prefetching.
+"""
+
+from datetime import date
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from email_processor.search import (
+    SenderFilter,
+    fetch_headers,
+    imap_date,
+    load_route_filters,
+    month_search_criteria,
+    translate_filter_condition,
+)
+
+ROUTE_FILE = Path(__file__).resolve().parents[2] / 'process_invoices.yaml'
+
+
+def test_imap_date_uses_english_month_names():
+    """IMAP dates are formatted as DD-Mon-YYYY."""
+    assert imap_date(date(2025, 5, 1)) == '01-May-2025'
+
+
+@pytest.mark.parametrize('year, month, expected', [
+    (2025, 5, 'SINCE 01-May-2025 BEFORE 01-Jun-2025 SENTSINCE 01-May-2025 SENTBEFORE 01-Jun-2025'),
+    (2025, 12, 'SINCE 01-Dec-2025 BEFORE 01-Jan-2026 SENTSINCE 01-Dec-2025 SENTBEFORE 01-Jan-2026'),
+])
+def test_month_search_criteria(year, month, expected):
+    """A month bounds both the arrival date and the Date header."""
+    assert month_search_criteria(year, month) == expected
+
+
+class TestSenderFilter:
+    """Test cases for the SenderFilter class."""
+
+    def test_allow_and_deny(self):
+        """Deny entries win over allow entries; domains match subdomains."""
+        senders = SenderFilter(allow=['vendor.com'], deny=['spam@vendor.com'])
+
+        assert senders.allows('Billing <billing@eu.vendor.com>')
+        assert not senders.allows('spam@vendor.com')
+        assert not senders.allows('someone@other.com')
+
+    def test_search_criteria(self):
+        """Plain entries are pushed down to the server."""
+        senders = SenderFilter(allow=['vendor.com', 'ap@acme.org'], deny=['spam@vendor.com', '*.ru'])
+
+        assert senders.search_criteria() == (
+            'OR FROM "vendor.com" FROM "ap@acme.org" NOT FROM "spam@vendor.com"'
+        )
+        assert SenderFilter(allow=['*@vendor.*']).search_criteria() is None
+
+
+class TestTranslateFilterCondition:
+    """Test cases for translate_filter_condition."""
+
+    def test_route_file_month_filter(self):
+        """The month filter shipped in process_invoices.yaml becomes a date range."""
+        [condition] = load_route_filters(ROUTE_FILE)
+
+        assert translate_filter_condition(condition, {'YEAR': 2025, 'MONTH': 5}) == (
+            'SENTSINCE 01-May-2025 SENTBEFORE 01-Jun-2025'
+        )
+
+    def test_untranslatable_clauses_are_dropped(self):
+        """Only clauses with a SEARCH equivalent are kept."""
+        condition = "{{date|date('%Y-%m-%d')}} >= '2025-02-03' and {{from}} contains 'acme' and {{size}} > 10"
+
+        assert translate_filter_condition(condition) == 'SENTSINCE 03-Feb-2025 FROM "acme"'
+
+    def test_disjunctions_are_not_translated(self):
+        """Conditions with "or" cannot be split into ANDed keys."""
+        condition = "{{from}} contains 'a' or {{from}} contains 'b'"
+
+        assert translate_filter_condition(condition) is None
+
+    def test_unknown_variables_are_not_translated(self):
+        """Clauses with unresolved template variables stay on the client."""
+        condition = "{{date|date('%Y')}} == '{{YEAR}}'"
+
+        assert translate_filter_condition(condition) is None
+
+
+def test_fetch_headers_batches_header_only_fetches():
+    """Headers are fetched with BODY.PEEK[HEADER.FIELDS] per UID batch."""
+    header = b'Date: Thu, 01 May 2025 10:00:00 +0000\r\nFrom: a@vendor.com\r\n\r\n'
+    mail = MagicMock()
+    mail.uid.return_value = ('OK', [
+        (b'1 (UID 4 BODY[HEADER.FIELDS (DATE FROM)] {%d}' % len(header), header), b')',
+    ])
+
+    [(uid, headers)] = list(fetch_headers(mail, [4, 5, 6], batch_size=500))
+
+    assert uid == 4
+    assert headers['From'] == 'a@vendor.com'
+    mail.uid.assert_called_once_with('FETCH', '4:6', '(UID BODY.PEEK[HEADER.FIELDS (DATE FROM)])')
+
+
+def test_fetch_headers_skips_failed_batches():
+    """Only UIDs whose headers were fetched are yielded when a batch fails."""
+    header = b'From: a@vendor.com\r\n\r\n'
+    mail = MagicMock()
+    mail.uid.side_effect = [
+        ('NO', [b'FETCH failed']),
+        ('OK', [(b'3 (UID 7 BODY[HEADER.FIELDS (DATE FROM)] {%d}' % len(header), header), b')']),
+    ]
+
+    fetched = [uid for uid, _ in fetch_headers(mail, [4, 5, 7], batch_size=2)]
+
+    assert fetched == [7]
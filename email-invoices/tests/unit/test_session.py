@@ -0,0 +1,93 @@
+"""
+Unit tests for the persistent IMAP session.
+"""
+
+import imaplib
+import socket
+import threading
+import time
+
+import pytest
+
+from email_processor.session import ImapSession
+
+
+class FakeImap:
+    """The parts of ``imaplib.IMAP4`` that IDLE uses, over one end of a socket pair."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile('rb')
+        self.tagged_commands = {}
+        self.capabilities = ('IMAP4REV1', 'IDLE')
+
+    def _new_tag(self):
+        self.tagged_commands[b'A001'] = None
+        return b'A001'
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def readline(self):
+        return self.file.readline()
+
+
+@pytest.fixture
+def connection():
+    """Return a session on a fake client and the server end of its connection."""
+    client, server = socket.socketpair()
+    session = ImapSession({'idle_timeout': 5})
+    session.mail = FakeImap(client)
+    yield session, server
+    session.mail.file.close()
+    client.close()
+    server.close()
+
+
+def serve(server, *replies):
+    """Answer IDLE with ``replies`` and complete it once the client sends DONE."""
+    def run():
+        buffer = b''
+        while b'IDLE\r\n' not in buffer:
+            buffer += server.recv(1024)
+        for reply in replies:
+            server.sendall(reply)
+        while b'DONE\r\n' not in buffer:
+            buffer += server.recv(1024)
+        server.sendall(b'A001 OK IDLE terminated\r\n')
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+class TestIdle:
+    """Test cases for waiting for new mail with IDLE."""
+
+    def test_update_sent_with_the_continuation(self, connection):
+        """An EXISTS read into imaplib's buffer with the continuation is seen at once."""
+        session, server = connection
+        serve(server, b'+ idling\r\n* 4 EXISTS\r\n')
+
+        start = time.monotonic()
+        assert session.wait_for_changes()
+        assert time.monotonic() - start < 2
+        assert session.mail.tagged_commands == {}
+
+    def test_update_sent_later(self, connection):
+        session, server = connection
+        serve(server, b'+ idling\r\n', b'* 1 RECENT\r\n')
+
+        assert session._idle(5)
+
+    def test_timeout_without_updates(self, connection):
+        session, server = connection
+        serve(server, b'+ idling\r\n')
+
+        assert not session._idle(0.3)
+
+    def test_bye_aborts(self, connection):
+        session, server = connection
+        serve(server, b'+ idling\r\n* BYE shutting down\r\n')
+
+        with pytest.raises(imaplib.IMAP4.abort, match='Server closed the session'):
+            session._idle(5)
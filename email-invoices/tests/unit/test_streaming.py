@@ -0,0 +1,90 @@
+"""
+Unit tests for the streaming MIME parser.
+"""
+
+import os
+from email.message import EmailMessage
+from unittest.mock import MagicMock
+
+import pytest
+from email_processor.blob_store import BlobStore
+from email_processor.streaming import SpoolFile, fetch_message_chunks, parse_message_stream
+
+
+def _chunks(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+@pytest.fixture
+def raw_message():
+    """Return a message with a base64 PDF, a quoted-printable CSV and a forwarded email."""
+    msg = EmailMessage()
+    msg['From'] = 'Billing <billing@vendor.com>'
+    msg['Subject'] = 'Invoice'
+    msg.set_content('See attached.')
+    msg.add_attachment(b'%PDF' + bytes(range(256)) * 400, maintype='application',
+                       subtype='pdf', filename='invoice.pdf')
+    msg.add_attachment(b'item;price=10\r\n' * 50, maintype='text', subtype='csv',
+                       filename='items.csv', cte='quoted-printable')
+    forwarded = EmailMessage()
+    forwarded.set_content('Forwarded')
+    forwarded.add_attachment(b'\x89PNG', maintype='image', subtype='png', filename='scan.png')
+    msg.add_attachment(forwarded)
+    return msg.as_bytes()
+
+
+class TestStreamingMessageParser:
+    """Test cases for parse_message_stream."""
+
+    @pytest.mark.parametrize('chunk_size', [1, 13, 4096, 10 ** 7])
+    def test_decodes_attachments_independent_of_chunking(self, raw_message, tmp_path, chunk_size):
+        """Attachments are decoded identically whatever the chunk boundaries."""
+        streamed = parse_message_stream(
+            _chunks(raw_message, chunk_size), lambda: SpoolFile(str(tmp_path))
+        )
+
+        assert streamed.headers['Subject'] == 'Invoice'
+        files = {a.filename: open(a.sink.path, 'rb').read() for a in streamed.attachments}
+        assert files == {
+            'invoice.pdf': b'%PDF' + bytes(range(256)) * 400,
+            'items.csv': b'item;price=10\r\n' * 50,
+            'scan.png': b'\x89PNG',
+        }
+
+    def test_enforces_size_limit(self, raw_message, tmp_path):
+        """Oversized attachments are discarded while decoding."""
+        streamed = parse_message_stream(
+            [raw_message], lambda: SpoolFile(str(tmp_path)), max_part_bytes=1024
+        )
+
+        oversized = {a.filename: a for a in streamed.attachments if a.error}
+        assert set(oversized) == {'invoice.pdf'}
+        assert oversized['invoice.pdf'].sink is None
+        assert len(os.listdir(tmp_path)) == 2
+
+    def test_writes_into_blob_store(self, raw_message, tmp_path):
+        """Blob writers can be used as sinks."""
+        store = BlobStore(tmp_path)
+        wanted = lambda headers: (headers.get_filename() or '').endswith('.png')
+
+        streamed = parse_message_stream(_chunks(raw_message, 64), store.writer, wanted=wanted)
+
+        [attachment] = streamed.attachments
+        assert store.path_for(attachment.sink.digest).read_bytes() == b'\x89PNG'
+
+
+def test_fetch_message_chunks_uses_partial_peeks():
+    """Messages are downloaded with BODY.PEEK[]<offset.length> commands."""
+    raw = b'0123456789'
+    mail = MagicMock()
+
+    def uid(command, uid, items):
+        if items == '(RFC822.SIZE)':
+            return 'OK', [b'1 (UID 7 RFC822.SIZE 10)']
+        offset, length = map(int, items[items.index('<') + 1:items.index('>')].split('.'))
+        chunk = raw[offset:offset + length]
+        return 'OK', [(b'1 (UID 7 BODY[]<%d> {%d}' % (offset, len(chunk)), chunk), b')']
+    mail.uid.side_effect = uid
+
+    assert list(fetch_message_chunks(mail, 7, chunk_size=4)) == [b'0123', b'4567', b'89']
+    assert mail.uid.call_args_list[1].args == ('FETCH', '7', '(BODY.PEEK[]<0.4>)')
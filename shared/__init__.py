@@ -7,10 +7,28 @@ such as configuration loading, logging, OCR processing, and other utilities.
 
 from .utils.config_loader import ConfigLoader, load_config
 from .utils.local_ocr import LocalOCRProcessor, create_ocr_processor
+from .utils.ocr_cache import OCRCache, get_ocr_cache
+from .utils.ocr_governor import OCRGovernor, get_ocr_governor
+from .utils.ocr_layout import OCRLayout
+from .utils.ocr_service import OCRService, OCRServiceClient, OCRServiceError
+from .utils.ocr_templates import TemplateRegistry, get_template_registry
+from .utils.pdf_text import extract_text_layer, is_usable_text
 
 __all__ = [
     'ConfigLoader', 
     'load_config',
     'LocalOCRProcessor',
-    'create_ocr_processor'
+    'create_ocr_processor',
+    'OCRCache',
+    'get_ocr_cache',
+    'OCRGovernor',
+    'get_ocr_governor',
+    'OCRLayout',
+    'OCRService',
+    'OCRServiceClient',
+    'OCRServiceError',
+    'TemplateRegistry',
+    'get_template_registry',
+    'extract_text_layer',
+    'is_usable_text'
 ]
@@ -0,0 +1 @@
+"""Benchmarks for the shared OCR utilities."""
@@ -0,0 +1,258 @@
+"""
+Synthetic invoice corpus for OCR benchmarks
+
+Generates the same documents for the same seed on any machine, without
+network access or test fixtures: born-digital PDFs with a text layer,
+scanned-looking noisy JPEG pages and multi-page scanned PDFs, in English,
+German and Polish. Every document is stored with its ground-truth text and
+a SHA-256, and the corpus digest identifies the exact inputs of a run.
+"""
+import hashlib
+import json
+import os
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Invoice vocabulary per Tesseract language code
+LABELS = {
+    'eng': {
+        'title': 'INVOICE', 'number': 'Invoice No.', 'date': 'Issue date',
+        'seller': 'Seller', 'buyer': 'Buyer', 'item': 'Service',
+        'net': 'Net amount', 'tax': 'VAT 23%', 'total': 'Total due',
+    },
+    'deu': {
+        'title': 'RECHNUNG', 'number': 'Rechnungsnummer', 'date': 'Rechnungsdatum',
+        'seller': 'Verkäufer', 'buyer': 'Käufer', 'item': 'Dienstleistung',
+        'net': 'Nettobetrag', 'tax': 'MwSt. 19%', 'total': 'Gesamtbetrag',
+    },
+    'pol': {
+        'title': 'FAKTURA VAT', 'number': 'Numer faktury', 'date': 'Data wystawienia',
+        'seller': 'Sprzedawca', 'buyer': 'Nabywca', 'item': 'Usługa',
+        'net': 'Wartość netto', 'tax': 'VAT 23%', 'total': 'Razem do zapłaty',
+    },
+}
+
+COMPANIES = [
+    'Northwind Traders Ltd.', 'Müller & Söhne GmbH', 'Zakład Usługowy Łączność Sp. z o.o.',
+    'Contoso Consulting LLC', 'Bäckerei Schäfer KG', 'Przedsiębiorstwo Handlowe Żuraw',
+]
+
+# Documents per kind at scale 1: (kind, language, pages)
+DEFAULT_SPEC = [
+    ('digital_pdf', 'eng', 1), ('digital_pdf', 'deu', 2), ('digital_pdf', 'eng', 3),
+    ('scanned_image', 'eng', 1), ('scanned_image', 'deu', 1), ('scanned_image', 'pol', 1),
+    ('scanned_pdf', 'eng', 3), ('scanned_pdf', 'pol', 4), ('scanned_pdf', 'deu', 2),
+]
+
+SCAN_DPI = 200
+A4_POINTS = (595, 842)
+FONT_POINTS = 11
+
+# Digital PDFs use Helvetica with WinAnsiEncoding; text is folded to Latin-1 first
+_PDF_ENCODING = 'cp1252'
+
+# Fonts with Polish letters; Pillow's bundled font covers Latin-1 only
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+]
+
+# Fixed PDF metadata date so generated files are byte-identical across runs
+_PDF_DATE = time.gmtime(1735689600)  # 2025-01-01
+
+
+def invoice_pages(rng: np.random.Generator, language: str, pages: int, index: int) -> List[List[str]]:
+    """Generate the text lines of each page of an invoice."""
+    labels = LABELS[language]
+    seller, buyer = rng.choice(len(COMPANIES), size=2, replace=False)
+    header = [
+        labels['title'],
+        f"{labels['number']}: FV/{index:04d}/{int(rng.integers(1, 13)):02d}/2025",
+        f"{labels['date']}: 2025-{int(rng.integers(1, 13)):02d}-{int(rng.integers(1, 29)):02d}",
+        f"{labels['seller']}: {COMPANIES[seller]}",
+        f"{labels['buyer']}: {COMPANIES[buyer]}",
+        '',
+    ]
+    result, net, row = [], 0, 0
+    for page in range(pages):
+        lines = list(header) if page == 0 else []
+        for _ in range(int(rng.integers(18, 26))):
+            row += 1
+            quantity = int(rng.integers(1, 20))
+            price = int(rng.integers(5, 900))
+            net += quantity * price
+            lines.append(f"{row:3d}. {labels['item']} {row:03d}   {quantity} x {price}.00   "
+                         f"{quantity * price}.00")
+        result.append(lines)
+    tax = round(net * (0.19 if language == 'deu' else 0.23), 2)
+    result[-1] += [
+        '',
+        f"{labels['net']}: {net:.2f}",
+        f"{labels['tax']}: {tax:.2f}",
+        f"{labels['total']}: {net + tax:.2f}",
+    ]
+    return result
+
+
+def _pdf_string(text: str) -> bytes:
+    encoded = text.encode(_PDF_ENCODING, errors='replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def write_text_pdf(path: Union[str, Path], pages: Sequence[Sequence[str]]) -> None:
+    """Write a born-digital A4 PDF with one Helvetica text line per entry."""
+    width, height = A4_POINTS
+    leading = FONT_POINTS * 1.4
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # Page tree, filled in once the page objects are numbered
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for lines in pages:
+        content = b'\n'.join(
+            [b'BT', f'/F1 {FONT_POINTS} Tf {leading:.1f} TL 56 {height - 64} Td'.encode()]
+            + [_pdf_string(line) + b" '" for line in lines]
+            + [b'ET']
+        )
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>'.encode()
+        )
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(out))
+
+
+def find_font() -> Optional[str]:
+    """Return the first installed font of ``FONT_CANDIDATES``, or None."""
+    return next((path for path in FONT_CANDIDATES if os.path.isfile(path)), None)
+
+
+def fold_to_latin1(text: str) -> str:
+    """Replace letters outside Latin-1 with their base letter (``ł`` becomes ``l``)."""
+    text = text.replace('ł', 'l').replace('Ł', 'L')
+    return ''.join(
+        char if ord(char) < 256 else unicodedata.normalize('NFKD', char)[0]
+        for char in text
+    )
+
+
+def render_page(lines: Sequence[str], dpi: int = SCAN_DPI, font_path: Optional[str] = None) -> Image.Image:
+    """Render text lines onto a white A4 grayscale page.
+
+    Without ``font_path`` Pillow's bundled font is used, so lines should be
+    folded with ``fold_to_latin1`` first.
+    """
+    scale = dpi / 72
+    page = Image.new('L', (round(A4_POINTS[0] * scale), round(A4_POINTS[1] * scale)), 255)
+    size = round(FONT_POINTS * scale)
+    font = ImageFont.truetype(font_path, size) if font_path else ImageFont.load_default(size=size)
+    draw = ImageDraw.Draw(page)
+    leading = FONT_POINTS * 1.4 * scale
+    for row, line in enumerate(lines):
+        draw.text((56 * scale, 64 * scale + row * leading), line, fill=0, font=font)
+    return page
+
+
+def add_scan_noise(page: Image.Image, rng: np.random.Generator) -> Image.Image:
+    """Make a clean page look scanned: skew, grey paper, sensor noise, specks and blur."""
+    page = page.rotate(float(rng.uniform(-1.5, 1.5)), resample=Image.BICUBIC, fillcolor=255)
+    pixels = np.asarray(page, np.float32) * rng.uniform(0.8, 0.92) + rng.uniform(12, 30)
+    pixels += rng.normal(0, 9, pixels.shape)
+    specks = int(rng.integers(100, 400))
+    rows = rng.integers(0, pixels.shape[0], specks)
+    cols = rng.integers(0, pixels.shape[1], specks)
+    pixels[rows, cols] = rng.uniform(0, 80, specks)
+    pixels = cv2.GaussianBlur(pixels, (3, 3), 0)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def build_corpus(
+    out_dir: Union[str, Path],
+    seed: int = 0,
+    scale: int = 1,
+    spec: Sequence = DEFAULT_SPEC
+) -> Dict[str, Any]:
+    """Generate the corpus and write ``manifest.json`` next to the documents.
+
+    Args:
+        out_dir: Directory for the documents
+        seed: Random seed; the same seed produces the same files
+        scale: Number of copies of ``spec`` (with different content)
+        spec: ``(kind, language, pages)`` of each document
+
+    Returns:
+        The manifest: corpus digest, page count and one entry per document
+        with its path, kind, language, page count, SHA-256 and ground truth
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    font_path = find_font()
+    documents = []
+    for index, (kind, language, pages) in enumerate(list(spec) * max(scale, 1)):
+        rng = np.random.default_rng([seed, index])
+        page_lines = invoice_pages(rng, language, pages, index)
+        name = f'{index:03d}_{kind}_{language}'
+        if kind == 'digital_pdf':
+            page_lines = [[fold_to_latin1(line) for line in lines] for lines in page_lines]
+            path = out_dir / f'{name}.pdf'
+            write_text_pdf(path, page_lines)
+        elif kind in ('scanned_image', 'scanned_pdf'):
+            if not font_path:
+                page_lines = [[fold_to_latin1(line) for line in lines] for lines in page_lines]
+            images = [add_scan_noise(render_page(lines, font_path=font_path), rng)
+                      for lines in page_lines]
+            if kind == 'scanned_image':
+                path = out_dir / f'{name}.jpg'
+                images[0].save(path, quality=70)
+            else:
+                path = out_dir / f'{name}.pdf'
+                images[0].save(path, save_all=True, append_images=images[1:], resolution=SCAN_DPI,
+                               creationDate=_PDF_DATE, modDate=_PDF_DATE)
+        else:
+            raise ValueError(f"Unknown document kind: {kind}")
+
+        documents.append({
+            'path': str(path),
+            'kind': kind,
+            'language': language,
+            'pages': pages,
+            'sha256': _sha256(path),
+            'text': '\n\n'.join('\n'.join(lines) for lines in page_lines),
+        })
+
+    digest = hashlib.sha256(''.join(doc['sha256'] for doc in documents).encode()).hexdigest()
+    manifest = {
+        'seed': seed,
+        'scale': scale,
+        'digest': digest,
+        'font': font_path or 'Pillow default',
+        'pages': sum(doc['pages'] for doc in documents),
+        'documents': documents,
+    }
+    (out_dir / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return manifest
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+OCR throughput benchmark suite
+
+Generates the synthetic invoice corpus (see ``corpus.py``) and runs
+``LocalOCRProcessor`` over it under several configurations. Each
+configuration runs in a fresh Python process so that peak memory and CPU
+time are measured for that configuration alone. The report is JSON with
+the commit, the corpus digest and, per configuration, pages/sec, document
+latency percentiles, peak RSS, CPU utilization and character accuracy
+against the ground truth.
+
+Usage:
+    python shared/benchmarks/ocr_benchmark.py --configs baseline,text_layer --output bench.json
+"""
+import argparse
+import difflib
+import json
+import logging
+import math
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from shared.benchmarks.corpus import build_corpus  # noqa: E402
+
+# LocalOCRProcessor settings of each named configuration
+CONFIGS: Dict[str, Dict[str, Any]] = {
+    'baseline': {},
+    'in_memory': {'in_memory': True},
+    'text_layer': {'in_memory': True, 'use_text_layer': True},
+    'parallel_pages': {'in_memory': True, 'use_text_layer': True, 'parallel_pages': True},
+    'adaptive_dpi': {'in_memory': True, 'use_text_layer': True, 'adaptive_dpi': True},
+    'tesserocr': {'in_memory': True, 'use_text_layer': True, 'engine': 'tesserocr'},
+}
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Return the nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def char_accuracy(expected: str, actual: str) -> float:
+    """Similarity of two texts with whitespace collapsed, from 0 to 1."""
+    expected, actual = ' '.join(expected.split()), ' '.join(actual.split())
+    return difflib.SequenceMatcher(None, expected, actual, autojunk=False).ratio()
+
+
+def _rss_mb(usage: resource.struct_rusage) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def run_config(name: str, manifest: Dict[str, Any], repeat: int = 1) -> Dict[str, Any]:
+    """Run one configuration over the corpus in the current process."""
+    from shared.utils.local_ocr import LocalOCRProcessor
+
+    settings = CONFIGS[name]
+    languages = sorted({doc['language'] for doc in manifest['documents']})
+    processor = LocalOCRProcessor({'languages': languages, 'tessdata_dir': None, **settings})
+    latencies: List[float] = []
+    accuracies: List[float] = []
+    errors = 0
+    try:
+        cpu_start = time.process_time()
+        children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        wall_start = time.perf_counter()
+        for _ in range(repeat):
+            for doc in manifest['documents']:
+                start = time.perf_counter()
+                if doc['path'].endswith('.pdf'):
+                    result = processor.extract_text_from_pdf(Path(doc['path']).read_bytes())
+                    text = result.get('full_text', '')
+                    failed = not result.get('success') or any(
+                        'error' in page for page in result.get('pages', [])
+                    )
+                else:
+                    text = processor.extract_text_from_image(doc['path'])
+                    failed = not text
+                latencies.append(time.perf_counter() - start)
+                accuracies.append(char_accuracy(doc['text'], text))
+                errors += failed
+        wall = time.perf_counter() - wall_start
+    finally:
+        # Wait for page workers so their CPU time and memory are accounted
+        if processor._page_pool is not None:
+            processor._page_pool.shutdown(wait=True)
+            processor._page_pool = None
+        processor.cleanup()
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (time.process_time() - cpu_start
+           + children.ru_utime - children_start.ru_utime
+           + children.ru_stime - children_start.ru_stime)
+    pages = manifest['pages'] * repeat
+    return {
+        'config': name,
+        'settings': settings,
+        'documents': len(latencies),
+        'pages': pages,
+        'errors': errors,
+        'seconds': round(wall, 3),
+        'pages_per_sec': round(pages / wall, 3) if wall else None,
+        'latency_ms': {
+            f'p{pct}': round(percentile(latencies, pct) * 1000, 1) for pct in (50, 95, 99)
+        },
+        'peak_rss_mb': _rss_mb(resource.getrusage(resource.RUSAGE_SELF)),
+        'peak_child_rss_mb': _rss_mb(children),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_utilization': round(cpu / (wall * (os.cpu_count() or 1)), 3) if wall else None,
+        'char_accuracy': round(sum(accuracies) / len(accuracies), 4) if accuracies else None,
+    }
+
+
+def run_isolated(name: str, corpus_dir: Path, repeat: int) -> Dict[str, Any]:
+    """Run one configuration in a fresh interpreter and return its result."""
+    completed = subprocess.run(
+        [sys.executable, __file__, '--run-config', name,
+         '--corpus-dir', str(corpus_dir), '--repeat', str(repeat)],
+        capture_output=True, text=True, check=False
+    )
+    if completed.returncode != 0:
+        return {'config': name, 'failed': completed.stderr.strip()[-2000:]}
+    # The report is the last line; anything before it is stray library output
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    """Return the commit of the working tree, or 'unknown'."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark LocalOCRProcessor configurations.')
+    parser.add_argument('--configs', type=str, default=','.join(CONFIGS),
+                        help=f"Comma-separated configurations ({', '.join(CONFIGS)})")
+    parser.add_argument('--corpus-dir', type=str, default=None,
+                        help='Directory for the generated corpus (a temporary one by default)')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus seed')
+    parser.add_argument('--scale', type=int, default=1, help='Corpus size multiplier')
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the corpus')
+    parser.add_argument('--output', type=str, default=None, help='Write the JSON report here')
+    parser.add_argument('--run-config', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.getLogger('shared').setLevel(logging.CRITICAL)
+
+    if args.run_config:
+        manifest = json.loads((Path(args.corpus_dir) / 'manifest.json').read_text())
+        print(json.dumps(run_config(args.run_config, manifest, args.repeat)))
+        return 0
+
+    names = [name for name in re.split(r'[,\s]+', args.configs) if name]
+    unknown = [name for name in names if name not in CONFIGS]
+    if unknown:
+        parser.error(f"Unknown configurations: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix='ocr_corpus_') as tmp_dir:
+        corpus_dir = Path(args.corpus_dir or tmp_dir)
+        manifest = build_corpus(corpus_dir, seed=args.seed, scale=args.scale)
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'corpus': {
+                'seed': manifest['seed'],
+                'scale': manifest['scale'],
+                'digest': manifest['digest'],
+                'documents': len(manifest['documents']),
+                'pages': manifest['pages'],
+            },
+            'results': [run_isolated(name, corpus_dir, args.repeat) for name in names],
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
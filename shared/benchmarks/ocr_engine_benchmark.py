@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+OCR engine benchmark
+
+Compares the ``pytesseract`` engine of ``LocalOCRProcessor``, which starts a
+``tesseract`` process per image, with the ``tesserocr`` engine, which keeps
+warm worker processes with the language models loaded. Both run over the
+same synthetic invoice pages.
+
+Usage:
+    python shared/benchmarks/ocr_engine_benchmark.py --pages 50 --workers 1,4
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from shared.utils.local_ocr import LocalOCRProcessor  # noqa: E402
+from shared.utils.tesseract_pool import HAS_TESSEROCR  # noqa: E402
+
+
+def build_pages(count: int, width: int = 1240, height: int = 1754) -> List[np.ndarray]:
+    """Render ``count`` deterministic A4 pages at 150 DPI with invoice-like text."""
+    pages = []
+    for index in range(count):
+        page = np.full((height, width, 3), 255, np.uint8)
+        lines = [
+            f"INVOICE No. FV/{index:05d}/2025",
+            f"Issue date: 2025-05-{index % 28 + 1:02d}",
+            f"Seller: Vendor {index % 7} Sp. z o.o.",
+            "Buyer: Example Company Ltd.",
+        ] + [
+            f"{row + 1}. Service item {row + 1:02d}    {row + 1} x {10 + index % 90}.00    "
+            f"{(row + 1) * (10 + index % 90)}.00 EUR"
+            for row in range(20)
+        ] + [f"TOTAL: {sum(range(1, 21)) * (10 + index % 90)}.00 EUR"]
+        for row, text in enumerate(lines):
+            cv2.putText(page, text, (80, 120 + row * 60), cv2.FONT_HERSHEY_SIMPLEX,
+                        1.0, (0, 0, 0), 2, cv2.LINE_AA)
+        pages.append(page)
+    return pages
+
+
+def run_once(pages: List[np.ndarray], engine: str, workers: int) -> Dict[str, Any]:
+    """OCR all pages with one engine configuration and return throughput figures."""
+    result: Dict[str, Any] = {'engine': engine, 'workers': workers, 'pages': len(pages)}
+    if engine == 'tesserocr' and not HAS_TESSEROCR:
+        result['skipped'] = 'tesserocr is not installed'
+        return result
+
+    processor = LocalOCRProcessor({
+        'engine': engine,
+        'parallel_pages': workers > 1,
+        'page_workers': workers,
+        'max_threads': workers,
+        'tessdata_dir': None,
+    })
+    try:
+        # Start the workers outside the timed region
+        processor.extract_text_from_image(pages[0])
+
+        start = time.perf_counter()
+        if workers > 1:
+            texts = [page['text'] for page in processor._ocr_pages(pages)]
+        else:
+            texts = [processor.extract_text_from_image(page) for page in pages]
+        elapsed = time.perf_counter() - start
+    finally:
+        processor.cleanup()
+
+    result.update({
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(len(pages) / elapsed, 2) if elapsed else None,
+        'characters': sum(len(text) for text in texts),
+    })
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark OCR engines.')
+    parser.add_argument('--pages', type=int, default=50,
+                        help='Number of synthetic pages to OCR')
+    parser.add_argument('--engines', type=str, default='pytesseract,tesserocr',
+                        help='Comma-separated engines to compare')
+    parser.add_argument('--workers', type=str, default='1',
+                        help='Comma-separated worker counts to compare')
+    args = parser.parse_args()
+
+    logging.getLogger('shared').setLevel(logging.WARNING)
+    pages = build_pages(args.pages)
+    engines = [name for name in re.split(r'[,\s]+', args.engines) if name]
+    worker_counts = [int(count) for count in re.split(r'[,\s]+', args.workers) if count]
+
+    results = [run_once(pages, engine, workers)
+               for engine in engines for workers in worker_counts]
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Page preprocessing micro-benchmark
+
+Measures the per-page cost of the steps run before Tesseract: the former
+``preprocess_image`` (kernel built per call, fresh intermediate arrays),
+``preprocess_page`` with and without a preallocated output and
+``preprocess_batch`` over a stack of pages. It also compares the conversion
+paths from a Poppler-rendered page: RGB to BGR to grayscale, RGB straight to
+grayscale, and pages rendered in grayscale. Every variant's output is
+checked against the former implementation.
+
+Usage:
+    python shared/benchmarks/preprocess_benchmark.py --pages 20 --repeat 5
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from shared.benchmarks.ocr_engine_benchmark import build_pages  # noqa: E402
+from shared.utils.page_preprocess import (  # noqa: E402
+    preprocess_batch,
+    preprocess_page,
+    to_gray,
+)
+
+
+def legacy_preprocess(image: np.ndarray) -> np.ndarray:
+    """``preprocess_image`` as it was: kernel and intermediate arrays made per call."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    return cv2.dilate(thresh, kernel, iterations=1)
+
+
+def time_per_page(run: Callable[[], Any], pages: int, repeat: int) -> Dict[str, float]:
+    """Time ``run`` (which processes ``pages`` pages) and return milliseconds per page."""
+    run()  # Warm up buffers and OpenCV
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000 / pages)
+    return {'ms_per_page': round(statistics.median(samples), 3),
+            'min_ms_per_page': round(min(samples), 3)}
+
+
+def run_benchmark(count: int, repeat: int) -> Dict[str, Any]:
+    """Benchmark every preprocessing and conversion variant over ``count`` pages."""
+    pages = build_pages(count)
+    stack = np.stack(pages)
+    expected = np.stack([legacy_preprocess(page) for page in pages])
+    rgb_pages = [Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB)) for page in pages]
+    gray_pages = [image.convert('L') for image in rgb_pages]
+    out = np.empty_like(expected)
+    height, width = expected.shape[1:]
+
+    def per_page(into: bool) -> np.ndarray:
+        for index, page in enumerate(pages):
+            preprocess_page(page, out[index] if into else None)
+        return out
+
+    variants: Dict[str, Dict[str, Any]] = {
+        'legacy': {'run': lambda: [legacy_preprocess(page) for page in pages]},
+        'page': {'run': lambda: per_page(False),
+                 'check': lambda: np.stack([preprocess_page(page) for page in pages])},
+        'page_preallocated': {'run': lambda: per_page(True), 'check': lambda: per_page(True)},
+        'batch': {'run': lambda: preprocess_batch(stack, out),
+                  'check': lambda: preprocess_batch(stack)},
+    }
+    conversions: Dict[str, Callable[[], Any]] = {
+        'rgb_to_bgr_to_gray': lambda: [
+            cv2.cvtColor(cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+            for image in rgb_pages
+        ],
+        'rgb_to_gray': lambda: [to_gray(image) for image in rgb_pages],
+        'rendered_gray': lambda: [to_gray(image) for image in gray_pages],
+    }
+
+    results: Dict[str, Any] = {
+        'pages': count,
+        'page_size': [width, height],
+        'repeat': repeat,
+        'preprocess': {},
+        'conversion': {},
+    }
+    for name, variant in variants.items():
+        results['preprocess'][name] = time_per_page(variant['run'], count, repeat)
+        if 'check' in variant:
+            results['preprocess'][name]['identical'] = bool(
+                np.array_equal(variant['check'](), expected)
+            )
+    for name, run in conversions.items():
+        results['conversion'][name] = time_per_page(run, count, repeat)
+
+    legacy_ms = results['preprocess']['legacy']['ms_per_page']
+    for timing in results['preprocess'].values():
+        ms = timing['ms_per_page']
+        timing['speedup'] = round(legacy_ms / ms, 2) if ms else None
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark page preprocessing.')
+    parser.add_argument('--pages', type=int, default=20,
+                        help='Number of synthetic pages per run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per variant; the median is reported')
+    args = parser.parse_args()
+
+    print(json.dumps(run_benchmark(max(args.pages, 1), max(args.repeat, 1)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""
+Test suite for the shared utilities.
+"""
+
+# This file makes the tests directory a Python package
@@ -0,0 +1,354 @@
+"""
+Unit tests for the local OCR processor.
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from shared.utils import local_ocr
+from shared.utils.local_ocr import LocalOCRProcessor
+
+
+def band_data(word, conf=90.0):
+    """Return Tesseract output columns of one block holding the single ``word``."""
+    return {
+        'level': [2, 4, 5], 'page_num': [1, 1, 1], 'block_num': [1, 1, 1],
+        'par_num': [1, 1, 1], 'line_num': [1, 1, 1], 'word_num': [0, 0, 1],
+        'left': [10, 10, 10], 'top': [20, 20, 20], 'width': [30, 30, 30],
+        'height': [12, 12, 12], 'conf': [-1, -1, conf], 'text': ['', '', word],
+    }
+
+
+def inked_page(height, width, blank_rows=()):
+    """Return a white page with ink on every row except ``blank_rows``."""
+    page = np.full((height, width), 255, np.uint8)
+    page[:, ::4] = 0
+    page[list(blank_rows)] = 255
+    return page
+
+
+def fake_recognize_page(self, img, languages=None):
+    """Stand-in for ``_recognize_page``: page 1 fails, page 2 hangs, the others echo their id."""
+    page = int(img[0, 0])
+    if page == 1:
+        raise RuntimeError('Tesseract crashed')
+    if page == 2:
+        time.sleep(1)
+    return {'text': f'page {page}', 'confidence': None}
+
+
+def pages(count):
+    """Return ``count`` small pages, each filled with its index."""
+    return [np.full((8, 8), index, np.uint8) for index in range(count)]
+
+
+class FakeRenderer:
+    """Stand-in for pdf2image's converters rendering a document of ``pages`` pages.
+
+    Page ``n`` rendered at ``dpi`` is ``100 + n`` rows high and ``dpi // 10``
+    columns wide, so the OCR stubs can tell which page they were given.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def __call__(self, pdf, dpi, first_page=None, last_page=None, thread_count=1,
+                 grayscale=False, fmt='ppm', output_folder=None, output_file=None,
+                 paths_only=False):
+        numbers = range(first_page or 1, min(last_page or self.pages, self.pages) + 1)
+        self.calls.append((numbers[0], numbers[-1], dpi))
+        images = []
+        for number in numbers:
+            image = Image.new('L' if grayscale else 'RGB', (dpi // 10, 100 + number), 'white')
+            image.paste(0, (2, 40, dpi // 10 - 2, 60))
+            images.append(image)
+        if output_folder is None:
+            return images
+        paths = []
+        for number, image in zip(numbers, images):
+            paths.append(os.path.join(output_folder, f'{output_file}-{number}.jpg'))
+            image.save(paths[-1])
+        return paths
+
+
+def page_text(img, **kwargs):
+    """Stand-in for ``pytesseract.image_to_string`` naming the page of a ``FakeRenderer``."""
+    return f'page {img.shape[0] - 100}\n'
+
+
+class TestTiling:
+    """Test cases for recognizing large pages in bands."""
+
+    @pytest.fixture
+    def processor(self):
+        return LocalOCRProcessor({'max_image_pixels': 30_000})
+
+    def test_needs_tiles(self, processor):
+        assert processor._needs_tiles(np.zeros((1000, 100), np.uint8))
+        assert not processor._needs_tiles(np.zeros((300, 100), np.uint8))
+        # Too few rows to cut into bands of at least 256 rows
+        assert not processor._needs_tiles(np.zeros((500, 1000), np.uint8))
+
+    def test_bands_end_at_blank_rows(self, processor):
+        """A band ends at the blank row in the last quarter of its 300 rows."""
+        bands = processor._tile_rows(inked_page(1000, 100, blank_rows=(280, 560, 830)))
+
+        assert bands == [(0, 280), (280, 560), (560, 830), (830, 1000)]
+
+    @pytest.mark.parametrize('shape', [(1000, 100), (2049, 37), (777, 120, 3)])
+    def test_bands_cover_the_page(self, processor, shape):
+        page = np.random.default_rng(1).integers(0, 256, shape, np.uint8)
+
+        bands = processor._tile_rows(page)
+
+        rows = max(30_000 // shape[1], 256)
+        assert bands[0][0] == 0 and bands[-1][1] == shape[0]
+        assert all(previous[1] == band[0] for previous, band in zip(bands, bands[1:]))
+        assert all(0 < bottom - top <= rows for top, bottom in bands)
+
+    def test_bands_are_merged_in_page_coordinates(self, processor, monkeypatch):
+        """Crop origins and band tops shift the boxes; block numbers keep increasing."""
+        page = inked_page(1000, 100, blank_rows=(280, 560, 830))
+        bands = []
+
+        def prepare(band):
+            bands.append(len(bands))
+            if len(bands) == 3:
+                return None, (0, 0)  # Blank band
+            return band, (7, 3)
+
+        monkeypatch.setattr(processor, '_prepare', prepare)
+        monkeypatch.setattr(processor, '_recognize_data',
+                            lambda band, languages=None: band_data(f'band{len(bands)}'))
+
+        layout = processor._recognize_tiled(page)
+
+        assert layout.size == (100, 1000)
+        assert layout.text.split() == ['band1', 'band2', 'band4']
+        assert layout.words['left'].tolist() == [17, 17, 17]
+        assert layout.words['top'].tolist() == [23, 280 + 23, 830 + 23]
+        assert layout.words['block'].tolist() == [1, 2, 3]
+        assert layout.blocks['top'].tolist() == [23, 280 + 23, 830 + 23]
+
+    def test_all_blank_bands(self, processor, monkeypatch):
+        monkeypatch.setattr(processor, '_prepare', lambda band: (None, (0, 0)))
+
+        assert processor._recognize_tiled(inked_page(1000, 100)) is None
+        assert processor.recognize(inked_page(1000, 100)) == ''
+
+
+class TestPagePool:
+    """Test cases for OCR of the pages of a document in worker processes."""
+
+    @pytest.fixture
+    def processor(self, monkeypatch):
+        # Forked workers inherit the patched class
+        monkeypatch.setattr(LocalOCRProcessor, '_recognize_page', fake_recognize_page)
+        monkeypatch.setattr(local_ocr, '_PAGE_TIMEOUT_GRACE', 0.0)
+        processor = LocalOCRProcessor({'parallel_pages': True, 'page_workers': 2})
+        yield processor
+        processor.cleanup()
+
+    def test_results_keep_page_order_and_errors(self, processor):
+        images = pages(6)
+        del images[2]  # No hanging page
+
+        results = processor._ocr_pages_with(images, None)
+
+        assert processor._page_pool is not None
+        assert [result['text'] for result in results] == [
+            'page 0', '', 'page 3', 'page 4', 'page 5'
+        ]
+        assert results[1] == {'text': '', 'confidence': None, 'error': 'Tesseract crashed'}
+        assert all('error' not in result for i, result in enumerate(results) if i != 1)
+
+    def test_page_timeout(self, processor):
+        """A page running past page_timeout is reported; the others still complete."""
+        processor.page_timeout = 0.2
+
+        results = processor._ocr_pages_with(pages(5), None)
+
+        assert [result.get('error') for result in results] == [
+            None, 'Tesseract crashed', 'Page OCR timed out', None, None
+        ]
+        assert [result['text'] for result in results] == ['page 0', '', '', 'page 3', 'page 4']
+
+    def test_single_page_stays_in_process(self, processor, monkeypatch):
+        monkeypatch.setattr(processor, '_get_page_pool', lambda: pytest.fail('Pool started'))
+
+        assert processor._ocr_pages_with(pages(1), None) == [
+            {'text': 'page 0', 'confidence': None}
+        ]
+
+
+    def test_result_timeout(self, tmp_path):
+        """Workers time Tesseract once they hold a slot, so the slot wait comes on top."""
+        assert LocalOCRProcessor()._page_result_timeout() is None
+        assert LocalOCRProcessor({'page_timeout': 30})._page_result_timeout() == 35.0
+
+        governed = {'governor': True, 'governor_slots': 2, 'slot_dir': str(tmp_path / 'slots'),
+                    'page_timeout': 30}
+        assert LocalOCRProcessor(governed)._page_result_timeout() is None
+        assert LocalOCRProcessor(
+            {**governed, 'slot_timeout': 60}
+        )._page_result_timeout() == 95.0
+
+
+class TestRendering:
+    """Test cases for rasterizing PDF pages in memory or into per-job directories."""
+
+    @pytest.fixture
+    def renderer(self, monkeypatch):
+        renderer = FakeRenderer(3)
+        monkeypatch.setattr(local_ocr, 'convert_from_bytes', renderer)
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_string', page_text)
+        return renderer
+
+    def test_in_memory_pages_are_not_written(self, renderer, tmp_path):
+        processor = LocalOCRProcessor({'in_memory': True, 'temp_dir': str(tmp_path)})
+
+        images = processor.render_pdf(b'%PDF')
+        result = processor.extract_text_from_pdf(b'%PDF')
+
+        assert [(image.mode, image.height) for image in images] == [
+            ('L', 101), ('L', 102), ('L', 103)
+        ]
+        assert result['full_text'] == 'page 1\n\npage 2\n\npage 3'
+        assert all('image_path' not in page for page in result['pages'])
+        assert list(tmp_path.iterdir()) == []
+
+    def test_each_render_gets_its_own_directory(self, renderer, tmp_path):
+        processor = LocalOCRProcessor({'temp_dir': str(tmp_path)})
+
+        first = processor.render_pdf(b'%PDF')
+        second = processor.render_pdf(b'%PDF')
+
+        assert [path.name for path in first] == [path.name for path in second]
+        assert first[0].parent != second[0].parent
+        assert {path.parent.parent for path in first + second} == {tmp_path}
+        assert all(path.exists() for path in first + second)
+
+    def test_page_directories_are_removed_unless_kept(self, renderer, tmp_path):
+        processor = LocalOCRProcessor({'temp_dir': str(tmp_path)})
+
+        discarded = processor.extract_text_from_pdf(b'%PDF', keep_images=False)
+
+        assert discarded['full_text'] == 'page 1\n\npage 2\n\npage 3'
+        assert list(tmp_path.iterdir()) == []
+
+        kept = processor.extract_text_from_pdf(b'%PDF')
+
+        paths = [page['image_path'] for page in kept['pages']]
+        assert len({os.path.dirname(path) for path in paths}) == 1
+        assert all(os.path.exists(path) for path in paths)
+
+        processor.cleanup()
+
+        assert not tmp_path.exists()
+
+
+class TestAdaptiveDpi:
+    """Test cases for OCR at probe_dpi with a re-scan of low-confidence pages."""
+
+    # Mean word confidence of (page, dpi); the others score 90. Pages are not
+    # cropped, so their size still tells the page and resolution
+    CONFIDENCES = {(2, 150): 40.0, (3, 150): 50.0, (3, 300): 45.0}
+
+    @pytest.fixture
+    def renderer(self, monkeypatch):
+        def image_to_data(img, **kwargs):
+            page, dpi = img.shape[0] - 100, img.shape[1] * 10
+            return band_data(f'page{page}@{dpi}', self.CONFIDENCES.get((page, dpi), 90.0))
+
+        renderer = FakeRenderer(4)
+        monkeypatch.setattr(local_ocr, 'convert_from_bytes', renderer)
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_data', image_to_data)
+        return renderer
+
+    def test_low_confidence_pages_are_rescanned(self, renderer, tmp_path):
+        """Only pages 2 and 3 are rendered again; page 3 keeps its better probe result."""
+        processor = LocalOCRProcessor({'adaptive_dpi': True, 'crop_margins': False,
+                                       'temp_dir': str(tmp_path)})
+
+        result = processor.extract_text_from_pdf(b'%PDF', keep_images=False)
+
+        assert renderer.calls == [(1, 4, 150), (2, 3, 300)]
+        assert [(page['page_number'], page['dpi'], page['confidence'], page['text'])
+                for page in result['pages']] == [
+            (1, 150, 90.0, 'page1@150'),
+            (2, 300, 90.0, 'page2@300'),
+            (3, 150, 50.0, 'page3@150'),
+            (4, 150, 90.0, 'page4@150'),
+        ]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_no_rescan_at_the_probe_resolution(self, renderer):
+        processor = LocalOCRProcessor({'adaptive_dpi': True, 'crop_margins': False, 'dpi': 150,
+                                       'in_memory': True})
+
+        result = processor.extract_text_from_pdf(b'%PDF')
+
+        assert renderer.calls == [(1, 4, 150)]
+        assert [page['confidence'] for page in result['pages']] == [90.0, 40.0, 50.0, 90.0]
+
+    def test_without_adaptive_dpi_pages_are_not_scored(self, renderer, monkeypatch):
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_string', page_text)
+        processor = LocalOCRProcessor({'in_memory': True})
+
+        result = processor.extract_text_from_pdf(b'%PDF')
+
+        assert renderer.calls == [(1, 4, 300)]
+        assert all('confidence' not in page and page['dpi'] == 300 for page in result['pages'])
+
+
+class TestStreaming:
+    """Test cases for iter_pdf_pages."""
+
+    @pytest.fixture
+    def renderer(self, monkeypatch):
+        renderer = FakeRenderer(5)
+        monkeypatch.setattr(local_ocr, 'pdfinfo_from_path', lambda path: {'Pages': 5})
+        monkeypatch.setattr(local_ocr, 'convert_from_path', renderer)
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_string', page_text)
+        return renderer
+
+    def test_pages_are_rendered_in_chunks(self, renderer, tmp_path):
+        """Each chunk's page files are gone by the time its pages are yielded."""
+        processor = LocalOCRProcessor({'chunk_pages': 2, 'temp_dir': str(tmp_path)})
+        pages, scratch = [], []
+
+        for page in processor.iter_pdf_pages(b'%PDF'):
+            pages.append((page['page_number'], page['text']))
+            scratch.append([path.name.split('_')[0] for path in tmp_path.iterdir()])
+
+        assert renderer.calls == [(1, 2, 300), (3, 4, 300), (5, 5, 300)]
+        assert pages == [(number, f'page {number}') for number in range(1, 6)]
+        # Only the document written once for Poppler stays during the iteration
+        assert scratch == [['stream']] * 5
+        assert list(tmp_path.iterdir()) == []
+
+    def test_chunk_size_argument(self, renderer, tmp_path):
+        pdf = tmp_path / 'invoice.pdf'
+        pdf.write_bytes(b'%PDF')
+        processor = LocalOCRProcessor({'temp_dir': str(tmp_path / 'ocr')})
+
+        numbers = [page['page_number'] for page in processor.iter_pdf_pages(pdf, chunk_size=3)]
+
+        assert numbers == [1, 2, 3, 4, 5]
+        assert renderer.calls == [(1, 3, 300), (4, 5, 300)]
+        assert list((tmp_path / 'ocr').iterdir()) == []
+
+    def test_closing_early_removes_the_written_document(self, renderer, tmp_path):
+        processor = LocalOCRProcessor({'chunk_pages': 2, 'temp_dir': str(tmp_path)})
+
+        pages = processor.iter_pdf_pages(b'%PDF')
+        assert next(pages)['page_number'] == 1
+        pages.close()
+
+        assert renderer.calls == [(1, 2, 300)]
+        assert list(tmp_path.iterdir()) == []
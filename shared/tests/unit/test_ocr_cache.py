@@ -0,0 +1,123 @@
+"""
+Unit tests for the OCR result cache.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from shared.utils import ocr_cache
+from shared.utils.ocr_cache import OCRCache, content_digest, get_ocr_cache, make_key
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Make access times strictly increasing so LRU order is deterministic."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(ocr_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def test_make_key_depends_on_digest_and_params():
+    """Keys differ by content and parameters but not by parameter order."""
+    key = make_key('abc', {'dpi': 300, 'languages': ['eng']})
+
+    assert key.startswith('abc:')
+    assert key == make_key('abc', {'languages': ['eng'], 'dpi': 300})
+    assert key != make_key('abc', {'dpi': 200, 'languages': ['eng']})
+    assert key != make_key('abd', {'dpi': 300, 'languages': ['eng']})
+
+
+def test_content_digest_accepts_bytes_paths_and_images(tmp_path):
+    """Bytes and the file holding them hash alike; arrays include their shape."""
+    path = tmp_path / 'page.bin'
+    path.write_bytes(b'page')
+
+    assert content_digest(b'page') == content_digest(path) == content_digest(str(path))
+    flat = np.zeros((2, 8), np.uint8)
+    assert content_digest(flat) != content_digest(flat.reshape(4, 4))
+    assert content_digest(Image.fromarray(flat)) == content_digest(Image.fromarray(flat.copy()))
+    with pytest.raises(TypeError):
+        content_digest(42)
+
+
+class TestOCRCache:
+    """Test cases for the OCRCache class."""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Return a cache with a small memory tier and a disk tier."""
+        cache = OCRCache(tmp_path / 'cache' / 'ocr.db', memory_items=2)
+        yield cache
+        cache.close()
+
+    def test_get_and_put_across_tiers(self, cache):
+        """Results evicted from memory are served from disk and counted per tier."""
+        for name in ('a', 'b', 'c'):
+            cache.put(name, {'text': name})
+
+        assert cache.get('c') == {'text': 'c'}
+        assert cache.get('a') == {'text': 'a'}
+        assert cache.get('missing') is None
+
+        stats = cache.stats()
+        assert stats['puts'] == 3
+        assert stats['memory_hits'] == 1
+        assert stats['disk_hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == round(2 / 3, 4)
+        assert stats['memory_items'] == 2
+        assert stats['bytes_read'] == len(b'{"text": "a"}')
+
+    def test_disk_tier_survives_reopen(self, cache):
+        """A new instance on the same file sees earlier results and their size."""
+        cache.put('a', {'text': 'ą'})
+        cache.put('a', {'text': 'ab'})
+
+        reopened = OCRCache(cache.path, memory_items=0)
+        assert reopened.get('a') == {'text': 'ab'}
+        assert reopened.stats()['disk_bytes'] == len(b'{"text": "ab"}')
+        reopened.close()
+
+    def test_eviction_trims_least_recently_used(self, tmp_path):
+        """Overflowing the disk tier deletes the oldest entries down to _EVICT_TO."""
+        entry = len(b'{"text": "0000"}')
+        cache = OCRCache(tmp_path / 'ocr.db', max_bytes=entry * 4, memory_items=0)
+        for i in range(4):
+            cache.put(f'k{i}', {'text': f'{i:04d}'})
+        # Reading k0 makes k1 the least recently used entry
+        assert cache.get('k0') is not None
+
+        cache.put('k4', {'text': '0004'})
+
+        stats = cache.stats()
+        assert stats['disk_bytes'] <= entry * 4 * ocr_cache._EVICT_TO
+        assert stats['evictions'] == 2
+        assert cache.get('k1') is None
+        assert cache.get('k2') is None
+        assert cache.get('k0') == {'text': '0000'}
+        cache.close()
+
+    def test_memory_only_cache(self):
+        """Without a path only the memory tier is used."""
+        cache = OCRCache(memory_items=1)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+        assert cache.stats()['disk_bytes'] == 0
+
+
+def test_get_ocr_cache_shares_instances_per_path(tmp_path, monkeypatch):
+    """Callers using the same database path get the same cache."""
+    monkeypatch.setattr(ocr_cache, '_caches', {})
+    monkeypatch.chdir(tmp_path)
+
+    shared = get_ocr_cache('ocr.db')
+
+    assert get_ocr_cache(str(tmp_path / 'ocr.db')) is shared
+    assert get_ocr_cache(tmp_path / 'other.db') is not shared
+    assert get_ocr_cache() is get_ocr_cache(None)
+    assert get_ocr_cache().path is None
@@ -0,0 +1,174 @@
+"""
+Unit tests for the host-wide OCR resource governor.
+"""
+
+import threading
+
+import cv2
+import pytest
+
+from shared.utils import ocr_governor
+from shared.utils.ocr_governor import OCRGovernor, cgroup_cpu_limit, get_ocr_governor
+
+
+@pytest.fixture(autouse=True)
+def thread_budget(monkeypatch):
+    """Restore the thread limits a governor applies to the process."""
+    monkeypatch.setenv('OMP_THREAD_LIMIT', '')
+    monkeypatch.setenv('OMP_NUM_THREADS', '')
+    threads = cv2.getNumThreads()
+    yield
+    cv2.setNumThreads(threads)
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """Point the cgroup files at a temporary directory and return a writer for them."""
+    paths = {
+        'v2': tmp_path / 'cpu.max',
+        'v1_quota': tmp_path / 'cpu.cfs_quota_us',
+        'v1_period': tmp_path / 'cpu.cfs_period_us',
+    }
+    monkeypatch.setattr(ocr_governor, '_CGROUP_V2_CPU_MAX', str(paths['v2']))
+    monkeypatch.setattr(ocr_governor, '_CGROUP_V1_QUOTA', str(paths['v1_quota']))
+    monkeypatch.setattr(ocr_governor, '_CGROUP_V1_PERIOD', str(paths['v1_period']))
+
+    def write(**contents):
+        for name, text in contents.items():
+            paths[name].write_text(text + '\n')
+    return write
+
+
+class TestCgroupCpuLimit:
+    """Test cases for cgroup_cpu_limit."""
+
+    def test_v2_quota(self, cgroup):
+        cgroup(v2='150000 100000')
+        assert cgroup_cpu_limit() == 1.5
+
+    def test_v2_unlimited(self, cgroup):
+        cgroup(v2='max 100000', v1_quota='200000', v1_period='100000')
+        assert cgroup_cpu_limit() is None
+
+    def test_v1_quota(self, cgroup):
+        cgroup(v1_quota='200000', v1_period='100000')
+        assert cgroup_cpu_limit() == 2.0
+
+    def test_v1_unlimited(self, cgroup):
+        cgroup(v1_quota='-1', v1_period='100000')
+        assert cgroup_cpu_limit() is None
+
+    def test_no_cgroup_files(self, cgroup):
+        assert cgroup_cpu_limit() is None
+
+    def test_available_cpus_rounds_the_quota_up(self, cgroup, monkeypatch):
+        """A fractional quota still gets a whole core, capped by the affinity."""
+        monkeypatch.setattr(ocr_governor, 'allowed_cpus', lambda: [0, 1, 2, 3])
+        cgroup(v2='150000 100000')
+        assert ocr_governor.available_cpus() == 2
+        cgroup(v2='50000 100000')
+        assert ocr_governor.available_cpus() == 1
+        cgroup(v2='max 100000')
+        assert ocr_governor.available_cpus() == 4
+
+
+class TestOCRGovernor:
+    """Test cases for the OCRGovernor class."""
+
+    @pytest.fixture
+    def cpus(self, monkeypatch):
+        """Pretend the process may run on four CPUs without a quota."""
+        monkeypatch.setattr(ocr_governor, 'allowed_cpus', lambda: [0, 1, 2, 3])
+        monkeypatch.setattr(ocr_governor, 'cgroup_cpu_limit', lambda: None)
+
+    def test_slots_are_sized_from_available_cores(self, cpus, tmp_path):
+        """Slots default to the cores divided by the threads of a slot."""
+        governor = OCRGovernor(threads_per_slot=2, slot_dir=tmp_path, pin=False)
+
+        assert governor.slots == 2
+        assert governor.slot_cpus(0) == [0, 1]
+        assert governor.slot_cpus(1) == [2, 3]
+        assert OCRGovernor(threads_per_slot=8, slot_dir=tmp_path, pin=False).slots == 1
+        assert OCRGovernor(slots=6, slot_dir=tmp_path, pin=False).slot_cpus(5) == [1]
+
+    def test_applies_thread_budget(self, cpus, tmp_path):
+        """OpenMP and OpenCV are limited to one slot's threads."""
+        OCRGovernor(threads_per_slot=2, slot_dir=tmp_path, pin=False)
+
+        assert ocr_governor.os.environ['OMP_THREAD_LIMIT'] == '2'
+        assert cv2.getNumThreads() == 2
+
+    def test_slot_is_reentrant(self, cpus, tmp_path):
+        """A thread holding a slot gets the same slot back without waiting."""
+        governor = OCRGovernor(slots=1, slot_dir=tmp_path, pin=False)
+
+        with governor.slot(timeout=0.1) as outer:
+            with governor.slot(timeout=0.1) as inner:
+                assert inner is outer
+            assert governor.stats()['in_use'] == 1
+        assert governor.stats()['in_use'] == 0
+        assert governor.stats()['acquired'] == 1
+
+    def test_slots_are_shared_through_slot_dir(self, cpus, tmp_path):
+        """A slot held by another governor on the same directory times out."""
+        holder = OCRGovernor(slots=1, slot_dir=tmp_path, pin=False)
+        waiter = OCRGovernor(slots=1, slot_dir=tmp_path, pin=False)
+
+        with holder.slot():
+            with pytest.raises(TimeoutError):
+                with waiter.slot(timeout=0.02):
+                    pass
+        assert waiter.stats()['timeouts'] == 1
+
+        with waiter.slot(timeout=0.1) as slot:
+            assert slot.index == 0
+
+    def test_waits_for_a_slot_released_by_another_thread(self, cpus, tmp_path):
+        """A waiting thread gets the slot once it is released and records the wait."""
+        governor = OCRGovernor(slots=1, slot_dir=tmp_path, pin=False)
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with governor.slot():
+                held.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait(5)
+        threading.Timer(0.05, release.set).start()
+        with governor.slot(timeout=5) as slot:
+            assert slot.waited >= 0.04
+        thread.join()
+
+        assert governor.stats()['waited'] == 1
+
+    def test_stats_percentiles(self, cpus, tmp_path):
+        """Wait percentiles and averages are reported in milliseconds."""
+        governor = OCRGovernor(slots=1, slot_dir=tmp_path, pin=False)
+        assert governor.stats()['p50_wait_ms'] is None
+        assert governor.stats()['avg_wait_ms'] is None
+
+        for waited in [0.001 * i for i in range(1, 101)]:
+            governor.record_wait(waited)
+
+        stats = governor.stats()
+        assert stats['acquired'] == 100
+        assert stats['p50_wait_ms'] == 51.0
+        assert stats['p95_wait_ms'] == 96.0
+        assert stats['max_wait_ms'] == 100.0
+        assert stats['avg_wait_ms'] == 50.5
+        assert stats['waited'] == 96
+
+
+def test_get_ocr_governor_shares_instances(tmp_path, monkeypatch):
+    """Callers with the same slot directory and sizing share one governor."""
+    monkeypatch.setattr(ocr_governor, '_governors', {})
+    monkeypatch.setattr(ocr_governor, 'OCRGovernor',
+                        lambda *args: OCRGovernor(*args, pin=False))
+
+    governor = get_ocr_governor(2, 1, tmp_path)
+
+    assert get_ocr_governor(2, 1, str(tmp_path)) is governor
+    assert get_ocr_governor(3, 1, tmp_path) is not governor
@@ -0,0 +1,148 @@
+"""
+Unit tests for OCR language detection.
+"""
+
+import numpy as np
+import pytest
+
+from shared.utils import local_ocr
+from shared.utils.local_ocr import LocalOCRProcessor
+from shared.utils.ocr_language import DOMINANCE, MIN_EVIDENCE, guess_language, language_scores
+
+LANGUAGES = ['eng', 'pol', 'deu']
+
+
+def test_language_scores_count_letters_once_and_words_twice():
+    scores = language_scores('Faktura VAT, zapłaty: łąka', LANGUAGES + ['fra'])
+
+    # ł, ą and ł are letters; "faktura" and "zapłaty" are words
+    assert scores == {'eng': 0, 'pol': 3 + 2 * 2, 'deu': 0, 'fra': 0}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Faktura VAT nr 1/2025, data wystawienia', 'pol'),
+    ('Rechnung für Müller, Gesamtbetrag', 'deu'),
+    ('Invoice number 17, total amount due', 'eng'),
+])
+def test_guess_language(text, expected):
+    assert guess_language(text, LANGUAGES) == expected
+
+
+def test_guess_language_needs_enough_evidence():
+    """A single marker word is below MIN_EVIDENCE unless the threshold is lowered."""
+    assert MIN_EVIDENCE > 2
+    assert guess_language('Invoice', LANGUAGES) is None
+    assert guess_language('Invoice', LANGUAGES, min_evidence=2) == 'eng'
+    assert guess_language('', LANGUAGES) is None
+    assert guess_language('Invoice', []) is None
+
+
+def test_guess_language_needs_a_dominant_winner():
+    """The winner must score DOMINANCE times the runner-up."""
+    # eng 4 (invoice, total), deu 2 (datum): not dominant enough
+    assert 4 < DOMINANCE * 2
+    assert guess_language('Invoice total Datum', LANGUAGES) is None
+    # eng 6 against deu 2 is
+    assert guess_language('Invoice total amount Datum', LANGUAGES) == 'eng'
+
+
+@pytest.fixture
+def page():
+    """Return a page with a block of text-like bars."""
+    page = np.full((600, 800), 255, np.uint8)
+    for top in range(100, 400, 40):
+        page[top:top + 20, 100:700] = 0
+    return page
+
+
+class TestAutoLanguage:
+    """Test cases for the auto-language mode of LocalOCRProcessor."""
+
+    @pytest.fixture
+    def processor(self):
+        return LocalOCRProcessor({'languages': LANGUAGES, 'auto_language': True})
+
+    def test_detect_languages_reads_the_top_of_the_text(self, processor, page, monkeypatch):
+        """The probe reads a downscaled sample and keeps only the language found."""
+        samples = []
+
+        def image_to_string(sample, **kwargs):
+            samples.append(sample.shape)
+            return 'Faktura VAT nr 12, data wystawienia'
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_string', image_to_string)
+        processor.language_probe_width = 400
+
+        assert processor.detect_languages(page) == ['pol']
+        [(height, width)] = samples
+        assert width <= 400 and height < 300 // 2
+
+    @pytest.mark.parametrize('result', ['', 'Invoice Faktura Rechnung', RuntimeError('boom')])
+    def test_detect_languages_falls_back_to_all(self, processor, page, monkeypatch, result):
+        """A blank, ambiguous or failed probe keeps all languages."""
+        def image_to_string(sample, **kwargs):
+            if isinstance(result, Exception):
+                raise result
+            return result
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_string', image_to_string)
+
+        assert processor.detect_languages(page) == LANGUAGES
+
+    def test_blank_page_keeps_all_languages(self, processor, monkeypatch):
+        monkeypatch.setattr(local_ocr.pytesseract, 'image_to_string',
+                            lambda *args, **kwargs: pytest.fail('blank page was probed'))
+
+        assert processor.detect_languages(np.full((600, 800), 255, np.uint8)) == LANGUAGES
+
+    def test_vendor_languages_are_reused_without_a_probe(self, processor, page, monkeypatch):
+        processor._learn_vendor_languages('acme.com', ['deu'], [{'languages': ['deu']}])
+        monkeypatch.setattr(processor, 'detect_languages',
+                            lambda img: pytest.fail('known vendor was probed'))
+
+        assert processor._document_languages(page, 'acme.com') == ['deu']
+
+    def test_vendor_languages_are_least_recently_used(self, processor, page, monkeypatch):
+        """The vendor used longest ago is forgotten once the limit is reached."""
+        monkeypatch.setattr(local_ocr, '_MAX_VENDOR_LANGUAGES', 2)
+        monkeypatch.setattr(processor, 'detect_languages', lambda img: ['eng'])
+        processor._learn_vendor_languages('a', ['pol'], [])
+        processor._learn_vendor_languages('b', ['deu'], [])
+        processor._document_languages(page, 'a')
+
+        processor._learn_vendor_languages('c', ['eng'], [])
+
+        assert list(processor._vendor_languages) == ['a', 'c']
+        assert processor._document_languages(page, 'b') == ['eng']
+
+    def test_fallback_forgets_the_vendor_language(self, processor):
+        """A vendor whose pages needed all languages is probed again next time."""
+        processor._learn_vendor_languages('acme.com', ['pol'], [{'languages': ['pol']}])
+        assert processor._vendor_languages['acme.com'] == ['pol']
+
+        processor._learn_vendor_languages(
+            'acme.com', ['pol'], [{'languages': ['pol']}, {'languages': LANGUAGES}]
+        )
+
+        assert 'acme.com' not in processor._vendor_languages
+
+    def test_all_languages_and_unknown_vendors_are_not_remembered(self, processor):
+        processor._learn_vendor_languages('acme.com', list(LANGUAGES), [])
+        processor._learn_vendor_languages(None, ['pol'], [])
+
+        assert not processor._vendor_languages
+
+    def test_low_confidence_pages_are_ocrd_again_with_all_languages(
+        self, processor, page, monkeypatch
+    ):
+        """Pages below min_confidence keep the better of both results."""
+        def recognize(img, languages=None):
+            if languages:
+                return {'text': 'probe', 'confidence': float(img[0, 0])}
+            return {'text': 'all', 'confidence': 50.0}
+        monkeypatch.setattr(processor, '_recognize_page', recognize)
+        processor.min_confidence = 70
+        pages = [np.full((10, 10), value, np.uint8) for value in (90, 40, 60)]
+
+        results = processor._ocr_pages(pages, ['pol'])
+
+        assert [r['text'] for r in results] == ['probe', 'all', 'probe']
+        assert [r['languages'] for r in results] == [['pol'], LANGUAGES, ['pol']]
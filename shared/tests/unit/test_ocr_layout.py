@@ -0,0 +1,122 @@
+"""
+Unit tests for the structured OCR layout.
+"""
+
+import numpy as np
+import pytest
+
+from shared.utils.ocr_layout import OCRLayout, parse_tsv
+
+# Two blocks: "Invoice No. 42" / "Total 10.00" and "Thanks", plus an empty
+# word and a word without a confidence that are dropped
+TSV = '\n'.join('\t'.join(str(v) for v in row) for row in [
+    ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+     'left', 'top', 'width', 'height', 'conf', 'text'),
+    (1, 1, 0, 0, 0, 0, 0, 0, 600, 400, -1, ''),
+    (2, 1, 1, 0, 0, 0, 10, 10, 300, 60, -1, ''),
+    (4, 1, 1, 1, 1, 0, 10, 10, 300, 20, -1, ''),
+    (5, 1, 1, 1, 1, 1, 10, 10, 80, 20, 96.5, 'Invoice'),
+    (5, 1, 1, 1, 1, 2, 100, 10, 40, 20, 91, 'No.'),
+    (5, 1, 1, 1, 1, 3, 150, 10, 30, 20, 88, '42'),
+    (5, 1, 1, 1, 1, 4, 190, 10, 10, 20, 95, ' '),
+    (4, 1, 1, 1, 2, 0, 10, 50, 200, 20, -1, ''),
+    (5, 1, 1, 1, 2, 1, 10, 50, 60, 20, 90, 'Total'),
+    (5, 1, 1, 1, 2, 2, 80, 50, 60, 20, 70, '10.00'),
+    (5, 1, 1, 1, 2, 3, 150, 50, 20, 20, -1, 'x'),
+    (2, 1, 2, 0, 0, 0, 10, 300, 100, 20, -1, ''),
+    (4, 1, 2, 1, 1, 0, 10, 300, 100, 20, -1, ''),
+    (5, 1, 2, 1, 1, 1, 10, 300, 100, 20, 99, 'Thanks'),
+]) + '\n'
+
+
+@pytest.fixture
+def layout():
+    """Return the layout of the fixed TSV, shifted by a crop offset."""
+    return OCRLayout.from_tesseract(parse_tsv(TSV), offset=(5, 100), size=(600, 400))
+
+
+def test_parse_tsv_columns():
+    """Rows are split into typed columns and the header row is skipped."""
+    data = parse_tsv(TSV)
+
+    assert len(data['level']) == 14
+    assert data['level'][:4] == [1, 2, 4, 5]
+    assert data['conf'][3] == 96.5
+    assert data['text'][3] == 'Invoice'
+    assert data['text'][0] == ''
+    # A row without its trailing (empty) text column is kept
+    assert parse_tsv('4\t1\t1\t1\t1\t0\t0\t0\t9\t9\t-1')['text'] == ['']
+
+
+def test_from_tesseract_indexes_word_texts(layout):
+    """Words are kept in order and their start/length slice the joined text."""
+    assert len(layout) == 6
+    assert layout.chars == 'Invoice No. 42 Total 10.00 Thanks'
+    assert layout.words['start'].tolist() == [0, 8, 12, 15, 21, 27]
+    assert layout.words['length'].tolist() == [7, 3, 2, 5, 5, 6]
+    assert [layout.word_text(i) for i in range(len(layout))] == [
+        'Invoice', 'No.', '42', 'Total', '10.00', 'Thanks'
+    ]
+    assert layout.words['left'][0] == 15
+    assert layout.words['top'][0] == 110
+    assert len(layout.lines) == 3
+    assert len(layout.blocks) == 2
+    assert layout.blocks['top'].tolist() == [110, 400]
+    assert layout.mean_confidence() == pytest.approx((96.5 + 91 + 88 + 90 + 70 + 99) / 6)
+
+
+def test_text_and_lines(layout):
+    """Lines are joined by newlines and blocks by blank lines."""
+    assert layout.text == 'Invoice No. 42\nTotal 10.00\n\nThanks'
+    assert list(layout.iter_lines()) == [
+        ('Invoice No. 42', (15, 110, 185, 130)),
+        ('Total 10.00', (15, 150, 145, 170)),
+        ('Thanks', (15, 400, 115, 420)),
+    ]
+
+
+def test_select_modes(layout):
+    """Words are selected by their center, their whole box or any overlap."""
+    rect = (100, 100, 160, 175)
+
+    assert layout.select(rect).tolist() == [1, 4]
+    assert layout.select(rect, 'inside').tolist() == [1]
+    assert layout.select(rect, 'overlap').tolist() == [1, 2, 4]
+    assert layout.text_in(rect, 'overlap') == 'No. 42\n10.00'
+    assert layout.text_in((0, 0, 10, 10)) == ''
+    with pytest.raises(ValueError):
+        layout.select(rect, 'nearest')
+
+
+def test_empty_layout():
+    """A blank page has no words and a zero confidence."""
+    layout = OCRLayout.empty((100, 50))
+
+    assert layout.text == ''
+    assert list(layout.iter_lines()) == []
+    assert layout.mean_confidence() == 0.0
+    assert layout.size == (100, 50)
+
+
+def _assert_same(restored, layout):
+    assert restored.chars == layout.chars
+    assert restored.size == layout.size
+    for name in ('words', 'lines', 'blocks'):
+        np.testing.assert_array_equal(getattr(restored, name), getattr(layout, name))
+        assert getattr(restored, name).dtype == getattr(layout, name).dtype
+
+
+def test_dict_round_trip(layout):
+    """to_dict output survives JSON-like copying and rebuilds the layout."""
+    restored = OCRLayout.from_dict(layout.to_dict())
+
+    _assert_same(restored, layout)
+    assert restored.text == layout.text
+
+
+def test_save_and_load(layout, tmp_path):
+    """A layout written to an .npz sidecar loads back unchanged."""
+    path = tmp_path / 'page.npz'
+    layout.save(path)
+
+    _assert_same(OCRLayout.load(path), layout)
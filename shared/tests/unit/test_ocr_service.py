@@ -0,0 +1,200 @@
+"""
+Unit tests for the local OCR service.
+"""
+
+import queue
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from shared.utils import ocr_service
+from shared.utils.ocr_service import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    OCRService,
+    OCRServiceClient,
+    OCRServiceError,
+    _Job,
+    recv_message,
+    send_message,
+)
+
+
+class StubProcessor:
+    """Stand-in for ``LocalOCRProcessor`` echoing images; ``b'wait'`` blocks until released."""
+
+    def __init__(self, config):
+        self.config = config
+        self.governor = None
+        self.templates = None
+        self.images = []
+        self.release = threading.Event()
+        self.cleaned_up = False
+
+    def extract_text_from_image(self, data, vendor=None):
+        self.images.append(bytes(data))
+        if data == b'wait':
+            self.release.wait(10)
+        if data == b'fail':
+            raise RuntimeError('Tesseract crashed')
+        return f'{bytes(data).decode()} from {vendor}'
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def sockets():
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+class TestMessages:
+    """Test cases for the socket message framing."""
+
+    def test_header_and_payload(self, sockets):
+        left, right = sockets
+
+        send_message(left, {'op': 'image', 'priority': 3}, b'\x00document\xff')
+
+        assert recv_message(right) == (
+            {'op': 'image', 'priority': 3, 'size': 10}, bytearray(b'\x00document\xff')
+        )
+
+    def test_file_payload(self, sockets, tmp_path):
+        left, right = sockets
+        path = tmp_path / 'page.png'
+        path.write_bytes(b'png data')
+
+        send_message(left, {'op': 'image'}, path)
+
+        assert recv_message(right) == ({'op': 'image', 'size': 8}, bytearray(b'png data'))
+
+    def test_header_only(self, sockets):
+        left, right = sockets
+
+        send_message(left, {'op': 'ping'})
+
+        assert recv_message(right) == ({'op': 'ping'}, bytearray())
+
+    def test_oversized_header_is_rejected(self, sockets):
+        left, right = sockets
+        left.sendall(struct.pack('>I', ocr_service._MAX_HEADER_BYTES + 1))
+
+        with pytest.raises(ValueError, match='Header'):
+            recv_message(right)
+
+    def test_oversized_payload_is_rejected(self, sockets):
+        left, right = sockets
+        send_message(left, {'op': 'pdf'}, b'x' * 11)
+
+        with pytest.raises(ValueError, match='exceeds the 10 byte limit'):
+            recv_message(right, max_payload=10)
+
+    def test_connection_closed_mid_message(self, sockets):
+        left, right = sockets
+        left.sendall(struct.pack('>I', 20) + b'{"op"')
+        left.close()
+
+        with pytest.raises(ConnectionError):
+            recv_message(right)
+
+
+def test_jobs_are_served_by_priority_then_submission_order():
+    jobs = queue.PriorityQueue()
+    for seq, priority in enumerate([PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH,
+                                    PRIORITY_NORMAL, PRIORITY_HIGH]):
+        jobs.put(_Job(priority, seq, 'image', bytearray()))
+
+    order = [jobs.get_nowait() for _ in range(5)]
+
+    assert [(job.priority, job.seq) for job in order] == [
+        (PRIORITY_HIGH, 2), (PRIORITY_HIGH, 4), (PRIORITY_NORMAL, 1), (PRIORITY_NORMAL, 3),
+        (PRIORITY_LOW, 0)
+    ]
+
+
+class TestService:
+    """Test cases for the service and its client over a Unix socket."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(ocr_service, 'LocalOCRProcessor', StubProcessor)
+        monkeypatch.setattr(ocr_service, '_DISCONNECT_POLL', 0.01)
+        service = OCRService({'dpi': 200}, socket_path=tmp_path / 'ocr.sock', concurrency=1)
+        service.start()
+        threading.Thread(target=service._server.serve_forever, daemon=True).start()
+        yield service
+        service.processor.release.set()
+        service.shutdown()
+        service.close()
+
+    @pytest.fixture
+    def client(self, service):
+        return OCRServiceClient(service.socket_path, timeout=10)
+
+    def test_processor_config(self, service):
+        assert service.processor.config == {'parallel_pages': True, 'dpi': 200}
+
+    def test_ping_image_and_stats(self, service, client):
+        assert client.ping()
+        assert client.extract_text_from_image(b'invoice', vendor='acme.com') == (
+            'invoice from acme.com'
+        )
+        with pytest.raises(OCRServiceError, match='Tesseract crashed'):
+            client.extract_text_from_image(b'fail')
+
+        stats = client.stats()
+
+        assert {key: stats[key] for key in ('submitted', 'completed', 'failed', 'cancelled',
+                                            'running', 'queued')} == {
+            'submitted': 2, 'completed': 1, 'failed': 1, 'cancelled': 0, 'running': 0,
+            'queued': 0
+        }
+        assert stats['avg_run_seconds'] is not None
+
+    def test_unknown_operation(self, client):
+        with pytest.raises(OCRServiceError, match='Unknown operation: scan'):
+            client._request({'op': 'scan'})
+
+    def test_queued_job_of_a_departed_client_is_dropped(self, service, client):
+        """A client that disconnects while its job waits does not get the job run."""
+        running = threading.Thread(target=client.extract_text_from_image, args=(b'wait',))
+        running.start()
+        wait_for(lambda: service.processor.images == [b'wait'])
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(service.socket_path)
+            send_message(sock, {'op': 'image'}, b'abandoned')
+            wait_for(lambda: service.stats()['queued'] == 1)
+        wait_for(lambda: service.stats()['cancelled'] == 1)
+        service.processor.release.set()
+        running.join(10)
+
+        assert client.extract_text_from_image(b'next') == 'next from None'
+        assert service.processor.images == [b'wait', b'next']
+        assert service.stats()['completed'] == 2
+
+    def test_close_removes_the_socket(self, service, client, tmp_path):
+        service.close()
+
+        assert not (tmp_path / 'ocr.sock').exists()
+        assert service.processor.cleaned_up
+        assert not client.ping()
+
+    def test_second_service_on_the_same_socket(self, service):
+        with pytest.raises(OCRServiceError, match='already listening'):
+            OCRService(socket_path=service.socket_path).start()
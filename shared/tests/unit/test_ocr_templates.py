@@ -0,0 +1,209 @@
+"""
+Unit tests for vendor layout templates.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from shared.utils import ocr_templates
+from shared.utils.ocr_layout import OCRLayout
+from shared.utils.ocr_templates import (
+    TemplateRegistry,
+    find_fields,
+    get_template_registry,
+    hamming,
+    match_field,
+    page_hash,
+    stack_zones,
+)
+
+PAGE_SIZE = (1000, 1400)
+
+
+def make_layout(lines, size=PAGE_SIZE):
+    """Build a layout with one Tesseract line per ``(text, left, top)``, 20 px high."""
+    data = {name: [] for name in ('level', 'block_num', 'par_num', 'line_num',
+                                  'left', 'top', 'width', 'height', 'conf', 'text')}
+    for line_num, (text, left, top) in enumerate(lines, 1):
+        for word in text.split():
+            for name, value in (('level', 5), ('block_num', 1), ('par_num', 1),
+                                ('line_num', line_num), ('left', left), ('top', top),
+                                ('width', 10 * len(word)), ('height', 20), ('conf', 90),
+                                ('text', word)):
+                data[name].append(value)
+            left += 10 * len(word) + 10
+    return OCRLayout.from_tesseract(data, size=size)
+
+
+def make_page(seed, size=(700, 500)):
+    """Render a synthetic page of dark text-like bars."""
+    rng = np.random.default_rng(seed)
+    page = np.full(size, 255, np.uint8)
+    for _ in range(12):
+        y, x = rng.integers(0, size[0] - 30), rng.integers(0, size[1] - 150)
+        page[y:y + 20, x:x + rng.integers(50, 150)] = 0
+    return page
+
+
+INVOICE = [
+    ('ACME Corporation', 50, 40),
+    ('Invoice No. INV-1001', 600, 100),
+    ('Invoice date 2025-05-01', 600, 130),
+    ('Widgets 3 x 10.00', 50, 600),
+    ('Total due 1,234.56', 600, 1200),
+]
+
+
+class TestPageHash:
+    """Test cases for page_hash and hamming."""
+
+    def test_same_layout_matches_across_resolutions(self):
+        """A page hashes alike at another resolution and in color."""
+        page = make_page(1)
+        larger = np.repeat(np.repeat(page, 2, axis=0), 2, axis=1)
+        color = np.dstack([page] * 3)
+
+        assert hamming(page_hash(page), page_hash(larger)) <= 2
+        assert page_hash(color) == page_hash(page)
+
+    def test_different_layouts_are_far_apart(self):
+        assert hamming(page_hash(make_page(1)), page_hash(make_page(2))) > 10
+
+    def test_hamming(self):
+        assert hamming(0b1011, 0b0001) == 2
+        assert hamming(0, 2 ** 64 - 1) == 64
+
+
+class TestFields:
+    """Test cases for match_field and find_fields."""
+
+    @pytest.mark.parametrize('name, text, expected', [
+        ('invoice_number', 'Invoice No. INV-1001', 'INV-1001'),
+        ('invoice_number', 'Invoice # 2025/05/17', '2025/05/17'),
+        ('invoice_number', 'Faktura VAT nr FV/12/2025', 'FV/12/2025'),
+        ('invoice_number', 'Nr faktury 17/05/2025', '17/05/2025'),
+        ('invoice_number', 'Rechnungsnummer RE-2025-17', 'RE-2025-17'),
+        ('issue_date', 'Invoice date 2025-05-01', '2025-05-01'),
+        ('issue_date', 'Data wystawienia: 01.05.2025', '01.05.2025'),
+        ('issue_date', 'Rechnungsdatum 1/5/25', '1/5/25'),
+        ('total', 'Total due 1,234.56', '1,234.56'),
+        ('total', 'Razem do zapłaty 1 234,56 PLN', '1 234,56'),
+        ('total', 'Gesamtbetrag 99,90 EUR', '99,90'),
+    ])
+    def test_match_field(self, name, text, expected):
+        assert match_field(name, text) == expected
+
+    def test_match_field_needs_label_and_value(self):
+        assert match_field('total', 'Amount 1,234.56') is None
+        assert match_field('total', 'Total due soon') is None
+        # The value must follow the label
+        assert match_field('issue_date', '2025-05-01 invoice date') is None
+
+    def test_find_fields_returns_first_line_of_each_field(self):
+        layout = make_layout(INVOICE + [('Total due 9.99', 600, 1300)])
+
+        fields = find_fields(layout)
+
+        assert fields == {
+            'invoice_number': ('INV-1001', (600, 100, 800, 120)),
+            'issue_date': ('2025-05-01', (600, 130, 830, 150)),
+            'total': ('1,234.56', (600, 1200, 780, 1220)),
+        }
+
+
+class TestTemplateRegistry:
+    """Test cases for the TemplateRegistry class."""
+
+    def test_learn_zones_and_validate(self):
+        """A learned template's zones cover its fields at any page size."""
+        registry = TemplateRegistry()
+        page = page_hash(make_page(1))
+
+        found = registry.learn('acme.com', page, make_layout(INVOICE))
+        template = registry.match('acme.com', page)
+
+        assert found['total'] == '1,234.56'
+        assert set(template['fields']) == {'invoice_number', 'issue_date', 'total'}
+        x0, y0, x1, y1 = registry.zones(template, PAGE_SIZE)['invoice_number']
+        assert x0 < 600 and y0 < 100 and x1 > 800 and y1 > 120
+        assert registry.zones(template, (2000, 2800))['invoice_number'] == (
+            pytest.approx(2 * x0, abs=1), pytest.approx(2 * y0, abs=1),
+            pytest.approx(2 * x1, abs=1), pytest.approx(2 * y1, abs=1),
+        )
+
+        texts = {'invoice_number': 'Invoice No. INV-1002', 'issue_date': 'Invoice date 2025-06-01',
+                 'total': 'Total due 99.00'}
+        assert registry.validate(template, texts) == {
+            'invoice_number': 'INV-1002', 'issue_date': '2025-06-01', 'total': '99.00'
+        }
+        assert registry.validate(template, {**texts, 'total': 'Thank you'}) is None
+        assert registry.stats() == {'matches': 1, 'hits': 1, 'misses': 1, 'learned': 1,
+                                    'templates': 1}
+        assert (template['hits'], template['misses']) == (1, 1)
+
+    def test_page_with_too_few_fields_is_not_learned(self):
+        registry = TemplateRegistry()
+
+        found = registry.learn('acme.com', 0, make_layout(INVOICE[:2]))
+
+        assert found == {'invoice_number': 'INV-1001'}
+        assert len(registry) == 0
+
+    def test_match_by_vendor_or_hash(self):
+        """Vendors use their own template; unknown senders the nearest by hash."""
+        registry = TemplateRegistry(max_distance=10)
+        acme, other = page_hash(make_page(1)), page_hash(make_page(2))
+        registry.learn('acme.com', acme, make_layout(INVOICE))
+        registry.learn(None, other, make_layout(INVOICE))
+
+        assert registry.match('acme.com', acme)['key'] == 'acme.com'
+        assert registry.match('acme.com', other) is None
+        assert registry.match('new.com', other)['key'] == f'hash:{other:016x}'
+        assert registry.match(None, acme ^ 0b111)['key'] == 'acme.com'
+        assert sorted(registry.keys()) == sorted(['acme.com', f'hash:{other:016x}'])
+
+    def test_json_round_trip(self, tmp_path):
+        """Templates are saved on learning and loaded by a new registry."""
+        path = tmp_path / 'templates' / 'templates.json'
+        page = page_hash(make_page(1))
+        TemplateRegistry(path).learn('acme.com', page, make_layout(INVOICE))
+
+        reopened = TemplateRegistry(path)
+
+        assert reopened.keys() == ['acme.com']
+        assert reopened.match('acme.com', page)['hash'] == f'{page:016x}'
+        assert json.loads(path.read_text())['acme.com']['fields'] == \
+            reopened.match('acme.com', page)['fields']
+        assert list(path.parent.iterdir()) == [path]
+
+    def test_unreadable_file_is_ignored(self, tmp_path):
+        path = tmp_path / 'templates.json'
+        path.write_text('{not json')
+
+        assert len(TemplateRegistry(path)) == 0
+
+
+def test_stack_zones():
+    """Zones are stacked with white gaps and their bands reported."""
+    page = np.zeros((100, 200), np.uint8)
+    zones = {'a': (10, 10, 60, 30), 'b': (0, 50, 100, 60)}
+
+    stacked, bands = stack_zones(page, zones)
+
+    gap = ocr_templates._ZONE_GAP
+    assert stacked.shape == (20 + 10 + 3 * gap, 100 + 2 * gap)
+    assert bands == {'a': (0, gap, 100 + 2 * gap, gap + 20),
+                     'b': (0, 2 * gap + 20, 100 + 2 * gap, 2 * gap + 30)}
+    assert not stacked[gap:gap + 20, gap:gap + 50].any()
+    assert (stacked[:gap] == 255).all()
+
+
+def test_get_template_registry_shares_instances(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_templates, '_registries', {})
+
+    registry = get_template_registry(tmp_path / 'templates.json')
+
+    assert get_template_registry(str(tmp_path / 'templates.json')) is registry
+    assert get_template_registry() is not registry
@@ -0,0 +1,119 @@
+"""
+Unit tests for page preprocessing.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from shared.utils.page_preprocess import preprocess_batch, preprocess_page
+
+
+def legacy_preprocess(image):
+    """The former preprocessing: grayscale, Otsu's threshold, then a 3x3 dilation."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    return cv2.dilate(thresh, kernel, iterations=1)
+
+
+def make_page(seed, height=120, width=160):
+    """Return a noisy BGR page with colored text."""
+    rng = np.random.default_rng(seed)
+    page = rng.integers(180, 256, (height, width, 3), np.uint8)
+    for line in range(3):
+        color = tuple(int(c) for c in rng.integers(0, 120, 3))
+        cv2.putText(page, f'INV {seed}-{line}', (5, 30 + line * 35),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    return page
+
+
+def as_bgr(page):
+    return page
+
+
+def as_bgra(page):
+    return cv2.cvtColor(page, cv2.COLOR_BGR2BGRA)
+
+
+def as_gray(page):
+    return cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+
+
+def as_pil_rgb(page):
+    return Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB))
+
+
+def as_pil_gray(page):
+    return Image.fromarray(as_gray(page))
+
+
+CONVERSIONS = [as_bgr, as_bgra, as_gray, as_pil_rgb, as_pil_gray]
+
+
+@pytest.mark.parametrize('convert', CONVERSIONS)
+def test_preprocess_page_matches_legacy(convert):
+    """Every input layout gives the same result as the former sequence on the BGR page."""
+    page = make_page(1)
+    expected = legacy_preprocess(page)
+
+    assert np.array_equal(preprocess_page(convert(page)), expected)
+
+    out = np.zeros_like(expected)
+    assert preprocess_page(convert(page), out) is out
+    assert np.array_equal(out, expected)
+
+
+@pytest.mark.parametrize('out', [
+    np.zeros((120, 161), np.uint8),
+    np.zeros((160, 120), np.uint8),
+    np.zeros((120, 160, 3), np.uint8),
+    np.zeros((120, 160), np.float32),
+])
+def test_preprocess_page_rejects_wrong_output(out):
+    with pytest.raises(ValueError):
+        preprocess_page(make_page(0), out)
+
+
+def test_preprocess_page_keeps_its_input():
+    page = as_gray(make_page(2))
+    original = page.copy()
+
+    preprocess_page(page)
+
+    assert np.array_equal(page, original)
+
+
+@pytest.mark.parametrize('convert', CONVERSIONS)
+def test_preprocess_batch_matches_legacy(convert):
+    """Otsu's threshold is chosen per page, also when the stack is converted at once."""
+    batch = [make_page(seed) for seed in range(4)]
+    expected = np.stack([legacy_preprocess(page) for page in batch])
+    converted = [convert(page) for page in batch]
+
+    assert np.array_equal(preprocess_batch(converted), expected)
+    if isinstance(converted[0], np.ndarray):
+        out = np.zeros_like(expected)
+        assert preprocess_batch(np.stack(converted), out) is out
+        assert np.array_equal(out, expected)
+
+
+def test_preprocess_batch_of_no_pages():
+    assert preprocess_batch([]).shape == (0, 0, 0)
+
+
+@pytest.mark.parametrize('out', [
+    np.zeros((2, 120, 161), np.uint8),
+    np.zeros((3, 120, 160), np.uint8),
+    np.zeros((2, 120, 160), np.float32),
+    np.zeros((2, 160, 120), np.uint8).transpose(0, 2, 1),
+])
+def test_preprocess_batch_rejects_wrong_output(out):
+    with pytest.raises(ValueError):
+        preprocess_batch(np.stack([make_page(0), make_page(1)]), out)
+
+
+def test_preprocess_batch_rejects_mixed_sizes():
+    with pytest.raises(ValueError):
+        preprocess_batch([make_page(0), make_page(1, width=200)])
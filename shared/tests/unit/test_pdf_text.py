@@ -0,0 +1,158 @@
+"""
+Unit tests for PDF text layer extraction.
+"""
+
+import os
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from shared.utils import local_ocr, pdf_text
+from shared.utils.local_ocr import LocalOCRProcessor
+from shared.utils.pdf_text import extract_text_layer, is_usable_text, page_runs
+
+READABLE = 'Invoice FV/2025/05/17 issued on 2025-05-17, total 1,234.56 EUR'
+
+
+class TestIsUsableText:
+    """Test cases for is_usable_text."""
+
+    def test_readable_page(self):
+        assert is_usable_text(READABLE)
+
+    def test_too_few_characters(self):
+        """Whitespace does not count towards min_chars."""
+        assert not is_usable_text('  Page 1 \n\n  ')
+        assert not is_usable_text('a b c d e f g h i j k l m n o p q r s', min_chars=20)
+        assert is_usable_text('a b c d e f g h i j k l m n o p q r s', min_chars=19)
+
+    def test_garbage_characters(self):
+        """Replacement and control characters above max_garbage_ratio mean a broken encoding."""
+        assert not is_usable_text('�' * 10 + 'x' * 20)
+        assert is_usable_text('�' * 2 + 'x' * 20)
+        assert not is_usable_text('\x01\x02\x03' + 'x' * 20, max_garbage_ratio=0.1)
+
+
+@pytest.mark.parametrize('numbers, expected', [
+    ([1, 2, 3, 7, 9, 10], [(1, 3), (7, 7), (9, 10)]),
+    ([10, 9, 9, 2], [(2, 2), (9, 10)]),
+    ([], []),
+])
+def test_page_runs(numbers, expected):
+    assert page_runs(numbers) == expected
+
+
+class TestExtractTextLayer:
+    """Test cases for extract_text_layer with pdftotext mocked."""
+
+    @pytest.fixture
+    def pdftotext(self, monkeypatch):
+        """Replace pdftotext; returns the recorded calls and lets a test set the output."""
+        calls = []
+        output = SimpleNamespace(stdout=b'', returncode=0)
+
+        def run(args, **kwargs):
+            calls.append(args)
+            pdf = args[-2]
+            assert os.path.exists(pdf)
+            return SimpleNamespace(stdout=output.stdout, stderr=b'', returncode=output.returncode)
+        monkeypatch.setattr(pdf_text.shutil, 'which', lambda cmd: f'/usr/bin/{cmd}')
+        monkeypatch.setattr(pdf_text.subprocess, 'run', run)
+        return SimpleNamespace(calls=calls, output=output)
+
+    def test_splits_pages_at_form_feeds(self, pdftotext):
+        pdftotext.output.stdout = 'page one\fpage two\f'.encode()
+
+        assert extract_text_layer(b'%PDF') == ['page one', 'page two']
+
+    def test_keeps_a_trailing_blank_page(self, pdftotext):
+        """Only the empty string after the last form feed is dropped."""
+        pdftotext.output.stdout = 'page one\f\f'.encode()
+        assert extract_text_layer(b'%PDF') == ['page one', '']
+
+        pdftotext.output.stdout = 'page one\f\fpage three\f'.encode()
+        assert extract_text_layer(b'%PDF') == ['page one', '', 'page three']
+
+    def test_bytes_are_written_to_a_temporary_file(self, pdftotext):
+        pdftotext.output.stdout = 'page two\f'.encode()
+
+        assert extract_text_layer(b'%PDF', first_page=2, last_page=2) == ['page two']
+
+        [args] = pdftotext.calls
+        assert args[:4] == ['pdftotext', '-layout', '-enc', 'UTF-8']
+        assert args[4:8] == ['-f', '2', '-l', '2']
+        assert args[-1] == '-'
+        assert not os.path.exists(args[-2])
+
+    def test_path_is_read_in_place(self, pdftotext, tmp_path):
+        path = tmp_path / 'doc.pdf'
+        path.write_bytes(b'%PDF')
+
+        extract_text_layer(path)
+
+        assert pdftotext.calls[0][-2] == str(path)
+        assert path.exists()
+
+    def test_failures_return_none(self, pdftotext, monkeypatch):
+        pdftotext.output.returncode = 1
+        assert extract_text_layer(b'%PDF') is None
+
+        def timeout(args, **kwargs):
+            raise subprocess.TimeoutExpired(args, 1)
+        monkeypatch.setattr(pdf_text.subprocess, 'run', timeout)
+        assert extract_text_layer(b'%PDF') is None
+
+        monkeypatch.setattr(pdf_text.shutil, 'which', lambda cmd: None)
+        assert extract_text_layer(b'%PDF') is None
+
+
+def test_process_pages_ocrs_only_pages_without_a_text_layer(monkeypatch):
+    """Readable pages keep their text; the others are rendered in runs and OCR'd."""
+    processor = LocalOCRProcessor({'use_text_layer': True})
+    layer = [READABLE, '', READABLE + ' (2)', '  \n', '�' * 30]
+    rendered = []
+
+    def render_pdf(pdf_data, first_page=None, last_page=None, dpi=None):
+        rendered.append((first_page, last_page))
+        # Each rendered page is filled with its page number
+        return [Image.new('L', (8, 8), number) for number in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(local_ocr, 'extract_text_layer', lambda pdf, first, last: layer)
+    monkeypatch.setattr(processor, 'render_pdf', render_pdf)
+    monkeypatch.setattr(processor, '_recognize_page', lambda img, languages=None: {
+        'text': f'ocr of page {img[0, 0]}', 'confidence': None
+    })
+
+    pages = processor._process_pages(b'%PDF')
+
+    assert rendered == [(2, 2), (4, 5)]
+    assert [(p['page_number'], p['method'], p['text']) for p in pages] == [
+        (1, 'text_layer', READABLE),
+        (2, 'ocr', 'ocr of page 2'),
+        (3, 'text_layer', READABLE + ' (2)'),
+        (4, 'ocr', 'ocr of page 4'),
+        (5, 'ocr', 'ocr of page 5'),
+    ]
+    assert all('image_path' not in page for page in pages)
+
+
+def test_process_pages_without_text_layer_ocrs_the_range(monkeypatch):
+    """When pdftotext is unavailable the requested range is rendered as a whole."""
+    processor = LocalOCRProcessor({'use_text_layer': True})
+    rendered = []
+
+    def render_pdf(pdf_data, first_page=None, last_page=None, dpi=None):
+        rendered.append((first_page, last_page))
+        return [Image.new('L', (8, 8), 0) for _ in range(3)]
+
+    monkeypatch.setattr(local_ocr, 'extract_text_layer', lambda pdf, first, last: None)
+    monkeypatch.setattr(processor, 'render_pdf', render_pdf)
+    monkeypatch.setattr(processor, '_recognize_page',
+                        lambda img, languages=None: {'text': 'ocr', 'confidence': None})
+
+    pages = processor._process_pages(b'%PDF', first_page=4, last_page=6)
+
+    assert rendered == [(4, 6)]
+    assert [(p['page_number'], p['method']) for p in pages] == [(4, 'ocr'), (5, 'ocr'), (6, 'ocr')]
@@ -0,0 +1,129 @@
+"""
+Unit tests for the warm Tesseract worker pool.
+"""
+
+import multiprocessing
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from shared.utils import tesseract_pool
+from shared.utils.tesseract_pool import TesseractWorkerPool
+
+# Image value that makes a stub worker exit as if Tesseract had crashed
+CRASH = 255
+
+
+class StubTessBaseAPI:
+    """Stand-in for ``tesserocr.PyTessBaseAPI`` reading an image's first pixel.
+
+    Lower values take longer, so later images of a batch finish first.
+    """
+
+    def __init__(self, lang, oem, psm, path=None):
+        self.value = None
+
+    def SetImage(self, image):
+        self.value = image.getpixel((0, 0))
+        if self.value == CRASH:
+            os._exit(1)
+        time.sleep((10 - self.value) * 0.02)
+
+    def Recognize(self, timeout):
+        # Milliseconds; pretend recognition takes as long as SetImage slept
+        return timeout >= (10 - self.value) * 20
+
+    def GetUTF8Text(self):
+        return f'image {self.value} {os.getpid()}\n'
+
+    def GetTSVText(self, page):
+        return f'tsv {self.value}'
+
+    def MeanTextConf(self):
+        return 90
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Forked workers inherit the stub engine
+    monkeypatch.setattr(tesseract_pool, 'HAS_TESSEROCR', True)
+    monkeypatch.setattr(tesseract_pool, 'tesserocr',
+                        SimpleNamespace(PyTessBaseAPI=StubTessBaseAPI), raising=False)
+    monkeypatch.setattr(tesseract_pool, 'Image', Image, raising=False)
+    pool = TesseractWorkerPool(workers=2)
+    yield pool
+    pool.close()
+
+
+def image(value):
+    return np.full((4, 4), value, np.uint8)
+
+
+def test_requires_tesserocr(monkeypatch):
+    monkeypatch.setattr(tesseract_pool, 'HAS_TESSEROCR', False)
+
+    with pytest.raises(ImportError):
+        TesseractWorkerPool()
+
+
+def test_results_keep_input_order(pool):
+    results = pool.recognize_many([image(value) for value in range(6)])
+
+    assert [text.split()[:2] for text, _, _ in results] == [
+        ['image', str(value)] for value in range(6)
+    ]
+    assert all(confidence == 90.0 and error is None for _, confidence, error in results)
+    assert pool.recognize(image(3)).startswith('image 3')
+    assert pool.recognize_with_confidence(image(3))[1] == 90.0
+    assert pool.recognize_tsv(image(4)) == 'tsv 4'
+    assert pool.recognize_many([image(5), image(6)], tsv=True) == [
+        ('tsv 5', 90.0, None), ('tsv 6', 90.0, None)
+    ]
+
+
+def test_timeout(pool):
+    with pytest.raises(RuntimeError, match='timed out'):
+        pool.recognize(image(0), timeout=0.01)
+
+    results = pool.recognize_many([image(0), image(9)], timeout=0.05)
+
+    assert results[0] == ('', None, 'Tesseract worker timed out')
+    assert results[1][0].startswith('image 9') and results[1][2] is None
+
+
+def test_result_timeout(pool):
+    """Workers time Tesseract once they hold a slot, so the slot wait comes on top."""
+    assert pool._result_timeout(None) is None
+    assert pool._result_timeout(30) == 35.0
+
+    pool._governor = object()
+    assert pool._result_timeout(30) is None
+    pool._slot_timeout = 60
+    assert pool._result_timeout(30) == 95.0
+
+
+def test_workers_are_restarted_after_a_crash(pool):
+    results = pool.recognize_many([image(CRASH)])
+
+    assert results[0][0] == '' and results[0][2]
+    with pytest.raises(RuntimeError):
+        pool.recognize(image(CRASH))
+    assert pool.recognize(image(7)).startswith('image 7')
+    assert [error for _, _, error in pool.recognize_many([image(1), image(2)])] == [None, None]
+
+
+def test_close_stops_the_workers(pool):
+    pids = {int(text.split()[2]) for text, _, _ in pool.recognize_many([image(9)] * 4)}
+
+    pool.close()
+
+    deadline = time.monotonic() + 10
+    while any(child.pid in pids for child in multiprocessing.active_children()):
+        assert time.monotonic() < deadline, 'Workers still running'
+        time.sleep(0.05)
+    with pytest.raises(RuntimeError):
+        pool.recognize(image(1))
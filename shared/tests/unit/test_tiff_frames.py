@@ -0,0 +1,73 @@
+"""
+Unit tests for reading multi-page TIFFs frame by frame.
+"""
+
+import pytest
+from PIL import Image
+
+from shared.utils.tiff_frames import frame_count, is_tiff, iter_frames
+
+
+@pytest.fixture
+def tiff_bytes(tmp_path):
+    """Return a four-page TIFF at 200 DPI: bilevel, RGB, palette and grayscale pages."""
+    pages = [
+        Image.new('1', (40, 30), 1),
+        Image.new('RGB', (40, 30), (200, 10, 10)),
+        Image.new('RGB', (40, 30), (10, 200, 10)).convert('P'),
+        Image.new('L', (40, 30), 77),
+    ]
+    path = tmp_path / 'fax.tiff'
+    pages[0].save(path, save_all=True, append_images=pages[1:], dpi=(200, 200))
+    return path.read_bytes()
+
+
+def test_is_tiff(tiff_bytes):
+    assert is_tiff(tiff_bytes)
+    assert is_tiff(bytearray(b'MM\x00*rest'))
+    assert not is_tiff(b'%PDF-1.7')
+
+
+def test_frame_count(tiff_bytes, tmp_path):
+    path = tmp_path / 'copy.tif'
+    path.write_bytes(tiff_bytes)
+
+    assert frame_count(tiff_bytes) == 4
+    assert frame_count(path) == 4
+    assert frame_count(str(path)) == 4
+
+
+def test_iter_frames_converts_each_page(tiff_bytes):
+    """Color frames come out as RGB and all others as 8-bit grayscale."""
+    frames = list(iter_frames(tiff_bytes))
+
+    assert [(number, frame.mode, dpi) for number, frame, dpi in frames] == [
+        (1, 'L', 200), (2, 'RGB', 200), (3, 'L', 200), (4, 'L', 200),
+    ]
+    assert all(frame.size == (40, 30) for _, frame, _ in frames)
+    assert frames[0][1].getpixel((0, 0)) == 255
+    assert frames[1][1].getpixel((0, 0)) == (200, 10, 10)
+    assert frames[3][1].getpixel((0, 0)) == 77
+
+
+@pytest.mark.parametrize('first, last, expected', [
+    (2, 3, [2, 3]),
+    (3, None, [3, 4]),
+    (None, 1, [1]),
+    (3, 10, [3, 4]),
+    (5, None, []),
+])
+def test_iter_frames_range(tiff_bytes, first, last, expected):
+    assert [number for number, _, _ in iter_frames(tiff_bytes, first, last)] == expected
+
+
+def test_iter_frames_without_resolution(tmp_path):
+    path = tmp_path / 'plain.tif'
+    Image.new('L', (10, 10)).save(path)
+
+    assert [(number, dpi) for number, _, dpi in iter_frames(path)] == [(1, None)]
+
+
+def test_iter_frames_rejects_other_files():
+    with pytest.raises(OSError):
+        list(iter_frames(b'%PDF-1.7 not an image'))
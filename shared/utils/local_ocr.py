@@ -6,20 +6,88 @@ Uses Tesseract OCR for text extraction from images and PDFs.
 """
 import os
 import io
+import contextlib
 import logging
 import tempfile
 import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union, BinaryIO
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, Union, BinaryIO
 
 import cv2
 import numpy as np
 from PIL import Image
 import pytesseract
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_path
 from dialogchain.utils.logger import setup_logger
+
+from .ocr_cache import (
+    DEFAULT_MAX_DISK_BYTES,
+    DEFAULT_MEMORY_ITEMS,
+    content_digest,
+    get_ocr_cache,
+    make_key,
+)
+from .ocr_governor import DEFAULT_SLOT_DIR, OCRSlot, get_ocr_governor
+from .ocr_language import guess_language
+from .ocr_layout import OCRLayout, parse_tsv
+from .ocr_templates import DEFAULT_MAX_DISTANCE, get_template_registry, page_hash, stack_zones
+from .page_preprocess import preprocess_batch, preprocess_page
+from .pdf_text import DEFAULT_MIN_TEXT_CHARS, extract_text_layer, is_usable_text, page_runs
+from .tesseract_pool import HAS_TESSEROCR, TesseractWorkerPool
+from .tiff_frames import TIFF_EXTENSIONS, TiffSource, iter_frames
 logger = setup_logger(__name__)
 
+DEFAULT_TESSDATA_DIR = '/usr/share/tesseract-ocr/4.00/tessdata'
+
+# Bump when preprocess_image changes so cached OCR results are not reused
+PREPROCESS_VERSION = 1
+
+# Extra time allowed for a page worker beyond the Tesseract timeout (and the
+# OCR slot timeout with the governor)
+_PAGE_TIMEOUT_GRACE = 5.0
+
+# Ink blobs smaller than this share of the page are treated as noise when
+# looking for the text region
+_MIN_REGION_AREA = 1e-4
+
+# Share of the text region, from the top, that the language probe reads
+_LANGUAGE_SAMPLE_SHARE = 1 / 3
+
+# Vendors whose detected language is remembered
+_MAX_VENDOR_LANGUAGES = 1024
+
+# Pages with more pixels than this (A4 at 600 DPI has 35 million) are OCR'd
+# in bands, which are never fewer than _MIN_TILE_ROWS rows high
+DEFAULT_MAX_IMAGE_PIXELS = 40_000_000
+_MIN_TILE_ROWS = 256
+
+# OCR processor of a page worker process, created by _init_page_worker
+_page_processor = None
+
+
+def _init_page_worker(config: Dict[str, Any]) -> None:
+    """Create the OCR processor of a page worker process."""
+    global _page_processor
+    _page_processor = LocalOCRProcessor(config)
+
+
+def _ocr_page_in_worker(image: Any, languages: Optional[List[str]] = None) -> Dict[str, Any]:
+    """OCR one rendered page inside a page worker process.
+    
+    With the governor, the time the page waited for an OCR slot is returned
+    as ``slot_wait`` so the parent can account for it. Tesseract's
+    ``page_timeout`` only starts once the slot is held.
+    """
+    with _page_processor._slot() as slot:
+        result = _page_processor._recognize_page(_page_processor.load_image(image), languages)
+    if slot is not None:
+        result['slot_wait'] = slot.waited
+    return result
+
+
 class LocalOCRProcessor:
     """Local OCR processor using Tesseract OCR."""
     
@@ -43,13 +111,112 @@ class LocalOCRProcessor:
         self.psm = self.config.get('psm', 6)  # 6 = Assume single uniform block of text
         self.use_gpu = self.config.get('use_gpu', False)
         self.max_threads = self.config.get('max_threads', 4)
+        self.tessdata_dir = self.config.get('tessdata_dir', DEFAULT_TESSDATA_DIR)
+        
+        # Host-wide OCR slots sized from the cores actually available; the
+        # governor then owns the thread limits and every Tesseract, OpenCV
+        # and pdf2image call runs with one slot's threads
+        self.governor = None
+        self.slot_timeout = self.config.get('slot_timeout')  # seconds
+        self._governor_settings = None
+        if self.config.get('governor'):
+            self._governor_settings = {
+                'slots': self.config.get('governor_slots'),
+                'threads_per_slot': self.config.get('threads_per_slot', 1),
+                'slot_dir': self.config.get('slot_dir', DEFAULT_SLOT_DIR),
+            }
+            self.governor = get_ocr_governor(**self._governor_settings)
+            self.max_threads = self.governor.threads_per_slot
         
-        # Configure OpenCV threading
-        cv2.setNumThreads(self.max_threads)
+        # OCR engine: 'pytesseract' starts tesseract per image, 'tesserocr'
+        # keeps warm workers with the language models loaded
+        self.engine = self.config.get('engine', 'pytesseract')
+        if self.engine == 'tesserocr' and not HAS_TESSEROCR:
+            self.logger.warning("tesserocr is not installed; falling back to pytesseract")
+            self.engine = 'pytesseract'
+        self._engine_pool = None
+        self._pool_lock = threading.Lock()
         
-        # Set environment variables for Tesseract
-        os.environ['OMP_THREAD_LIMIT'] = str(self.max_threads)
-        os.environ['OMP_NUM_THREADS'] = str(self.max_threads)
+        # Page-parallel PDF OCR: one process per page, sized from max_threads
+        self.parallel_pages = self.config.get('parallel_pages', False)
+        self.page_workers = max(int(
+            self.config.get('page_workers')
+            or (self.governor.slots if self.governor else self.max_threads)
+        ), 1)
+        self.page_timeout = self.config.get('page_timeout')  # seconds per page
+        self._page_pool = None
+        
+        # Keep rendered PDF pages in memory instead of JPEG files under temp_dir
+        self.in_memory = self.config.get('in_memory', False)
+        
+        # Use the embedded text of born-digital PDF pages and OCR only scans
+        self.use_text_layer = self.config.get('use_text_layer', False)
+        self.min_text_chars = self.config.get('min_text_chars', DEFAULT_MIN_TEXT_CHARS)
+        
+        # PDF pages rasterized (or TIFF frames decoded) at a time when streaming
+        self.chunk_pages = max(int(self.config.get('chunk_pages', 10)), 1)
+        
+        # Adaptive resolution: OCR pages at probe_dpi and re-render only those
+        # whose mean word confidence is below min_confidence at dpi
+        self.adaptive_dpi = self.config.get('adaptive_dpi', False)
+        self.probe_dpi = self.config.get('probe_dpi', 150)
+        self.min_confidence = self.config.get('min_confidence', 70)
+        
+        # Crop margins and skip blank pages before recognition
+        self.crop_margins = self.config.get('crop_margins', self.adaptive_dpi)
+        
+        # Huge pages are preprocessed and recognized in horizontal bands of at
+        # most max_image_pixels, cut at blank rows, so no full-size copy of
+        # them is made beyond the decoded image
+        self.max_image_pixels = int(
+            self.config.get('max_image_pixels', DEFAULT_MAX_IMAGE_PIXELS)
+        )
+        
+        # Keep word, line and block boxes of OCR'd pages as OCRLayout arrays
+        self.structured = self.config.get('structured', False)
+        
+        # Auto language: probe a low-resolution sample of a document's first
+        # OCR'd page (or reuse the vendor's earlier result) and OCR with only
+        # the language found; pages below min_confidence are OCR'd again with
+        # all languages
+        self.auto_language = self.config.get('auto_language', False) and len(self.languages) > 1
+        if self.auto_language and self.engine == 'tesserocr':
+            self.logger.warning("auto_language needs the pytesseract engine; disabling it")
+            self.auto_language = False
+        self.language_probe_width = self.config.get('language_probe_width', 1000)
+        self._vendor_languages: 'OrderedDict[str, List[str]]' = OrderedDict()
+        self._vendor_lock = threading.Lock()
+        
+        # Vendor layout templates: learn where page 1 of a vendor's invoices
+        # has its number, date and total, and OCR only those zones of later
+        # pages with the same layout, falling back to the full page
+        self.templates = None
+        if self.config.get('templates') or self.config.get('template_path'):
+            self.templates = get_template_registry(
+                self.config.get('template_path'),
+                max_distance=self.config.get('template_max_distance', DEFAULT_MAX_DISTANCE)
+            )
+        
+        # Templates are learned from the layouts of fully OCR'd pages
+        self._layouts = self.structured or self.templates is not None
+        
+        # OCR result cache keyed by content hash and OCR parameters
+        self.cache = None
+        if self.config.get('cache_enabled') or self.config.get('cache_path'):
+            self.cache = get_ocr_cache(
+                self.config.get('cache_path'),
+                max_bytes=int(self.config.get('cache_max_mb', 0) * 1024 * 1024)
+                or DEFAULT_MAX_DISK_BYTES,
+                memory_items=self.config.get('cache_memory_items', DEFAULT_MEMORY_ITEMS)
+            )
+        
+        if self.governor is None:
+            # Configure OpenCV threading
+            cv2.setNumThreads(self.max_threads)
+            
+            # Set environment variables for Tesseract
+            os.environ['OMP_THREAD_LIMIT'] = str(self.max_threads)
+            os.environ['OMP_NUM_THREADS'] = str(self.max_threads)
         
         # Create temp directory if it doesn't exist
         self.temp_dir = Path(self.config.get('temp_dir', tempfile.mkdtemp(prefix='ocr_'))) 
@@ -58,7 +225,13 @@ class LocalOCRProcessor:
         self.logger.info(f"Initialized LocalOCRProcessor with config: {self.config}")
     
     def cleanup(self):
-        """Clean up temporary files."""
+        """Clean up temporary files and stop page workers."""
+        if getattr(self, '_page_pool', None) is not None:
+            self._page_pool.shutdown(wait=False, cancel_futures=True)
+            self._page_pool = None
+        if getattr(self, '_engine_pool', None) is not None:
+            self._engine_pool.close()
+            self._engine_pool = None
         if hasattr(self, 'temp_dir') and self.temp_dir.exists():
             shutil.rmtree(self.temp_dir, ignore_errors=True)
     
@@ -76,134 +249,1179 @@ class LocalOCRProcessor:
             Preprocessed image as numpy array
         """
         try:
-            # Convert to grayscale
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image
+            # Grayscale, Otsu threshold and dilation to connect text components,
+            # with a cached kernel and reused intermediate buffers
+            return preprocess_page(image)
+        except Exception as e:
+            self.logger.warning(f"Error in image preprocessing: {e}")
+            return image  # Return original if preprocessing fails
+    
+    def preprocess_batch(
+        self, pages: Union[np.ndarray, List[Union[np.ndarray, Image.Image]]]
+    ) -> np.ndarray:
+        """Preprocess a stack of equally sized pages as ``preprocess_image`` does each.
+        
+        Args:
+            pages: ``(n, height, width[, 3])`` BGR or grayscale array, or a
+                list of numpy or PIL pages of the same size
+            
+        Returns:
+            The preprocessed pages as one ``(n, height, width)`` array
+            
+        Raises:
+            ValueError: If the pages differ in size
+        """
+        return preprocess_batch(pages)
+    
+    def load_image(
+        self, image: Union[str, Path, bytes, BinaryIO, np.ndarray, Image.Image]
+    ) -> np.ndarray:
+        """Load an image file, encoded bytes, file-like object, PIL image or numpy array.
+        
+        Files are decoded as BGR arrays; PIL images rendered in grayscale stay
+        single-channel so preprocessing can skip the color conversion.
+        
+        Raises:
+            ValueError: If the image cannot be decoded
+        """
+        if isinstance(image, (str, Path)):
+            img = cv2.imread(str(image))
+        elif isinstance(image, (bytes, bytearray)):
+            img = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        elif isinstance(image, Image.Image):
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert('RGB')
+            img = np.asarray(image)
+            if img.ndim == 3:
+                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        elif hasattr(image, 'read'):  # File-like object
+            img_array = np.frombuffer(image.read(), np.uint8)
+            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+        else:  # Assume it's a numpy array
+            img = image
+        
+        if img is None:
+            raise ValueError("Could not load image")
+        return img
+    
+    def detect_text_region(self, binary: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """Find the bounding box of the text on a preprocessed page.
+        
+        Ink is closed into line-sized blobs so that specks of scanner noise,
+        which stay small, can be ignored; the region is the union of the
+        remaining blobs plus a margin.
+        
+        Args:
+            binary: Preprocessed (thresholded) image
             
-            # Apply thresholding to get binary image
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        Returns:
+            ``(x, y, width, height)``, or None if the page is blank
+        """
+        if binary.ndim == 3:
+            binary = cv2.cvtColor(binary, cv2.COLOR_BGR2GRAY)
+        height, width = binary.shape
+        ink = cv2.threshold(binary, 127, 255, cv2.THRESH_BINARY_INV)[1]
+        if cv2.countNonZero(ink) > ink.size // 2:  # Light text on a dark background
+            ink = cv2.bitwise_not(ink)
+        
+        step = max(width // 100, 3)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (step, max(step // 3, 1)))
+        blobs = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, kernel)
+        contours, _ = cv2.findContours(blobs, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = _MIN_REGION_AREA * width * height
+        boxes = [box for box in map(cv2.boundingRect, contours) if box[2] * box[3] >= min_area]
+        if not boxes:
+            return None
+        
+        margin = max(step, 10)
+        x0 = max(min(x for x, _, _, _ in boxes) - margin, 0)
+        y0 = max(min(y for _, y, _, _ in boxes) - margin, 0)
+        x1 = min(max(x + w for x, _, w, _ in boxes) + margin, width)
+        y1 = min(max(y + h for _, y, _, h in boxes) + margin, height)
+        return x0, y0, x1 - x0, y1 - y0
+    
+    def _prepare(self, img: np.ndarray) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+        """Preprocess a loaded image and crop it to its text region.
+        
+        Returns:
+            The image to recognize, or None if ``crop_margins`` found it blank,
+            and the ``(x, y)`` origin of the crop in the loaded image
+        """
+        processed_img = self.preprocess_image(img)
+        if not self.crop_margins:
+            return processed_img, (0, 0)
+        region = self.detect_text_region(processed_img)
+        if region is None:
+            return None, (0, 0)
+        x, y, w, h = region
+        return processed_img[y:y + h, x:x + w], (x, y)
+    
+    def _needs_tiles(self, img: np.ndarray) -> bool:
+        """Tell whether a page is too large to preprocess and recognize in one piece."""
+        height, width = img.shape[:2]
+        return height * width > self.max_image_pixels and height > 2 * _MIN_TILE_ROWS
+    
+    def _tile_rows(self, img: np.ndarray) -> List[Tuple[int, int]]:
+        """Split a large page into bands of at most ``max_image_pixels`` pixels.
+        
+        Each band ends at the row with the least ink in its last quarter, so
+        text lines are not cut in half.
+        
+        Returns:
+            ``(top, bottom)`` rows of each band, covering the page
+        """
+        height, width = img.shape[:2]
+        rows = max(self.max_image_pixels // width, _MIN_TILE_ROWS)
+        bands = []
+        top = 0
+        while height - top > rows:
+            start = top + rows * 3 // 4
+            window = img[start:top + rows]
+            if window.ndim == 3:
+                window = cv2.cvtColor(window, cv2.COLOR_BGR2GRAY)
+            cut = start + int(np.argmin(np.count_nonzero(window < 128, axis=1)))
+            bands.append((top, cut))
+            top = cut
+        bands.append((top, height))
+        return bands
+    
+    def _recognize_tiled(
+        self, img: np.ndarray, languages: Optional[List[str]] = None
+    ) -> Optional[OCRLayout]:
+        """Recognize a large page band by band and merge the bands into one layout.
+        
+        Returns:
+            The layout in the pixel coordinates of ``img``, or None if every
+            band is blank
+        """
+        merged: Dict[str, List[Any]] = {}
+        blocks = 0
+        for top, bottom in self._tile_rows(img):
+            with self._slot():
+                processed_img, (x, y) = self._prepare(img[top:bottom])
+                if processed_img is None:
+                    continue
+                data = self._recognize_data(processed_img, languages)
+            data['left'] = [left + x for left in data['left']]
+            data['top'] = [row + y + top for row in data['top']]
+            data['block_num'] = [int(block) + blocks for block in data['block_num']]
+            blocks = max(data['block_num'], default=blocks)
+            for column, values in data.items():
+                merged.setdefault(column, []).extend(values)
+        if not merged:
+            return None
+        return OCRLayout.from_tesseract(merged, size=(img.shape[1], img.shape[0]))
+    
+    def _slot(self) -> 'contextlib.AbstractContextManager[Optional[OCRSlot]]':
+        """Hold one of the governor's OCR slots, if there is a governor.
+        
+        The tesserocr workers hold slots themselves while they recognize.
+        
+        Raises:
+            TimeoutError: If no slot became free within ``slot_timeout``
+        """
+        if self.governor is None or self.engine == 'tesserocr':
+            return contextlib.nullcontext()
+        return self.governor.slot(timeout=self.slot_timeout)
+    
+    def _render_slot(self) -> 'contextlib.AbstractContextManager[Optional[OCRSlot]]':
+        """Hold one of the governor's slots while Poppler rasterizes, if there is a governor."""
+        if self.governor is None:
+            return contextlib.nullcontext()
+        return self.governor.slot(timeout=self.slot_timeout)
+    
+    def tesseract_config(self, languages: Optional[List[str]] = None) -> str:
+        """Build the Tesseract command line options, for ``languages`` if given."""
+        config = f'--oem {self.oem} --psm {self.psm} -l {"+".join(languages or self.languages)}'
+        if self.tessdata_dir:
+            config += f' --tessdata-dir {self.tessdata_dir}'
+        return config
+    
+    def recognize(self, img: np.ndarray, languages: Optional[List[str]] = None) -> str:
+        """Preprocess a loaded image and run Tesseract on it.
+        
+        Args:
+            img: Loaded image
+            languages: Languages to recognize (defaults to ``languages``)
             
-            # Apply dilation to connect text components
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-            dilated = cv2.dilate(thresh, kernel, iterations=1)
+        Raises:
+            RuntimeError: If Tesseract fails or exceeds ``page_timeout``
+        """
+        if self._needs_tiles(img):
+            layout = self._recognize_tiled(img, languages)
+            return layout.text if layout is not None else ''
+        with self._slot():
+            processed_img, _ = self._prepare(img)
+            if processed_img is None:
+                return ''
+            if self.engine == 'tesserocr':
+                return self._get_engine_pool().recognize(
+                    processed_img, timeout=self.page_timeout or None
+                ).strip()
+            text = pytesseract.image_to_string(
+                processed_img,
+                config=self.tesseract_config(languages),
+                output_type=pytesseract.Output.STRING,
+                timeout=self.page_timeout or 0
+            )
+            return text.strip()
+    
+    def recognize_with_confidence(
+        self, img: np.ndarray, languages: Optional[List[str]] = None
+    ) -> Tuple[str, Optional[float]]:
+        """Recognize a loaded image and score it by Tesseract's word confidences.
+        
+        Returns:
+            The text and the mean confidence (0-100) of its words; the
+            confidence is 0 if no words were found and None for a blank page
             
-            return dilated
+        Raises:
+            RuntimeError: If Tesseract fails or exceeds ``page_timeout``
+        """
+        if self._needs_tiles(img):
+            layout = self._recognize_tiled(img, languages)
+            return (layout.text, layout.mean_confidence()) if layout is not None else ('', None)
+        with self._slot():
+            processed_img, _ = self._prepare(img)
+            if processed_img is None:
+                return '', None
+            if self.engine == 'tesserocr':
+                text, confidence = self._get_engine_pool().recognize_with_confidence(
+                    processed_img, timeout=self.page_timeout or None
+                )
+                return text.strip(), confidence
+        
+            layout = OCRLayout.from_tesseract(self._recognize_data(processed_img, languages))
+            return layout.text, layout.mean_confidence()
+    
+    def _recognize_data(
+        self, processed_img: np.ndarray, languages: Optional[List[str]] = None
+    ) -> Dict[str, List[Any]]:
+        """Run Tesseract on a prepared image and return its word-level output columns."""
+        if self.engine == 'tesserocr':
+            return parse_tsv(self._get_engine_pool().recognize_tsv(
+                processed_img, timeout=self.page_timeout or None
+            ))
+        return pytesseract.image_to_data(
+            processed_img,
+            config=self.tesseract_config(languages),
+            output_type=pytesseract.Output.DICT,
+            timeout=self.page_timeout or 0
+        )
+    
+    def recognize_layout(self, img: np.ndarray) -> OCRLayout:
+        """Recognize a loaded image and keep Tesseract's word, line and block boxes.
+        
+        Boxes are in the pixel coordinates of ``img``, also when ``crop_margins``
+        recognized only its text region.
+        
+        Returns:
+            The layout; empty for a blank page
             
+        Raises:
+            RuntimeError: If Tesseract fails or exceeds ``page_timeout``
+        """
+        layout = self._recognize_layout(img)
+        return layout if layout is not None else OCRLayout.empty((img.shape[1], img.shape[0]))
+    
+    def _recognize_layout(
+        self, img: np.ndarray, languages: Optional[List[str]] = None
+    ) -> Optional[OCRLayout]:
+        """Like ``recognize_layout``, but None for a page ``crop_margins`` found blank."""
+        if self._needs_tiles(img):
+            return self._recognize_tiled(img, languages)
+        with self._slot():
+            processed_img, offset = self._prepare(img)
+            if processed_img is None:
+                return None
+            data = self._recognize_data(processed_img, languages)
+        return OCRLayout.from_tesseract(data, offset, (img.shape[1], img.shape[0]))
+    
+    def _recognize_page(
+        self, img: np.ndarray, languages: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Recognize a page, scoring it only when ``adaptive_dpi`` or ``auto_language`` needs it.
+        
+        Returns:
+            The page's ``text`` and ``confidence``, and with ``structured``
+            or ``templates`` its ``layout``
+        """
+        scored = self.adaptive_dpi or self.auto_language
+        if self._layouts:
+            layout = self._recognize_layout(img, languages)
+            if layout is None:
+                return {'text': '', 'confidence': None,
+                        'layout': OCRLayout.empty((img.shape[1], img.shape[0]))}
+            confidence = layout.mean_confidence() if scored else None
+            return {'text': layout.text, 'confidence': confidence, 'layout': layout}
+        if scored:
+            text, confidence = self.recognize_with_confidence(img, languages)
+            return {'text': text, 'confidence': confidence}
+        return {'text': self.recognize(img, languages), 'confidence': None}
+    
+    def detect_languages(self, img: np.ndarray) -> List[str]:
+        """Probe a low-resolution sample of a page for the language it is written in.
+        
+        The top of the page's text region, where invoices name the document
+        and the parties, is downscaled to ``language_probe_width`` and read
+        with all ``languages``; ``guess_language`` then looks for letters and
+        words distinctive of one of them.
+        
+        Returns:
+            The detected language alone, or all ``languages`` if the sample
+            is blank, too short or ambiguous
+        """
+        try:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+            height, width = gray.shape
+            scale = min(self.language_probe_width / width, 1.0)
+            if scale < 1.0:
+                gray = cv2.resize(gray, (round(width * scale), round(height * scale)),
+                                  interpolation=cv2.INTER_AREA)
+            region = self.detect_text_region(self.preprocess_image(gray))
+            if region is None:
+                return list(self.languages)
+            x, y, w, h = region
+            sample = gray[y:y + max(round(h * _LANGUAGE_SAMPLE_SHARE), 1), x:x + w]
+            with self._slot():
+                text = pytesseract.image_to_string(
+                    sample, config=self.tesseract_config(), timeout=self.page_timeout or 0
+                )
         except Exception as e:
-            self.logger.warning(f"Error in image preprocessing: {e}")
-            return image  # Return original if preprocessing fails
+            self.logger.warning(f"Language probe failed: {e}")
+            return list(self.languages)
+        
+        language = guess_language(text, self.languages)
+        self.logger.debug(f"Language probe: {language or 'inconclusive'}")
+        return [language] if language else list(self.languages)
+    
+    def _document_languages(self, img: np.ndarray, vendor: Optional[str] = None) -> List[str]:
+        """Return the languages to OCR a document with: the vendor's last ones, or a probe's."""
+        if vendor:
+            with self._vendor_lock:
+                if vendor in self._vendor_languages:
+                    self._vendor_languages.move_to_end(vendor)
+                    return self._vendor_languages[vendor]
+        return self.detect_languages(img)
+    
+    def _learn_vendor_languages(
+        self, vendor: Optional[str], languages: List[str], results: List[Dict[str, Any]]
+    ) -> None:
+        """Remember a vendor's language, or forget it when its pages fell back to all languages."""
+        if not vendor or languages == list(self.languages):
+            return
+        with self._vendor_lock:
+            if any(result.get('languages') == list(self.languages) for result in results):
+                self._vendor_languages.pop(vendor, None)
+                return
+            self._vendor_languages[vendor] = languages
+            self._vendor_languages.move_to_end(vendor)
+            while len(self._vendor_languages) > _MAX_VENDOR_LANGUAGES:
+                self._vendor_languages.popitem(last=False)
+    
+    def _template_page(
+        self, img: np.ndarray, page: int, vendor: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """OCR only the field zones of a page 1 that matches a known template.
+        
+        The zones are stacked into one image and recognized in one call, with
+        the vendor's language if ``auto_language`` knows it.
+        
+        Args:
+            img: Loaded page
+            page: ``page_hash`` of the page
+            vendor: Sender of the document
+        
+        Returns:
+            The page's ``text`` (its zones' lines), ``fields``, ``template``
+            key and ``method`` 'template', or None if no template matched or
+            its zones failed validation
+        """
+        template = self.templates.match(vendor, page)
+        if template is None:
+            return None
+        try:
+            zones = self.templates.zones(template, (img.shape[1], img.shape[0]))
+            stacked, bands = stack_zones(img, zones)
+            languages = None
+            if vendor:
+                with self._vendor_lock:
+                    languages = self._vendor_languages.get(vendor)
+            with self._slot():
+                data = self._recognize_data(self.preprocess_image(stacked), languages)
+            layout = OCRLayout.from_tesseract(data, size=(stacked.shape[1], stacked.shape[0]))
+        except Exception as e:
+            self.logger.warning(f"Template OCR failed, OCR'ing the full page: {e}")
+            return None
+        
+        texts = {name: layout.text_in(band) for name, band in bands.items()}
+        fields = self.templates.validate(template, texts)
+        if fields is None:
+            self.logger.info(f"Page does not validate against template {template['key']}")
+            return None
+        return {
+            'text': '\n'.join(texts.values()),
+            'confidence': None,
+            'method': 'template',
+            'fields': fields,
+            'template': template['key']
+        }
     
-    def extract_text_from_image(self, image: Union[str, Path, BinaryIO, np.ndarray]) -> str:
+    def _learn_template(self, vendor: Optional[str], page: int, result: Dict[str, Any]) -> None:
+        """Learn a template from a fully OCR'd page 1 and record the ``fields`` found on it."""
+        if 'layout' in result and 'error' not in result:
+            result['fields'] = self.templates.learn(vendor, page, result['layout'])
+    
+    def _recognize_document(self, img: np.ndarray, vendor: Optional[str] = None) -> str:
+        """Recognize a loaded single-page document.
+        
+        With ``templates`` a known layout is OCR'd zone by zone, and with
+        ``auto_language`` the document's language is picked first.
+        """
+        page = None
+        if self.templates is not None:
+            page = page_hash(img)
+            result = self._template_page(img, page, vendor)
+            if result is not None:
+                return result['text']
+        if not self.auto_language and page is None:
+            return self.recognize(img)
+        languages = self._document_languages(img, vendor) if self.auto_language else None
+        results = self._ocr_pages([img], languages)
+        if 'error' in results[0]:
+            raise RuntimeError(results[0]['error'])
+        if languages:
+            self._learn_vendor_languages(vendor, languages, results)
+        if page is not None:
+            self._learn_template(vendor, page, results[0])
+        return results[0]['text']
+    
+    def extract_text_from_image(
+        self, image: Union[str, Path, BinaryIO, np.ndarray], vendor: Optional[str] = None
+    ) -> str:
         """Extract text from an image file or numpy array.
         
         Args:
             image: Path to image file, file-like object, or numpy array
+            vendor: Sender of the document (e.g. its e-mail domain); with
+                ``auto_language`` its language from earlier documents is reused
             
         Returns:
             Extracted text as string
         """
         try:
-            # Load image if it's a file path or file-like object
-            if isinstance(image, (str, Path)):
-                img = cv2.imread(str(image))
-            elif hasattr(image, 'read'):  # File-like object
-                img_array = np.frombuffer(image.read(), np.uint8)
-                img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            else:  # Assume it's a numpy array
-                img = image
-            
-            if img is None:
-                raise ValueError("Could not load image")
-                
-            # Preprocess the image
-            processed_img = self.preprocess_image(img)
-            
-            # Configure Tesseract parameters
-            config = (
-                f'--oem {self.oem} '  
-                f'--psm {self.psm} '  
-                f'-l "+".join({self.languages}) '  
-                f'--tessdata-dir /usr/share/tesseract-ocr/4.00/tessdata'  
-            )
+            if self.cache is None:
+                return self._recognize_document(self.load_image(image), vendor)
             
-            # Run Tesseract OCR
-            text = pytesseract.image_to_string(
-                processed_img,
-                config=config,
-                output_type=pytesseract.Output.STRING
-            )
-            
-            return text.strip()
+            if hasattr(image, 'read'):  # File-like object, hashed and decoded once
+                image = image.read()
+            key = make_key(content_digest(image), self.cache_params('image'))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached['text']
             
+            text = self._recognize_document(self.load_image(image), vendor)
+            self.cache.put(key, {'text': text})
+            return text
         except Exception as e:
             self.logger.error(f"Error in text extraction: {e}", exc_info=True)
             return ""
     
-    def extract_text_from_pdf(self, pdf_data: bytes) -> Dict[str, Any]:
-        """Extract text from a PDF document.
+    def extract_layout_from_image(self, image: Union[str, Path, BinaryIO, np.ndarray]) -> OCRLayout:
+        """Extract the words of an image with their boxes and confidences.
         
         Args:
-            pdf_data: PDF file contents as bytes
+            image: Path to image file, file-like object, or numpy array
             
         Returns:
-            Dictionary with extracted text and metadata
+            The image's OCRLayout; empty if the image is blank or OCR fails
         """
-        result = {
-            'pages': [],
-            'full_text': '',
-            'page_count': 0,
-            'success': False
+        try:
+            if self.cache is None:
+                return self.recognize_layout(self.load_image(image))
+            
+            if hasattr(image, 'read'):  # File-like object, hashed and decoded once
+                image = image.read()
+            key = make_key(content_digest(image), self.cache_params('layout'))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return OCRLayout.from_dict(cached)
+            
+            layout = self.recognize_layout(self.load_image(image))
+            self.cache.put(key, layout.to_dict())
+            return layout
+        except Exception as e:
+            self.logger.error(f"Error in layout extraction: {e}", exc_info=True)
+            return OCRLayout.empty()
+    
+    def cache_params(self, kind: str) -> Dict[str, Any]:
+        """Return the settings that affect OCR output, for cache keys."""
+        params = {
+            'kind': kind,
+            'engine': self.engine,
+            'languages': list(self.languages),
+            'oem': self.oem,
+            'psm': self.psm,
+            'preprocess': PREPROCESS_VERSION,
+            'max_image_pixels': self.max_image_pixels
         }
+        if self.crop_margins:
+            params['crop'] = True
+        if self.auto_language:
+            params['auto_language'] = True
+        if self.templates is not None and kind != 'layout':
+            params['templates'] = True
+        if kind == 'pdf':
+            params.update(dpi=self.dpi, text_layer=self.use_text_layer,
+                          min_text_chars=self.min_text_chars)
+            if self.adaptive_dpi:
+                params.update(probe_dpi=self.probe_dpi, min_confidence=self.min_confidence)
+        if kind in ('pdf', 'tiff') and self.structured:
+            params['structured'] = True
+        return params
+    
+    def _get_engine_pool(self) -> TesseractWorkerPool:
+        """Return the warm Tesseract workers, starting them on first use."""
+        with self._pool_lock:
+            if self._engine_pool is None:
+                workers = self.page_workers if self.parallel_pages else 1
+                self._engine_pool = TesseractWorkerPool(
+                    languages=self.languages,
+                    oem=self.oem,
+                    psm=self.psm,
+                    tessdata_dir=self.tessdata_dir,
+                    workers=workers,
+                    threads_per_worker=self.max_threads if self.governor
+                    else max(self.max_threads // workers, 1),
+                    governor=self._governor_settings,
+                    slot_timeout=self.slot_timeout
+                )
+        return self._engine_pool
+    
+    def _get_page_pool(self) -> ProcessPoolExecutor:
+        """Return the page worker pool, starting it on first use.
         
-        try:
-            # Convert PDF to images
-            images = convert_from_bytes(
+        The ``max_threads`` budget is split across the workers so that
+        Tesseract and OpenCV threads inside them do not oversubscribe cores;
+        with the governor each worker gets one slot's threads instead.
+        """
+        with self._pool_lock:
+            if self._page_pool is None:
+                threads = (self.max_threads if self.governor
+                           else max(self.max_threads // self.page_workers, 1))
+                worker_config = {
+                    key: value for key, value in self.config.items() if key != 'temp_dir'
+                }
+                worker_config.update(
+                    max_threads=threads, parallel_pages=False, cache_enabled=False, cache_path=None
+                )
+                self._page_pool = ProcessPoolExecutor(
+                    max_workers=self.page_workers,
+                    initializer=_init_page_worker,
+                    initargs=(worker_config,),
+                )
+        return self._page_pool
+    
+    def render_pdf(
+        self,
+        pdf_data: Union[bytes, str, Path],
+        first_page: Optional[int] = None,
+        last_page: Optional[int] = None,
+        dpi: Optional[int] = None
+    ) -> List[Union[Path, Image.Image]]:
+        """Rasterize a PDF, or a range of its pages, at ``dpi``.
+        
+        With ``in_memory`` enabled, pages come back as grayscale PIL images
+        decoded straight from the rasterizer's output and nothing is written
+        under ``temp_dir``. Otherwise they are written as JPEG files to a
+        scratch directory of their own, so concurrent calls never collide.
+        
+        Args:
+            pdf_data: PDF file contents as bytes, or the path of a PDF file
+            first_page: First page to render (1-based)
+            last_page: Last page to render
+            dpi: Resolution (defaults to the configured ``dpi``)
+            
+        Returns:
+            One PIL image or image path per page
+        """
+        dpi = dpi or self.dpi
+        convert = convert_from_bytes if isinstance(pdf_data, (bytes, bytearray)) else convert_from_path
+        if self.in_memory:
+            with self._render_slot():
+                return convert(
+                    pdf_data,
+                    dpi=dpi,
+                    first_page=first_page,
+                    last_page=last_page,
+                    thread_count=self.max_threads,
+                    grayscale=True
+                )
+        
+        job_dir = tempfile.mkdtemp(prefix='pdf_pages_', dir=self.temp_dir)
+        with self._render_slot():
+            return [Path(path) for path in convert(
                 pdf_data,
-                dpi=self.dpi,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=last_page,
                 thread_count=self.max_threads,
                 fmt='jpeg',
-                output_folder=str(self.temp_dir / 'pdf_pages'),
+                output_folder=job_dir,
                 output_file='page',
                 paths_only=True
-            )
+            )]
+    
+    def _render_runs(
+        self, pdf_data: Union[bytes, str, Path], runs: List[Tuple[Optional[int], Optional[int]]], dpi: int
+    ) -> Tuple[List[int], List[Union[Path, Image.Image]]]:
+        """Render runs of pages and return their page numbers and images."""
+        numbers, images = [], []
+        for first, last in runs:
+            rendered = self.render_pdf(pdf_data, first, last, dpi=dpi)
+            numbers.extend(range(first or 1, (first or 1) + len(rendered)))
+            images.extend(rendered)
+        return numbers, images
+    
+    def _ocr_pages(
+        self, images: List[Any], languages: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """OCR rendered pages, in page order.
+        
+        Pages OCR'd with fewer than all ``languages`` and scored below
+        ``min_confidence`` are OCR'd again with all of them, keeping the
+        better result.
+        
+        Args:
+            images: Rendered pages as returned by ``render_pdf``
+            languages: Languages to recognize (defaults to ``languages``)
             
-            # Process each page
-            full_text = []
-            for i, img_path in enumerate(images, 1):
+        Returns:
+            One result per page with its ``text``, ``confidence`` (only
+            measured with ``adaptive_dpi`` or ``auto_language``), ``layout``
+            with ``structured``, ``languages`` with ``auto_language`` and
+            ``error`` if the page failed
+        """
+        if languages is None or list(languages) == list(self.languages):
+            results = self._ocr_pages_with(images, None)
+            if self.auto_language:
+                for result in results:
+                    result['languages'] = list(self.languages)
+            return results
+        
+        results = self._ocr_pages_with(images, languages)
+        retry = [
+            i for i, result in enumerate(results)
+            if 'error' not in result and result['confidence'] is not None
+            and result['confidence'] < self.min_confidence
+        ]
+        for result in results:
+            result['languages'] = list(languages)
+        if retry:
+            self.logger.info(f"Re-OCR'ing {len(retry)} of {len(images)} pages with all languages")
+            for i, result in zip(retry, self._ocr_pages([images[i] for i in retry])):
+                if ('error' not in result and result['confidence'] is not None
+                        and result['confidence'] >= results[i]['confidence']):
+                    results[i] = result
+        return results
+    
+    def _ocr_pages_with(
+        self, images: List[Any], languages: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """OCR rendered pages with the given languages; see ``_ocr_pages``."""
+        if self.engine == 'tesserocr':
+            # Preprocess here and let the warm workers recognize concurrently
+            results: List[Dict[str, Any]] = []
+            prepared = {}
+            for i, image in enumerate(images):
+                try:
+                    img = self.load_image(image)
+                    if self._needs_tiles(img):
+                        results.append(self._recognize_page(img, languages))
+                        continue
+                    processed_img, offset = self._prepare(img)
+                except Exception as e:
+                    self.logger.error(f"Error processing page {i + 1}: {e}")
+                    results.append({'text': '', 'confidence': None, 'error': str(e)})
+                    continue
+                size = (img.shape[1], img.shape[0])
+                results.append({'text': '', 'confidence': None})
+                if self._layouts:
+                    results[i]['layout'] = OCRLayout.empty(size)
+                if processed_img is not None:
+                    prepared[i] = (processed_img, offset, size)
+            recognized = self._get_engine_pool().recognize_many(
+                [processed_img for processed_img, _, _ in prepared.values()],
+                timeout=self.page_timeout or None,
+                tsv=self._layouts
+            )
+            for (i, (_, offset, size)), (text, confidence, error) in zip(
+                prepared.items(), recognized
+            ):
+                if error:
+                    results[i]['error'] = error
+                elif self._layouts:
+                    layout = OCRLayout.from_tesseract(parse_tsv(text), offset, size)
+                    results[i].update(text=layout.text, layout=layout)
+                else:
+                    results[i]['text'] = text.strip()
+                if self.adaptive_dpi and not error:
+                    results[i]['confidence'] = confidence
+            return results
+        
+        if not (self.parallel_pages and len(images) > 1):
+            results = []
+            for i, image in enumerate(images, 1):
                 try:
-                    # Extract text from page image
-                    page_text = self.extract_text_from_image(img_path)
-                    
-                    # Add to results
-                    result['pages'].append({
-                        'page_number': i,
-                        'text': page_text,
-                        'image_path': str(img_path)
-                    })
-                    full_text.append(page_text)
-                    
+                    results.append(self._recognize_page(self.load_image(image), languages))
                 except Exception as e:
                     self.logger.error(f"Error processing page {i}: {e}")
+                    results.append({'text': '', 'confidence': None, 'error': str(e)})
+            return results
+        
+        pool = self._get_page_pool()
+        futures = [pool.submit(_ocr_page_in_worker, image, languages) for image in images]
+        timeout = self._page_result_timeout()
+        results = []
+        for i, future in enumerate(futures, 1):
+            try:
+                result = future.result(timeout=timeout)
+                waited = result.pop('slot_wait', None)
+                if waited is not None and self.governor is not None:
+                    self.governor.record_wait(waited)
+                results.append(result)
+            except FutureTimeoutError as e:
+                if future.done():
+                    # The worker itself raised, e.g. no slot within slot_timeout
+                    self.logger.error(f"Error processing page {i}: {e}")
+                    results.append({'text': '', 'confidence': None,
+                                    'error': str(e) or 'No OCR slot became free'})
+                    continue
+                # Only drops a page still queued; a running one is bounded by
+                # the Tesseract timeout in its worker
+                future.cancel()
+                self.logger.error(f"Timed out processing page {i}")
+                results.append({'text': '', 'confidence': None, 'error': 'Page OCR timed out'})
+            except Exception as e:
+                self.logger.error(f"Error processing page {i}: {e}")
+                results.append({'text': '', 'confidence': None, 'error': str(e)})
+        return results
+    
+    def _page_result_timeout(self) -> Optional[float]:
+        """Return how long to wait for a page worker's result, or None to wait indefinitely.
+        
+        Workers apply ``page_timeout`` to Tesseract once they hold an OCR
+        slot, so the wait for the slot comes on top: up to ``slot_timeout``,
+        or without limit if the governor has none.
+        """
+        if not self.page_timeout:
+            return None
+        if self.governor is None:
+            return self.page_timeout + _PAGE_TIMEOUT_GRACE
+        if self.slot_timeout is None:
+            return None
+        return self.page_timeout + self.slot_timeout + _PAGE_TIMEOUT_GRACE
+    
+    def _rescan_low_confidence(
+        self,
+        pdf_data: Union[bytes, str, Path],
+        numbers: List[int],
+        images: List[Any],
+        ocr: List[Dict[str, Any]],
+        dpis: List[int],
+        languages: Optional[List[str]] = None
+    ) -> None:
+        """Re-render pages OCR'd below ``min_confidence`` at ``dpi`` and keep the better result.
+        
+        ``images``, ``ocr`` and ``dpis`` are updated in place.
+        """
+        low = [
+            number for number, result in zip(numbers, ocr)
+            if 'error' not in result and result['confidence'] is not None
+            and result['confidence'] < self.min_confidence
+        ]
+        if not low or self.dpi <= self.probe_dpi:
+            return
+        
+        self.logger.info(f"Re-scanning {len(low)} of {len(numbers)} pages at {self.dpi} DPI")
+        index = {number: i for i, number in enumerate(numbers)}
+        rescan_numbers, rescan_images = self._render_runs(pdf_data, page_runs(low), self.dpi)
+        for number, image, result in zip(
+            rescan_numbers, rescan_images, self._ocr_pages(rescan_images, languages)
+        ):
+            i = index[number]
+            if ('error' in result or result['confidence'] is None
+                    or result['confidence'] < ocr[i]['confidence']):
+                continue
+            images[i], ocr[i], dpis[i] = image, result, self.dpi
+    
+    def _ocr_document(
+        self,
+        numbers: List[int],
+        images: List[Any],
+        vendor: Optional[str] = None,
+        rescan: Optional[Callable[[List[Dict[str, Any]], Optional[List[str]]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """OCR the rendered pages of a document, or of a chunk of it, in page order.
+        
+        With ``templates`` page 1, if among the pages, is first read zone by
+        zone; with ``auto_language`` the language is picked from the first
+        page OCR'd in full. What was learned is remembered for the vendor.
+        
+        Args:
+            numbers: Page numbers of the images
+            images: Rendered pages, as ``load_image`` accepts them
+            vendor: Sender of the document
+            rescan: Called with the results and languages before anything is
+                learned from them, to replace pages (``adaptive_dpi``)
+            
+        Returns:
+            One result per page, as returned by ``_ocr_pages`` or ``_template_page``
+        """
+        # OCR only the field zones of a page 1 with a known layout
+        first_hash, template_result = None, None
+        if self.templates is not None and numbers and numbers[0] == 1:
+            first = self.load_image(images[0])
+            first_hash = page_hash(first)
+            template_result = self._template_page(first, first_hash, vendor)
+        skip = 1 if template_result else 0
+        
+        # Pick the document's language from its first OCR'd page
+        languages = None
+        if self.auto_language and len(images) > skip:
+            languages = self._document_languages(self.load_image(images[skip]), vendor)
+        
+        ocr = self._ocr_pages(images[skip:], languages)
+        if template_result:
+            ocr.insert(0, template_result)
+        if rescan is not None:
+            rescan(ocr, languages)
+        if languages:
+            self._learn_vendor_languages(vendor, languages, ocr)
+        if first_hash is not None and not template_result:
+            self._learn_template(vendor, first_hash, ocr[0])
+        return ocr
+    
+    def _page_result(
+        self,
+        number: int,
+        result: Dict[str, Any],
+        dpi: Optional[int] = None,
+        image_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the page entry of a document result from a page's OCR result."""
+        page = {
+            'page_number': number,
+            'text': result['text'],
+            'method': result.get('method', 'ocr')
+        }
+        if dpi:
+            page['dpi'] = dpi
+        if result['confidence'] is not None:
+            page['confidence'] = round(result['confidence'], 1)
+        if 'languages' in result:
+            page['languages'] = result['languages']
+        if 'layout' in result and self.structured:
+            page['layout'] = result['layout']
+        for key in ('fields', 'template'):
+            if key in result:
+                page[key] = result[key]
+        if image_path:
+            page['image_path'] = image_path
+        if 'error' in result:
+            page['error'] = result['error']
+        return page
+    
+    def _process_pages(
+        self,
+        pdf_data: Union[bytes, str, Path],
+        first_page: Optional[int] = None,
+        last_page: Optional[int] = None,
+        keep_images: bool = True,
+        vendor: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Extract the text of a PDF, or a range of its pages, page by page.
+        
+        Args:
+            pdf_data: PDF file contents as bytes, or the path of a PDF file
+            first_page: First page to process (1-based)
+            last_page: Last page to process
+            keep_images: Keep rendered page files and record their ``image_path``;
+                otherwise they are deleted once the pages are OCR'd
+            vendor: Sender of the document, for ``auto_language``
+            
+        Returns:
+            Page results in page order; with ``structured`` OCR'd pages also
+            have a ``layout`` (text-layer pages have none), and with
+            ``templates`` page 1 has the ``fields`` found on it and, if only
+            its zones were OCR'd, method 'template' and the ``template`` key
+        """
+        pages: Dict[int, Dict[str, Any]] = {}
+        
+        # Born-digital pages keep their embedded text; the rest are OCR'd
+        layer = (
+            extract_text_layer(pdf_data, first_page, last_page) if self.use_text_layer else None
+        )
+        if layer is None:
+            runs = [(first_page, last_page)]
+        else:
+            scanned = []
+            for number, text in enumerate(layer, first_page or 1):
+                if is_usable_text(text, self.min_text_chars):
+                    pages[number] = {
+                        'page_number': number,
+                        'text': text.strip(),
+                        'method': 'text_layer'
+                    }
+                else:
+                    scanned.append(number)
+            runs = page_runs(scanned)
+        
+        # Convert the remaining pages to images, at probe_dpi first in adaptive mode
+        dpi = self.probe_dpi if self.adaptive_dpi else self.dpi
+        numbers, images = self._render_runs(pdf_data, runs, dpi)
+        scratch_dirs = {image.parent for image in images if isinstance(image, Path)}
+        
+        try:
+            dpis = [dpi] * len(images)
+            
+            def rescan(ocr: List[Dict[str, Any]], languages: Optional[List[str]]) -> None:
+                self._rescan_low_confidence(pdf_data, numbers, images, ocr, dpis, languages)
+            
+            # Process each page, in parallel worker processes if enabled
+            ocr = self._ocr_document(numbers, images, vendor,
+                                     rescan if self.adaptive_dpi else None)
+            if self.adaptive_dpi:
+                scratch_dirs.update(image.parent for image in images if isinstance(image, Path))
+            
+            for number, image, result, page_dpi in zip(numbers, images, ocr, dpis):
+                image_path = str(image) if keep_images and isinstance(image, Path) else None
+                pages[number] = self._page_result(number, result, page_dpi, image_path)
+        finally:
+            if not keep_images:
+                for scratch_dir in scratch_dirs:
+                    shutil.rmtree(scratch_dir, ignore_errors=True)
+        
+        return [pages[number] for number in sorted(pages)]
+    
+    def iter_pdf_pages(
+        self,
+        pdf_source: Union[bytes, str, Path],
+        chunk_size: Optional[int] = None,
+        vendor: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Extract the text of a PDF page by page, yielding each chunk's pages when ready.
+        
+        Pages are rasterized ``chunk_size`` at a time and each chunk's rendered
+        files are deleted before the next chunk starts, so disk and memory use
+        stay bounded by the chunk size rather than the document length. Page
+        results have the same keys as in ``extract_text_from_pdf`` except
+        ``image_path``.
+        
+        Args:
+            pdf_source: PDF file contents as bytes, or the path of a PDF file
+            chunk_size: Pages per chunk (defaults to ``chunk_pages``)
+            vendor: Sender of the document, for ``auto_language``
+            
+        Yields:
+            Page results in page order
+            
+        Raises:
+            Exception: If the PDF cannot be read or a chunk cannot be rendered
+        """
+        chunk_size = max(chunk_size or self.chunk_pages, 1)
+        spilled = None
+        if isinstance(pdf_source, (bytes, bytearray)):
+            # Poppler reads page ranges from a file; write the document once
+            fd, spilled = tempfile.mkstemp(suffix='.pdf', prefix='stream_', dir=self.temp_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pdf_source)
+            pdf_source = spilled
+        
+        try:
+            page_count = pdfinfo_from_path(str(pdf_source))['Pages']
+            for first in range(1, page_count + 1, chunk_size):
+                last = min(first + chunk_size - 1, page_count)
+                yield from self._process_pages(pdf_source, first, last, keep_images=False,
+                                               vendor=vendor)
+        finally:
+            if spilled:
+                os.unlink(spilled)
+    
+    def extract_text_from_pdf(
+        self, pdf_data: bytes, keep_images: bool = True, vendor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Extract text from a PDF document.
+        
+        Args:
+            pdf_data: PDF file contents as bytes
+            keep_images: Keep the rendered page files under ``temp_dir`` and
+                record their ``image_path``; otherwise they are deleted once
+                the pages are OCR'd
+            vendor: Sender of the document (e.g. its e-mail domain); with
+                ``auto_language`` its language from earlier documents is reused
+            
+        Returns:
+            Dictionary with extracted text and metadata
+        """
+        result = {
+            'pages': [],
+            'full_text': '',
+            'page_count': 0,
+            'success': False
+        }
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_key(content_digest(pdf_data), self.cache_params('pdf'))
+            cached = self._cached_document(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            result['pages'] = self._process_pages(pdf_data, keep_images=keep_images, vendor=vendor)
+            full_text = [page['text'] for page in result['pages']]
             
             # Combine all pages
             result['full_text'] = '\n\n'.join(full_text)
-            result['page_count'] = len(images)
+            result['page_count'] = len(result['pages'])
             result['success'] = True
             
+            if cache_key:
+                self._cache_document(cache_key, result)
+            
         except Exception as e:
             self.logger.error(f"Error in PDF processing: {e}", exc_info=True)
             result['error'] = str(e)
         
         return result
     
-    def process_file(self, file_path: Union[str, Path], file_type: str = None) -> Dict[str, Any]:
+    def _cached_document(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached document result with its page layouts rebuilt, if there is one."""
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        return {
+            **cached,
+            'pages': [
+                {**page, 'layout': OCRLayout.from_dict(page['layout'])}
+                if 'layout' in page else page
+                for page in cached['pages']
+            ]
+        }
+    
+    def _cache_document(self, key: str, result: Dict[str, Any]) -> None:
+        """Cache a document result unless a page failed."""
+        if any('error' in page for page in result['pages']):
+            return
+        # Rendered page files are temporary, so they are not cached
+        self.cache.put(key, {
+            **result,
+            'pages': [
+                {k: v.to_dict() if k == 'layout' else v
+                 for k, v in page.items() if k != 'image_path'}
+                for page in result['pages']
+            ]
+        })
+    
+    def iter_tiff_pages(
+        self,
+        tiff_source: TiffSource,
+        chunk_size: Optional[int] = None,
+        vendor: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Extract the text of a multi-page TIFF frame by frame, yielding each chunk's pages.
+        
+        Frames are decoded ``chunk_size`` at a time, so memory holds one chunk
+        of pages however long the document is; pages larger than
+        ``max_image_pixels`` are also recognized in bands. Page results have
+        the keys of ``extract_text_from_pdf``'s, with ``dpi`` the resolution
+        the file records, if any.
+        
+        Args:
+            tiff_source: TIFF contents as bytes, or the path of a TIFF file
+            chunk_size: Frames per chunk (defaults to ``chunk_pages``)
+            vendor: Sender of the document, for ``auto_language`` and ``templates``
+            
+        Yields:
+            Page results in page order
+            
+        Raises:
+            OSError: If the TIFF cannot be read
+        """
+        chunk_size = max(chunk_size or self.chunk_pages, 1)
+        chunk: List[Tuple[int, Image.Image, Optional[int]]] = []
+        for frame in iter_frames(tiff_source):
+            chunk.append(frame)
+            if len(chunk) == chunk_size:
+                yield from self._process_frames(chunk, vendor)
+                chunk = []
+        if chunk:
+            yield from self._process_frames(chunk, vendor)
+    
+    def _process_frames(
+        self, frames: List[Tuple[int, Image.Image, Optional[int]]], vendor: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """OCR a chunk of decoded TIFF frames and return their page results."""
+        ocr = self._ocr_document(
+            [number for number, _, _ in frames], [image for _, image, _ in frames], vendor
+        )
+        return [self._page_result(number, result, dpi)
+                for (number, _, dpi), result in zip(frames, ocr)]
+    
+    def extract_text_from_tiff(
+        self, tiff_data: TiffSource, vendor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Extract text from a multi-page TIFF, e.g. a scanned fax.
+        
+        Frames are streamed through ``iter_tiff_pages``; a path is read
+        lazily, so a large file is never loaded whole.
+        
+        Args:
+            tiff_data: TIFF contents as bytes, or the path of a TIFF file
+            vendor: Sender of the document (e.g. its e-mail domain)
+            
+        Returns:
+            Dictionary with extracted text and metadata, as ``extract_text_from_pdf``
+        """
+        result = {
+            'pages': [],
+            'full_text': '',
+            'page_count': 0,
+            'success': False
+        }
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_key(content_digest(tiff_data), self.cache_params('tiff'))
+            cached = self._cached_document(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            result['pages'] = list(self.iter_tiff_pages(tiff_data, vendor=vendor))
+            result['full_text'] = '\n\n'.join(page['text'] for page in result['pages'])
+            result['page_count'] = len(result['pages'])
+            result['success'] = True
+            
+            if cache_key:
+                self._cache_document(cache_key, result)
+            
+        except Exception as e:
+            self.logger.error(f"Error in TIFF processing: {e}", exc_info=True)
+            result['error'] = str(e)
+        
+        return result
+    
+    def process_file(
+        self, file_path: Union[str, Path], file_type: str = None, vendor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Process a file with the appropriate OCR method.
         
         Args:
             file_path: Path to the file to process
             file_type: Optional file type (pdf, jpg, png, etc.)
+            vendor: Sender of the document, for ``auto_language``
             
         Returns:
             Dictionary with processing results
@@ -224,11 +1442,14 @@ class LocalOCRProcessor:
             if file_type.lower() == 'pdf':
                 # Process PDF file
                 with open(file_path, 'rb') as f:
-                    pdf_result = self.extract_text_from_pdf(f.read())
+                    pdf_result = self.extract_text_from_pdf(f.read(), vendor=vendor)
                     result.update(pdf_result)
+            elif f'.{file_type.lower()}' in TIFF_EXTENSIONS:
+                # Stream the frames of a (multi-page) TIFF from disk
+                result.update(self.extract_text_from_tiff(file_path, vendor=vendor))
             else:
                 # Process image file
-                result['text'] = self.extract_text_from_image(file_path)
+                result['text'] = self.extract_text_from_image(file_path, vendor=vendor)
                 result['success'] = bool(result['text'].strip())
                 
         except Exception as e:
@@ -240,13 +1461,24 @@ class LocalOCRProcessor:
 def create_ocr_processor(config: Optional[Dict[str, Any]] = None) -> LocalOCRProcessor:
     """Create a configured instance of LocalOCRProcessor.
     
+    With ``service_socket`` set, a client of the local OCR service listening
+    on that socket is returned instead; it has the same document methods.
+    
     Args:
         config: Optional configuration dictionary
         
     Returns:
-        Configured LocalOCRProcessor instance
+        Configured LocalOCRProcessor instance, or an OCRServiceClient
     """
-    return LocalOCRProcessor(config=config or {})
+    config = config or {}
+    if config.get('service_socket'):
+        from .ocr_service import PRIORITY_NORMAL, OCRServiceClient
+        return OCRServiceClient(
+            config['service_socket'],
+            priority=int(config.get('service_priority', PRIORITY_NORMAL)),
+            timeout=config.get('service_timeout')
+        )
+    return LocalOCRProcessor(config=config)
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+"""
+OCR Result Cache Module
+
+This module caches OCR results keyed by the SHA-256 of the document, page or
+image bytes plus the OCR parameters that affect the output. Results are kept
+in an in-memory LRU tier in front of an SQLite tier on disk, which is bounded
+by size and can be shared by several processes.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+DEFAULT_MEMORY_ITEMS = 256
+
+# Fraction of max_bytes the disk tier is trimmed to when it overflows
+_EVICT_TO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_results_accessed ON ocr_results (accessed);
+"""
+
+_caches: Dict[str, 'OCRCache'] = {}
+_caches_lock = threading.Lock()
+
+
+def content_digest(content: Union[bytes, str, Path, np.ndarray, Image.Image]) -> str:
+    """Return the SHA-256 of a document, image file or decoded image.
+
+    Args:
+        content: Raw bytes, a file path, a numpy array or a PIL image
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+    elif isinstance(content, (str, Path)):
+        with open(content, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    elif isinstance(content, np.ndarray):
+        digest.update(f"{content.shape}{content.dtype}".encode())
+        digest.update(np.ascontiguousarray(content).data)
+    elif isinstance(content, Image.Image):
+        digest.update(f"{content.size}{content.mode}".encode())
+        digest.update(content.tobytes())
+    else:
+        raise TypeError(f"Cannot hash {type(content).__name__}")
+    return digest.hexdigest()
+
+
+def make_key(digest: str, params: Dict[str, Any]) -> str:
+    """Combine a content digest with the OCR parameters into a cache key."""
+    encoded = json.dumps(params, sort_keys=True, default=str).encode()
+    return f"{digest}:{hashlib.sha256(encoded).hexdigest()[:16]}"
+
+
+class OCRCache:
+    """Two-tier cache of JSON-serializable OCR results.
+
+    The memory tier holds the ``memory_items`` most recently used results.
+    The optional disk tier is an SQLite database trimmed to ``max_bytes``
+    by least recent use. The cache is safe to share between threads, and
+    processes may share the same database file.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_bytes: int = DEFAULT_MAX_DISK_BYTES,
+        memory_items: int = DEFAULT_MEMORY_ITEMS
+    ):
+        """Initialize the cache.
+
+        Args:
+            path: Path of the SQLite database, or None for a memory-only cache
+            max_bytes: Size limit of the disk tier
+            memory_items: Number of results kept in memory
+        """
+        self.path = str(path) if path else None
+        self.max_bytes = max_bytes
+        self.memory_items = max(memory_items, 0)
+        self._memory: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'puts': 0,
+            'evictions': 0,
+            'bytes_read': 0,
+            'bytes_written': 0,
+        }
+
+        self._conn = None
+        self._disk_bytes = 0
+        if self.path:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+            self._disk_bytes = self._conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM ocr_results'
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        """Close the disk tier."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached result, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._memory[key]
+
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT value FROM ocr_results WHERE key = ?', (key,)
+                ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._conn.execute(
+                'UPDATE ocr_results SET accessed = ? WHERE key = ?', (time.time(), key)
+            )
+            self._stats['disk_hits'] += 1
+            self._stats['bytes_read'] += len(row[0])
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a result in both tiers."""
+        with self._lock:
+            self._stats['puts'] += 1
+            self._remember(key, value)
+            if self._conn is None:
+                return
+
+            data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+            previous = self._conn.execute(
+                'SELECT size FROM ocr_results WHERE key = ?', (key,)
+            ).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ocr_results (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time())
+            )
+            self._disk_bytes += len(data) - (previous[0] if previous else 0)
+            self._stats['bytes_written'] += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _remember(self, key: str, value: Any) -> None:
+        if not self.memory_items:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Delete the least recently used disk entries down to ``_EVICT_TO`` of the limit."""
+        # Other processes may have written to the same file
+        self._disk_bytes = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM ocr_results'
+        ).fetchone()[0]
+        target = self.max_bytes * _EVICT_TO
+        rows = self._conn.execute('SELECT key, size FROM ocr_results ORDER BY accessed')
+        evicted = []
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            evicted.append((key,))
+            self._disk_bytes -= size
+        rows.close()
+        self._conn.executemany('DELETE FROM ocr_results WHERE key = ?', evicted)
+        self._stats['evictions'] += len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, miss and byte counters plus the current tier sizes."""
+        with self._lock:
+            lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hits = lookups - self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(hits / lookups, 4) if lookups else None,
+                'memory_items': len(self._memory),
+                'disk_bytes': self._disk_bytes,
+            }
+
+
+def get_ocr_cache(
+    path: Optional[Union[str, Path]] = None,
+    max_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    memory_items: int = DEFAULT_MEMORY_ITEMS
+) -> OCRCache:
+    """Return the cache for a database path, shared by all callers in the process.
+
+    Args:
+        path: Path of the SQLite database, or None for a memory-only cache
+        max_bytes: Size limit of the disk tier (used when the cache is created)
+        memory_items: Number of results kept in memory (used when the cache is created)
+
+    Returns:
+        The shared cache instance
+    """
+    name = os.path.abspath(path) if path else ''
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = OCRCache(path, max_bytes=max_bytes, memory_items=memory_items)
+        return _caches[name]
@@ -0,0 +1,290 @@
+"""
+OCR Resource Governor Module
+
+Every OCR process on a host used to size its Tesseract, OpenCV and Poppler
+threads from its own ``max_threads``, so pipelines running side by side (or a
+process pool inside one of them) oversubscribed the cores. The governor
+derives one budget from the CPUs the process may actually use, including a
+cgroup CPU quota, and splits it into slots of ``threads_per_slot`` threads.
+Slots are lock files, so they are shared by all processes using the same
+``slot_dir``; an OCR call holds a slot while it runs, with its thread pinned
+to the slot's CPUs, and the time spent waiting for one is recorded.
+"""
+import collections
+import contextlib
+import fcntl
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOT_DIR = os.path.join(tempfile.gettempdir(), 'ocr_slots')
+
+# Waits kept for the percentile metrics
+_RECENT_WAITS = 1024
+
+# Polling interval while all slots are taken, doubled up to the maximum
+_POLL_SECONDS = 0.005
+_MAX_POLL_SECONDS = 0.1
+
+_CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+_CGROUP_V1_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+_CGROUP_V1_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+_governors: Dict[Tuple[str, int, int], 'OCRGovernor'] = {}
+_governors_lock = threading.Lock()
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """Return the cgroup CPU quota in cores, or None if there is none."""
+    cpu_max = _read(_CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+    quota, period = _read(_CGROUP_V1_QUOTA), _read(_CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def allowed_cpus() -> List[int]:
+    """Return the CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cpus() -> int:
+    """Number of cores this process can use: its CPU affinity capped by the cgroup quota."""
+    cpus = len(allowed_cpus())
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(math.ceil(limit), 1))
+    return max(cpus, 1)
+
+
+class OCRSlot:
+    """A granted OCR slot: its index, the CPUs it is pinned to and its thread count."""
+
+    __slots__ = ('index', 'cpus', 'threads', 'waited')
+
+    def __init__(self, index: int, cpus: List[int], threads: int, waited: float):
+        self.index = index
+        self.cpus = cpus
+        self.threads = threads
+        self.waited = waited
+
+    def __repr__(self) -> str:
+        return f"OCRSlot({self.index}, cpus={self.cpus}, threads={self.threads})"
+
+
+class OCRGovernor:
+    """Host-wide OCR slots sized from the available cores.
+
+    Slot ``i`` is the lock file ``slot-<i>.lock`` in ``slot_dir``, held with
+    ``flock`` while an OCR call runs, so a crashed process never leaks one.
+    A thread that already holds a slot gets the same slot again, so nested
+    OCR calls cannot deadlock.
+    """
+
+    def __init__(
+        self,
+        slots: Optional[int] = None,
+        threads_per_slot: int = 1,
+        slot_dir: Union[str, Path] = DEFAULT_SLOT_DIR,
+        pin: bool = True
+    ):
+        """Create the slot files and apply the thread budget to this process.
+
+        Args:
+            slots: Number of slots (defaults to the available cores divided
+                by ``threads_per_slot``)
+            threads_per_slot: Threads an OCR call may use
+            slot_dir: Directory of the slot lock files, shared by the
+                processes the slots are divided between
+            pin: Pin a thread to its slot's CPUs while it holds the slot
+        """
+        self.threads_per_slot = max(int(threads_per_slot), 1)
+        self.slots = max(int(slots or available_cpus() // self.threads_per_slot), 1)
+        self.slot_dir = Path(slot_dir)
+        self.slot_dir.mkdir(parents=True, exist_ok=True)
+        self.pin = pin and hasattr(os, 'sched_setaffinity')
+        self._cpus = allowed_cpus()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next = 0
+        self._recent_waits: 'collections.deque[float]' = collections.deque(maxlen=_RECENT_WAITS)
+        self._stats = {
+            'acquired': 0,
+            'waited': 0,
+            'timeouts': 0,
+            'in_use': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
+        self.apply_thread_budget()
+        logger.info(f"OCR governor: {self.slots} slots of {self.threads_per_slot} threads "
+                    f"in {self.slot_dir}")
+
+    def apply_thread_budget(self) -> None:
+        """Limit Tesseract's OpenMP and OpenCV threads of this process to one slot's."""
+        threads = str(self.threads_per_slot)
+        os.environ['OMP_THREAD_LIMIT'] = threads
+        os.environ['OMP_NUM_THREADS'] = threads
+        cv2.setNumThreads(self.threads_per_slot)
+
+    def slot_cpus(self, index: int) -> List[int]:
+        """Return the CPUs of a slot; slots wrap around when there are more threads than CPUs."""
+        start = index * self.threads_per_slot
+        return sorted({self._cpus[(start + i) % len(self._cpus)]
+                       for i in range(self.threads_per_slot)})
+
+    def _try_lock(self, index: int) -> Optional[int]:
+        fd = os.open(self.slot_dir / f'slot-{index}.lock', os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _acquire(self, start: float, timeout: Optional[float]) -> Tuple[int, int]:
+        """Lock the first free slot, starting at a different one each call."""
+        with self._lock:
+            first = self._next
+            self._next = (self._next + 1) % self.slots
+        poll = _POLL_SECONDS
+        while True:
+            for offset in range(self.slots):
+                index = (first + offset) % self.slots
+                fd = self._try_lock(index)
+                if fd is not None:
+                    return index, fd
+            if timeout is not None and time.monotonic() - start >= timeout:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise TimeoutError(f"No OCR slot became free within {timeout} seconds")
+            time.sleep(poll)
+            poll = min(poll * 2, _MAX_POLL_SECONDS)
+
+    def record_wait(self, waited: float) -> None:
+        """Count a slot acquisition, e.g. one a page worker process reported."""
+        with self._lock:
+            self._stats['acquired'] += 1
+            self._stats['wait_seconds'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+            if waited >= _POLL_SECONDS:
+                self._stats['waited'] += 1
+            self._recent_waits.append(waited)
+
+    @contextlib.contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[OCRSlot]:
+        """Hold an OCR slot for the duration of the ``with`` block.
+
+        Args:
+            timeout: Seconds to wait for a free slot, or None to wait indefinitely
+
+        Yields:
+            The slot; the calling thread runs on its CPUs until the block ends
+
+        Raises:
+            TimeoutError: If no slot became free within ``timeout``
+        """
+        held = getattr(self._local, 'slot', None)
+        if held is not None:
+            yield held
+            return
+
+        start = time.monotonic()
+        index, fd = self._acquire(start, timeout)
+        waited = time.monotonic() - start
+        self.record_wait(waited)
+        with self._lock:
+            self._stats['in_use'] += 1
+        slot = OCRSlot(index, self.slot_cpus(index), self.threads_per_slot, waited)
+        self._local.slot = slot
+        previous_cpus = None
+        try:
+            if self.pin:
+                try:
+                    previous_cpus = os.sched_getaffinity(0)
+                    os.sched_setaffinity(0, slot.cpus)
+                except OSError as e:
+                    logger.debug(f"Could not pin OCR slot {index}: {e}")
+                    previous_cpus = None
+            yield slot
+        finally:
+            self._local.slot = None
+            if previous_cpus is not None:
+                try:
+                    os.sched_setaffinity(0, previous_cpus)
+                except OSError:
+                    pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+            with self._lock:
+                self._stats['in_use'] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return slot counters and queueing times of this process's OCR calls."""
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            stats = dict(self._stats)
+
+        def percentile_ms(pct: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(int(pct / 100 * len(waits)), len(waits) - 1)] * 1000, 2)
+
+        wait_seconds, max_wait = stats.pop('wait_seconds'), stats.pop('max_wait_seconds')
+        return {
+            'slots': self.slots,
+            'threads_per_slot': self.threads_per_slot,
+            **stats,
+            'avg_wait_ms': round(wait_seconds / stats['acquired'] * 1000, 2)
+            if stats['acquired'] else None,
+            'p50_wait_ms': percentile_ms(50),
+            'p95_wait_ms': percentile_ms(95),
+            'max_wait_ms': round(max_wait * 1000, 2),
+        }
+
+
+def get_ocr_governor(
+    slots: Optional[int] = None,
+    threads_per_slot: int = 1,
+    slot_dir: Union[str, Path] = DEFAULT_SLOT_DIR
+) -> OCRGovernor:
+    """Return the governor for a slot directory and sizing, shared by all callers in the process.
+
+    Args:
+        slots: Number of slots (defaults to the available cores divided by
+            ``threads_per_slot``)
+        threads_per_slot: Threads an OCR call may use
+        slot_dir: Directory of the slot lock files
+
+    Returns:
+        The shared governor instance
+    """
+    key = (os.path.abspath(slot_dir), int(slots or 0), max(int(threads_per_slot), 1))
+    with _governors_lock:
+        if key not in _governors:
+            _governors[key] = OCRGovernor(slots, threads_per_slot, slot_dir)
+        return _governors[key]
@@ -0,0 +1,262 @@
+"""
+OCR Layout Module
+
+Keeps Tesseract's word, line and block boxes with their confidences in NumPy
+structured arrays instead of per-word dicts. The word texts are concatenated
+into one string that the word rows index into. Queries such as "the text
+inside this rectangle" are vectorized over the arrays, so downstream field
+extraction does not need the image or another OCR pass.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+WORD_DTYPE = np.dtype([
+    ('left', np.int32), ('top', np.int32), ('width', np.int32), ('height', np.int32),
+    ('conf', np.float32),
+    ('block', np.int32), ('par', np.int32), ('line', np.int32),
+    ('start', np.int32), ('length', np.int32),  # Slice of the word in OCRLayout.chars
+])
+
+BOX_DTYPE = np.dtype([
+    ('left', np.int32), ('top', np.int32), ('width', np.int32), ('height', np.int32),
+    ('block', np.int32), ('par', np.int32), ('line', np.int32),
+])
+
+# Tesseract TSV levels
+_LEVEL_BLOCK = 2
+_LEVEL_LINE = 4
+_LEVEL_WORD = 5
+
+_TSV_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                'left', 'top', 'width', 'height', 'conf', 'text')
+
+Rect = Tuple[float, float, float, float]
+
+
+def parse_tsv(tsv: str) -> Dict[str, List[Any]]:
+    """Parse Tesseract TSV output into the columns ``pytesseract.image_to_data`` returns.
+
+    Args:
+        tsv: TSV text, with or without the header row
+
+    Returns:
+        Dictionary of column lists keyed like ``pytesseract.Output.DICT``
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in _TSV_COLUMNS}
+    for row in tsv.splitlines():
+        fields = row.split('\t')
+        if len(fields) < len(_TSV_COLUMNS) - 1 or fields[0] == 'level':
+            continue
+        fields += [''] * (len(_TSV_COLUMNS) - len(fields))
+        for name, value in zip(_TSV_COLUMNS[:-2], fields):
+            columns[name].append(int(value))
+        columns['conf'].append(float(fields[-2]))
+        columns['text'].append(fields[-1])
+    return columns
+
+
+class OCRLayout:
+    """Word, line and block boxes of one recognized image.
+
+    Attributes:
+        words: ``WORD_DTYPE`` array in reading order
+        lines: ``BOX_DTYPE`` array of text lines
+        blocks: ``BOX_DTYPE`` array of text blocks
+        chars: Word texts concatenated; ``words['start']`` and
+            ``words['length']`` index into it
+        size: ``(width, height)`` of the image the boxes refer to
+    """
+
+    __slots__ = ('words', 'lines', 'blocks', 'chars', 'size')
+
+    def __init__(
+        self,
+        words: np.ndarray,
+        lines: np.ndarray,
+        blocks: np.ndarray,
+        chars: str,
+        size: Tuple[int, int] = (0, 0)
+    ):
+        self.words = words
+        self.lines = lines
+        self.blocks = blocks
+        self.chars = chars
+        self.size = (int(size[0]), int(size[1]))
+
+    @classmethod
+    def empty(cls, size: Tuple[int, int] = (0, 0)) -> 'OCRLayout':
+        """Return a layout without any text, e.g. for a blank page."""
+        return cls(np.zeros(0, WORD_DTYPE), np.zeros(0, BOX_DTYPE), np.zeros(0, BOX_DTYPE), '', size)
+
+    @classmethod
+    def from_tesseract(
+        cls,
+        data: Dict[str, Sequence[Any]],
+        offset: Tuple[int, int] = (0, 0),
+        size: Tuple[int, int] = (0, 0)
+    ) -> 'OCRLayout':
+        """Build a layout from ``image_to_data`` columns (or ``parse_tsv`` output).
+
+        Args:
+            data: Tesseract output columns
+            offset: ``(x, y)`` added to every box, e.g. the origin of a crop
+            size: ``(width, height)`` of the full image
+
+        Returns:
+            The layout; words with a negative confidence or no text are dropped
+        """
+        level = np.asarray(data['level'], np.int32)
+        conf = np.asarray(data['conf'], np.float32)
+        texts = data['text']
+        dx, dy = offset
+
+        def boxes(mask: np.ndarray, dtype: np.dtype) -> np.ndarray:
+            array = np.zeros(int(mask.sum()), dtype)
+            for name, column in (('left', 'left'), ('top', 'top'), ('width', 'width'),
+                                 ('height', 'height'), ('block', 'block_num'),
+                                 ('par', 'par_num'), ('line', 'line_num')):
+                array[name] = np.asarray(data[column], np.int32)[mask]
+            array['left'] += dx
+            array['top'] += dy
+            return array
+
+        is_word = (level == _LEVEL_WORD) & (conf >= 0)
+        is_word &= np.fromiter((bool(str(text).strip()) for text in texts), bool, len(texts))
+        words = boxes(is_word, WORD_DTYPE)
+        words['conf'] = conf[is_word]
+
+        word_texts = [str(texts[i]).strip() for i in np.flatnonzero(is_word)]
+        lengths = np.fromiter((len(text) for text in word_texts), np.int32, len(word_texts))
+        words['length'] = lengths
+        words['start'] = np.cumsum(lengths) - lengths + np.arange(len(lengths), dtype=np.int32)
+
+        return cls(
+            words,
+            boxes(level == _LEVEL_LINE, BOX_DTYPE),
+            boxes(level == _LEVEL_BLOCK, BOX_DTYPE),
+            ' '.join(word_texts),
+            size
+        )
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def word_text(self, index: int) -> str:
+        """Return the text of one word."""
+        start, length = self.words['start'][index], self.words['length'][index]
+        return self.chars[start:start + length]
+
+    def mean_confidence(self) -> float:
+        """Mean word confidence (0-100), or 0 if there are no words."""
+        return float(self.words['conf'].mean()) if len(self.words) else 0.0
+
+    def _join(self, indices: Union[Sequence[int], np.ndarray]) -> str:
+        """Join words into lines, with a blank line between blocks."""
+        words = self.words[np.asarray(indices, np.intp)]
+        if not len(words):
+            return ''
+        new_line = ((words['block'][1:] != words['block'][:-1])
+                    | (words['par'][1:] != words['par'][:-1])
+                    | (words['line'][1:] != words['line'][:-1]))
+        new_block = words['block'][1:] != words['block'][:-1]
+        separators = np.where(new_block, '\n\n', np.where(new_line, '\n', ' '))
+        parts: List[str] = []
+        for i, (start, length) in enumerate(zip(words['start'].tolist(), words['length'].tolist())):
+            if i:
+                parts.append(separators[i - 1])
+            parts.append(self.chars[start:start + length])
+        return ''.join(parts)
+
+    @property
+    def text(self) -> str:
+        """Full text, one line per Tesseract line and a blank line between blocks."""
+        return self._join(range(len(self.words)))
+
+    def iter_lines(self) -> Iterator[Tuple[str, Tuple[int, int, int, int]]]:
+        """Yield the text and ``(x0, y0, x1, y1)`` box of each line, in reading order."""
+        words = self.words
+        if not len(words):
+            return
+        keys = np.stack([words['block'], words['par'], words['line']], axis=1)
+        breaks = (np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1).tolist()
+        for start, end in zip([0] + breaks, breaks + [len(words)]):
+            line = words[start:end]
+            yield self._join(range(start, end)), (
+                int(line['left'].min()), int(line['top'].min()),
+                int((line['left'] + line['width']).max()), int((line['top'] + line['height']).max())
+            )
+
+    def select(self, rect: Rect, mode: str = 'center') -> np.ndarray:
+        """Return the indices of the words in a rectangle, in reading order.
+
+        Args:
+            rect: ``(x0, y0, x1, y1)`` in image pixels
+            mode: ``'center'`` (the word's center lies in the rectangle),
+                ``'inside'`` (the whole box does) or ``'overlap'`` (any part does)
+        """
+        x0, y0, x1, y1 = rect
+        left, top = self.words['left'], self.words['top']
+        right, bottom = left + self.words['width'], top + self.words['height']
+        if mode == 'center':
+            cx, cy = (left + right) / 2, (top + bottom) / 2
+            mask = (cx >= x0) & (cx <= x1) & (cy >= y0) & (cy <= y1)
+        elif mode == 'inside':
+            mask = (left >= x0) & (right <= x1) & (top >= y0) & (bottom <= y1)
+        elif mode == 'overlap':
+            mask = (left < x1) & (right > x0) & (top < y1) & (bottom > y0)
+        else:
+            raise ValueError(f"Unknown selection mode: {mode}")
+        return np.flatnonzero(mask)
+
+    def text_in(self, rect: Rect, mode: str = 'center') -> str:
+        """Return the text of the words in a rectangle (see ``select``)."""
+        return self._join(self.select(rect, mode))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON-serializable, columnar copy of the layout."""
+        def columns(array: np.ndarray) -> Dict[str, List[Any]]:
+            return {name: array[name].tolist() for name in array.dtype.names}
+        return {
+            'words': columns(self.words),
+            'lines': columns(self.lines),
+            'blocks': columns(self.blocks),
+            'chars': self.chars,
+            'size': list(self.size),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'OCRLayout':
+        """Rebuild a layout from ``to_dict`` output."""
+        def array(columns: Dict[str, List[Any]], dtype: np.dtype) -> np.ndarray:
+            result = np.zeros(len(next(iter(columns.values()), [])), dtype)
+            for name in dtype.names:
+                result[name] = columns.get(name, [])
+            return result
+        return cls(
+            array(data['words'], WORD_DTYPE),
+            array(data['lines'], BOX_DTYPE),
+            array(data['blocks'], BOX_DTYPE),
+            data['chars'],
+            tuple(data.get('size', (0, 0)))
+        )
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the layout to a compressed ``.npz`` sidecar file."""
+        np.savez_compressed(
+            path, words=self.words, lines=self.lines, blocks=self.blocks,
+            chars=np.array(self.chars), size=np.array(self.size, np.int32)
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'OCRLayout':
+        """Read a layout written by ``save``."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['words'], data['lines'], data['blocks'],
+                       str(data['chars']), tuple(data['size']))
+
+    def __repr__(self) -> str:
+        return (f"OCRLayout({len(self.words)} words, {len(self.lines)} lines, "
+                f"{len(self.blocks)} blocks, size={self.size})")
+
@@ -0,0 +1,569 @@
+"""
+Local OCR Service Module
+
+Runs one ``LocalOCRProcessor`` in a daemon listening on a Unix socket, so all
+invoice pipelines on a host share one warm, right-sized pool of OCR workers
+instead of each starting its own. Jobs wait in a priority queue and are run
+by a fixed number of dispatcher threads; clients send a document and block
+until its result comes back.
+
+Each message on the socket is a 4-byte big-endian header length, a JSON
+header and, for documents, ``size`` bytes of file data.
+
+Usage:
+    python -m shared.utils.ocr_service --socket /run/ocr/ocr.sock --config ocr.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import queue
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .local_ocr import LocalOCRProcessor
+from .ocr_layout import OCRLayout
+from .tiff_frames import TIFF_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'ocr_service.sock')
+DEFAULT_CONCURRENCY = 2
+DEFAULT_MAX_DOCUMENT_BYTES = 256 * 1024 * 1024
+
+# Lower values are served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+_LENGTH = struct.Struct('>I')
+_MAX_HEADER_BYTES = 1024 * 1024
+_CHUNK_SIZE = 1024 * 1024
+
+# Seconds between checks that a client waiting for its result is still connected
+_DISCONNECT_POLL = 0.5
+
+
+class OCRServiceError(RuntimeError):
+    """The OCR service could not be reached or failed to run a job."""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], min(size - received, _CHUNK_SIZE))
+        if not count:
+            raise ConnectionError("Connection closed mid-message")
+        received += count
+    return buffer
+
+
+def send_message(
+    sock: socket.socket,
+    header: Dict[str, Any],
+    payload: Union[bytes, Path, None] = None
+) -> None:
+    """Send a header and an optional payload; files are sent without reading them into memory."""
+    if isinstance(payload, Path):
+        header = {**header, 'size': payload.stat().st_size}
+    elif payload is not None:
+        header = {**header, 'size': len(payload)}
+    encoded = json.dumps(header).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded)
+    if isinstance(payload, Path):
+        with open(payload, 'rb') as f:
+            sock.sendfile(f)
+    elif payload:
+        sock.sendall(payload)
+
+
+def recv_message(
+    sock: socket.socket, max_payload: int = DEFAULT_MAX_DOCUMENT_BYTES
+) -> Tuple[Dict[str, Any], bytearray]:
+    """Receive a header and its payload.
+
+    Raises:
+        ValueError: If the header or payload exceeds the size limits
+        ConnectionError: If the peer closes the connection early
+    """
+    (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    if length > _MAX_HEADER_BYTES:
+        raise ValueError(f"Header of {length} bytes is too large")
+    header = json.loads(_recv_exact(sock, length))
+    size = int(header.get('size', 0))
+    if size > max_payload:
+        raise ValueError(f"Document of {size} bytes exceeds the {max_payload} byte limit")
+    return header, _recv_exact(sock, size) if size else bytearray()
+
+
+def _peer_closed(sock: socket.socket) -> bool:
+    """Tell whether the peer of a connection waiting for a response has closed it."""
+    readable, _, _ = select.select([sock], [], [], 0)
+    if not readable:
+        return False
+    try:
+        return not sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+
+class _Job:
+    """A queued OCR request."""
+
+    __slots__ = ('priority', 'seq', 'op', 'data', 'vendor', 'submitted', 'started',
+                 'cancelled', 'done', 'result', 'error')
+
+    def __init__(self, priority: int, seq: int, op: str, data: bytearray,
+                 vendor: Optional[str] = None):
+        self.priority = priority
+        self.seq = seq
+        self.op = op
+        self.data = data
+        self.vendor = vendor
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+    def __lt__(self, other: '_Job') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OCRService:
+    """OCR daemon serving a priority job queue over a Unix socket."""
+
+    def __init__(
+        self,
+        config: Optional[Dict[str, Any]] = None,
+        socket_path: Union[str, Path] = DEFAULT_SOCKET_PATH,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_document_bytes: int = DEFAULT_MAX_DOCUMENT_BYTES,
+        socket_mode: int = 0o660
+    ):
+        """Initialize the service and warm up its OCR processor.
+
+        Args:
+            config: ``LocalOCRProcessor`` settings; ``parallel_pages`` is on
+                unless disabled, so PDF pages share the processor's workers
+            socket_path: Path of the Unix socket
+            concurrency: Jobs run at the same time
+            max_document_bytes: Largest document accepted
+            socket_mode: Permissions of the socket file
+        """
+        self.processor = LocalOCRProcessor({'parallel_pages': True, **(config or {})})
+        self.socket_path = str(socket_path)
+        self.concurrency = max(concurrency, 1)
+        self.max_document_bytes = max_document_bytes
+        self.socket_mode = socket_mode
+        self._queue: 'queue.PriorityQueue[_Job]' = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+        self._dispatchers = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'running': 0,
+            'queue_seconds': 0.0,
+            'max_queue_seconds': 0.0,
+            'run_seconds': 0.0,
+        }
+
+    def submit(
+        self,
+        op: str,
+        data: bytearray,
+        priority: int = PRIORITY_NORMAL,
+        vendor: Optional[str] = None
+    ) -> _Job:
+        """Queue a job; wait on its ``done`` event for the result.
+
+        Args:
+            op: ``'image'``, ``'pdf'`` or ``'tiff'``
+            data: Document contents
+            priority: Lower values run first
+            vendor: Sender of the document, for the processor's ``auto_language``
+        """
+        if op not in ('image', 'pdf', 'tiff'):
+            raise ValueError(f"Unknown operation: {op}")
+        job = _Job(priority, next(self._seq), op, data, vendor)
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._queue.put(job)
+        return job
+
+    def _run_job(self, job: _Job) -> Any:
+        if job.op in ('pdf', 'tiff'):
+            if job.op == 'pdf':
+                # Rendered page files would pile up in a long-running daemon
+                result = self.processor.extract_text_from_pdf(job.data, keep_images=False,
+                                                              vendor=job.vendor)
+            else:
+                result = self.processor.extract_text_from_tiff(job.data, vendor=job.vendor)
+            # Layouts of a ``structured`` service travel as their columnar dicts
+            return {**result, 'pages': [
+                {**page, 'layout': page['layout'].to_dict()} if 'layout' in page else page
+                for page in result['pages']
+            ]}
+        return {'text': self.processor.extract_text_from_image(job.data, vendor=job.vendor)}
+
+    def _dispatch(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                if job.cancelled:
+                    continue
+                job.started = time.monotonic()
+                waited = job.started - job.submitted
+                self._stats['running'] += 1
+                self._stats['queue_seconds'] += waited
+                self._stats['max_queue_seconds'] = max(self._stats['max_queue_seconds'], waited)
+            try:
+                job.result = self._run_job(job)
+            except Exception as e:
+                logger.error(f"OCR job failed: {e}", exc_info=True)
+                job.error = str(e)
+            finally:
+                job.data = bytearray()
+                with self._lock:
+                    self._stats['running'] -= 1
+                    self._stats['completed' if job.error is None else 'failed'] += 1
+                    self._stats['run_seconds'] += time.monotonic() - job.started
+                job.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return job counters, queue depth and average queue and run times.
+
+        With the processor's ``governor`` enabled, its slot counters and slot
+        waiting times are included as ``governor``, and with ``templates``
+        the template registry's counters as ``templates``.
+        """
+        with self._lock:
+            finished = self._stats['completed'] + self._stats['failed']
+            started = finished + self._stats['running']
+            stats = {
+                **{key: value for key, value in self._stats.items()
+                   if key not in ('queue_seconds', 'run_seconds')},
+                'queued': self._queue.qsize(),
+                'max_queue_seconds': round(self._stats['max_queue_seconds'], 3),
+                'avg_queue_seconds': round(self._stats['queue_seconds'] / started, 3)
+                if started else None,
+                'avg_run_seconds': round(self._stats['run_seconds'] / finished, 3)
+                if finished else None,
+            }
+        if self.processor.governor is not None:
+            stats['governor'] = self.processor.governor.stats()
+        if self.processor.templates is not None:
+            stats['templates'] = self.processor.templates.stats()
+        return stats
+
+    def _cancel(self, job: _Job) -> None:
+        """Drop the job of a client that went away, unless it is already running."""
+        with self._lock:
+            if job.started is None:
+                job.cancelled = True
+                job.data = bytearray()
+                self._stats['cancelled'] += 1
+        if job.cancelled:
+            logger.warning("Client went away while its job was queued; dropped the job")
+        else:
+            logger.warning("Client went away while its job was running; the result is discarded")
+
+    def _handle(self, sock: socket.socket) -> None:
+        """Serve one client request."""
+        try:
+            header, payload = recv_message(sock, self.max_document_bytes)
+        except (ValueError, ConnectionError) as e:
+            send_message(sock, {'ok': False, 'error': str(e)})
+            return
+
+        op = header.get('op')
+        if op == 'ping':
+            send_message(sock, {'ok': True})
+        elif op == 'stats':
+            send_message(sock, {'ok': True, 'result': self.stats()})
+        elif op in ('image', 'pdf', 'tiff'):
+            job = self.submit(op, payload, int(header.get('priority', PRIORITY_NORMAL)),
+                              header.get('vendor'))
+            while not job.done.wait(_DISCONNECT_POLL):
+                if _peer_closed(sock):
+                    self._cancel(job)
+                    return
+            try:
+                send_message(sock, {'ok': job.error is None, 'result': job.result,
+                                    'error': job.error})
+            except OSError as e:
+                logger.warning(f"Client went away before its result was sent: {e}")
+        else:
+            send_message(sock, {'ok': False, 'error': f"Unknown operation: {op}"})
+
+    def _remove_stale_socket(self) -> None:
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+        else:
+            raise OCRServiceError(f"An OCR service is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def start(self) -> None:
+        """Bind the socket and start the dispatcher threads."""
+        service = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                service._handle(self.request)
+
+        self._remove_stale_socket()
+        if os.path.dirname(self.socket_path):
+            os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.socket_path, self.socket_mode)
+
+        self._stop.clear()
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch, name=f'ocr-dispatch-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in self._dispatchers:
+            thread.start()
+        logger.info(f"OCR service listening on {self.socket_path} "
+                    f"({self.concurrency} concurrent jobs)")
+
+    def serve_forever(self) -> None:
+        """Start the service and handle requests until ``shutdown`` is called."""
+        if self._server is None:
+            self.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        """Stop ``serve_forever`` (call from another thread or a signal handler)."""
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+    def close(self) -> None:
+        """Stop the dispatchers, remove the socket and release the OCR workers."""
+        self._stop.set()
+        for thread in self._dispatchers:
+            thread.join(timeout=5)
+        self._dispatchers = []
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        self.processor.cleanup()
+
+
+class OCRServiceClient:
+    """Client of an ``OCRService`` with the document methods of ``LocalOCRProcessor``."""
+
+    def __init__(
+        self,
+        socket_path: Union[str, Path] = DEFAULT_SOCKET_PATH,
+        priority: int = PRIORITY_NORMAL,
+        timeout: Optional[float] = None
+    ):
+        """Initialize the client.
+
+        Args:
+            socket_path: Path of the service socket
+            priority: Priority of submitted jobs (lower runs first)
+            timeout: Seconds to wait for a result, or None to wait indefinitely
+        """
+        self.socket_path = str(socket_path)
+        self.priority = priority
+        self.timeout = timeout
+
+    def _request(self, header: Dict[str, Any], payload: Union[bytes, Path, None] = None) -> Any:
+        """Send a request on a new connection and return the result.
+
+        Raises:
+            OCRServiceError: If the service is unreachable or the job failed
+            OSError: If a file payload cannot be read
+        """
+        if isinstance(payload, Path):
+            payload.stat()  # Report a missing file as such, not as a service failure
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                send_message(sock, header, payload)
+                response, _ = recv_message(sock)
+        except (OSError, ValueError) as e:
+            raise OCRServiceError(f"OCR service at {self.socket_path} failed: {e}") from e
+        if not response.get('ok'):
+            raise OCRServiceError(response.get('error') or 'OCR job failed')
+        return response.get('result')
+
+    def ping(self) -> bool:
+        """Return True if the service is accepting requests."""
+        try:
+            self._request({'op': 'ping'})
+            return True
+        except OCRServiceError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the service's job statistics."""
+        return self._request({'op': 'stats'})
+
+    def extract_text_from_image(
+        self, image: Union[str, Path, bytes, BinaryIO, np.ndarray], vendor: Optional[str] = None
+    ) -> str:
+        """Extract text from an image file, encoded bytes, file-like object or numpy array.
+
+        ``vendor`` names the sender of the document, for the service's ``auto_language``.
+
+        Raises:
+            OCRServiceError: If the service is unreachable or the job failed
+        """
+        if isinstance(image, str):
+            image = Path(image)
+        elif isinstance(image, np.ndarray):
+            ok, encoded = cv2.imencode('.png', image)
+            if not ok:
+                raise ValueError("Could not encode image")
+            image = encoded.tobytes()
+        elif hasattr(image, 'read'):
+            image = image.read()
+        result = self._request({'op': 'image', 'priority': self.priority, 'vendor': vendor}, image)
+        return result['text']
+
+    def extract_text_from_pdf(
+        self, pdf_data: Union[bytes, str, Path], vendor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Extract text from a PDF; the result has the keys of ``LocalOCRProcessor``'s.
+
+        ``vendor`` names the sender of the document, for the service's ``auto_language``.
+
+        Raises:
+            OCRServiceError: If the service is unreachable or the job failed
+        """
+        if isinstance(pdf_data, str):
+            pdf_data = Path(pdf_data)
+        result = self._request(
+            {'op': 'pdf', 'priority': self.priority, 'vendor': vendor}, pdf_data
+        )
+        for page in result.get('pages', []):
+            if 'layout' in page:
+                page['layout'] = OCRLayout.from_dict(page['layout'])
+        return result
+
+    def extract_text_from_tiff(
+        self, tiff_data: Union[bytes, str, Path], vendor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Extract text from a multi-page TIFF; the result has the keys of a PDF's.
+
+        ``vendor`` names the sender of the document, for the service's ``auto_language``.
+
+        Raises:
+            OCRServiceError: If the service is unreachable or the job failed
+        """
+        if isinstance(tiff_data, str):
+            tiff_data = Path(tiff_data)
+        result = self._request(
+            {'op': 'tiff', 'priority': self.priority, 'vendor': vendor}, tiff_data
+        )
+        for page in result.get('pages', []):
+            if 'layout' in page:
+                page['layout'] = OCRLayout.from_dict(page['layout'])
+        return result
+
+    def process_file(
+        self, file_path: Union[str, Path], file_type: str = None, vendor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Process a file like ``LocalOCRProcessor.process_file``, recording errors in the result."""
+        file_path = Path(file_path)
+        if not file_type:
+            file_type = file_path.suffix.lower().lstrip('.')
+
+        result = {
+            'file_path': str(file_path),
+            'file_type': file_type,
+            'success': False,
+            'text': '',
+            'metadata': {}
+        }
+        try:
+            if file_type.lower() == 'pdf':
+                result.update(self.extract_text_from_pdf(file_path, vendor=vendor))
+            elif f'.{file_type.lower()}' in TIFF_EXTENSIONS:
+                result.update(self.extract_text_from_tiff(file_path, vendor=vendor))
+            else:
+                result['text'] = self.extract_text_from_image(file_path, vendor=vendor)
+                result['success'] = bool(result['text'].strip())
+        except (OCRServiceError, OSError) as e:
+            logger.error(f"Error processing file {file_path}: {e}")
+            result['error'] = str(e)
+        return result
+
+    def cleanup(self) -> None:
+        """Nothing to release; present for compatibility with ``LocalOCRProcessor``."""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Run the local OCR service.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='Unix socket path')
+    parser.add_argument('--config', default=None,
+                        help='JSON file with LocalOCRProcessor settings')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Jobs run at the same time')
+    parser.add_argument('--max-document-mb', type=float,
+                        default=DEFAULT_MAX_DOCUMENT_BYTES / (1024 * 1024),
+                        help='Largest document accepted')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    config = json.loads(Path(args.config).read_text()) if args.config else {}
+    service = OCRService(
+        config,
+        socket_path=args.socket,
+        concurrency=args.concurrency,
+        max_document_bytes=int(args.max_document_mb * 1024 * 1024)
+    )
+    signal.signal(signal.SIGTERM, lambda *_: service.shutdown())
+    signal.signal(signal.SIGINT, lambda *_: service.shutdown())
+    service.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
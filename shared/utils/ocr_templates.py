@@ -0,0 +1,310 @@
+"""
+OCR Template Module
+
+Recurring vendors send invoices with the same layout every month. A template
+records where the invoice number, issue date and total were found on page 1
+of an earlier invoice, as fractions of the page size, keyed by the sender
+and by a perceptual hash of the page. When a new page matches a template,
+only those zones need to be OCR'd; their text is validated against the
+expected label and value patterns, and a page that fails validation is OCR'd
+in full and its template learned again.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .ocr_layout import OCRLayout
+
+logger = logging.getLogger(__name__)
+
+# Label and value patterns of the fields a template records (English,
+# Polish and German invoices); the value must follow its label on one line
+FIELD_PATTERNS: Dict[str, Tuple[Pattern, Pattern]] = {
+    'invoice_number': (
+        re.compile(r'invoice\s*(?:no\.?|number|#)|n(?:ume)?r\.?\s+faktury|faktura\s+(?:vat\s+)?nr'
+                   r'|rechnungs\s*-?\s*(?:nr\.?|nummer)', re.IGNORECASE),
+        re.compile(r'[A-Z0-9][A-Z0-9/\-.]*\d[A-Z0-9/\-.]*', re.IGNORECASE),
+    ),
+    'issue_date': (
+        re.compile(r'(?:issue|invoice)\s+date|date\s+of\s+issue|data\s+wystawienia'
+                   r'|rechnungsdatum', re.IGNORECASE),
+        re.compile(r'\d{4}-\d{2}-\d{2}|\d{1,2}[./-]\d{1,2}[./-]\d{2,4}'),
+    ),
+    'total': (
+        re.compile(r'total(?:\s+due)?|amount\s+due|razem(?:\s+do\s+zap[łl]aty)?|do\s+zap[łl]aty'
+                   r'|gesamtbetrag|gesamtsumme', re.IGNORECASE),
+        re.compile(r'\d[\d\s.,]*[.,]\d{2}'),
+    ),
+}
+
+# Fields a page must have for its layout to become a template
+MIN_TEMPLATE_FIELDS = 2
+
+# Largest Hamming distance between page hashes of the same layout (of 64 bits)
+DEFAULT_MAX_DISTANCE = 10
+
+# Zone padding: vertical in line heights, horizontal as a share of the page
+# width, plus room to the right for longer values
+_PAD_LINES = 0.5
+_PAD_WIDTH = 0.02
+_GROW_RIGHT = 0.15
+
+# White rows between zones stacked for OCR
+_ZONE_GAP = 32
+
+Rect = Tuple[int, int, int, int]
+
+_registries: Dict[str, 'TemplateRegistry'] = {}
+_registries_lock = threading.Lock()
+
+
+def page_hash(image: np.ndarray) -> int:
+    """Return the 64-bit difference hash of a page image.
+
+    The page is shrunk to 9x8 pixels and each bit says whether a pixel is
+    brighter than its right neighbour, so the hash survives resolution,
+    scan noise and small content changes but not a different layout.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits of two page hashes."""
+    return bin(a ^ b).count('1')
+
+
+def match_field(name: str, text: str) -> Optional[str]:
+    """Return the value of a field in a line of text, if its label and value are there."""
+    label, value = FIELD_PATTERNS[name]
+    found = label.search(text)
+    if not found:
+        return None
+    matched = value.search(text, found.end())
+    return matched.group(0).strip() if matched else None
+
+
+def find_fields(layout: OCRLayout) -> Dict[str, Tuple[str, Rect]]:
+    """Find each field's first line in a page layout.
+
+    Returns:
+        Field name to its value and the pixel box of its line
+    """
+    fields: Dict[str, Tuple[str, Rect]] = {}
+    for text, box in layout.iter_lines():
+        for name in FIELD_PATTERNS:
+            if name in fields:
+                continue
+            value = match_field(name, text)
+            if value:
+                fields[name] = (value, box)
+    return fields
+
+
+def stack_zones(image: np.ndarray, zones: Dict[str, Rect]) -> Tuple[np.ndarray, Dict[str, Rect]]:
+    """Stack the zones of a page into one image so they are OCR'd in one call.
+
+    Returns:
+        The stacked grayscale image and each zone's band in it
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    crops = {name: gray[y0:y1, x0:x1] for name, (x0, y0, x1, y1) in zones.items()}
+    width = max((crop.shape[1] for crop in crops.values()), default=1) + 2 * _ZONE_GAP
+    height = sum(crop.shape[0] for crop in crops.values()) + _ZONE_GAP * (len(crops) + 1)
+    stacked = np.full((height, width), 255, np.uint8)
+    bands = {}
+    top = _ZONE_GAP
+    for name, crop in crops.items():
+        h, w = crop.shape
+        stacked[top:top + h, _ZONE_GAP:_ZONE_GAP + w] = crop
+        bands[name] = (0, top, width, top + h)
+        top += h + _ZONE_GAP
+    return stacked, bands
+
+
+class TemplateRegistry:
+    """Field zones of known page layouts, persisted as a JSON file.
+
+    Templates are keyed by vendor (e.g. the sender domain) when one is
+    given, otherwise by the page hash. A template is only used for pages
+    whose hash is within ``max_distance`` of the one it was learned from; a
+    vendor without a template of its own is matched against all of them.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        min_fields: int = MIN_TEMPLATE_FIELDS
+    ):
+        """Load the registry.
+
+        Args:
+            path: JSON file of the templates, or None to keep them in memory
+            max_distance: Largest page hash distance of a matching page
+            min_fields: Fields a page must have to become a template
+        """
+        self.path = Path(path) if path else None
+        self.max_distance = max_distance
+        self.min_fields = min_fields
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Dict[str, Any]] = {}
+        self._stats = {'matches': 0, 'hits': 0, 'misses': 0, 'learned': 0}
+        if self.path and self.path.exists():
+            try:
+                self._templates = json.loads(self.path.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable template registry {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def match(self, vendor: Optional[str], page: int) -> Optional[Dict[str, Any]]:
+        """Return the template of a vendor, or the nearest one by page hash.
+
+        Args:
+            vendor: Sender of the document, or None
+            page: ``page_hash`` of page 1
+
+        Returns:
+            The template, or None if none is within ``max_distance``
+        """
+        with self._lock:
+            if vendor and vendor in self._templates:
+                candidates = [self._templates[vendor]]
+            else:
+                candidates = list(self._templates.values())
+            best = min(candidates, key=lambda t: hamming(int(t['hash'], 16), page), default=None)
+            if best is None or hamming(int(best['hash'], 16), page) > self.max_distance:
+                return None
+            self._stats['matches'] += 1
+            return best
+
+    def zones(self, template: Dict[str, Any], size: Tuple[int, int]) -> Dict[str, Rect]:
+        """Return a template's field zones in the pixels of a page of ``size`` (width, height)."""
+        width, height = size
+        return {
+            name: (round(x0 * width), round(y0 * height), round(x1 * width), round(y1 * height))
+            for name, (x0, y0, x1, y1) in template['fields'].items()
+        }
+
+    def validate(self, template: Dict[str, Any], texts: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Read the field values from the OCR'd zones of a template.
+
+        Returns:
+            Field name to value, or None if any zone lacks its label or value
+        """
+        fields = {}
+        for name in template['fields']:
+            value = match_field(name, texts.get(name, ''))
+            if value is None:
+                with self._lock:
+                    self._stats['misses'] += 1
+                    template['misses'] = template.get('misses', 0) + 1
+                return None
+            fields[name] = value
+        with self._lock:
+            self._stats['hits'] += 1
+            template['hits'] = template.get('hits', 0) + 1
+        return fields
+
+    def learn(self, vendor: Optional[str], page: int, layout: OCRLayout) -> Dict[str, str]:
+        """Record the field zones of a fully OCR'd page 1.
+
+        The page becomes the template of ``vendor`` (or of its hash) if at
+        least ``min_fields`` fields were found, replacing an older one.
+
+        Args:
+            vendor: Sender of the document, or None
+            page: ``page_hash`` of the page
+            layout: OCR layout of the page
+
+        Returns:
+            The field values found on the page
+        """
+        width, height = layout.size
+        found = find_fields(layout)
+        if len(found) < self.min_fields or not width or not height:
+            return {name: value for name, (value, _) in found.items()}
+
+        zones = {}
+        for name, (_, (x0, y0, x1, y1)) in found.items():
+            pad_y = (y1 - y0) * _PAD_LINES
+            pad_x = width * _PAD_WIDTH
+            zones[name] = [
+                round(max(x0 - pad_x, 0) / width, 4),
+                round(max(y0 - pad_y, 0) / height, 4),
+                round(min(x1 + pad_x + width * _GROW_RIGHT, width) / width, 4),
+                round(min(y1 + pad_y, height) / height, 4),
+            ]
+        key = vendor or f'hash:{page:016x}'
+        with self._lock:
+            self._templates[key] = {
+                'key': key,
+                'hash': f'{page:016x}',
+                'fields': zones,
+                'learned': time.time(),
+                'hits': 0,
+                'misses': 0,
+            }
+            self._stats['learned'] += 1
+            self._save()
+        logger.info(f"Learned OCR template {key} with fields {', '.join(zones)}")
+        return {name: value for name, (value, _) in found.items()}
+
+    def _save(self) -> None:
+        """Write the templates atomically; called with the lock held."""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.templates_', dir=self.path.parent)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._templates, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save template registry {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return match, hit, miss and learn counters and the number of templates."""
+        with self._lock:
+            return {**self._stats, 'templates': len(self._templates)}
+
+    def keys(self) -> List[str]:
+        """Return the keys of the known templates."""
+        with self._lock:
+            return list(self._templates)
+
+
+def get_template_registry(
+    path: Optional[Union[str, Path]] = None,
+    max_distance: int = DEFAULT_MAX_DISTANCE
+) -> TemplateRegistry:
+    """Return the registry for a file path, shared by all callers in the process.
+
+    Args:
+        path: JSON file of the templates, or None for a memory-only registry
+        max_distance: Largest page hash distance of a matching page (used
+            when the registry is created)
+
+    Returns:
+        The shared registry instance
+    """
+    name = os.path.abspath(path) if path else ''
+    with _registries_lock:
+        if name not in _registries:
+            _registries[name] = TemplateRegistry(path, max_distance=max_distance)
+        return _registries[name]
@@ -0,0 +1,164 @@
+"""
+Page Preprocessing Module
+
+Grayscale conversion, Otsu thresholding and dilation of page images, the
+steps ``LocalOCRProcessor.preprocess_image`` runs before Tesseract. The
+structuring element is built once, the intermediate grayscale and binary
+pages are written into per-thread buffers that are reused while the page
+size stays the same, and pages are converted to grayscale from the layout
+they arrive in (RGB from Pillow, BGR from OpenCV) without a color round trip.
+``preprocess_batch`` does the same for a stack of pages, converting the
+whole stack in one call and writing into one preallocated output array.
+"""
+import threading
+from typing import Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Structuring element of the dilation that connects text components
+DILATE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+_OTSU = cv2.THRESH_BINARY + cv2.THRESH_OTSU
+
+PageImage = Union[np.ndarray, Image.Image]
+
+_scratch = threading.local()
+
+
+def _scratch_buffer(name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """Return this thread's buffer ``name``, reallocated only when ``shape`` changes."""
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = buffers[name] = np.empty(shape, np.uint8)
+    return buffer
+
+
+def page_shape(image: PageImage) -> Tuple[int, int]:
+    """Return the ``(height, width)`` of a numpy or PIL page."""
+    if isinstance(image, Image.Image):
+        return image.size[1], image.size[0]
+    return image.shape[0], image.shape[1]
+
+
+def to_gray(image: PageImage, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Convert a page to 8-bit grayscale straight from its native layout.
+
+    Pillow images are read as RGB (or as they are in mode 'L') and numpy
+    arrays as BGR(A), as OpenCV decodes them; a grayscale array is returned
+    as is unless ``out`` is given.
+
+    Args:
+        image: Page as a numpy array or PIL image
+        out: ``(height, width)`` uint8 array to write into
+
+    Returns:
+        The grayscale page (``out`` if given)
+    """
+    if isinstance(image, Image.Image):
+        if image.mode == 'L':
+            gray = np.asarray(image)
+            if out is None:
+                return gray
+            np.copyto(out, gray)
+            return out
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2GRAY, dst=out)
+    if image.ndim == 3 and image.shape[2] in (3, 4):
+        code = cv2.COLOR_BGR2GRAY if image.shape[2] == 3 else cv2.COLOR_BGRA2GRAY
+        return cv2.cvtColor(image, code, dst=out)
+    if image.ndim == 3:
+        image = image[:, :, 0]
+    if out is None:
+        return image
+    np.copyto(out, image)
+    return out
+
+
+def preprocess_page(image: PageImage, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Convert a page to grayscale, binarize it with Otsu's threshold and dilate it.
+
+    Args:
+        image: Page as a numpy array (BGR or grayscale) or PIL image
+        out: ``(height, width)`` uint8 array to write the result into;
+            a new array is returned if not given
+
+    Returns:
+        The preprocessed page
+
+    Raises:
+        ValueError: If ``out`` has the wrong shape
+    """
+    shape = page_shape(image)
+    if out is not None and (out.shape != shape or out.dtype != np.uint8):
+        raise ValueError(f"Output must be a uint8 array of shape {shape}")
+    gray = to_gray(image, None if isinstance(image, np.ndarray) and image.ndim == 2
+                   else _scratch_buffer('gray', shape))
+    binary = _scratch_buffer('binary', shape)
+    cv2.threshold(gray, 0, 255, _OTSU, dst=binary)
+    if out is None:
+        out = np.empty(shape, np.uint8)
+    cv2.dilate(binary, DILATE_KERNEL, dst=out, iterations=1)
+    return out
+
+
+def preprocess_batch(
+    pages: Union[np.ndarray, Sequence[PageImage]],
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Preprocess a stack of equally sized pages like ``preprocess_page``.
+
+    An ``(n, height, width, 3)`` BGR stack is converted to grayscale in a
+    single call, straight into the output array. Otsu's threshold is chosen
+    per page, so thresholding and dilation then run page by page, in place
+    in the output.
+
+    Args:
+        pages: ``(n, height, width[, channels])`` array, or a sequence of
+            numpy or PIL pages of the same size
+        out: ``(n, height, width)`` uint8 array to write into, e.g. reused
+            across batches; allocated if not given
+
+    Returns:
+        The preprocessed pages as one ``(n, height, width)`` array
+
+    Raises:
+        ValueError: If the pages differ in size or ``out`` has the wrong shape
+    """
+    if isinstance(pages, np.ndarray):
+        count, height, width = pages.shape[:3]
+    else:
+        shapes = {page_shape(page) for page in pages}
+        if len(shapes) > 1:
+            raise ValueError(f"Pages of a batch must have the same size, got {sorted(shapes)}")
+        count = len(pages)
+        height, width = shapes.pop() if shapes else (0, 0)
+
+    if out is None:
+        out = np.empty((count, height, width), np.uint8)
+    elif (out.shape != (count, height, width) or out.dtype != np.uint8
+          or not out.flags.c_contiguous):
+        raise ValueError(
+            f"Output must be a contiguous uint8 array of shape {(count, height, width)}"
+        )
+    if not count:
+        return out
+
+    if isinstance(pages, np.ndarray) and pages.ndim == 4 and pages.shape[3] in (3, 4):
+        code = cv2.COLOR_BGR2GRAY if pages.shape[3] == 3 else cv2.COLOR_BGRA2GRAY
+        cv2.cvtColor(pages.reshape(count * height, width, pages.shape[3]), code,
+                     dst=out.reshape(count * height, width))
+    else:
+        for index in range(count):
+            to_gray(pages[index], out[index])
+
+    binary = _scratch_buffer('binary', (height, width))
+    for index in range(count):
+        cv2.threshold(out[index], 0, 255, _OTSU, dst=binary)
+        cv2.dilate(binary, DILATE_KERNEL, dst=out[index], iterations=1)
+    return out
@@ -0,0 +1,118 @@
+"""
+PDF Text Layer Module
+
+This module reads the embedded text layer of PDF documents with Poppler's
+``pdftotext`` (installed together with ``pdftoppm``, which pdf2image needs)
+and decides per page whether that text is usable or the page is a scan that
+still has to be OCR'd.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_TEXT_CHARS = 20
+DEFAULT_MAX_GARBAGE_RATIO = 0.1
+
+
+def extract_text_layer(
+    pdf: Union[bytes, str, Path],
+    first_page: Optional[int] = None,
+    last_page: Optional[int] = None,
+    timeout: float = 60,
+    pdftotext_cmd: str = 'pdftotext'
+) -> Optional[List[str]]:
+    """Extract the embedded text of each page of a PDF.
+
+    Args:
+        pdf: PDF contents as bytes, or the path of a PDF file
+        first_page: First page to extract (1-based)
+        last_page: Last page to extract
+        timeout: Seconds to wait for ``pdftotext``
+        pdftotext_cmd: ``pdftotext`` executable
+
+    Returns:
+        The text of each page (empty for pages without a text layer), or
+        None if ``pdftotext`` is unavailable or fails
+    """
+    if shutil.which(pdftotext_cmd) is None:
+        logger.debug(f"{pdftotext_cmd} not found; skipping the text layer")
+        return None
+
+    tmp_path = None
+    if isinstance(pdf, (bytes, bytearray)):
+        fd, tmp_path = tempfile.mkstemp(suffix='.pdf', prefix='text_layer_')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        pdf = tmp_path
+
+    args = [pdftotext_cmd, '-layout', '-enc', 'UTF-8']
+    if first_page:
+        args += ['-f', str(first_page)]
+    if last_page:
+        args += ['-l', str(last_page)]
+    args += [str(pdf), '-']
+
+    try:
+        completed = subprocess.run(args, capture_output=True, timeout=timeout, check=False)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"pdftotext failed: {e}")
+        return None
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+
+    if completed.returncode != 0:
+        logger.debug(f"pdftotext exited with {completed.returncode}: {completed.stderr[:200]!r}")
+        return None
+
+    # pdftotext ends every page with a form feed
+    pages = completed.stdout.decode('utf-8', errors='replace').split('\f')
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+
+def is_usable_text(
+    text: str,
+    min_chars: int = DEFAULT_MIN_TEXT_CHARS,
+    max_garbage_ratio: float = DEFAULT_MAX_GARBAGE_RATIO
+) -> bool:
+    """Decide whether the text layer of a page can replace OCR.
+
+    Scanned pages have no text layer or only a few stray characters, and
+    PDFs with broken font encodings produce replacement or control
+    characters; both are sent to OCR.
+
+    Args:
+        text: Text layer of one page
+        min_chars: Minimum number of non-whitespace characters
+        max_garbage_ratio: Maximum share of unreadable characters
+
+    Returns:
+        True if the page is born-digital with a readable text layer
+    """
+    chars = ''.join(text.split())
+    if len(chars) < min_chars:
+        return False
+    garbage = sum(1 for char in chars if char == '\ufffd' or not char.isprintable())
+    return garbage / len(chars) <= max_garbage_ratio
+
+
+def page_runs(page_numbers: Sequence[int]) -> List[Tuple[int, int]]:
+    """Group page numbers into contiguous ``(first, last)`` runs.
+
+    For example ``[1, 2, 3, 7, 9, 10]`` becomes ``[(1, 3), (7, 7), (9, 10)]``.
+    """
+    runs: List[Tuple[int, int]] = []
+    for number in sorted(set(page_numbers)):
+        if runs and number == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], number)
+        else:
+            runs.append((number, number))
+    return runs
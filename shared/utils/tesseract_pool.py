@@ -0,0 +1,244 @@
+"""
+Tesseract Worker Pool Module
+
+``pytesseract`` starts a new ``tesseract`` process for every image, writes the
+image to a temporary file and reloads the language models each time. This
+module keeps a pool of worker processes instead, each holding a Tesseract
+API instance (via ``tesserocr``) with the models already loaded, and sends
+page images to them as numpy arrays over the pool's pipes.
+"""
+import contextlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ocr_governor import get_ocr_governor
+
+try:
+    import tesserocr
+    from PIL import Image
+    HAS_TESSEROCR = True
+except ImportError:
+    HAS_TESSEROCR = False
+
+logger = logging.getLogger(__name__)
+
+# Extra time allowed for a worker result beyond the Tesseract timeout (and the
+# OCR slot timeout with the governor)
+_RESULT_GRACE = 5.0
+
+# Tesseract API, OCR governor and slot timeout of a worker process, created
+# by _init_worker
+_api = None
+_governor = None
+_slot_timeout = None
+
+
+def _init_worker(
+    languages: Sequence[str],
+    oem: int,
+    psm: int,
+    tessdata_dir: Optional[str],
+    threads: int,
+    governor: Optional[Dict[str, Any]] = None,
+    slot_timeout: Optional[float] = None
+) -> None:
+    """Load the Tesseract models once per worker process."""
+    global _api, _governor, _slot_timeout
+    _slot_timeout = slot_timeout
+    if governor:
+        _governor = get_ocr_governor(**governor)
+        threads = _governor.threads_per_slot
+    os.environ['OMP_THREAD_LIMIT'] = str(threads)
+    kwargs = {'lang': '+'.join(languages), 'oem': oem, 'psm': psm}
+    if tessdata_dir and os.path.isdir(tessdata_dir):
+        kwargs['path'] = tessdata_dir.rstrip('/') + '/'
+    _api = tesserocr.PyTessBaseAPI(**kwargs)
+
+
+def _recognize(
+    image: np.ndarray, tsv: bool = False, timeout: Optional[float] = None
+) -> Tuple[str, float, Optional[float]]:
+    """Recognize one preprocessed image with the worker's Tesseract API.
+
+    ``timeout`` only starts once the worker holds a governor slot.
+
+    Returns:
+        The text (Tesseract TSV with word boxes if ``tsv``), the mean word
+        confidence (0-100) and the seconds waited for a governor slot
+
+    Raises:
+        RuntimeError: If recognition takes longer than ``timeout``
+        TimeoutError: If no governor slot became free within the slot timeout
+    """
+    slot_context = _governor.slot(timeout=_slot_timeout) if _governor else contextlib.nullcontext()
+    with slot_context as slot:
+        _api.SetImage(Image.fromarray(image))
+        if timeout and not _api.Recognize(int(timeout * 1000)):
+            raise RuntimeError("Tesseract worker timed out")
+        text = _api.GetTSVText(0) if tsv else _api.GetUTF8Text()
+        return text, float(_api.MeanTextConf()), slot.waited if slot else None
+
+
+class TesseractWorkerPool:
+    """Warm Tesseract workers with their language models loaded.
+
+    Each worker process initializes Tesseract once; images are passed to the
+    workers as numpy arrays, so nothing is written to disk and no process is
+    started per image. If a worker dies, the images it was given fail and the
+    workers are restarted for the next ones.
+    """
+
+    def __init__(
+        self,
+        languages: Sequence[str] = ('eng',),
+        oem: int = 1,
+        psm: int = 6,
+        tessdata_dir: Optional[str] = None,
+        workers: int = 1,
+        threads_per_worker: int = 1,
+        governor: Optional[Dict[str, Any]] = None,
+        slot_timeout: Optional[float] = None
+    ):
+        """Start the worker processes.
+
+        Args:
+            languages: Tesseract language codes
+            oem: OCR engine mode
+            psm: Page segmentation mode
+            tessdata_dir: Directory with the language models (Tesseract's
+                default location if None or missing)
+            workers: Number of worker processes
+            threads_per_worker: OpenMP threads Tesseract may use in a worker
+            governor: ``get_ocr_governor`` arguments; workers then hold one of
+                its slots per image and use the slot's threads
+            slot_timeout: Seconds a worker waits for a governor slot, or None
+                to wait indefinitely
+
+        Raises:
+            ImportError: If ``tesserocr`` is not installed
+        """
+        if not HAS_TESSEROCR:
+            raise ImportError("TesseractWorkerPool requires the tesserocr package")
+        self.workers = max(workers, 1)
+        self._governor = get_ocr_governor(**governor) if governor else None
+        self._slot_timeout = slot_timeout
+        self._initargs = (list(languages), oem, psm, tessdata_dir, max(threads_per_worker, 1),
+                          governor, slot_timeout)
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    def _result_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        """Return how long to wait for a result whose recognition may take ``timeout``.
+
+        Workers apply ``timeout`` once they hold a governor slot, so the wait
+        for the slot comes on top: up to the slot timeout, or without limit
+        if there is none.
+        """
+        if not timeout:
+            return None
+        if self._governor is None:
+            return timeout + _RESULT_GRACE
+        if self._slot_timeout is None:
+            return None
+        return timeout + self._slot_timeout + _RESULT_GRACE
+
+    def _submit(self, image: np.ndarray, tsv: bool, timeout: Optional[float]) -> Any:
+        with self._lock:
+            try:
+                return self._executor.submit(_recognize, image, tsv, timeout)
+            except BrokenProcessPool:
+                # A worker died (e.g. Tesseract crashed); the pool cannot be reused
+                logger.warning("A Tesseract worker died; restarting the workers")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+                return self._executor.submit(_recognize, image, tsv, timeout)
+
+    def _result(self, future: Any, timeout: Optional[float]) -> Tuple[str, float]:
+        """Wait for a worker result and account its slot wait with the governor."""
+        try:
+            text, confidence, waited = future.result(timeout=self._result_timeout(timeout))
+        except FutureTimeoutError:
+            if future.done():
+                # The worker itself raised: no slot within the slot timeout
+                raise
+            # Only drops an image still queued; a running one is bounded by
+            # the timeout in its worker
+            future.cancel()
+            raise RuntimeError("Tesseract worker timed out")
+        if waited is not None and self._governor is not None:
+            self._governor.record_wait(waited)
+        return text, confidence
+
+    def recognize(self, image: np.ndarray, timeout: Optional[float] = None) -> str:
+        """Recognize a preprocessed image.
+
+        Args:
+            image: Grayscale or binary image
+            timeout: Seconds Tesseract may take once the worker holds its slot
+
+        Returns:
+            Recognized text
+
+        Raises:
+            RuntimeError: If recognition times out or the worker dies
+        """
+        return self._result(self._submit(image, False, timeout), timeout)[0]
+
+    def recognize_with_confidence(
+        self, image: np.ndarray, timeout: Optional[float] = None
+    ) -> Tuple[str, float]:
+        """Recognize a preprocessed image and return Tesseract's mean word confidence.
+
+        Raises:
+            RuntimeError: If recognition times out or the worker dies
+        """
+        return self._result(self._submit(image, False, timeout), timeout)
+
+    def recognize_tsv(self, image: np.ndarray, timeout: Optional[float] = None) -> str:
+        """Recognize a preprocessed image and return Tesseract's TSV with word boxes.
+
+        Raises:
+            RuntimeError: If recognition times out or the worker dies
+        """
+        return self._result(self._submit(image, True, timeout), timeout)[0]
+
+    def recognize_many(
+        self, images: Sequence[np.ndarray], timeout: Optional[float] = None, tsv: bool = False
+    ) -> List[Tuple[str, Optional[float], Optional[str]]]:
+        """Recognize images concurrently across the workers.
+
+        Args:
+            images: Preprocessed images
+            timeout: Seconds Tesseract may take per image once a worker holds its slot
+            tsv: Return Tesseract TSV with word boxes instead of plain text
+
+        Returns:
+            One ``(text, confidence, error)`` tuple per image, in input order
+        """
+        futures = [self._submit(image, tsv, timeout) for image in images]
+        results = []
+        for i, future in enumerate(futures, 1):
+            try:
+                results.append((*self._result(future, timeout), None))
+            except Exception as e:
+                logger.error(f"Error recognizing image {i}: {e}")
+                results.append(('', None, str(e)))
+        return results
+
+    def close(self) -> None:
+        """Stop the workers."""
+        with self._lock:
+            self._executor.shutdown(wait=False, cancel_futures=True)
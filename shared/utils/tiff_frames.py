@@ -0,0 +1,78 @@
+"""
+TIFF Frames Module
+
+Scanned faxes arrive as multi-page TIFFs, often of 100 MB or more. This
+module reads them one frame at a time with Pillow, which decodes a frame
+only when it is seeked to, so memory holds a single page rather than the
+whole document.
+"""
+import io
+import logging
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+TIFF_EXTENSIONS = frozenset({'.tif', '.tiff'})
+
+# Little- and big-endian TIFF and BigTIFF signatures
+_TIFF_MAGIC = (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+')
+
+_X_RESOLUTION = 282
+
+TiffSource = Union[bytes, bytearray, str, Path]
+
+
+def is_tiff(data: Union[bytes, bytearray]) -> bool:
+    """Tell whether document contents start with a TIFF signature."""
+    return bytes(data[:4]) in _TIFF_MAGIC
+
+
+def _open(source: TiffSource) -> Image.Image:
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(str(source))
+
+
+def frame_count(source: TiffSource) -> int:
+    """Return the number of frames (pages) of a TIFF without decoding them."""
+    with _open(source) as tiff:
+        return getattr(tiff, 'n_frames', 1)
+
+
+def iter_frames(
+    source: TiffSource,
+    first_frame: Optional[int] = None,
+    last_frame: Optional[int] = None
+) -> Iterator[Tuple[int, Image.Image, Optional[int]]]:
+    """Decode the frames of a TIFF one at a time.
+
+    Color frames are converted to RGB and all others (bilevel fax pages,
+    palette images) to 8-bit grayscale, the modes ``LocalOCRProcessor.load_image`` takes
+    without another conversion.
+
+    Args:
+        source: TIFF contents as bytes, or the path of a TIFF file (read lazily)
+        first_frame: First frame to decode (1-based)
+        last_frame: Last frame to decode
+
+    Yields:
+        The frame number, the decoded frame and its horizontal resolution in
+        DPI, if the file records one
+
+    Raises:
+        OSError: If the file is not an image Pillow can read
+    """
+    with _open(source) as tiff:
+        count = getattr(tiff, 'n_frames', 1)
+        for index in range((first_frame or 1) - 1, min(last_frame or count, count)):
+            tiff.seek(index)
+            if tiff.mode != 'P':
+                # Pillow keeps the palette of an earlier palette frame after seeking
+                tiff.palette = None
+            frame = tiff.convert('RGB' if tiff.mode in ('RGB', 'RGBA', 'CMYK', 'YCbCr') else 'L')
+            # Pillow reports 1 DPI for a frame without resolution tags
+            dpi = tiff.info.get('dpi') if _X_RESOLUTION in tiff.tag_v2 else None
+            yield index + 1, frame, round(float(dpi[0])) if dpi and dpi[0] else None